@@ -27,7 +27,7 @@ from typing import Dict, Any, Optional, List
 from langgraph.errors import GraphInterrupt
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi.responses import StreamingResponse, FileResponse, PlainTextResponse
 from docx import Document as DocxDocument
 from pydantic import BaseModel
 import uvicorn
@@ -102,6 +102,7 @@ def jwt_decode(token: str, secret: str, alg: str = "HS256") -> Dict[str, Any]:
 
 # Import the RAG system from new modular structure
 from main import run_agentic_rag, rag_healthcheck
+from utils.metrics import render_metrics
 from nodes.DBRetrieval.KGdb import test_database_connection
 from config.settings import PROJECT_CATEGORIES, CATEGORIES_PATH, PLANNER_PLAYBOOK, PLAYBOOK_PATH, DEBUG_MODE, MAX_CONVERSATION_HISTORY
 
@@ -1319,6 +1320,12 @@ async def health_check():
             timestamp=datetime.now().isoformat()
         )
 
+# Prometheus scrape endpoint
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Node, LLM and Supabase RPC histograms in Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Debug endpoint to check if project categories and playbook are loaded
 @app.get("/debug/categories")
 async def debug_categories():
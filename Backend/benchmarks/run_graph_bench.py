@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end benchmark for the RAG graph.
+
+Runs `build_graph()` against the deterministic stubs in benchmarks/stubs.py
+(no OpenAI, Groq, Gemini or Supabase access) and reports:
+- p50 / p95 latency per graph and subgraph node
+- p50 / p95 / max total turn latency and throughput
+- peak RSS of the process
+- checkpoint bytes (latest checkpoint per thread and total stored)
+
+Usage (from Backend/):
+    python -m benchmarks.run_graph_bench --turns 80 --concurrency 4
+    python -m benchmarks.run_graph_bench --compare benchmarks/baseline.json
+    python -m benchmarks.run_graph_bench --write-baseline benchmarks/baseline.json
+
+`--compare` exits non-zero when a tracked metric regresses by more than
+`--tolerance` (default 25%) relative to the baseline. Latencies must also be
+`--min-delta-ms` (default 50 ms) slower in absolute terms, and nodes are gated
+on p50 only: with a few dozen samples a node's p95 is close to its maximum, so
+cheap nodes would flap on scheduler noise. Warmup turns (imports, first graph
+compile, lazy clients) are run first and left out of every sample.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+# QA-style questions. Phrasing avoids the doc-generation cues in
+# nodes/DesktopAgent/doc_generation/task_classifier.py so every turn takes the
+# router -> db_retrieval path instead of the desktop/docgen subgraph.
+DEFAULT_QUERIES = [
+    "Find jobs with a slab on grade and thickened edges",
+    "Which jobs used timber trusses over 12 m spans?",
+    "Show retaining wall details with 200 mm stems",
+    "Which warehouses used W310 steel members?",
+    "What footing sizes were used for the 2025 residential jobs?",
+]
+
+# Metrics compared against the baseline (all lower-is-better)
+TRACKED = ("turn_p50_ms", "turn_p95_ms", "peak_rss_mb", "checkpoint_bytes_latest_avg")
+# Tracked metrics in milliseconds; these also need --min-delta-ms of absolute slowdown
+LATENCY_METRICS = ("turn_p50_ms", "turn_p95_ms")
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+
+
+def _prepare_environment(latency_scale: float, projects: int, chunks_per_project: int):
+    """Install stubs before any graph module imports its LLMs or Supabase client."""
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark-offline")
+    os.environ["SUPABASE_URL"] = "http://benchmark.invalid"
+    os.environ["SUPABASE_ANON_KEY"] = "benchmark"
+    os.environ["CHECKPOINTER_TYPE"] = "memory"
+    os.environ.setdefault("DEBUG_MODE", "false")
+    os.environ.setdefault("GROQ_API_KEY", "")
+
+    _ensure_offline_tokenizer()
+
+    from benchmarks.stubs import FakeEmbeddings, FakeSupabaseClient, StubChatModel
+
+    emb = FakeEmbeddings(latency_scale=latency_scale)
+    supa = FakeSupabaseClient(emb, projects=projects, chunks_per_project=chunks_per_project,
+                              latency_scale=latency_scale)
+
+    import supabase
+    supabase.create_client = lambda *args, **kwargs: supa
+
+    import config.llm_instances as llm_instances
+    from utils.metrics import instrument_llm
+
+    def stub(call_site: str) -> StubChatModel:
+        return instrument_llm(StubChatModel(call_site=call_site, latency_scale=latency_scale), call_site, "stub")
+
+    for name, call_site in (
+        ("llm_fast", "fast"), ("llm_router", "router"), ("llm_grader", "grader"),
+        ("llm_support", "support"), ("llm_verify", "verify"),
+        ("llm_synthesis", "synthesis"), ("llm_corrective", "corrective"),
+    ):
+        setattr(llm_instances, name, stub(call_site))
+    llm_instances.create_llm_instance = lambda model_name, temperature=0, **kw: stub("rag_planner")
+    llm_instances.make_llm = lambda model_name, temperature=0.1: stub("synthesis")
+    llm_instances.emb = emb
+    return supa
+
+
+def _ensure_offline_tokenizer():
+    """tiktoken downloads encodings on first use; fall back to a ~4 chars/token estimate offline."""
+    try:
+        import tiktoken
+    except ImportError:
+        return
+    try:
+        tiktoken.get_encoding("cl100k_base")
+        return
+    except Exception:
+        pass
+
+    class _ApproxEncoding:
+        name = "approx-4-chars"
+
+        def encode(self, text, **kwargs):
+            return [0] * (max(1, len(text) // 4) if text else 0)
+
+        def encode_ordinary(self, text):
+            return self.encode(text)
+
+    approx = _ApproxEncoding()
+    tiktoken.get_encoding = lambda name: approx
+    tiktoken.encoding_for_model = lambda model: approx
+
+
+def _checkpoint_bytes(checkpointer, thread_ids: List[str]) -> Dict[str, float]:
+    serde = checkpointer.serde
+    latest, total = [], 0
+    for tid in thread_ids:
+        config = {"configurable": {"thread_id": tid}}
+        tup = checkpointer.get_tuple(config)
+        if tup is not None:
+            latest.append(len(serde.dumps_typed(tup.checkpoint)[1]))
+        for item in checkpointer.list(config):
+            total += len(serde.dumps_typed(item.checkpoint)[1])
+    return {
+        "checkpoint_bytes_latest_avg": statistics.mean(latest) if latest else 0.0,
+        "checkpoint_bytes_latest_max": max(latest) if latest else 0,
+        "checkpoint_bytes_total": total,
+    }
+
+
+def run(turns: int, concurrency: int, sessions: int, latency_scale: float,
+        projects: int, chunks_per_project: int, warmup: int = 0) -> Dict[str, Any]:
+    _prepare_environment(latency_scale, projects, chunks_per_project)
+
+    from graph.builder import build_graph
+    from models.parent_state import ParentState
+    from utils.metrics import add_node_observer
+
+    node_samples: Dict[str, List[float]] = defaultdict(list)
+    lock = threading.Lock()
+
+    def observe(node_name, state, result, duration_s):
+        with lock:
+            node_samples[node_name].append(duration_s * 1000.0)
+
+    add_node_observer(observe)
+    app = build_graph()
+
+    thread_ids = [f"bench-{i}" for i in range(max(1, sessions))]
+    turn_ms: List[float] = []
+    failures = 0
+
+    def one_turn(i: int):
+        tid = thread_ids[i % len(thread_ids)]
+        query = DEFAULT_QUERIES[i % len(DEFAULT_QUERIES)]
+        start = time.perf_counter()
+        out = app.invoke(
+            ParentState(session_id=tid, user_query=query, original_question=query),
+            config={"configurable": {"thread_id": tid}},
+        )
+        elapsed = (time.perf_counter() - start) * 1000.0
+        return elapsed, bool(out.get("db_retrieval_result"))
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        # Warmup turns use their own threads so the measured ones start from a warm checkpoint
+        list(pool.map(lambda i: app.invoke(
+            ParentState(session_id=f"warmup-{i}", user_query=DEFAULT_QUERIES[i % len(DEFAULT_QUERIES)],
+                        original_question=DEFAULT_QUERIES[i % len(DEFAULT_QUERIES)]),
+            config={"configurable": {"thread_id": f"warmup-{i}"}},
+        ), range(warmup)))
+    with lock:
+        node_samples.clear()
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        for elapsed, ok in pool.map(one_turn, range(turns)):
+            turn_ms.append(elapsed)
+            failures += 0 if ok else 1
+    wall_s = time.perf_counter() - wall_start
+
+    from graph.checkpointer import checkpointer
+
+    report: Dict[str, Any] = {
+        "config": {
+            "turns": turns, "warmup": warmup, "concurrency": concurrency, "sessions": len(thread_ids),
+            "latency_scale": latency_scale, "projects": projects, "chunks_per_project": chunks_per_project,
+        },
+        "turn_p50_ms": round(_percentile(turn_ms, 50), 1),
+        "turn_p95_ms": round(_percentile(turn_ms, 95), 1),
+        "turn_max_ms": round(max(turn_ms) if turn_ms else 0.0, 1),
+        "throughput_turns_per_s": round(turns / wall_s, 2) if wall_s else 0.0,
+        "turns_without_answer": failures,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "nodes": {
+            name: {
+                "calls": len(samples),
+                "p50_ms": round(_percentile(samples, 50), 1),
+                "p95_ms": round(_percentile(samples, 95), 1),
+            }
+            for name, samples in sorted(node_samples.items())
+        },
+    }
+    report.update({k: round(v, 1) for k, v in _checkpoint_bytes(checkpointer, thread_ids).items()})
+    return report
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float,
+            min_delta_ms: float = 50.0) -> List[str]:
+    """Return human-readable regressions (empty when within tolerance)."""
+    def regressed(cur: float, base: float, latency: bool) -> bool:
+        if cur <= base * (1.0 + tolerance):
+            return False
+        return not latency or cur - base > min_delta_ms
+
+    regressions = []
+    for key in TRACKED:
+        base, cur = baseline.get(key), report.get(key)
+        if not base or cur is None:
+            continue
+        if regressed(cur, base, key in LATENCY_METRICS):
+            regressions.append(f"{key}: {cur} vs baseline {base} (+{(cur / base - 1) * 100:.0f}%)")
+    # Nodes on p50: their p95 over a few dozen samples is effectively the max
+    for name, stats in (baseline.get("nodes") or {}).items():
+        cur = (report.get("nodes") or {}).get(name)
+        if cur and stats.get("p50_ms") and regressed(cur["p50_ms"], stats["p50_ms"], latency=True):
+            regressions.append(f"node {name} p50: {cur['p50_ms']}ms vs baseline {stats['p50_ms']}ms")
+    return regressions
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    print(f"\nTurns: {report['config']['turns']}  concurrency: {report['config']['concurrency']}  "
+          f"throughput: {report['throughput_turns_per_s']} turns/s")
+    print(f"Turn latency: p50={report['turn_p50_ms']}ms  p95={report['turn_p95_ms']}ms  max={report['turn_max_ms']}ms")
+    print(f"Peak RSS: {report['peak_rss_mb']} MB")
+    print(f"Checkpoint bytes: latest avg={report['checkpoint_bytes_latest_avg']}  total={report['checkpoint_bytes_total']}")
+    print(f"\n{'node':<32}{'calls':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, stats in report["nodes"].items():
+        print(f"{name:<32}{stats['calls']:>8}{stats['p50_ms']:>10}{stats['p95_ms']:>10}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline RAG graph benchmark")
+    parser.add_argument("--turns", type=int, default=80)
+    parser.add_argument("--warmup", type=int, default=4, help="Unmeasured turns run before the measured ones")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--sessions", type=int, default=4, help="Distinct thread_ids turns are spread over")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="Multiplier for stub LLM/embedding/RPC latencies (0 = measure pure overhead)")
+    parser.add_argument("--projects", type=int, default=40)
+    parser.add_argument("--chunks-per-project", type=int, default=25)
+    parser.add_argument("--json", type=Path, help="Write the full report to this file")
+    parser.add_argument("--compare", type=Path, help="Baseline report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--min-delta-ms", type=float, default=50.0,
+                        help="Latency regressions must also exceed this many ms (ignores noise on cheap nodes)")
+    parser.add_argument("--write-baseline", type=Path, help="Write this run as the new baseline")
+    args = parser.parse_args(argv)
+
+    report = run(args.turns, args.concurrency, args.sessions, args.latency_scale,
+                 args.projects, args.chunks_per_project, warmup=args.warmup)
+    _print_report(report)
+
+    for path in (args.json, args.write_baseline):
+        if path:
+            path.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+            print(f"\nWrote {path}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        if baseline.get("config") != report["config"]:
+            print("\n⚠️  Baseline was recorded with a different configuration; comparison may be meaningless")
+        regressions = compare(report, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("\n❌ Regressions vs baseline:")
+            for line in regressions:
+                print(f"   {line}")
+            return 1
+        print(f"\n✅ Within {args.tolerance:.0%} of baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+"""
+Deterministic offline stand-ins for the graph's external services.
+
+- StubChatModel: LangChain chat model with a fixed latency + token-rate profile
+  that answers each prompt family (router selection, DB router, RAG planner,
+  grader, synthesis) with a canned, parseable response.
+- FakeEmbeddings: hash-seeded unit vectors with a fixed per-call latency.
+- FakeSupabaseClient: in-memory corpus implementing the `match_*` RPCs and the
+  small subset of the PostgREST table API used by the retrievers.
+
+Nothing here touches the network; all outputs depend only on the inputs and
+the seed, so runs are comparable across machines.
+"""
+import hashlib
+import json
+import math
+import random
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4) if text else 0
+
+
+@dataclass(frozen=True)
+class LatencyProfile:
+    """Fixed time-to-first-token plus a constant output token rate."""
+
+    first_token_s: float
+    tokens_per_s: float
+    output_tokens: int
+
+    def duration(self, scale: float) -> float:
+        return scale * (self.first_token_s + self.output_tokens / self.tokens_per_s)
+
+
+# Rough shapes of the hosted models each call site uses (small router models vs.
+# large synthesis models). Only relative magnitudes matter for regressions.
+LATENCY_PROFILES: Dict[str, LatencyProfile] = {
+    "fast": LatencyProfile(0.030, 400.0, 40),
+    "router": LatencyProfile(0.030, 400.0, 40),
+    "grader": LatencyProfile(0.040, 400.0, 60),
+    "support": LatencyProfile(0.030, 400.0, 20),
+    "verify": LatencyProfile(0.040, 400.0, 40),
+    "rag_planner": LatencyProfile(0.080, 150.0, 120),
+    "synthesis": LatencyProfile(0.150, 80.0, 300),
+    "corrective": LatencyProfile(0.150, 80.0, 200),
+}
+
+
+def _scripted_response(prompt: str, profile: LatencyProfile) -> str:
+    """Return a response that the node consuming this prompt family can parse."""
+    if "determines which router(s) should handle" in prompt:
+        return json.dumps({"routers": ["rag"], "reasoning": "benchmark: database search"})
+    if "routing assistant for a retrieval system" in prompt:
+        return json.dumps({
+            "databases": {"project_db": True, "code_db": False, "coop_manual": False, "speckle_db": False},
+            "project_route": "smart",
+        })
+    if "query processor and planner" in prompt:
+        query = re.search(r'CURRENT QUERY: "(.*?)"', prompt)
+        q = query.group(1) if query else "benchmark query"
+        return json.dumps({
+            "rewriting": {"is_followup": False, "confidence": 0.0, "rewritten_query": q, "filters": {}},
+            "planning": {
+                "reasoning": "benchmark plan",
+                "steps": [
+                    {"op": "RETRIEVE", "args": {"queries": [q]}},
+                    {"op": "LIMIT_PROJECTS", "args": {"n": 5}},
+                ],
+            },
+        })
+    if "respond ONLY with 'yes' or 'no'" in prompt:
+        n_chunks = len(re.findall(r"^\[\d+\]", prompt, flags=re.M)) or 1
+        return "\n".join("yes" if i % 3 else "no" for i in range(n_chunks))
+    # Synthesis/corrective answers quote the synthetic corpus chunks present in
+    # the prompt so the verifier's term-overlap grounding check passes instead
+    # of looping back to retrieval.
+    words = " ".join(re.findall(r"sheet S-\d+: [^.]*\.", prompt)).split()
+    if not words:
+        words = ["retrieved", "drawings", "reinforced", "concrete", "slab"]
+    return " ".join(words[i % len(words)] for i in range(profile.output_tokens))
+
+
+class StubChatModel(BaseChatModel):
+    """Chat model that sleeps for its latency profile and returns scripted text."""
+
+    call_site: str = "fast"
+    latency_scale: float = 1.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-stub"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        prompt = "\n".join(str(m.content) for m in messages)
+        profile = LATENCY_PROFILES.get(self.call_site, LATENCY_PROFILES["fast"])
+        text = _scripted_response(prompt, profile)
+        time.sleep(profile.duration(self.latency_scale))
+        usage = {"input_tokens": _approx_tokens(prompt), "output_tokens": _approx_tokens(text)}
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        message = AIMessage(content=text, usage_metadata=usage)
+        return ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={"token_usage": {"prompt_tokens": usage["input_tokens"], "completion_tokens": usage["output_tokens"]}},
+        )
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "StubChatModel":
+        return self
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic hash-seeded unit vectors."""
+
+    def __init__(self, size: int = 256, latency_s: float = 0.015, latency_scale: float = 1.0):
+        self.size = size
+        self.latency_s = latency_s
+        self.latency_scale = latency_scale
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+        rng = random.Random(seed)
+        vec = [rng.gauss(0.0, 1.0) for _ in range(self.size)]
+        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        return [v / norm for v in vec]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency_s * self.latency_scale)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency_s * self.latency_scale)
+        return self._vector(text)
+
+
+class _Result:
+    def __init__(self, data: List[Dict[str, Any]], count: Optional[int] = None):
+        self.data = data
+        self.count = count if count is not None else len(data)
+
+
+class _Query:
+    """Lazily evaluated RPC or table query; `execute()` runs it."""
+
+    def __init__(self, run):
+        self._run = run
+
+    def execute(self) -> _Result:
+        return self._run()
+
+
+class _TableQuery:
+    def __init__(self, rows: List[Dict[str, Any]], columns: str):
+        self._rows = rows
+        self._columns = columns
+        self._filters = []
+        self._range = None
+
+    def _field(self, row: Dict[str, Any], key: str) -> Any:
+        return row.get(key, (row.get("metadata") or {}).get(key))
+
+    def eq(self, key: str, value: Any) -> "_TableQuery":
+        self._filters.append(lambda r: self._field(r, key) == value)
+        return self
+
+    def in_(self, key: str, values: List[Any]) -> "_TableQuery":
+        allowed = set(values)
+        self._filters.append(lambda r: self._field(r, key) in allowed)
+        return self
+
+    def like(self, key: str, pattern: str) -> "_TableQuery":
+        regex = re.compile("^" + re.escape(pattern).replace("%", ".*") + "$")
+        self._filters.append(lambda r: bool(regex.match(str(self._field(r, key) or ""))))
+        return self
+
+    def range(self, start: int, end: int) -> "_TableQuery":
+        self._range = (start, end)
+        return self
+
+    def limit(self, n: int) -> "_TableQuery":
+        self._range = (0, n - 1)
+        return self
+
+    def execute(self) -> _Result:
+        rows = [r for r in self._rows if all(f(r) for f in self._filters)]
+        total = len(rows)
+        if self._range:
+            rows = rows[self._range[0]: self._range[1] + 1]
+        if self._columns != "*":
+            cols = [c.strip() for c in self._columns.split(",")]
+            rows = [{c: self._field(r, c) for c in cols} for r in rows]
+        return _Result(rows, count=total)
+
+
+class _Table:
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self._rows = rows
+
+    def select(self, columns: str = "*", count: Optional[str] = None) -> _TableQuery:
+        return _TableQuery(self._rows, columns)
+
+
+# RPC name -> table it searches
+RPC_TABLES = {
+    "match_image_descriptions_verbatim": "image_descriptions",
+    "match_image_descriptions_summary": "image_descriptions",
+    "match_project_descriptions": "project_description",
+    "match_code_documents": "code_chunks",
+    "match_code_documents_filtered": "code_chunks",
+    "match_coop_documents": "coop_chunks",
+}
+
+
+class FakeSupabaseClient:
+    """In-memory Supabase with exact cosine `match_*` RPCs over a synthetic corpus."""
+
+    def __init__(self, embeddings: FakeEmbeddings, projects: int = 40, chunks_per_project: int = 25,
+                 rpc_latency_s: float = 0.040, latency_scale: float = 1.0, seed: int = 7):
+        self.rpc_latency_s = rpc_latency_s
+        self.latency_scale = latency_scale
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        rng = random.Random(seed)
+        topics = ["slab on grade", "retaining wall", "steel beam", "timber truss", "footing", "lintel"]
+        for table in set(RPC_TABLES.values()):
+            rows = []
+            for p in range(projects):
+                project_key = f"25-{(p % 12) + 1:02d}-{p:03d}"
+                for c in range(chunks_per_project):
+                    topic = topics[rng.randrange(len(topics))]
+                    content = f"Project {project_key} sheet S-{c:02d}: {topic} detail with {rng.randint(100, 900)} mm members."
+                    rows.append({
+                        "id": f"{table}-{p}-{c}",
+                        "content": content,
+                        "project_key": project_key,
+                        "filename": f"CODE-{p % 5}.pdf",
+                        "metadata": {"project_key": project_key, "page": c, "filename": f"CODE-{p % 5}.pdf"},
+                        "embedding": embeddings._vector(content),
+                    })
+            self.tables[table] = rows
+        self.tables["project_info"] = [
+            {
+                "project_key": f"25-{(p % 12) + 1:02d}-{p:03d}",
+                "project_name": f"Benchmark Project {p}",
+                "project_address": f"{100 + p} Main St",
+                "project_city": "Guelph",
+                "project_postal_code": "N1H 1A1",
+            }
+            for p in range(projects)
+        ]
+
+    def table(self, name: str) -> _Table:
+        return _Table(self.tables.get(name, []))
+
+    def _match(self, function: str, params: Dict[str, Any]) -> _Result:
+        time.sleep(self.rpc_latency_s * self.latency_scale)
+        rows = self.tables.get(RPC_TABLES.get(function, ""), [])
+        query = params.get("query_embedding") or []
+        keys = params.get("project_keys")
+        filenames = params.get("filename_filter")
+        scored = []
+        for row in rows:
+            if keys and row["project_key"] not in keys:
+                continue
+            if filenames and row["filename"] not in filenames:
+                continue
+            sim = sum(a * b for a, b in zip(query, row["embedding"]))
+            scored.append((sim, row))
+        scored.sort(key=lambda t: t[0], reverse=True)
+        per_project = params.get("chunks_per_project")
+        projects_limit = params.get("projects_limit")
+        out, seen = [], {}
+        for sim, row in scored:
+            key = row["project_key"]
+            if per_project and seen.get(key, 0) >= per_project:
+                continue
+            if projects_limit and key not in seen and len(seen) >= projects_limit:
+                continue
+            seen[key] = seen.get(key, 0) + 1
+            out.append({k: v for k, v in row.items() if k != "embedding"} | {"similarity": sim})
+            if len(out) >= params.get("match_count", 10):
+                break
+        return _Result(out)
+
+    def rpc(self, function: str, params: Dict[str, Any]) -> _Query:
+        return _Query(lambda: self._match(function, params))
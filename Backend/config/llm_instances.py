@@ -3,6 +3,7 @@ LLM Instance Configuration
 Create and configure all LLM instances used throughout the system
 """
 import os
+import uuid
 from pathlib import Path
 
 # Compat shim for newer openai package (>=1.x) with langchain_openai expecting DefaultHttpxClient
@@ -32,6 +33,7 @@ from .settings import (
     RAG_PLANNER_MODEL, VERIFY_MODEL, GROQ_API_KEY
 )
 from .logging_config import log_syn
+from utils.metrics import instrument_llm
 
 # Try to import Google Gemini SDKs
 GOOGLE_VERTEX_AI_AVAILABLE = False
@@ -137,8 +139,20 @@ try:
             else:
                 messages = [input]
             
-            # Call _generate directly with messages
-            result = self._generate(messages, **kwargs)
+            # Call _generate directly with messages. This bypasses BaseChatModel's
+            # callback manager, so dispatch start/end to configured handlers here.
+            run_id = uuid.uuid4()
+            handlers = list(self.callbacks or []) if isinstance(self.callbacks, list) else []
+            for handler in handlers:
+                handler.on_llm_start({}, [str(m.content) for m in messages], run_id=run_id)
+            try:
+                result = self._generate(messages, **kwargs)
+            except Exception as e:
+                for handler in handlers:
+                    handler.on_llm_error(e, run_id=run_id)
+                raise
+            for handler in handlers:
+                handler.on_llm_end(result, run_id=run_id)
             
             # Return the AIMessage from the result (matching BaseChatModel behavior)
             if result.generations:
@@ -312,6 +326,12 @@ llm_verify = create_llm_instance(
     timeout=25
 )
 
+instrument_llm(llm_fast, "fast", FAST_MODEL)
+instrument_llm(llm_router, "router", ROUTER_MODEL)
+instrument_llm(llm_grader, "grader", GRADER_MODEL)
+instrument_llm(llm_support, "support", SUPPORT_MODEL)
+instrument_llm(llm_verify, "verify", VERIFY_MODEL)
+
 
 # =============================================================================
 # HIGH-QUALITY MODELS (more expensive, better quality)
@@ -491,6 +511,8 @@ def make_llm(model_name: str, temperature: float = 0.1):
 
 llm_synthesis = make_llm(SYNTHESIS_MODEL, temperature=0.1)
 llm_corrective = make_llm(CORRECTIVE_MODEL, temperature=0.1)
+instrument_llm(llm_synthesis, "synthesis", SYNTHESIS_MODEL)
+instrument_llm(llm_corrective, "corrective", CORRECTIVE_MODEL)
 
 # =============================================================================
 # LOG MODEL CONFIGURATION AT STARTUP
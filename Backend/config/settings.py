@@ -142,6 +142,7 @@ DEEP_AGENT_ENABLED = os.getenv("DEEP_AGENT_ENABLED", "true").lower() == "true"
 INTERRUPT_DESTRUCTIVE_ACTIONS = os.getenv("INTERRUPT_DESTRUCTIVE_ACTIONS", "true").lower() == "true"
 INTERRUPT_APPROVAL_TIMEOUT = int(os.getenv("INTERRUPT_APPROVAL_TIMEOUT", "300"))
 MAX_INLINE_TOOL_RESULT = int(os.getenv("MAX_INLINE_TOOL_RESULT", "3000"))
+TOOL_EVICTION_FORMAT = os.getenv("TOOL_EVICTION_FORMAT", "json").lower()  # "json" (compact) or "msgpack" (msgpack + zstd)
 
 # =============================================================================
 # ROLE-BASED DATABASE PREFERENCES
@@ -11,6 +11,7 @@ from models.parent_state import ParentState
 from models.rag_state import RAGState
 from config.logging_config import log_query
 from utils.path_setup import ensure_info_retrieval_on_path
+from utils.metrics import record_node
 
 ensure_info_retrieval_on_path()
 from nodes.plan import node_plan
@@ -158,9 +159,11 @@ def _wrap_node(node_name: str, fn):
             "timestamp": time.time(),
         }
 
+        start = time.perf_counter()
         result = fn(state, *args, **kwargs)
         if not isinstance(result, dict):
             result = {"_raw_result": result}
+        record_node(node_name, state, result, time.perf_counter() - start)
 
         result_trace = result.get("execution_trace", []) or []
         result_verbose = result.get("execution_trace_verbose", []) or []
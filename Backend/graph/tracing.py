@@ -2,13 +2,16 @@
 Tracing utilities for LangGraph subgraphs.
 
 Provides a decorator to wrap subgraph nodes (sync or async) and append
-structured execution traces with lightweight state snapshots.
+structured execution traces with lightweight state snapshots. Node latency,
+payload size and retrieved-doc counts are also recorded in utils.metrics.
 """
 import asyncio
 import time
 from datetime import datetime
 from typing import Any, Callable, Dict
 
+from utils.metrics import record_node
+
 
 def _snapshot_state(state: Any) -> Dict[str, str]:
     """
@@ -51,9 +54,11 @@ def wrap_subgraph_node(node_name: str) -> Callable:
 
                 result = await fn(state)
 
+                duration_s = time.perf_counter() - start
+                record_node(node_name, state, result, duration_s)
                 entry.update(
                     {
-                        "duration_ms": int((time.perf_counter() - start) * 1000),
+                        "duration_ms": int(duration_s * 1000),
                         "result_keys": list(result.keys()) if isinstance(result, dict) else [],
                     }
                 )
@@ -76,9 +81,11 @@ def wrap_subgraph_node(node_name: str) -> Callable:
 
             result = fn(state)
 
+            duration_s = time.perf_counter() - start
+            record_node(node_name, state, result, duration_s)
             entry.update(
                 {
-                    "duration_ms": int((time.perf_counter() - start) * 1000),
+                    "duration_ms": int(duration_s * 1000),
                     "result_keys": list(result.keys()) if isinstance(result, dict) else [],
                 }
             )
@@ -12,6 +12,7 @@ from config.settings import (
 )
 from config.llm_instances import emb
 from config.logging_config import log_query
+from utils.metrics import timed_rpc
 from .supabase_client import vs_smart, vs_large, vs_code, vs_coop
 
 
@@ -185,13 +186,13 @@ def make_hybrid_retriever(project: Optional[str] = None, sql_filters: Optional[D
                     projects_limit = min(30, len(unique_project_keys)) if unique_project_keys else 50
                     match_count = 300
                     
-                    result = _supa.rpc(rpc_function, {
+                    result = timed_rpc(_supa, rpc_function, {
                         'query_embedding': query_embedding,
                         'match_count': match_count,
                         'projects_limit': projects_limit,
                         'chunks_per_project': chunks_per_project,
                         'project_keys': unique_project_keys
-                    }).execute()
+                    })
                     
                     # Convert HNSW result to rows
                     dense_rows = result.data or []
@@ -260,13 +261,13 @@ def make_hybrid_retriever(project: Optional[str] = None, sql_filters: Optional[D
             projects_limit = 30
             match_count = 300
             
-            result = _supa.rpc(rpc_function, {
+            result = timed_rpc(_supa, rpc_function, {
                 'query_embedding': query_embedding,
                 'match_count': match_count,
                 'projects_limit': projects_limit,
                 'chunks_per_project': chunks_per_project,
                 'project_keys': None
-            }).execute()
+            })
             
             dense_rows = result.data or []
             print(f"📊 RPC RETURNED: {len(dense_rows)} rows from {rpc_function}")  # Diagnostic
@@ -359,17 +360,17 @@ def make_code_hybrid_retriever(filename_filter: Optional[List[str]] = None):
                     log_query.debug(f"📋 Filtered codes: {', '.join(filename_filter[:5])}{'...' if len(filename_filter) > 5 else ''}")
                     
                     # Use the new filtered RPC function that filters at database level
-                    result = _supa.rpc("match_code_documents_filtered", {
+                    result = timed_rpc(_supa, "match_code_documents_filtered", {
                         'query_embedding': query_embedding,
                         'match_count': match_count,
                         'filename_filter': filename_filter  # Pass as array to SQL function
-                    }).execute()
+                    })
                 else:
                     # Use standard RPC function (no filtering)
-                    result = _supa.rpc("match_code_documents", {
+                    result = timed_rpc(_supa, "match_code_documents", {
                         'query_embedding': query_embedding,
                         'match_count': match_count
-                    }).execute()
+                    })
                 
                 dense_rows = result.data or []
                 fused_rows = dense_rows[:k]  # Take top k results
@@ -457,10 +458,10 @@ def make_coop_hybrid_retriever():
                 match_count = min(1000, k * 5)
                 
                 try:
-                    result = _supa.rpc("match_coop_documents", {
+                    result = timed_rpc(_supa, "match_coop_documents", {
                         'query_embedding': query_embedding,
                         'match_count': match_count
-                    }).execute()
+                    })
                     
                     dense_rows = result.data or []
                     fused_rows = dense_rows[:k]
@@ -16,7 +16,7 @@ from config.settings import (
 )
 from config.logging_config import log_enh
 from utils.plan_executor import self_grade
-from utils.token_counter import count_tokens
+from utils.token_counter import count_many, within_token_budget
 
 
 def _log_docs_summary(docs, logger, prefix: str = "Documents"):
@@ -62,7 +62,6 @@ def _grade_collection(query: str, docs: List[Document], label: str) -> List[Docu
         return []
 
     limited = docs[:MAX_DOCS_TO_GRADE]
-    total_tokens = sum(count_tokens(_doc_text(d)) for d in limited)
 
     if not USE_GRADER:
         log_enh.info(
@@ -70,14 +69,17 @@ def _grade_collection(query: str, docs: List[Document], label: str) -> List[Docu
         )
         return limited
 
-    if total_tokens > MAX_GRADER_TOKENS:
+    # Upper-bound check first; exact (memoized, batched) counts only near the cap
+    texts = [_doc_text(d) for d in limited]
+    if not within_token_budget(texts, MAX_GRADER_TOKENS):
+        total_tokens = sum(count_many(texts))
         log_enh.info(
             f"Heuristic grading for {label}: {total_tokens} tokens > {MAX_GRADER_TOKENS}"
         )
         return _heuristic_grade(query, limited)
 
     log_enh.info(
-        f"LLM grading {label}: {len(limited)} docs ({total_tokens} tokens, cap={MAX_GRADER_TOKENS})"
+        f"LLM grading {label}: {len(limited)} docs (within cap={MAX_GRADER_TOKENS} tokens)"
     )
     graded = self_grade(query, limited)
     return graded[:MAX_GRADED_DOCS]
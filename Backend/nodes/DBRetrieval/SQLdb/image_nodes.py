@@ -9,6 +9,7 @@ from config.logging_config import log_query, log_vlm
 from config.settings import SUPABASE_URL, SUPABASE_KEY
 from config.llm_instances import emb  # Text embedding model (text-embedding-3-small)
 from supabase import create_client
+from utils.metrics import timed_rpc
 
 
 def describe_image_for_search(image_base64: str, user_question: str = "") -> str:
@@ -326,13 +327,13 @@ def node_image_similarity_search(state: DBRetrievalState) -> dict:
         
         log_vlm.info(f"🖼️ Calling match_image_descriptions_summary (match_count={match_count}, projects_limit={projects_limit})")
         
-        result = _supa.rpc("match_image_descriptions_summary", {
+        result = timed_rpc(_supa, "match_image_descriptions_summary", {
             'query_embedding': query_embedding,
             'match_count': match_count,
             'projects_limit': projects_limit,
             'chunks_per_project': chunks_per_project,
             'project_keys': None  # Search all projects
-        }).execute()
+        })
         
         raw_results = result.data or []
         log_vlm.info(f"🖼️ RPC returned {len(raw_results)} results")
@@ -11,7 +11,7 @@ from langchain_core.documents import Document
 from models.db_retrieval_state import DBRetrievalState
 from config.settings import USE_VERIFIER, MAX_VERIFIER_TOKENS
 from config.logging_config import log_enh
-from utils.token_counter import count_tokens
+from utils.token_counter import count_tokens, within_token_budget
 
 PROJECT_RE = re.compile(r"\\d{2}-\\d{2}-\\d{3,4}")
 
@@ -116,8 +116,8 @@ def node_verify(state: DBRetrievalState) -> dict:
     )
     retrieved_docs = list(getattr(state, "graded_docs", None) or getattr(state, "retrieved_docs", []) or [])
 
-    answer_tokens = count_tokens(answer_text)
-    if answer_tokens > MAX_VERIFIER_TOKENS:
+    if not within_token_budget(answer_text, MAX_VERIFIER_TOKENS):
+        answer_tokens = count_tokens(answer_text)
         log_enh.warning(
             f"Skipping verification: answer too long ({answer_tokens} tokens > {MAX_VERIFIER_TOKENS})"
         )
@@ -595,12 +595,13 @@ Keep plans concise (3-7 steps max).
 
         if result.get("success") and not result.get("eviction", {}).get("evicted"):
             output = result.get("output", "")
-            if len(str(output)) > self.evictor.max_inline_size:
-                eviction = self.evictor.process_result(
-                    tool_name="generate_document",
-                    result=output,
-                    workspace_dir=workspace_dir,
-                )
+            # process_result stops measuring once the inline threshold is crossed
+            eviction = self.evictor.process_result(
+                tool_name="generate_document",
+                result=output,
+                workspace_dir=workspace_dir,
+            )
+            if eviction.get("evicted"):
                 result["eviction"] = eviction
                 result["output"] = eviction.get("summary", str(output)[:500])
         return result
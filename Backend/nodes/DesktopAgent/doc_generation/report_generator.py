@@ -9,6 +9,8 @@ from pathlib import Path
 import json
 from typing import Any, Dict
 
+from langgraph.config import get_stream_writer
+
 from models.rag_state import RAGState
 from config.logging_config import log_query
 
@@ -186,11 +188,37 @@ def node_doc_generate_report(state: RAGState) -> dict:
     if context_docs:
         overrides["extra_context"] = context_docs
 
+    # Stream each finished section (in display order) while later ones are still drafting
+    try:
+        writer = get_stream_writer()
+    except Exception:
+        # get_stream_writer only works in streaming context, ignore if not available
+        writer = None
+
+    def _emit_section(event: Dict[str, Any]) -> None:
+        if writer is None:
+            return
+        section = event.get("section") or {}
+        try:
+            writer(
+                {
+                    "type": "report_section",
+                    "node": "doc_generate_report",
+                    "index": event.get("index"),
+                    "section_type": event.get("section_type"),
+                    "status": event.get("status"),
+                    "content": _clean_draft_text(section.get("text", "")),
+                }
+            )
+        except Exception as exc:  # noqa: BLE001
+            log_query.debug(f"DOCGEN: section stream emit failed (non-critical): {exc}")
+
     result = drafter.draft_report(
         company_id=company_id,
         user_request=state.user_query or "",
         doc_type=state.doc_type,
         overrides=overrides or None,
+        on_section=_emit_section,
     )
 
     warnings = result.get("warnings", []) or []
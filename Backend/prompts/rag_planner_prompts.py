@@ -5,6 +5,7 @@ Handles follow-up detection, pronoun resolution, and query plan generation
 from langchain_core.prompts import PromptTemplate
 from config.llm_instances import create_llm_instance
 from config.settings import PLANNER_PLAYBOOK, RAG_PLANNER_MODEL
+from utils.metrics import instrument_llm
 
 RAG_PLANNER_PROMPT = PromptTemplate.from_template(
 """You are an intelligent query processor and planner for an engineering-drawings RAG system. You must perform TWO tasks in sequence:
@@ -96,4 +97,5 @@ OUTPUT STRICT JSON (no markdown, no code fences):
 
 # Create RAG planner LLM instance (using 70B model for complex reasoning)
 rag_planner_llm = create_llm_instance(RAG_PLANNER_MODEL, temperature=0)
+instrument_llm(rag_planner_llm, "rag_planner", RAG_PLANNER_MODEL)
 
@@ -0,0 +1,57 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+backend_dir = ROOT / "Backend"
+if str(backend_dir) not in sys.path:
+    sys.path.append(str(backend_dir))
+
+pytest.importorskip("langchain_core")
+
+from benchmarks import run_graph_bench  # noqa: E402
+from benchmarks.stubs import FakeEmbeddings, FakeSupabaseClient, StubChatModel  # noqa: E402
+
+
+def test_fake_supabase_rpc_honours_project_filters():
+    emb = FakeEmbeddings(size=32, latency_scale=0.0)
+    supa = FakeSupabaseClient(emb, projects=6, chunks_per_project=5, latency_scale=0.0)
+    keys = ["25-01-000", "25-02-001"]
+
+    rows = supa.rpc("match_image_descriptions_verbatim", {
+        "query_embedding": emb.embed_query("footing detail"),
+        "match_count": 50,
+        "project_keys": keys,
+        "chunks_per_project": 2,
+    }).execute().data
+
+    assert {r["project_key"] for r in rows} == set(keys)
+    assert len(rows) == 4
+    assert rows[0]["similarity"] >= rows[-1]["similarity"]
+
+
+def test_stub_router_prompt_returns_parseable_json():
+    llm = StubChatModel(call_site="router", latency_scale=0.0)
+    out = llm.invoke("You are a routing assistant that determines which router(s) should handle a user's query.")
+    assert '"routers": ["rag"]' in out.content
+    assert out.usage_metadata["output_tokens"] > 0
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    baseline = {"turn_p50_ms": 100.0, "turn_p95_ms": 200.0, "nodes": {"answer": {"p50_ms": 100.0, "p95_ms": 150.0}}}
+    report = {"turn_p50_ms": 110.0, "turn_p95_ms": 300.0, "nodes": {"answer": {"p50_ms": 200.0, "p95_ms": 150.0}}}
+
+    regressions = run_graph_bench.compare(report, baseline, tolerance=0.25)
+
+    assert len(regressions) == 2
+    assert regressions[0].startswith("turn_p95_ms")
+    assert regressions[1].startswith("node answer p50")
+
+
+def test_compare_ignores_latency_deltas_below_floor():
+    baseline = {"turn_p95_ms": 20.0, "nodes": {"grade": {"p50_ms": 20.0}}}
+    report = {"turn_p95_ms": 60.0, "nodes": {"grade": {"p50_ms": 60.0}}}
+
+    assert run_graph_bench.compare(report, baseline, tolerance=0.25) == []
+    assert len(run_graph_bench.compare(report, baseline, tolerance=0.25, min_delta_ms=10.0)) == 2
@@ -0,0 +1,97 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+backend_dir = ROOT / "Backend"
+if str(backend_dir) not in sys.path:
+    sys.path.append(str(backend_dir))
+
+pytest.importorskip("dotenv")
+
+from utils import metrics  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _reset_registry():
+    metrics.REGISTRY.reset()
+    yield
+    metrics.REGISTRY.reset()
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = metrics.REGISTRY.histogram("test_latency_seconds", "Test.", ("node",), (0.1, 1.0))
+    hist.observe(0.05, node="plan")
+    hist.observe(0.5, node="plan")
+    hist.observe(5.0, node="plan")
+
+    text = metrics.render_metrics()
+
+    assert '# TYPE test_latency_seconds histogram' in text
+    assert 'test_latency_seconds_bucket{node="plan",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{node="plan",le="1"} 2' in text
+    assert 'test_latency_seconds_bucket{node="plan",le="+Inf"} 3' in text
+    assert 'test_latency_seconds_count{node="plan"} 3' in text
+
+
+def test_record_node_labels_session_route_and_doc_counts():
+    state = {"session_id": "s1", "workflow": "qa"}
+    result = {"retrieved_docs": [1, 2, 3], "final_answer": "x" * 100}
+
+    metrics.record_node("retrieve", state, result, 0.2)
+    text = metrics.render_metrics()
+
+    assert 'sid_node_duration_seconds_count{node="retrieve",route="qa",session="s1"} 1' in text
+    assert 'sid_retrieved_docs_sum{node="retrieve.retrieved_docs",route="qa"} 3' in text
+    assert 'sid_node_payload_bytes_count{node="retrieve",route="qa"} 1' in text
+
+
+def test_session_label_cardinality_is_capped(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_MAX_SESSIONS", 1)
+    assert metrics.REGISTRY.session_label("a") == "a"
+    assert metrics.REGISTRY.session_label("b") == "other"
+    assert metrics.REGISTRY.session_label("a") == "a"
+    assert metrics.REGISTRY.session_label(None) == "none"
+
+
+def test_timed_rpc_records_status():
+    class _Query:
+        def __init__(self, fail):
+            self.fail = fail
+
+        def execute(self):
+            if self.fail:
+                raise RuntimeError("boom")
+            return "rows"
+
+    class _Client:
+        def rpc(self, name, params):
+            return _Query(params.get("fail", False))
+
+    assert metrics.timed_rpc(_Client(), "match_code_documents", {}) == "rows"
+    with pytest.raises(RuntimeError):
+        metrics.timed_rpc(_Client(), "match_code_documents", {"fail": True})
+
+    text = metrics.render_metrics()
+    assert 'sid_supabase_rpc_duration_seconds_count{function="match_code_documents",status="ok"} 1' in text
+    assert 'sid_supabase_rpc_duration_seconds_count{function="match_code_documents",status="error"} 1' in text
+
+
+def test_llm_callback_records_token_usage():
+    pytest.importorskip("langchain_core")
+    import uuid
+
+    class _Response:
+        llm_output = {"token_usage": {"prompt_tokens": 120, "completion_tokens": 30}}
+        generations = []
+
+    handler = metrics.LLMMetricsCallback("grader", "gpt-4o-mini")
+    run_id = uuid.uuid4()
+    handler.on_chat_model_start({}, [], run_id=run_id)
+    handler.on_llm_end(_Response(), run_id=run_id)
+
+    text = metrics.render_metrics()
+    assert 'sid_llm_call_duration_seconds_count{call_site="grader",model="gpt-4o-mini",status="ok"} 1' in text
+    assert 'sid_llm_tokens_sum{call_site="grader",model="gpt-4o-mini",kind="prompt"} 120' in text
+    assert 'sid_llm_tokens_sum{call_site="grader",model="gpt-4o-mini",kind="completion"} 30' in text
@@ -0,0 +1,85 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+backend_dir = ROOT / "Backend"
+if str(backend_dir) not in sys.path:
+    sys.path.append(str(backend_dir))
+
+from utils import token_counter  # noqa: E402
+
+
+class _WordEncoding:
+    """Whitespace 'encoding' that records how often it is asked to encode."""
+
+    name = "test-words"
+
+    def __init__(self):
+        self.calls = 0
+        self.batch_calls = 0
+
+    def encode_ordinary(self, text):
+        self.calls += 1
+        return text.split()
+
+    def encode_ordinary_batch(self, texts, num_threads=1):
+        self.batch_calls += 1
+        return [t.split() for t in texts]
+
+
+@pytest.fixture
+def encoding(monkeypatch):
+    enc = _WordEncoding()
+    monkeypatch.setitem(token_counter._encodings, "test-model", enc)
+    monkeypatch.setattr(token_counter, "_counters", {})
+    token_counter.clear_token_cache()
+    yield enc
+    token_counter.clear_token_cache()
+
+
+def test_encoding_loaded_once_per_model(monkeypatch):
+    loads = []
+    monkeypatch.setattr(token_counter, "_encodings", {})
+    monkeypatch.setattr(token_counter, "TIKTOKEN_AVAILABLE", True)
+    monkeypatch.setattr(
+        token_counter, "tiktoken",
+        type("T", (), {"encoding_for_model": staticmethod(lambda m: loads.append(m) or _WordEncoding())}),
+        raising=False,
+    )
+
+    first = token_counter.get_encoding("gpt-x")
+    second = token_counter.get_encoding("gpt-x")
+
+    assert first is second
+    assert loads == ["gpt-x"]
+
+
+def test_repeated_text_is_encoded_once(encoding):
+    assert token_counter.count_tokens("slab on grade detail", model="test-model") == 4
+    assert token_counter.count_tokens("slab on grade detail", model="test-model") == 4
+    assert encoding.calls == 1
+
+
+def test_count_many_preserves_order_and_batches_misses(encoding):
+    token_counter.count_tokens("a b", model="test-model")
+
+    counts = token_counter.count_many(["a b c", "a b", "", "a b c", "d"], model="test-model")
+
+    assert counts == [3, 2, 0, 3, 1]
+    assert encoding.batch_calls == 1
+
+
+def test_within_budget_skips_encoding_when_upper_bound_fits(encoding):
+    assert token_counter.within_token_budget(["short", "texts"], 100, model="test-model")
+    assert encoding.calls == 0 and encoding.batch_calls == 0
+
+    long_text = "word " * 50
+    assert not token_counter.within_token_budget(long_text, 10, model="test-model")
+    assert token_counter.within_token_budget(long_text, 60, model="test-model")
+
+
+def test_upper_bound_never_below_fallback_estimate():
+    text = "Project 25-01-001 footing detail " * 20
+    assert token_counter.estimate_tokens_upper_bound(text) >= token_counter._approx_tokens(text)
@@ -0,0 +1,76 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+backend_dir = ROOT / "Backend"
+if str(backend_dir) not in sys.path:
+    sys.path.append(str(backend_dir))
+
+pytest.importorskip("dotenv")
+# config.settings is imported through the config package, which builds the LLM clients
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from utils import tool_eviction  # noqa: E402
+from utils.tool_eviction import ToolResultEvictor, estimate_size  # noqa: E402
+
+
+ROWS = [{"row": i, "cells": ["A", i * 1.5, None]} for i in range(500)]
+
+
+def test_estimate_size_stops_after_threshold():
+    size, prefix, exceeded = estimate_size(ROWS, 200)
+    assert exceeded
+    assert 200 < size < 400
+    assert prefix.startswith('[{"row":0')
+
+    small = {"ok": True}
+    assert estimate_size(small, 200) == (len('{"ok":true}'), '{"ok":true}', False)
+
+
+def test_small_result_stays_inline(tmp_path):
+    evictor = ToolResultEvictor(max_inline_size=100)
+    out = evictor.process_result("excel", {"value": 1}, tmp_path)
+    assert out == {"inline": {"value": 1}, "evicted": False}
+    assert not list(tmp_path.iterdir())
+
+
+def test_json_spill_pages_lazily(tmp_path):
+    evictor = ToolResultEvictor(max_inline_size=100, spill_format="json")
+    out = evictor.process_result("excel", ROWS, tmp_path)
+
+    assert out["evicted"] and out["filename"].endswith(".jsonl")
+    assert out["item_count"] == 500
+    assert out["summary"].startswith("List with 500 items")
+    assert evictor.load_evicted_result(out["file_ref"], offset=10, limit=2) == ROWS[10:12]
+    assert evictor.load_evicted_result(out["file_ref"]) == ROWS
+
+
+def test_dict_and_text_spill_round_trip(tmp_path):
+    evictor = ToolResultEvictor(max_inline_size=50)
+    payload = {"objects": ROWS[:20], "name": "speckle"}
+
+    out = evictor.process_result("speckle", payload, tmp_path)
+    assert out["summary"].startswith("Dict with keys: [objects, name]")
+    assert evictor.load_evicted_result(out["file_ref"]) == payload
+
+    text = "Section text. " * 40
+    out = evictor.process_result("docgen", text, tmp_path)
+    assert evictor.load_evicted_result(out["file_ref"]) == text
+    assert evictor.load_evicted_result(out["file_ref"], offset=14, limit=7) == "Section"
+
+
+def test_msgpack_spill_round_trip(tmp_path):
+    if not tool_eviction.BINARY_SPILL_AVAILABLE:
+        pytest.skip("msgpack/zstandard not installed")
+    evictor = ToolResultEvictor(max_inline_size=100, spill_format="msgpack")
+
+    out = evictor.process_result("excel", ROWS, tmp_path)
+    assert out["format"] == "msgpack" and out["filename"].endswith(".msgpack.zst")
+    assert out["size_bytes"] < out["size_chars"]
+    assert evictor.load_evicted_result(out["file_ref"], offset=498, limit=5) == ROWS[498:]
+
+    single = evictor.process_result("excel", {"sheet": ROWS[:50]}, tmp_path)
+    assert evictor.load_evicted_result(single["file_ref"]) == {"sheet": ROWS[:50]}
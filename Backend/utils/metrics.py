@@ -0,0 +1,328 @@
+"""
+In-process metrics for the RAG graph.
+
+Keeps fixed-bucket histograms in memory and renders them in the Prometheus
+text exposition format for the `/metrics` endpoint. Recording is a dict
+lookup plus a bisect under a lock, so it is safe to leave enabled in
+production. No prometheus_client dependency is required.
+
+Metrics recorded:
+- sid_node_duration_seconds{node,route,session}: graph / subgraph node latency
+- sid_node_payload_bytes{node,route}: approximate size of each node's state update
+- sid_retrieved_docs{node,route}: document counts returned by retrieval nodes
+- sid_llm_call_duration_seconds{call_site,model,status}: LLM call latency
+- sid_llm_tokens{call_site,model,kind}: prompt / completion tokens per call
+- sid_supabase_rpc_duration_seconds{function,status}: Supabase RPC latency
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Read directly from the environment (not config.settings): config.llm_instances
+# imports this module, so importing the config package here would be circular.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_MAX_SESSIONS = int(os.getenv("METRICS_MAX_SESSIONS", "500"))  # session label cardinality cap
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 200, 500, 1000)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 2048, 4096, 8192, 16384, 32768, 131072)
+
+# Result keys that carry retrieved documents in node updates
+DOC_RESULT_KEYS = ("retrieved_docs", "graded_docs", "code_docs", "coop_docs", "image_similarity_results")
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Histogram:
+    """Fixed-bucket histogram keyed by label values."""
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # labels -> [bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [0.0] * (len(self.buckets) + 2)
+                self._series[key] = series
+            series[idx] += 1
+            series[-1] += value
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._series.items()}
+        for key, series in sorted(snapshot.items()):
+            base = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key))
+            sep = "," if base else ""
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                yield f'{self.name}_bucket{{{base}{sep}le="{_fmt(bound)}"}} {_fmt(cumulative)}'
+            label_block = f"{{{base}}}" if base else ""
+            yield f"{self.name}_sum{label_block} {_fmt(series[-1])}"
+            yield f"{self.name}_count{label_block} {_fmt(cumulative)}"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+class MetricsRegistry:
+    """Holds every histogram and renders the exposition text."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, None] = {}
+
+    def histogram(self, name: str, doc: str, labelnames: Sequence[str], buckets: Sequence[float]) -> Histogram:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = Histogram(name, doc, labelnames, buckets)
+                self._metrics[name] = metric
+            return metric
+
+    def session_label(self, session_id: Optional[str]) -> str:
+        """Bound label cardinality: sessions beyond METRICS_MAX_SESSIONS collapse to 'other'."""
+        if not session_id:
+            return "none"
+        with self._lock:
+            if session_id in self._sessions:
+                return session_id
+            if len(self._sessions) < METRICS_MAX_SESSIONS:
+                self._sessions[session_id] = None
+                return session_id
+        return "other"
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.doc}")
+            lines.append(f"# TYPE {metric.name} histogram")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            self._sessions.clear()
+        for metric in metrics:
+            metric.reset()
+
+
+REGISTRY = MetricsRegistry()
+
+NODE_DURATION = REGISTRY.histogram(
+    "sid_node_duration_seconds", "Graph node execution time.", ("node", "route", "session"), LATENCY_BUCKETS
+)
+NODE_PAYLOAD = REGISTRY.histogram(
+    "sid_node_payload_bytes", "Approximate size of the state update returned by a node.", ("node", "route"), SIZE_BUCKETS
+)
+RETRIEVED_DOCS = REGISTRY.histogram(
+    "sid_retrieved_docs", "Documents returned by retrieval nodes.", ("node", "route"), COUNT_BUCKETS
+)
+LLM_DURATION = REGISTRY.histogram(
+    "sid_llm_call_duration_seconds", "LLM call latency per call site.", ("call_site", "model", "status"), LATENCY_BUCKETS
+)
+LLM_TOKENS = REGISTRY.histogram(
+    "sid_llm_tokens", "Tokens per LLM call.", ("call_site", "model", "kind"), TOKEN_BUCKETS
+)
+SUPABASE_RPC_DURATION = REGISTRY.histogram(
+    "sid_supabase_rpc_duration_seconds", "Supabase RPC latency per function.", ("function", "status"), LATENCY_BUCKETS
+)
+
+
+def _state_get(state: Any, field: str, default=None):
+    if isinstance(state, dict):
+        return state.get(field, default)
+    return getattr(state, field, default)
+
+
+def route_label(state: Any) -> str:
+    """Coarse route for a turn: the docgen/qa workflow, else the DB retrieval route."""
+    return (
+        _state_get(state, "workflow")
+        or _state_get(state, "db_retrieval_route")
+        or _state_get(state, "data_route")
+        or "default"
+    )
+
+
+def estimate_size(obj: Any, max_depth: int = 4, _depth: int = 0) -> int:
+    """Cheap, bounded estimate of the serialized size of a payload in bytes."""
+    if obj is None or isinstance(obj, bool):
+        return 4
+    if isinstance(obj, (int, float)):
+        return 8
+    if isinstance(obj, (str, bytes)):
+        return len(obj)
+    if _depth >= max_depth:
+        return 16
+    if isinstance(obj, dict):
+        return sum(len(str(k)) + estimate_size(v, max_depth, _depth + 1) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set)):
+        return sum(estimate_size(v, max_depth, _depth + 1) for v in obj)
+    content = getattr(obj, "page_content", None)
+    if content is not None:
+        return len(content) + estimate_size(getattr(obj, "metadata", None), max_depth, _depth + 1)
+    view = getattr(obj, "__dict__", None)
+    if view:
+        return estimate_size(view, max_depth, _depth + 1)
+    return 16
+
+
+# Callables receiving (node_name, state, result, duration_s) for every node
+# execution; used by the offline benchmark to collect raw latency samples.
+_NODE_OBSERVERS: List[Callable[[str, Any, Any, float], None]] = []
+
+
+def add_node_observer(observer: Callable[[str, Any, Any, float], None]) -> None:
+    """Register a callable invoked after every recorded node execution."""
+    _NODE_OBSERVERS.append(observer)
+
+
+def remove_node_observer(observer: Callable[[str, Any, Any, float], None]) -> None:
+    if observer in _NODE_OBSERVERS:
+        _NODE_OBSERVERS.remove(observer)
+
+
+def record_node(node_name: str, state: Any, result: Any, duration_s: float) -> None:
+    """Record latency, payload size and doc counts for one node execution."""
+    for observer in list(_NODE_OBSERVERS):
+        try:
+            observer(node_name, state, result, duration_s)
+        except Exception:  # pragma: no cover - observers must never break a node
+            pass
+    if not METRICS_ENABLED:
+        return
+    try:
+        route = route_label(result if isinstance(result, dict) and result.get("workflow") else state)
+        session = REGISTRY.session_label(_state_get(state, "session_id"))
+        NODE_DURATION.observe(duration_s, node=node_name, route=route, session=session)
+        if isinstance(result, dict):
+            NODE_PAYLOAD.observe(estimate_size(result), node=node_name, route=route)
+            for key in DOC_RESULT_KEYS:
+                docs = result.get(key)
+                if isinstance(docs, list):
+                    RETRIEVED_DOCS.observe(len(docs), node=f"{node_name}.{key}", route=route)
+    except Exception:  # pragma: no cover - metrics must never break a node
+        pass
+
+
+def record_llm_call(call_site: str, model: str, duration_s: float, status: str = "ok",
+                    prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None) -> None:
+    """Record one LLM call; token counts are optional (not all providers report usage)."""
+    if not METRICS_ENABLED:
+        return
+    LLM_DURATION.observe(duration_s, call_site=call_site, model=model, status=status)
+    if prompt_tokens is not None:
+        LLM_TOKENS.observe(prompt_tokens, call_site=call_site, model=model, kind="prompt")
+    if completion_tokens is not None:
+        LLM_TOKENS.observe(completion_tokens, call_site=call_site, model=model, kind="completion")
+
+
+def timed_rpc(client: Any, function: str, params: Dict[str, Any]):
+    """Execute `client.rpc(function, params)` and record its latency by function name."""
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        return client.rpc(function, params).execute()
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        if METRICS_ENABLED:
+            SUPABASE_RPC_DURATION.observe(time.perf_counter() - start, function=function, status=status)
+
+
+def _usage_from_response(response: Any) -> Tuple[Optional[int], Optional[int]]:
+    """Pull prompt/completion token counts from a LangChain LLMResult."""
+    usage = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+    if not isinstance(usage, dict):
+        usage = getattr(usage, "__dict__", {}) or {}
+    prompt = usage.get("prompt_tokens") or usage.get("input_tokens")
+    completion = usage.get("completion_tokens") or usage.get("output_tokens")
+    if prompt is None and completion is None:
+        for generations in getattr(response, "generations", None) or []:
+            for gen in generations:
+                meta = getattr(getattr(gen, "message", None), "usage_metadata", None) or {}
+                if meta:
+                    prompt = (prompt or 0) + (meta.get("input_tokens") or 0)
+                    completion = (completion or 0) + (meta.get("output_tokens") or 0)
+    return prompt, completion
+
+
+try:
+    from langchain_core.callbacks import BaseCallbackHandler
+except ImportError:  # pragma: no cover - langchain is a hard dependency of the backend
+    BaseCallbackHandler = object  # type: ignore[misc,assignment]
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """LangChain callback recording latency and token usage for one LLM call site."""
+
+    def __init__(self, call_site: str, model: str = ""):
+        self.call_site = call_site
+        self.model = model
+        self._starts: Dict[Any, float] = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start = self._starts.pop(run_id, None)
+        if start is None:
+            return
+        prompt, completion = _usage_from_response(response)
+        record_llm_call(self.call_site, self.model, time.perf_counter() - start,
+                        prompt_tokens=prompt, completion_tokens=completion)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        start = self._starts.pop(run_id, None)
+        if start is not None:
+            record_llm_call(self.call_site, self.model, time.perf_counter() - start, status="error")
+
+
+def instrument_llm(llm: Any, call_site: str, model: str = "") -> Any:
+    """Attach an LLMMetricsCallback to a LangChain chat model (no-op when metrics are disabled)."""
+    if not METRICS_ENABLED or llm is None:
+        return llm
+    handler = LLMMetricsCallback(call_site, model)
+    try:
+        existing = list(getattr(llm, "callbacks", None) or [])
+        llm.callbacks = existing + [handler]
+    except Exception:  # pragma: no cover - non-pydantic wrappers
+        pass
+    return llm
+
+
+def render_metrics() -> str:
+    """Prometheus text exposition for every registered metric."""
+    return REGISTRY.render()
@@ -1,7 +1,15 @@
 """
 Token counting utilities with optional tiktoken support and safe fallbacks.
+
+Encodings are loaded once per process (per model) and exact counts are
+memoized in an LRU keyed by a hash of the text, so documents that are counted
+repeatedly (grading passes, verifier checks) are only encoded once.
 """
-from typing import Any, Dict, List, Union
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
 try:
     import tiktoken
@@ -10,20 +18,116 @@ try:
 except ImportError:
     TIKTOKEN_AVAILABLE = False
 
+DEFAULT_MODEL = "gpt-4"
+FALLBACK_ENCODING = "cl100k_base"
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "8192"))  # memoized (encoding, text hash) -> count entries
+TOKEN_BATCH_THREADS = int(os.getenv("TOKEN_BATCH_THREADS", "4"))
 
-class TokenCounter:
-    """Counts tokens for strings, message lists, or arbitrary dicts."""
+_encodings: Dict[str, Any] = {}
+_encodings_lock = threading.Lock()
 
-    def __init__(self, model: str = "gpt-4"):
-        self.model = model
+_count_cache: "OrderedDict[Tuple[str, bytes], int]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_encoding(model: str = DEFAULT_MODEL):
+    """
+    Return the tiktoken encoding for `model`, loading it at most once per process.
+
+    Returns None when tiktoken is unavailable or the encoding cannot be loaded
+    (e.g. no network to fetch the BPE file); callers then use the 4-chars-per-token
+    approximation.
+    """
+    model = model or DEFAULT_MODEL
+    encoding = _encodings.get(model)
+    if encoding is not None or model in _encodings:
+        return encoding
+
+    with _encodings_lock:
+        if model in _encodings:
+            return _encodings[model]
+        encoding = None
         if TIKTOKEN_AVAILABLE:
             try:
-                self.encoding = tiktoken.encoding_for_model(model)
+                encoding = tiktoken.encoding_for_model(model)
             except KeyError:
                 # Fallback to common encoding
-                self.encoding = tiktoken.get_encoding("cl100k_base")
-        else:
-            self.encoding = None
+                try:
+                    encoding = tiktoken.get_encoding(FALLBACK_ENCODING)
+                except Exception:
+                    encoding = None
+            except Exception:
+                encoding = None
+        _encodings[model] = encoding
+        return encoding
+
+
+def _approx_tokens(text: str) -> int:
+    # Fallback: rough average of 4 chars per token
+    return max(1, len(text) // 4) if text else 0
+
+
+def estimate_tokens_upper_bound(text: Union[str, List[Any], Dict[str, Any]]) -> int:
+    """
+    Cheap upper bound on the token count without encoding.
+
+    Every BPE token covers at least one UTF-8 byte, so the byte length bounds
+    the exact count from above for tiktoken encodings (and is far above the
+    chars/4 fallback).
+    """
+    if isinstance(text, list):
+        return sum(estimate_tokens_upper_bound(item) for item in text)
+    if isinstance(text, dict):
+        return sum(estimate_tokens_upper_bound(value) for value in text.values())
+    if isinstance(text, str):
+        return len(text.encode("utf-8"))
+    return 0
+
+
+def _cache_key(encoding_name: str, text: str) -> Tuple[str, bytes]:
+    return encoding_name, hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def _cache_get(key: Tuple[str, bytes]) -> Optional[int]:
+    with _cache_lock:
+        count = _count_cache.get(key)
+        if count is not None:
+            _count_cache.move_to_end(key)
+        return count
+
+
+def _cache_put(key: Tuple[str, bytes], count: int) -> None:
+    with _cache_lock:
+        _count_cache[key] = count
+        _count_cache.move_to_end(key)
+        while len(_count_cache) > TOKEN_CACHE_SIZE:
+            _count_cache.popitem(last=False)
+
+
+def clear_token_cache() -> None:
+    """Drop all memoized token counts."""
+    with _cache_lock:
+        _count_cache.clear()
+
+
+class TokenCounter:
+    """Counts tokens for strings, message lists, or arbitrary dicts."""
+
+    def __init__(self, model: str = DEFAULT_MODEL):
+        self.model = model
+        self.encoding = get_encoding(model)
+
+    def _count_text(self, text: str) -> int:
+        if not text:
+            return 0
+        if not self.encoding:
+            return _approx_tokens(text)
+        key = _cache_key(self.encoding.name, text)
+        count = _cache_get(key)
+        if count is None:
+            count = len(self.encoding.encode_ordinary(text))
+            _cache_put(key, count)
+        return count
 
     def count_tokens(self, text: Union[str, List[Any], Dict[str, Any]]) -> int:
         """Count tokens for supported input types."""
@@ -37,20 +141,80 @@ class TokenCounter:
             return total
 
         if isinstance(text, str):
-            if self.encoding:
-                return len(self.encoding.encode(text))
-            # Fallback: rough average of 4 chars per token
-            return max(1, len(text) // 4) if text else 0
+            return self._count_text(text)
 
         return 0
 
+    def count_many(self, texts: Sequence[str]) -> List[int]:
+        """
+        Count tokens for many strings, returning counts in input order.
+
+        Cache misses are encoded together with tiktoken's batch encoder, which
+        fans out over a thread pool (tiktoken releases the GIL while encoding).
+        """
+        counts: List[Optional[int]] = [None] * len(texts)
+        if not self.encoding:
+            return [_approx_tokens(t) if isinstance(t, str) else 0 for t in texts]
+
+        misses: Dict[Tuple[str, bytes], List[int]] = {}
+        for idx, text in enumerate(texts):
+            if not isinstance(text, str) or not text:
+                counts[idx] = 0
+                continue
+            key = _cache_key(self.encoding.name, text)
+            cached = _cache_get(key)
+            if cached is not None:
+                counts[idx] = cached
+            else:
+                misses.setdefault(key, []).append(idx)
 
-_default_counter = TokenCounter()
+        if misses:
+            keys = list(misses)
+            miss_texts = [texts[misses[k][0]] for k in keys]
+            if len(miss_texts) == 1:
+                encoded = [self.encoding.encode_ordinary(miss_texts[0])]
+            else:
+                encoded = self.encoding.encode_ordinary_batch(
+                    miss_texts, num_threads=max(1, TOKEN_BATCH_THREADS)
+                )
+            for key, tokens in zip(keys, encoded):
+                _cache_put(key, len(tokens))
+                for idx in misses[key]:
+                    counts[idx] = len(tokens)
+
+        return counts  # type: ignore[return-value]
+
+    def within_budget(self, text: Union[str, List[Any], Dict[str, Any]], limit: int) -> bool:
+        """True if `text` fits in `limit` tokens; skips exact encoding when the upper bound already fits."""
+        if estimate_tokens_upper_bound(text) <= limit:
+            return True
+        if isinstance(text, list) and all(isinstance(t, str) for t in text):
+            return sum(self.count_many(text)) <= limit
+        return self.count_tokens(text) <= limit
+
+
+_counters: Dict[str, TokenCounter] = {}
+
+
+def get_counter(model: str = None) -> TokenCounter:
+    """Shared TokenCounter for `model` (default model when None)."""
+    model = model or DEFAULT_MODEL
+    counter = _counters.get(model)
+    if counter is None:
+        counter = _counters.setdefault(model, TokenCounter(model))
+    return counter
 
 
 def count_tokens(text: Union[str, List[Any], Dict[str, Any]], model: str = None) -> int:
     """Convenience wrapper to count tokens with an optional model override."""
-    if model and model != _default_counter.model:
-        return TokenCounter(model).count_tokens(text)
-    return _default_counter.count_tokens(text)
+    return get_counter(model).count_tokens(text)
+
+
+def count_many(texts: Sequence[str], model: str = None) -> List[int]:
+    """Batch token counts (in input order) with an optional model override."""
+    return get_counter(model).count_many(texts)
+
 
+def within_token_budget(text: Union[str, List[Any], Dict[str, Any]], limit: int, model: str = None) -> bool:
+    """Budget check that only encodes when the cheap upper bound exceeds `limit`."""
+    return get_counter(model).within_budget(text, limit)
@@ -1,73 +1,206 @@
 """
 Tool result eviction and summarization utilities.
+
+Size checks encode the result lazily (compact JSON) and stop as soon as the
+inline threshold is crossed, so small results are never fully re-serialized
+and large ones are only serialized once, straight into the spill file.
+
+Spill formats (TOOL_EVICTION_FORMAT):
+- "json" (default): compact JSON; lists are written as JSON Lines (header line
+  + one item per line) so `load_evicted_result` can page without parsing the
+  whole file. Stays readable by the agent's read_file tool.
+- "msgpack": header + one msgpack object per item through a zstd stream.
+  Smaller and faster for large Excel/Speckle payloads; falls back to "json"
+  when msgpack or zstandard is not installed.
 """
 import json
 import logging
+from itertools import islice
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Iterator, Optional, Tuple
 from uuid import uuid4
 
-from config.settings import MAX_INLINE_TOOL_RESULT
+from config.settings import MAX_INLINE_TOOL_RESULT, TOOL_EVICTION_FORMAT
+
+try:
+    import msgpack
+    import zstandard
+
+    BINARY_SPILL_AVAILABLE = True
+except ImportError:
+    BINARY_SPILL_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+_HEADER_KEY = "__evicted__"
+_compact_encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def estimate_size(result: Any, limit: int) -> Tuple[int, str, bool]:
+    """
+    Measure the compact-JSON size of `result`, stopping once it exceeds `limit`.
+
+    Returns (chars_seen, prefix, exceeded). When not exceeded, chars_seen is the
+    exact serialized length and prefix is the full serialization.
+    """
+    if isinstance(result, str):
+        return len(result), result[: limit + 1], len(result) > limit
+    if not isinstance(result, (dict, list, tuple)):
+        text = str(result)
+        return len(text), text[: limit + 1], len(text) > limit
+
+    size = 0
+    parts = []
+    # iterencode (non one-shot) yields chunks lazily from the pure-Python encoder
+    for chunk in _compact_encoder.iterencode(result):
+        size += len(chunk)
+        parts.append(chunk)
+        if size > limit:
+            return size, "".join(parts), True
+    return size, "".join(parts), False
+
 
 class ToolResultEvictor:
     """Handles eviction of large tool outputs to files with summarization."""
 
-    def __init__(self, max_inline_size: int = MAX_INLINE_TOOL_RESULT):
+    def __init__(self, max_inline_size: int = MAX_INLINE_TOOL_RESULT, spill_format: str = TOOL_EVICTION_FORMAT):
         self.max_inline_size = max_inline_size
         self.summary_length = 500
+        self.spill_format = spill_format
+        if spill_format == "msgpack" and not BINARY_SPILL_AVAILABLE:
+            logger.warning("msgpack/zstandard not installed - evicting tool results as compact JSON")
+            self.spill_format = "json"
 
     def process_result(self, tool_name: str, result: Any, workspace_dir: Path) -> Dict[str, Any]:
         """Process tool result, evicting large outputs to files."""
-        if isinstance(result, dict) or isinstance(result, (list, tuple)):
-            result_str = json.dumps(result, indent=2)
-        else:
-            result_str = str(result)
-
-        if len(result_str) <= self.max_inline_size:
+        _, preview, exceeded = estimate_size(result, self.max_inline_size)
+        if not exceeded:
             return {"inline": result, "evicted": False}
 
-        logger.info(f"Evicting large result from {tool_name}: {len(result_str)} chars > {self.max_inline_size}")
-        filename = f"{tool_name}_{uuid4().hex[:8]}.json"
-        filepath = workspace_dir / filename
-        filepath.write_text(result_str, encoding="utf-8")
+        logger.info(f"Evicting large result from {tool_name}: > {self.max_inline_size} chars")
+        if isinstance(result, str) or not isinstance(result, (dict, list, tuple)):
+            filename = f"{tool_name}_{uuid4().hex[:8]}.txt"
+            filepath = workspace_dir / filename
+            text = result if isinstance(result, str) else str(result)
+            filepath.write_text(text, encoding="utf-8")
+            raw_size, fmt = len(text), "text"
+        elif self.spill_format == "msgpack":
+            filename = f"{tool_name}_{uuid4().hex[:8]}.msgpack.zst"
+            filepath = workspace_dir / filename
+            raw_size, fmt = self._write_msgpack(result, filepath), "msgpack"
+        else:
+            is_list = isinstance(result, (list, tuple))
+            filename = f"{tool_name}_{uuid4().hex[:8]}.{'jsonl' if is_list else 'json'}"
+            filepath = workspace_dir / filename
+            raw_size, fmt = self._write_json(result, filepath), "json"
 
-        summary = self._create_summary(result, result_str)
+        summary = self._create_summary(result, preview)
 
-        return {
+        eviction = {
             "evicted": True,
             "file_ref": str(filepath),
             "filename": filename,
             "summary": summary,
-            "size_chars": len(result_str),
+            "format": fmt,
+            "size_chars": raw_size,
             "size_bytes": filepath.stat().st_size,
             "original_type": type(result).__name__,
         }
+        if isinstance(result, (list, tuple)):
+            eviction["item_count"] = len(result)
+        return eviction
+
+    def _write_json(self, result: Any, filepath: Path) -> int:
+        """Stream compact JSON (JSON Lines for lists) to disk; returns chars written."""
+        written = 0
+        with filepath.open("w", encoding="utf-8") as fh:
+            if isinstance(result, (list, tuple)):
+                header = json.dumps({_HEADER_KEY: "list", "count": len(result)})
+                fh.write(header + "\n")
+                written += len(header) + 1
+                for item in result:
+                    line = _compact_encoder.encode(item)
+                    fh.write(line + "\n")
+                    written += len(line) + 1
+            else:
+                for chunk in _compact_encoder.iterencode(result):
+                    fh.write(chunk)
+                    written += len(chunk)
+        return written
+
+    def _write_msgpack(self, result: Any, filepath: Path) -> int:
+        """Stream header + items as msgpack through a zstd compressor; returns uncompressed bytes."""
+        is_list = isinstance(result, (list, tuple))
+        items = result if is_list else [result]
+        packer = msgpack.Packer(default=str)
+        written = 0
+        with filepath.open("wb") as raw, zstandard.ZstdCompressor(level=3).stream_writer(raw) as fh:
+            header = packer.pack({_HEADER_KEY: "list" if is_list else "value", "count": len(items)})
+            fh.write(header)
+            written += len(header)
+            for item in items:
+                packed = packer.pack(item)
+                fh.write(packed)
+                written += len(packed)
+        return written
 
     def _create_summary(self, result: Any, result_str: str) -> str:
         """Create intelligent summary of evicted result."""
         if isinstance(result, list):
             return f"List with {len(result)} items. Preview: {result_str[:self.summary_length]}..."
         if isinstance(result, dict):
-            keys = list(result.keys())[:10]
+            keys = [str(k) for k in list(result.keys())[:10]]
             extra = len(result.keys()) - len(keys)
             key_str = ", ".join(keys) + (f", ... (+{extra})" if extra > 0 else "")
             return f"Dict with keys: [{key_str}]. Preview: {result_str[:self.summary_length]}..."
         return result_str[:self.summary_length] + "..."
 
-    def load_evicted_result(self, file_ref: str) -> Any:
-        """Load an evicted result from file."""
+    def _read_msgpack(self, filepath: Path) -> Iterator[Any]:
+        """Yield the header, then each item, from a msgpack+zstd spill file."""
+        if not BINARY_SPILL_AVAILABLE:
+            raise RuntimeError(f"msgpack/zstandard required to read {filepath.name}")
+        with filepath.open("rb") as raw, zstandard.ZstdDecompressor().stream_reader(raw) as fh:
+            yield from msgpack.Unpacker(fh, raw=False, strict_map_key=False)
+
+    def _read_jsonl(self, filepath: Path) -> Iterator[Any]:
+        """Yield the header, then each item, from a JSON Lines spill file."""
+        with filepath.open("r", encoding="utf-8") as fh:
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+
+    def load_evicted_result(self, file_ref: str, offset: int = 0, limit: Optional[int] = None) -> Any:
+        """
+        Load an evicted result from file.
+
+        With `limit`, list results are read lazily and only items
+        [offset, offset + limit) are decoded; text results return that
+        character window. Without it the full result is returned.
+        """
         filepath = Path(file_ref)
         if not filepath.exists():
             logger.error(f"Evicted file not found: {file_ref}")
             return None
-        content = filepath.read_text(encoding="utf-8")
+        stop = None if limit is None else offset + limit
         try:
-            return json.loads(content)
-        except json.JSONDecodeError:
-            return content
+            name = filepath.name
+            if name.endswith((".jsonl", ".msgpack.zst")):
+                records = self._read_msgpack(filepath) if name.endswith(".zst") else self._read_jsonl(filepath)
+                header = next(records, None) or {}
+                if header.get(_HEADER_KEY) != "list":
+                    return next(records, None)
+                return list(islice(records, offset, stop))
+            if name.endswith(".txt"):
+                with filepath.open("r", encoding="utf-8") as fh:
+                    return fh.read() if stop is None else fh.read(stop)[offset:]
+            content = filepath.read_text(encoding="utf-8")
+            try:
+                result = json.loads(content)
+            except json.JSONDecodeError:
+                result = content
+            if limit is not None and isinstance(result, (list, str)):
+                return result[offset:stop]
+            return result
         except Exception as exc:
             logger.error(f"Error loading evicted result: {exc}")
             return None
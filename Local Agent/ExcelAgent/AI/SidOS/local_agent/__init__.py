@@ -9,6 +9,7 @@ principle: Excel is the source of truth for all calculations.
 """
 
 from .excel_tools import ExcelToolAPI, ExcelToolAPIError, execute_tool_sequence
+from .formula_engine import FormulaEngine, UnsupportedFormulaError
 from .semantic_loader import load_metadata, save_metadata, validate_metadata, SemanticMetadataError
 from .config import load_config, AgentConfig
 from .agent_service import LocalAgent
@@ -17,6 +18,8 @@ __all__ = [
     "ExcelToolAPI",
     "ExcelToolAPIError",
     "execute_tool_sequence",
+    "FormulaEngine",
+    "UnsupportedFormulaError",
     "load_metadata",
     "save_metadata",
     "validate_metadata",
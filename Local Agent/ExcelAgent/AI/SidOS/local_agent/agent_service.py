@@ -101,7 +101,8 @@ class LocalAgent:
                 workbook_path=workbook_path,
                 semantic_metadata=semantic_metadata,
                 tool_sequence=tool_sequence,
-                visible=self.config.excel_visible
+                visible=self.config.excel_visible,
+                backend=self.config.excel_backend
             )
             
             if result["success"]:
@@ -30,6 +30,7 @@ class AgentConfig:
         poll_interval: Seconds between polling for new tasks
         excel_visible: Whether to show Excel application
         calculation_timeout: Seconds to wait after triggering recalculation
+        excel_backend: "xlwings" (live Excel) or "compiled" (headless formula engine)
         log_level: Logging level (DEBUG, INFO, WARNING, ERROR)
         log_file: Path to log file (None for console only)
     """
@@ -39,6 +40,7 @@ class AgentConfig:
     poll_interval: float = 2.0
     excel_visible: bool = False
     calculation_timeout: float = 2.0
+    excel_backend: str = "xlwings"
     log_level: str = "INFO"
     log_file: Optional[Path] = None
 
@@ -59,6 +61,7 @@ def load_config(config_path: Optional[Path] = None) -> AgentConfig:
         SIDOS_POLL_INTERVAL: Polling interval in seconds
         SIDOS_EXCEL_VISIBLE: Show Excel (true/false)
         SIDOS_CALCULATION_TIMEOUT: Calculation timeout in seconds
+        SIDOS_EXCEL_BACKEND: xlwings or compiled
         SIDOS_LOG_LEVEL: Logging level
         SIDOS_LOG_FILE: Path to log file
     
@@ -76,6 +79,7 @@ def load_config(config_path: Optional[Path] = None) -> AgentConfig:
         poll_interval=float(os.getenv("SIDOS_POLL_INTERVAL", "2.0")),
         excel_visible=os.getenv("SIDOS_EXCEL_VISIBLE", "false").lower() == "true",
         calculation_timeout=float(os.getenv("SIDOS_CALCULATION_TIMEOUT", "2.0")),
+        excel_backend=os.getenv("SIDOS_EXCEL_BACKEND", "xlwings").lower(),
         log_level=os.getenv("SIDOS_LOG_LEVEL", "INFO"),
         log_file=Path(os.getenv("SIDOS_LOG_FILE", "")) if os.getenv("SIDOS_LOG_FILE") else None
     )
@@ -100,6 +104,8 @@ def load_config(config_path: Optional[Path] = None) -> AgentConfig:
                 config.excel_visible = bool(file_config["excel_visible"])
             if "calculation_timeout" in file_config:
                 config.calculation_timeout = float(file_config["calculation_timeout"])
+            if "excel_backend" in file_config:
+                config.excel_backend = str(file_config["excel_backend"]).lower()
             if "log_level" in file_config:
                 config.log_level = file_config["log_level"]
             if "log_file" in file_config:
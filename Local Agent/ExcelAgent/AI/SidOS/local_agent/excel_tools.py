@@ -8,6 +8,12 @@ This module implements the fixed tool API as specified in the gameplan:
 - execute_lookup(name, key): Execute lookup operation
 - recalculate(): Trigger Excel recalculation (CRITICAL - Excel does the math)
 - read_output(name): Read output parameter from Excel
+- evaluate_batch(inputs, outputs): Evaluate outputs for a sweep of input values
+
+Two backends execute the workbook's formulas:
+- "xlwings" (default): drives a live Excel instance
+- "compiled": compiles the workbook's own formulas headlessly (formula_engine.py)
+  and falls back to Excel for any output it cannot reproduce
 
 CRITICAL PRINCIPLE: Excel remains the source of truth for all calculations.
 This API NEVER performs structural engineering calculations itself.
@@ -18,7 +24,7 @@ Author: Sidian Engineering Team
 
 import logging
 import time
-from typing import Dict, Any, Optional, Union
+from typing import Dict, Any, List, Optional, Sequence, Union
 from pathlib import Path
 
 try:
@@ -28,6 +34,18 @@ except ImportError:
     XLWINGS_AVAILABLE = False
     xw = None
 
+try:
+    try:
+        from .formula_engine import FormulaEngine, UnsupportedFormulaError, parse_address
+    except ImportError:
+        from formula_engine import FormulaEngine, UnsupportedFormulaError, parse_address
+    FORMULA_ENGINE_AVAILABLE = True
+except ImportError:
+    FORMULA_ENGINE_AVAILABLE = False
+    FormulaEngine = None
+
+BACKENDS = ("xlwings", "compiled")
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -50,7 +68,8 @@ class ExcelToolAPI:
     hardcoding cell addresses, as long as semantic metadata is provided.
     
     Attributes:
-        wb: xlwings Book object representing the Excel workbook
+        wb: xlwings Book object (None until Excel is needed on the compiled backend)
+        engine: FormulaEngine for the compiled backend, else None
         inputMap: Dictionary mapping input parameter names to cell locations
         outputMap: Dictionary mapping output parameter names to cell locations
         lookupMap: Dictionary mapping lookup names to lookup configurations
@@ -62,7 +81,8 @@ class ExcelToolAPI:
         workbook_path: Union[str, Path],
         semantic_metadata: Dict[str, Any],
         visible: bool = False,
-        calculation_timeout: float = 2.0
+        calculation_timeout: float = 2.0,
+        backend: str = "xlwings"
     ):
         """
         Initialize Excel Tool API with workbook and semantic metadata.
@@ -93,14 +113,22 @@ class ExcelToolAPI:
                 }
             visible: Whether to show Excel application (default: False)
             calculation_timeout: Seconds to wait after triggering recalculation
+            backend: "xlwings" (live Excel) or "compiled" (headless formula engine,
+                with Excel opened only for outputs it cannot evaluate)
         
         Raises:
-            ExcelToolAPIError: If xlwings is not available or workbook cannot be opened
+            ExcelToolAPIError: If the backend is unavailable or workbook cannot be opened
         """
-        if not XLWINGS_AVAILABLE:
+        if backend not in BACKENDS:
+            raise ExcelToolAPIError(f"Unknown backend '{backend}'. Use one of: {', '.join(BACKENDS)}")
+        if backend == "xlwings" and not XLWINGS_AVAILABLE:
             raise ExcelToolAPIError(
                 "xlwings is not available. Install with: pip install xlwings"
             )
+        if backend == "compiled" and not FORMULA_ENGINE_AVAILABLE:
+            raise ExcelToolAPIError(
+                "The compiled backend needs openpyxl and numpy. Install with: pip install openpyxl numpy"
+            )
         
         self.workbook_path = Path(workbook_path)
         if not self.workbook_path.exists():
@@ -114,16 +142,69 @@ class ExcelToolAPI:
         # Configuration
         self.visible = visible
         self.calculation_timeout = calculation_timeout
-        
-        # Open Excel workbook
+        self.backend = backend
+        self.wb = None
+        self.engine = None
+        
+        # Inputs written through the compiled backend, replayed into Excel on fallback
+        self._written_inputs: Dict[str, Any] = {}
+        
+        if backend == "compiled":
+            try:
+                logger.info(f"Compiling workbook formulas: {workbook_path}")
+                self.engine = FormulaEngine(
+                    self.workbook_path,
+                    inputs=[self._cell_key(name, self.inputMap) for name in self.inputMap],
+                    outputs=[self._cell_key(name, self.outputMap) for name in self.outputMap]
+                )
+            except ExcelToolAPIError:
+                raise
+            except Exception as e:
+                raise ExcelToolAPIError(f"Failed to compile workbook: {e}") from e
+            for name in self.outputMap:
+                key = self._cell_key(name, self.outputMap)
+                if not self.engine.is_supported(key):
+                    logger.warning(
+                        f"Output '{name}' will be computed by Excel: {self.engine.unsupported.get(key)}"
+                    )
+        else:
+            self._open_excel()
+    
+    def _open_excel(self):
+        """Open the workbook in Excel (once) and return the xlwings Book"""
+        if self.wb is not None:
+            return self.wb
+        if not XLWINGS_AVAILABLE:
+            raise ExcelToolAPIError(
+                "xlwings is not available. Install with: pip install xlwings"
+            )
         try:
-            logger.info(f"Opening workbook: {workbook_path}")
-            self.wb = xw.Book(str(workbook_path))
-            if not visible:
+            logger.info(f"Opening workbook: {self.workbook_path}")
+            self.wb = xw.Book(str(self.workbook_path))
+            if not self.visible:
                 self.wb.app.visible = False
             logger.info(f"Successfully opened workbook: {self.wb.name}")
         except Exception as e:
             raise ExcelToolAPIError(f"Failed to open workbook: {e}") from e
+        
+        # Bring Excel up to date with inputs written before it was opened
+        for name, value in self._written_inputs.items():
+            cell_info = self.inputMap[name]
+            self.wb.sheets[cell_info["sheet"]].range(cell_info["address"]).value = value
+        if self._written_inputs:
+            self.recalculate_excel()
+        return self.wb
+    
+    @staticmethod
+    def _cell_key(name: str, mapping: Dict[str, Any]):
+        """(sheet, row, column) for a semantic name, as used by the formula engine"""
+        try:
+            cell_info = mapping[name]
+            return parse_address(cell_info["sheet"], cell_info["address"])
+        except KeyError as e:
+            raise ExcelToolAPIError(f"Invalid semantic metadata for '{name}': missing {e}") from e
+        except UnsupportedFormulaError as e:
+            raise ExcelToolAPIError(f"Invalid address for '{name}': {e}") from e
     
     def read_input(self, name: str) -> Any:
         """
@@ -156,8 +237,11 @@ class ExcelToolAPI:
             address = cell_info["address"]
             
             logger.debug(f"Reading input '{name}' from {sheet_name}!{address}")
-            sheet = self.wb.sheets[sheet_name]
-            value = sheet.range(address).value
+            if self.engine is not None:
+                value = self.engine.get_value(self._cell_key(name, self.inputMap))
+            else:
+                sheet = self.wb.sheets[sheet_name]
+                value = sheet.range(address).value
             
             logger.info(f"Read input '{name}': {value}")
             return value
@@ -200,8 +284,12 @@ class ExcelToolAPI:
             address = cell_info["address"]
             
             logger.debug(f"Writing input '{name}' = {value} to {sheet_name}!{address}")
-            sheet = self.wb.sheets[sheet_name]
-            sheet.range(address).value = value
+            if self.engine is not None:
+                self.engine.set_value(self._cell_key(name, self.inputMap), value)
+                self._written_inputs[name] = value
+            if self.wb is not None:
+                sheet = self.wb.sheets[sheet_name]
+                sheet.range(address).value = value
             
             logger.info(f"Wrote input '{name}': {value}")
         
@@ -230,9 +318,25 @@ class ExcelToolAPI:
         math happens inside Excel formulas. This method simply triggers Excel
         to execute those formulas.
         
+        On the compiled backend the workbook's formulas are executed by the
+        formula engine, re-evaluating only cells downstream of changed inputs.
+        If Excel has been opened for fallback outputs it is recalculated too.
+        
         Raises:
             ExcelToolAPIError: If recalculation fails
         """
+        if self.engine is not None:
+            try:
+                count = self.engine.recalculate()
+                logger.info(f"Compiled recalculation complete ({count} cells)")
+            except Exception as e:
+                raise ExcelToolAPIError(f"Failed to recalculate: {e}") from e
+            if self.wb is None:
+                return
+        self.recalculate_excel()
+    
+    def recalculate_excel(self) -> None:
+        """Trigger a full recalculation in the live Excel instance"""
         try:
             logger.info("Triggering Excel recalculation...")
             
@@ -284,8 +388,12 @@ class ExcelToolAPI:
             address = cell_info["address"]
             
             logger.debug(f"Reading output '{name}' from {sheet_name}!{address}")
-            sheet = self.wb.sheets[sheet_name]
-            value = sheet.range(address).value
+            key = self._cell_key(name, self.outputMap) if self.engine is not None else None
+            if key is not None and self.engine.is_supported(key):
+                value = self.engine.get_value(key)
+            else:
+                sheet = self._open_excel().sheets[sheet_name]
+                value = sheet.range(address).value
             
             logger.info(f"Read output '{name}': {value}")
             return value
@@ -336,7 +444,6 @@ class ExcelToolAPI:
             if lookup_type == "vlookup":
                 # This is a simplified implementation
                 # In production, you'd implement full VLOOKUP logic
-                sheet = self.wb.sheets[sheet_name]
                 lookup_range = lookup_info.get("range", "A1:D100")
                 
                 # Find key in first column and return value from specified column
@@ -356,6 +463,76 @@ class ExcelToolAPI:
                 f"Failed to execute lookup '{name}': {e}"
             ) from e
     
+    def evaluate_batch(
+        self,
+        inputs: Dict[str, Sequence[Any]],
+        outputs: List[str]
+    ) -> Dict[str, List[Any]]:
+        """
+        Evaluate outputs for many input combinations (e.g., a span sweep).
+        
+        On the compiled backend the whole sweep runs through the formula engine
+        (vectorized where the formulas allow). Outputs the engine cannot
+        evaluate, and the xlwings backend, go through Excel one sample at a
+        time. Input values are restored afterwards.
+        
+        Args:
+            inputs: Semantic input name -> list of values (all the same length)
+            outputs: Semantic output names to read for every sample
+        
+        Returns:
+            Output name -> list of values, one per sample
+        
+        Raises:
+            ExcelToolAPIError: If a name is unknown or evaluation fails
+        """
+        for name in inputs:
+            if name not in self.inputMap:
+                raise ExcelToolAPIError(f"Input '{name}' not found in semantic metadata")
+        for name in outputs:
+            if name not in self.outputMap:
+                raise ExcelToolAPIError(f"Output '{name}' not found in semantic metadata")
+        lengths = {len(values) for values in inputs.values()}
+        if len(lengths) > 1:
+            raise ExcelToolAPIError("All input sequences must have the same length")
+        n = lengths.pop() if lengths else 0
+        
+        results: Dict[str, List[Any]] = {}
+        excel_outputs = list(outputs)
+        if self.engine is not None:
+            compiled = [name for name in outputs if self.engine.is_supported(self._cell_key(name, self.outputMap))]
+            excel_outputs = [name for name in outputs if name not in compiled]
+            if compiled:
+                try:
+                    values = self.engine.evaluate_batch(
+                        {self._cell_key(name, self.inputMap): seq for name, seq in inputs.items()},
+                        [self._cell_key(name, self.outputMap) for name in compiled]
+                    )
+                except Exception as e:
+                    raise ExcelToolAPIError(f"Failed to evaluate batch: {e}") from e
+                for name in compiled:
+                    results[name] = values[self._cell_key(name, self.outputMap)]
+        
+        if excel_outputs and n:
+            logger.info(f"Evaluating {n} samples in Excel for: {', '.join(excel_outputs)}")
+            original = {name: self.read_input(name) for name in inputs}
+            try:
+                for name in excel_outputs:
+                    results[name] = []
+                for i in range(n):
+                    for name, seq in inputs.items():
+                        self.write_input(name, seq[i])
+                    self._open_excel()
+                    self.recalculate()
+                    for name in excel_outputs:
+                        results[name].append(self.read_output(name))
+            finally:
+                for name, value in original.items():
+                    self.write_input(name, value)
+                self.recalculate()
+        
+        return {name: results.get(name, []) for name in outputs}
+    
     def close(self, save: bool = False) -> None:
         """
         Close the Excel workbook.
@@ -366,6 +543,9 @@ class ExcelToolAPI:
         Raises:
             ExcelToolAPIError: If closing fails
         """
+        if self.wb is None:
+            return  # compiled backend never needed Excel
+        
         try:
             if save:
                 logger.info("Saving workbook before closing...")
@@ -393,7 +573,8 @@ def execute_tool_sequence(
     workbook_path: Union[str, Path],
     semantic_metadata: Dict[str, Any],
     tool_sequence: list,
-    visible: bool = False
+    visible: bool = False,
+    backend: str = "xlwings"
 ) -> Dict[str, Any]:
     """
     Execute a sequence of tool operations on an Excel workbook.
@@ -408,9 +589,11 @@ def execute_tool_sequence(
             [
                 {"tool": "write_input", "params": {"name": "span", "value": 15.0}},
                 {"tool": "recalculate", "params": {}},
-                {"tool": "read_output", "params": {"name": "moment"}}
+                {"tool": "read_output", "params": {"name": "moment"}},
+                {"tool": "evaluate_batch", "params": {"inputs": {"span": [6, 8, 10]}, "outputs": ["moment"]}}
             ]
         visible: Whether to show Excel (default: False)
+        backend: "xlwings" or "compiled" (see ExcelToolAPI)
     
     Returns:
         Dictionary containing results:
@@ -426,7 +609,7 @@ def execute_tool_sequence(
     error = None
     
     try:
-        with ExcelToolAPI(workbook_path, semantic_metadata, visible=visible) as api:
+        with ExcelToolAPI(workbook_path, semantic_metadata, visible=visible, backend=backend) as api:
             for tool_call in tool_sequence:
                 tool_name = tool_call["tool"]
                 params = tool_call.get("params", {})
@@ -473,6 +656,15 @@ def execute_tool_sequence(
                         "result": result
                     })
                 
+                elif tool_name == "evaluate_batch":
+                    result = api.evaluate_batch(params["inputs"], params["outputs"])
+                    results.append({
+                        "tool": tool_name,
+                        "success": True,
+                        "result": result
+                    })
+                    outputs.update(result)
+                
                 else:
                     raise ValueError(f"Unknown tool: {tool_name}")
         
@@ -0,0 +1,1119 @@
+#!/usr/bin/env python3
+"""
+Formula Engine - Headless evaluation of a workbook's own formulas
+
+This module compiles the formula dependency graph of an Excel workbook (read
+with openpyxl) into Python closures, so semantic inputs can be changed and
+outputs re-evaluated without a live Excel instance:
+
+- Only the cells that the semantic outputs depend on are compiled
+- After an input changes, only its dependent sub-graph is re-evaluated
+- evaluate_batch() runs parameter sweeps vectorized with NumPy, falling back
+  to a per-sample loop for formulas that cannot be vectorized
+- validate() recomputes every compiled cell from the saved inputs and compares
+  against the values Excel cached in the file; mismatching cells are treated as
+  unsupported
+
+The engine never contains engineering math of its own. It executes the
+workbook's formulas - Excel stays the source of truth - and anything it cannot
+reproduce exactly (unsupported functions, circular references, validation
+mismatches) is reported as unsupported so the caller can use Excel instead.
+
+Author: Sidian Engineering Team
+"""
+
+import logging
+import math
+import re
+from collections import defaultdict, deque
+from functools import reduce
+from pathlib import Path
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+from openpyxl import load_workbook
+from openpyxl.cell.read_only import EmptyCell
+from openpyxl.formula import Tokenizer
+from openpyxl.formula.tokenizer import Token
+from openpyxl.utils import column_index_from_string
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# (sheet name, row, column)
+CellKey = Tuple[str, int, int]
+
+
+class UnsupportedFormulaError(Exception):
+    """Raised when a cell cannot be evaluated headlessly (use Excel instead)"""
+    pass
+
+
+class ExcelError:
+    """An Excel error value such as #DIV/0!"""
+
+    __slots__ = ("code",)
+
+    def __init__(self, code: str):
+        self.code = code
+
+    def __eq__(self, other):
+        return isinstance(other, ExcelError) and other.code == self.code
+
+    def __hash__(self):
+        return hash(self.code)
+
+    def __repr__(self):
+        return self.code
+
+
+DIV0 = ExcelError("#DIV/0!")
+VALUE = ExcelError("#VALUE!")
+REF = ExcelError("#REF!")
+NA = ExcelError("#N/A")
+NUM = ExcelError("#NUM!")
+NAME = ExcelError("#NAME?")
+_ERROR_CODES = {e.code: e for e in (DIV0, VALUE, REF, NA, NUM, NAME, ExcelError("#NULL!"))}
+
+
+class _ErrorRaised(Exception):
+    """Internal: an Excel error propagating through an expression"""
+
+    def __init__(self, error: ExcelError):
+        super().__init__(error.code)
+        self.error = error
+
+
+class _NotVectorizable(Exception):
+    """Internal: a formula needs per-sample (scalar) evaluation"""
+    pass
+
+
+class _RangeValue:
+    """Values of a rectangular range, row-major"""
+
+    __slots__ = ("rows",)
+
+    def __init__(self, rows: List[List[Any]]):
+        self.rows = rows
+
+    def flat(self) -> List[Any]:
+        return [v for row in self.rows for v in row]
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self.rows), (len(self.rows[0]) if self.rows else 0)
+
+
+# ============================================================================
+# Value coercion (Excel semantics)
+# ============================================================================
+
+def _is_array(value: Any) -> bool:
+    return isinstance(value, np.ndarray)
+
+
+def _scalar(value: Any) -> Any:
+    """Collapse a 1x1 range to its value; larger ranges are #VALUE! in scalar context"""
+    if isinstance(value, _RangeValue):
+        if value.shape == (1, 1):
+            return value.rows[0][0]
+        raise _ErrorRaised(VALUE)
+    return value
+
+
+def _to_number(value: Any) -> Any:
+    value = _scalar(value)
+    if isinstance(value, ExcelError):
+        raise _ErrorRaised(value)
+    if value is None:
+        return 0
+    if isinstance(value, (bool, np.bool_)):
+        return int(value)
+    if isinstance(value, (int, float, np.number)) or _is_array(value):
+        return value
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            raise _ErrorRaised(VALUE)
+    raise _ErrorRaised(VALUE)
+
+
+def _finite(value: Any) -> Any:
+    """
+    A swept array whose samples are all valid. NaN/inf mark samples where Excel
+    shows an error; a comparison or truth test would turn them back into ordinary
+    values, so those sweeps are evaluated per sample instead.
+    """
+    if _is_array(value) and value.dtype.kind == "f" and not np.isfinite(value).all():
+        raise _NotVectorizable("an Excel error reaches a comparison or condition")
+    return value
+
+
+def _to_text(value: Any) -> str:
+    value = _scalar(value)
+    if _is_array(value):
+        raise _NotVectorizable("text operation on a swept value")
+    if isinstance(value, ExcelError):
+        raise _ErrorRaised(value)
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else format(value, ".15g")
+    return str(value)
+
+
+def _to_bool(value: Any) -> Any:
+    value = _scalar(value)
+    if isinstance(value, ExcelError):
+        raise _ErrorRaised(value)
+    if _is_array(value):
+        return _finite(value).astype(bool)
+    if value is None:
+        return False
+    if isinstance(value, str):
+        if value.upper() in ("TRUE", "FALSE"):
+            return value.upper() == "TRUE"
+        raise _ErrorRaised(VALUE)
+    return bool(value)
+
+
+def _compare_key(value: Any) -> Tuple[int, Any]:
+    """Excel ordering: numbers < text < logicals; text is case-insensitive"""
+    if isinstance(value, bool):
+        return 2, value
+    if isinstance(value, str):
+        return 1, value.casefold()
+    return 0, value
+
+
+def _compare(op: str, left: Any, right: Any) -> Any:
+    left, right = _scalar(left), _scalar(right)
+    for v in (left, right):
+        if isinstance(v, ExcelError):
+            raise _ErrorRaised(v)
+    if _is_array(left) or _is_array(right):
+        if isinstance(left, str) or isinstance(right, str):
+            raise _NotVectorizable("text comparison on a swept value")
+        left, right = _finite(_to_number(left)), _finite(_to_number(right))
+    else:
+        # A blank compares as 0 against numbers and "" against text
+        if left is None:
+            left = "" if isinstance(right, str) else (False if isinstance(right, bool) else 0)
+        if right is None:
+            right = "" if isinstance(left, str) else (False if isinstance(left, bool) else 0)
+        left, right = _compare_key(left), _compare_key(right)
+    if op == "=":
+        return left == right
+    if op == "<>":
+        return left != right
+    if op == "<":
+        return left < right
+    if op == ">":
+        return left > right
+    if op == "<=":
+        return left <= right
+    return left >= right
+
+
+def _divide(left: Any, right: Any) -> Any:
+    if _is_array(right):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(right == 0, np.nan, left / np.where(right == 0, 1, right))
+    if right == 0:
+        raise _ErrorRaised(DIV0)
+    return left / right
+
+
+def _power(left: Any, right: Any) -> Any:
+    if _is_array(left) or _is_array(right):
+        with np.errstate(all="ignore"):
+            return np.power(np.asarray(left, dtype=float), right)
+    if left == 0 and right < 0:
+        raise _ErrorRaised(DIV0)
+    if left < 0 and not float(right).is_integer():
+        raise _ErrorRaised(NUM)
+    return left ** right
+
+
+_BINARY_NUMERIC: Dict[str, Callable[[Any, Any], Any]] = {
+    "+": lambda a, b: a + b,
+    "-": lambda a, b: a - b,
+    "*": lambda a, b: a * b,
+    "/": _divide,
+    "^": _power,
+}
+_COMPARISONS = ("=", "<>", "<", ">", "<=", ">=")
+
+
+# ============================================================================
+# Worksheet functions
+# ============================================================================
+
+def _args_scalar(args: Sequence[Any]) -> None:
+    for a in args:
+        if _is_array(a) or (isinstance(a, _RangeValue) and any(_is_array(v) for v in a.flat())):
+            raise _NotVectorizable("function has no vectorized form")
+
+
+def _numbers(args: Sequence[Any]) -> List[Any]:
+    """Numeric arguments for aggregates: range members skip blanks/text/logicals, direct args are coerced"""
+    out = []
+    for a in args:
+        if isinstance(a, _RangeValue):
+            for v in a.flat():
+                if isinstance(v, ExcelError):
+                    raise _ErrorRaised(v)
+                if isinstance(v, (int, float, np.number)) and not isinstance(v, bool) or _is_array(v):
+                    out.append(v)
+        else:
+            out.append(_to_number(a))
+    return out
+
+
+def _round_half_away(x: Any, digits: Any, mode: str = "round") -> Any:
+    digits = int(_to_number(digits))
+    factor = 10.0 ** digits
+    if _is_array(x):
+        scaled = np.abs(x) * factor
+        if mode == "up":
+            rounded = np.ceil(np.round(scaled, 9))
+        elif mode == "down":
+            rounded = np.floor(np.round(scaled, 9))
+        else:
+            rounded = np.floor(np.round(scaled, 9) + 0.5)
+        return np.sign(x) * rounded / factor
+    # Excel works to 15 significant digits, so 2.675 rounds to 2.68
+    scaled = float(format(abs(x) * factor, ".15g"))
+    if mode == "up":
+        rounded = math.ceil(scaled)
+    elif mode == "down":
+        rounded = math.floor(scaled)
+    else:
+        rounded = math.floor(scaled + 0.5)
+    return math.copysign(rounded / factor, x) if rounded else 0.0
+
+
+def _math1(np_fn: Callable, py_fn: Callable, domain: Optional[Callable[[float], bool]] = None) -> Callable:
+    def fn(x):
+        x = _to_number(x)
+        if _is_array(x):
+            with np.errstate(all="ignore"):
+                return np_fn(x)
+        if domain is not None and not domain(x):
+            raise _ErrorRaised(NUM)
+        return py_fn(x)
+    return fn
+
+
+def _reduce(np_fn: Callable, py_fn: Callable, values: List[Any], empty: Any = 0) -> Any:
+    if not values:
+        return empty
+    if any(_is_array(v) for v in values):
+        return reduce(np_fn, values)
+    return py_fn(values)
+
+
+def _fn_if(cond, if_true=None, if_false=None):
+    # IF is lazy in scalar mode: only the taken branch is evaluated
+    c = _to_bool(cond())
+    if _is_array(c):
+        a = if_true() if if_true is not None else True
+        b = if_false() if if_false is not None else False
+        a, b = _scalar(a), _scalar(b)
+        if isinstance(a, (str, ExcelError)) or isinstance(b, (str, ExcelError)):
+            raise _NotVectorizable("IF branches are not numeric")
+        return np.where(c, _to_number(a), _to_number(b))
+    if c:
+        return if_true() if if_true is not None else True
+    return if_false() if if_false is not None else False
+
+
+def _fn_iferror(value, fallback):
+    try:
+        result = _scalar(value())
+    except _ErrorRaised:
+        return fallback()
+    if isinstance(result, ExcelError):
+        return fallback()
+    if _is_array(result) and not np.isfinite(result).all():
+        alt = _to_number(fallback())
+        return np.where(np.isfinite(result), result, alt)
+    return result
+
+
+_LAZY_FUNCTIONS = {"IF": _fn_if, "IFERROR": _fn_iferror}
+
+
+def _lookup_equal(a: Any, b: Any) -> bool:
+    if isinstance(a, str) and isinstance(b, str):
+        return a.casefold() == b.casefold()
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return a == b
+    return False
+
+
+def _approx_position(key: Any, values: List[Any]) -> Optional[int]:
+    """Last position whose value is <= key before values exceed it (sorted-ascending lookup)"""
+    found = None
+    key_rank = _compare_key(key)
+    for i, v in enumerate(values):
+        if v is None:
+            continue
+        rank = _compare_key(v)
+        if rank[0] != key_rank[0]:
+            continue
+        if rank > key_rank:
+            break
+        found = i
+    return found
+
+
+def _fn_vlookup(key, table, col, approx=True, horizontal=False):
+    _args_scalar([key, col, approx])
+    key = _scalar(key)
+    if isinstance(key, ExcelError):
+        raise _ErrorRaised(key)
+    if not isinstance(table, _RangeValue):
+        raise _ErrorRaised(VALUE)
+    rows = [list(r) for r in zip(*table.rows)] if horizontal else table.rows
+    index = int(_to_number(col))
+    if index < 1 or index > (len(rows[0]) if rows else 0):
+        raise _ErrorRaised(REF)
+    first = [r[0] for r in rows]
+    if _to_bool(approx):
+        pos = _approx_position(key, first)
+    else:
+        pos = next((i for i, v in enumerate(first) if _lookup_equal(key, v)), None)
+    if pos is None:
+        raise _ErrorRaised(NA)
+    return rows[pos][index - 1]
+
+
+def _fn_match(key, lookup, match_type=1):
+    _args_scalar([key, match_type])
+    key = _scalar(key)
+    if not isinstance(lookup, _RangeValue) or 1 not in lookup.shape:
+        raise _ErrorRaised(NA)
+    values = lookup.flat()
+    kind = int(_to_number(match_type))
+    if kind == 0:
+        pos = next((i for i, v in enumerate(values) if _lookup_equal(key, v)), None)
+    elif kind > 0:
+        pos = _approx_position(key, values)
+    else:
+        pos = None
+        key_rank = _compare_key(key)
+        for i, v in enumerate(values):
+            if v is None or _compare_key(v) < key_rank:
+                break
+            pos = i
+    if pos is None:
+        raise _ErrorRaised(NA)
+    return pos + 1
+
+
+def _fn_index(array, row, col=None):
+    _args_scalar([row, col])
+    if not isinstance(array, _RangeValue):
+        return array
+    n_rows, n_cols = array.shape
+    r = int(_to_number(row))
+    c = int(_to_number(col)) if col is not None else None
+    if c is None:
+        if n_rows == 1:
+            r, c = 1, r
+        elif n_cols == 1:
+            c = 1
+        else:
+            raise _ErrorRaised(REF)
+    if not (1 <= r <= n_rows and 1 <= c <= n_cols):
+        raise _ErrorRaised(REF)
+    return array.rows[r - 1][c - 1]
+
+
+def _fn_choose(index, *options):
+    _args_scalar([index])
+    i = int(_to_number(index))
+    if not 1 <= i <= len(options):
+        raise _ErrorRaised(VALUE)
+    return options[i - 1]
+
+
+def _fn_mod(x, d):
+    x, d = _to_number(x), _to_number(d)
+    if _is_array(x) or _is_array(d):
+        with np.errstate(all="ignore"):
+            return np.where(d == 0, np.nan, np.mod(x, np.where(d == 0, 1, d)))
+    if d == 0:
+        raise _ErrorRaised(DIV0)
+    return x - d * math.floor(x / d)
+
+
+def _fn_multiple(x, significance, up: bool):
+    x, s = _to_number(x), _to_number(significance)
+    _args_scalar([x, s])
+    if s == 0:
+        return 0
+    if x > 0 and s < 0:
+        raise _ErrorRaised(NUM)
+    q = x / s
+    q = float(format(q, ".15g"))
+    return (math.ceil(q) if up else math.floor(q)) * s
+
+
+def _fn_and(*args):
+    values = [_to_bool(v) for a in args for v in (a.flat() if isinstance(a, _RangeValue) else [a]) if v is not None]
+    if not values:
+        raise _ErrorRaised(VALUE)
+    return _reduce(np.logical_and, all, values)
+
+
+def _fn_or(*args):
+    values = [_to_bool(v) for a in args for v in (a.flat() if isinstance(a, _RangeValue) else [a]) if v is not None]
+    if not values:
+        raise _ErrorRaised(VALUE)
+    return _reduce(np.logical_or, any, values)
+
+
+def _fn_not(x):
+    b = _to_bool(x)
+    return np.logical_not(b) if _is_array(b) else not b
+
+
+def _fn_average(*args):
+    values = _numbers(args)
+    if not values:
+        raise _ErrorRaised(DIV0)
+    return _reduce(np.add, sum, values) / len(values)
+
+
+def _fn_sumproduct(*ranges):
+    _args_scalar(ranges)
+    if not ranges or any(not isinstance(r, _RangeValue) or r.shape != ranges[0].shape for r in ranges):
+        raise _ErrorRaised(VALUE)
+    total = 0
+    for values in zip(*(r.flat() for r in ranges)):
+        product = 1
+        for v in values:
+            if isinstance(v, ExcelError):
+                raise _ErrorRaised(v)
+            product *= v if isinstance(v, (int, float)) and not isinstance(v, bool) else 0
+        total += product
+    return total
+
+
+def _text_fn(fn: Callable) -> Callable:
+    def wrapped(*args):
+        _args_scalar(args)
+        return fn(*args)
+    return wrapped
+
+
+FUNCTIONS: Dict[str, Callable[..., Any]] = {
+    # Math
+    "ABS": _math1(np.abs, abs),
+    "SQRT": _math1(np.sqrt, math.sqrt, lambda x: x >= 0),
+    "EXP": _math1(np.exp, math.exp),
+    "LN": _math1(np.log, math.log, lambda x: x > 0),
+    "LOG10": _math1(np.log10, math.log10, lambda x: x > 0),
+    "SIN": _math1(np.sin, math.sin),
+    "COS": _math1(np.cos, math.cos),
+    "TAN": _math1(np.tan, math.tan),
+    "ASIN": _math1(np.arcsin, math.asin, lambda x: -1 <= x <= 1),
+    "ACOS": _math1(np.arccos, math.acos, lambda x: -1 <= x <= 1),
+    "ATAN": _math1(np.arctan, math.atan),
+    "RADIANS": _math1(np.radians, math.radians),
+    "DEGREES": _math1(np.degrees, math.degrees),
+    "SIGN": _math1(np.sign, lambda x: (x > 0) - (x < 0)),
+    "INT": _math1(np.floor, math.floor),
+    "TRUNC": _math1(np.trunc, math.trunc),
+    "PI": lambda: math.pi,
+    "LOG": lambda x, base=10: _divide(_math1(np.log, math.log, lambda v: v > 0)(x),
+                                      _math1(np.log, math.log, lambda v: v > 0)(base)),
+    "POWER": lambda x, y: _power(_to_number(x), _to_number(y)),
+    "ATAN2": lambda x, y: np.arctan2(_to_number(y), _to_number(x)) if _is_array(_to_number(x)) or _is_array(_to_number(y))
+    else math.atan2(_to_number(y), _to_number(x)),
+    "MOD": _fn_mod,
+    "ROUND": lambda x, n=0: _round_half_away(_to_number(x), n),
+    "ROUNDUP": lambda x, n=0: _round_half_away(_to_number(x), n, "up"),
+    "ROUNDDOWN": lambda x, n=0: _round_half_away(_to_number(x), n, "down"),
+    "CEILING": lambda x, s=1: _fn_multiple(x, s, up=True),
+    "FLOOR": lambda x, s=1: _fn_multiple(x, s, up=False),
+    # Aggregates
+    "SUM": lambda *args: _reduce(np.add, sum, _numbers(args)),
+    "PRODUCT": lambda *args: _reduce(np.multiply, math.prod, _numbers(args)),
+    "MIN": lambda *args: _reduce(np.minimum, min, _numbers(args)),
+    "MAX": lambda *args: _reduce(np.maximum, max, _numbers(args)),
+    "AVERAGE": _fn_average,
+    "COUNT": lambda *args: len(_numbers(args)),
+    "COUNTA": lambda *args: sum(
+        1 for a in args for v in (a.flat() if isinstance(a, _RangeValue) else [a]) if v is not None
+    ),
+    "SUMPRODUCT": _fn_sumproduct,
+    # Logical
+    "AND": _fn_and,
+    "OR": _fn_or,
+    "NOT": _fn_not,
+    "TRUE": lambda: True,
+    "FALSE": lambda: False,
+    "CHOOSE": _fn_choose,
+    "NA": lambda: NA,
+    # Information
+    "ISBLANK": _text_fn(lambda x: _scalar(x) is None),
+    "ISNUMBER": _text_fn(lambda x: isinstance(_scalar(x), (int, float)) and not isinstance(_scalar(x), bool)),
+    "ISTEXT": _text_fn(lambda x: isinstance(_scalar(x), str)),
+    "ISERROR": _text_fn(lambda x: isinstance(_scalar(x), ExcelError)),
+    # Text
+    "CONCATENATE": _text_fn(lambda *args: "".join(_to_text(a) for a in args)),
+    "CONCAT": _text_fn(lambda *args: "".join(
+        _to_text(v) for a in args for v in (a.flat() if isinstance(a, _RangeValue) else [a])
+    )),
+    "LEN": _text_fn(lambda x: len(_to_text(x))),
+    "UPPER": _text_fn(lambda x: _to_text(x).upper()),
+    "LOWER": _text_fn(lambda x: _to_text(x).lower()),
+    "TRIM": _text_fn(lambda x: " ".join(_to_text(x).split())),
+    "LEFT": _text_fn(lambda x, n=1: _to_text(x)[:int(_to_number(n))]),
+    "RIGHT": _text_fn(lambda x, n=1: _to_text(x)[-int(_to_number(n)):] if int(_to_number(n)) else ""),
+    "MID": _text_fn(lambda x, start, n: _to_text(x)[int(_to_number(start)) - 1:int(_to_number(start)) - 1 + int(_to_number(n))]),
+    "VALUE": _text_fn(lambda x: _to_number(_to_text(x))),
+    # Lookup
+    "VLOOKUP": lambda key, table, col, approx=True: _fn_vlookup(key, table, col, approx),
+    "HLOOKUP": lambda key, table, row, approx=True: _fn_vlookup(key, table, row, approx, horizontal=True),
+    "MATCH": _fn_match,
+    "INDEX": _fn_index,
+}
+
+
+# ============================================================================
+# Formula parsing and compilation
+# ============================================================================
+
+_REF_RE = re.compile(
+    r"^(?:(?:'(?P<qsheet>(?:[^']|'')+)'|(?P<sheet>[^'!:]+))!)?"
+    r"\$?(?P<c1>[A-Za-z]{1,3})\$?(?P<r1>\d+)"
+    r"(?::\$?(?P<c2>[A-Za-z]{1,3})\$?(?P<r2>\d+))?$"
+)
+
+# Binary operator precedence (higher binds tighter); unary minus binds above '^'
+_PRECEDENCE = {"=": 1, "<>": 1, "<": 1, ">": 1, "<=": 1, ">=": 1, "&": 2, "+": 3, "-": 3, "*": 4, "/": 4, "^": 5}
+_UNARY_PRECEDENCE = 6
+
+
+def parse_reference(text: str, current_sheet: str) -> Tuple[str, int, int, int, int]:
+    """Parse 'Sheet'!$A$1:B2 into (sheet, min_row, min_col, max_row, max_col)"""
+    match = _REF_RE.match(text.strip())
+    if not match:
+        raise UnsupportedFormulaError(f"unsupported reference '{text}'")
+    sheet = match.group("qsheet")
+    sheet = sheet.replace("''", "'") if sheet is not None else (match.group("sheet") or current_sheet)
+    r1, c1 = int(match.group("r1")), column_index_from_string(match.group("c1").upper())
+    r2 = int(match.group("r2")) if match.group("r2") else r1
+    c2 = column_index_from_string(match.group("c2").upper()) if match.group("c2") else c1
+    return sheet, min(r1, r2), min(c1, c2), max(r1, r2), max(c1, c2)
+
+
+def parse_address(sheet: str, address: str) -> CellKey:
+    """Semantic metadata (sheet, "B3") -> cell key; ranges are not single cells"""
+    ref_sheet, r1, c1, r2, c2 = parse_reference(address, sheet)
+    if (r1, c1) != (r2, c2):
+        raise UnsupportedFormulaError(f"'{address}' is a range, not a single cell")
+    return ref_sheet, r1, c1
+
+
+class _Parser:
+    """Recursive-descent parser over openpyxl formula tokens -> nested tuples"""
+
+    def __init__(self, formula: str):
+        try:
+            tokens = Tokenizer(formula).items
+        except Exception as e:
+            raise UnsupportedFormulaError(f"cannot tokenize formula: {e}") from e
+        self.tokens = [t for t in tokens if t.type != Token.WSPACE]
+        self.pos = 0
+
+    def parse(self):
+        node = self._expr(0)
+        if self.pos != len(self.tokens):
+            raise UnsupportedFormulaError(f"unexpected token '{self.tokens[self.pos].value}'")
+        return node
+
+    def _peek(self) -> Optional[Token]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _next(self) -> Token:
+        token = self._peek()
+        if token is None:
+            raise UnsupportedFormulaError("unexpected end of formula")
+        self.pos += 1
+        return token
+
+    def _expr(self, min_prec: int):
+        left = self._prefix()
+        while True:
+            token = self._peek()
+            if token is None:
+                return left
+            if token.type == Token.OP_POST and token.value == "%":
+                self.pos += 1
+                left = ("bin", "/", left, ("num", 100))
+                continue
+            if token.type != Token.OP_IN:
+                return left
+            prec = _PRECEDENCE.get(token.value)
+            if prec is None:
+                raise UnsupportedFormulaError(f"unsupported operator '{token.value}'")
+            if prec < min_prec:
+                return left
+            self.pos += 1
+            right = self._expr(prec + 1)  # all Excel binary operators are left-associative
+            left = ("bin", token.value, left, right)
+
+    def _prefix(self):
+        token = self._next()
+        if token.type == Token.OP_PRE:
+            operand = self._expr(_UNARY_PRECEDENCE)
+            return ("neg", operand) if token.value == "-" else ("pos", operand)
+        if token.type == Token.OPERAND:
+            if token.subtype == Token.NUMBER:
+                return ("num", float(token.value) if any(ch in token.value for ch in ".eE") else int(token.value))
+            if token.subtype == Token.TEXT:
+                return ("str", token.value[1:-1].replace('""', '"'))
+            if token.subtype == Token.LOGICAL:
+                return ("bool", token.value.upper() == "TRUE")
+            if token.subtype == Token.ERROR:
+                return ("err", _ERROR_CODES.get(token.value.upper(), ExcelError(token.value.upper())))
+            if token.subtype == Token.RANGE:
+                return ("ref", token.value)
+            raise UnsupportedFormulaError(f"unsupported operand '{token.value}'")
+        if token.type == Token.FUNC and token.subtype == Token.OPEN:
+            name = token.value[:-1].upper()
+            for prefix in ("_XLFN.", "_XLWS."):
+                if name.startswith(prefix):
+                    name = name[len(prefix):]
+            args = []
+            if self._peek() is not None and self._peek().type == Token.FUNC and self._peek().subtype == Token.CLOSE:
+                self.pos += 1
+                return ("call", name, args)
+            while True:
+                nxt = self._peek()
+                if nxt is not None and (nxt.type == Token.SEP or (nxt.type == Token.FUNC and nxt.subtype == Token.CLOSE)):
+                    args.append(("missing",))
+                else:
+                    args.append(self._expr(0))
+                sep = self._next()
+                if sep.type == Token.SEP and sep.subtype == Token.ARG:
+                    continue
+                if sep.type == Token.FUNC and sep.subtype == Token.CLOSE:
+                    return ("call", name, args)
+                raise UnsupportedFormulaError(f"unsupported separator '{sep.value}'")
+        if token.type == Token.PAREN and token.subtype == Token.OPEN:
+            node = self._expr(0)
+            close = self._next()
+            if close.type != Token.PAREN or close.subtype != Token.CLOSE:
+                raise UnsupportedFormulaError("unbalanced parentheses")
+            return node
+        raise UnsupportedFormulaError(f"unsupported token '{token.value}'")
+
+
+class FormulaEngine:
+    """
+    Compiled, headless evaluator for the formulas behind a set of output cells.
+
+    Attributes:
+        workbook_path: Path to the workbook the graph was compiled from
+        unsupported: Cell key -> reason, for compiled cells that must be computed by Excel
+        validation: Result of the last validate() call
+    """
+
+    def __init__(
+        self,
+        workbook_path: Union[str, Path],
+        inputs: Iterable[CellKey],
+        outputs: Iterable[CellKey],
+        validate: bool = True
+    ):
+        """
+        Load the workbook and compile the sub-graph that the outputs depend on.
+
+        Args:
+            workbook_path: Path to Excel workbook file (.xlsx, .xlsm)
+            inputs: Cell keys that will be written (treated as constants even if they hold formulas)
+            outputs: Cell keys that will be read
+            validate: Compare compiled results with Excel's cached values (recommended)
+        """
+        self.workbook_path = Path(workbook_path)
+        self.inputs: Set[CellKey] = set(inputs)
+        self.outputs: List[CellKey] = list(outputs)
+
+        self._values: Dict[CellKey, Any] = {}
+        self._cached: Dict[CellKey, Any] = {}
+        self._formulas: Dict[CellKey, Any] = {}
+        self._defined_names: Dict[str, Tuple[str, str]] = {}
+        self._load()
+
+        self._compiled: Dict[CellKey, Callable[[], Any]] = {}
+        self._precedents: Dict[CellKey, Set[CellKey]] = {}
+        self._dependents: Dict[CellKey, Set[CellKey]] = defaultdict(set)
+        self.unsupported: Dict[CellKey, str] = {}
+        self._order: Dict[CellKey, int] = {}
+        self._plans: Dict[FrozenSet[CellKey], List[CellKey]] = {}
+        self._dirty: Set[CellKey] = set()
+        self._compile(self.outputs)
+
+        self.validation: Dict[str, Any] = {}
+        if validate:
+            self.validate()
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+    def _load(self) -> None:
+        """Read formulas/constants and Excel's cached values in two read-only passes"""
+        wb = load_workbook(self.workbook_path, read_only=True, data_only=False)
+        try:
+            for name, defined in wb.defined_names.items():
+                destinations = list(defined.destinations)
+                if len(destinations) == 1:
+                    self._defined_names[name.upper()] = destinations[0]
+            for ws in wb.worksheets:
+                for row in ws.iter_rows():
+                    for cell in row:
+                        if isinstance(cell, EmptyCell) or cell.value is None:
+                            continue
+                        key = (ws.title, cell.row, cell.column)
+                        if cell.data_type == 'f':
+                            self._formulas[key] = cell.value
+                        elif cell.data_type == 'e':
+                            self._values[key] = _ERROR_CODES.get(str(cell.value), ExcelError(str(cell.value)))
+                        else:
+                            self._values[key] = cell.value
+        finally:
+            wb.close()
+
+        wb = load_workbook(self.workbook_path, read_only=True, data_only=True)
+        try:
+            for ws in wb.worksheets:
+                for row in ws.iter_rows():
+                    for cell in row:
+                        if isinstance(cell, EmptyCell) or cell.value is None:
+                            continue
+                        key = (ws.title, cell.row, cell.column)
+                        if key in self._formulas:
+                            value = cell.value
+                            if cell.data_type == 'e':
+                                value = _ERROR_CODES.get(str(value), ExcelError(str(value)))
+                            self._cached[key] = value
+                            self._values[key] = value
+        finally:
+            wb.close()
+
+    # ------------------------------------------------------------------
+    # Compilation
+    # ------------------------------------------------------------------
+    def _compile(self, targets: Iterable[CellKey]) -> None:
+        stack = [k for k in targets if k in self._formulas and k not in self.inputs]
+        seen: Set[CellKey] = set()
+        while stack:
+            key = stack.pop()
+            if key in seen:
+                continue
+            seen.add(key)
+            refs: Set[CellKey] = set()
+            try:
+                formula = self._formulas[key]
+                if not isinstance(formula, str):
+                    raise UnsupportedFormulaError(f"{type(formula).__name__} formulas are not supported")
+                ast = _Parser(formula).parse()
+                self._compiled[key] = self._compile_node(ast, key[0], refs)
+            except UnsupportedFormulaError as e:
+                self.unsupported[key] = str(e)
+            self._precedents[key] = refs
+            for ref in refs:
+                self._dependents[ref].add(key)
+                if ref in self._formulas and ref not in self.inputs:
+                    stack.append(ref)
+
+        # Topological order (Kahn); whatever is left over sits on a cycle
+        graph_nodes = seen
+        indegree = {k: sum(1 for p in self._precedents[k] if p in graph_nodes) for k in graph_nodes}
+        queue = deque(sorted(k for k, d in indegree.items() if d == 0))
+        order: List[CellKey] = []
+        while queue:
+            key = queue.popleft()
+            order.append(key)
+            for dep in self._dependents.get(key, ()):
+                if dep in indegree:
+                    indegree[dep] -= 1
+                    if indegree[dep] == 0:
+                        queue.append(dep)
+        for key in graph_nodes - set(order):
+            self.unsupported.setdefault(key, "circular reference")
+            order.append(key)
+        self._order = {k: i for i, k in enumerate(order)}
+        self._propagate_unsupported()
+
+        logger.info(
+            f"Compiled {len(self._compiled)} formula cells for {len(self.outputs)} outputs "
+            f"({len(self.unsupported)} need Excel)"
+        )
+
+    def _propagate_unsupported(self) -> None:
+        """A cell is only as supported as its formula precedents"""
+        for key in sorted(self._order, key=self._order.get):
+            if key in self.unsupported:
+                continue
+            bad = next((p for p in self._precedents[key] if p in self.unsupported), None)
+            if bad is not None:
+                self.unsupported[key] = f"depends on {bad[0]}!{bad[1]},{bad[2]}"
+        self._plans.clear()
+
+    def _compile_node(self, node, sheet: str, refs: Set[CellKey]) -> Callable[[], Any]:
+        kind = node[0]
+        if kind in ("num", "str", "bool", "err"):
+            value = node[1]
+            return lambda: value
+        if kind == "missing":
+            return lambda: None
+        if kind == "ref":
+            return self._compile_ref(node[1], sheet, refs)
+        if kind == "neg":
+            operand = self._compile_node(node[1], sheet, refs)
+            return lambda: -_to_number(operand())
+        if kind == "pos":
+            return self._compile_node(node[1], sheet, refs)
+        if kind == "bin":
+            op = node[1]
+            left = self._compile_node(node[2], sheet, refs)
+            right = self._compile_node(node[3], sheet, refs)
+            if op in _BINARY_NUMERIC:
+                fn = _BINARY_NUMERIC[op]
+                return lambda: fn(_to_number(left()), _to_number(right()))
+            if op == "&":
+                return lambda: _to_text(left()) + _to_text(right())
+            return lambda: _compare(op, left(), right())
+        if kind == "call":
+            name, arg_nodes = node[1], node[2]
+            args = [self._compile_node(a, sheet, refs) for a in arg_nodes]
+            if name in _LAZY_FUNCTIONS:
+                lazy = _LAZY_FUNCTIONS[name]
+                return lambda: lazy(*args)
+            if name not in FUNCTIONS:
+                raise UnsupportedFormulaError(f"unsupported function {name}()")
+            fn = FUNCTIONS[name]
+            return lambda: fn(*(a() for a in args))
+        raise UnsupportedFormulaError(f"unsupported expression {kind}")
+
+    def _compile_ref(self, text: str, sheet: str, refs: Set[CellKey]) -> Callable[[], Any]:
+        target = text
+        if text.upper() in self._defined_names:
+            ref_sheet, coord = self._defined_names[text.upper()]
+            target = f"'{ref_sheet}'!{coord}"
+        ref_sheet, r1, c1, r2, c2 = parse_reference(target, sheet)
+        values = self._values
+        if (r1, c1) == (r2, c2):
+            key = (ref_sheet, r1, c1)
+            refs.add(key)
+            return lambda: values.get(key)
+        if (r2 - r1 + 1) * (c2 - c1 + 1) > 100_000:
+            raise UnsupportedFormulaError(f"range {text} is too large")
+        grid = [[(ref_sheet, r, c) for c in range(c1, c2 + 1)] for r in range(r1, r2 + 1)]
+        for row in grid:
+            refs.update(row)
+        return lambda: _RangeValue([[values.get(k) for k in row] for row in grid])
+
+    # ------------------------------------------------------------------
+    # Evaluation
+    # ------------------------------------------------------------------
+    def is_supported(self, key: CellKey) -> bool:
+        """True when the cell can be read from the engine (constants always can)"""
+        return key not in self.unsupported and (key in self._compiled or key not in self._formulas or key in self.inputs)
+
+    def _evaluate_cell(self, key: CellKey) -> Any:
+        try:
+            value = _scalar(self._compiled[key]())
+        except _ErrorRaised as e:
+            value = e.error
+        self._values[key] = value
+        return value
+
+    def _plan(self, changed: FrozenSet[CellKey]) -> List[CellKey]:
+        """Supported formula cells downstream of the changed cells, in evaluation order"""
+        plan = self._plans.get(changed)
+        if plan is None:
+            affected: Set[CellKey] = set()
+            stack = list(changed)
+            while stack:
+                for dep in self._dependents.get(stack.pop(), ()):
+                    if dep not in affected and dep in self._compiled and dep not in self.inputs:
+                        affected.add(dep)
+                        stack.append(dep)
+            plan = sorted((k for k in affected if k not in self.unsupported), key=self._order.get)
+            self._plans[changed] = plan
+        return plan
+
+    def set_value(self, key: CellKey, value: Any) -> None:
+        """Write an input cell; dependents are recomputed on the next recalculate()/get_value()"""
+        if key not in self.inputs:
+            raise UnsupportedFormulaError(f"{key[0]}!{key[1]},{key[2]} is not a declared input")
+        self._values[key] = value
+        self._dirty.add(key)
+
+    def recalculate(self) -> int:
+        """Re-evaluate only the sub-graph affected by inputs written since the last call"""
+        if not self._dirty:
+            return 0
+        plan = self._plan(frozenset(self._dirty))
+        self._dirty.clear()
+        for key in plan:
+            self._evaluate_cell(key)
+        return len(plan)
+
+    def get_value(self, key: CellKey) -> Any:
+        """Current value of a cell (recalculating first if inputs changed)"""
+        if not self.is_supported(key):
+            raise UnsupportedFormulaError(self.unsupported.get(key, "cell was not compiled"))
+        self.recalculate()
+        value = self._values.get(key)
+        return value.code if isinstance(value, ExcelError) else value
+
+    def evaluate_batch(
+        self,
+        inputs: Dict[CellKey, Sequence[Any]],
+        outputs: Sequence[CellKey]
+    ) -> Dict[CellKey, List[Any]]:
+        """
+        Evaluate outputs for many input combinations (a parameter sweep).
+
+        All input sequences must have the same length. Numeric sweeps run
+        vectorized (NumPy arrays flow through the compiled graph); samples that
+        hit an Excel error, and formulas with no vectorized form, are evaluated
+        one sample at a time. Engine state is unchanged afterwards.
+
+        Returns:
+            Output key -> list of values, one per sample
+        """
+        lengths = {len(v) for v in inputs.values()}
+        if len(lengths) > 1:
+            raise ValueError("All input sequences must have the same length")
+        n = lengths.pop() if lengths else 0
+        for key in outputs:
+            if not self.is_supported(key):
+                raise UnsupportedFormulaError(self.unsupported.get(key, "cell was not compiled"))
+        for key in inputs:
+            if key not in self.inputs:
+                raise UnsupportedFormulaError(f"{key[0]}!{key[1]},{key[2]} is not a declared input")
+
+        self.recalculate()
+        plan = self._plan(frozenset(inputs))
+        needed = self._ancestors(outputs)
+        plan = [k for k in plan if k in needed]
+        saved = {k: self._values.get(k) for k in list(inputs) + plan}
+
+        results: Dict[CellKey, List[Any]] = {}
+        scalar_samples = list(range(n))
+        try:
+            if n and all(isinstance(v, (int, float)) and not isinstance(v, bool) for seq in inputs.values() for v in seq):
+                try:
+                    for key, seq in inputs.items():
+                        self._values[key] = np.asarray(seq, dtype=float)
+                    for key in plan:
+                        self._evaluate_cell(key)
+                    results, scalar_samples = self._collect_vectorized(outputs, n)
+                except (_NotVectorizable, _ErrorRaised, TypeError, ValueError) as e:
+                    logger.debug(f"Batch not vectorizable ({e}); evaluating per sample")
+                    results, scalar_samples = {}, list(range(n))
+            for key in outputs:
+                results.setdefault(key, [None] * n)
+            for i in scalar_samples:
+                for key, seq in inputs.items():
+                    self._values[key] = seq[i]
+                for key in plan:
+                    self._evaluate_cell(key)
+                for key in outputs:
+                    value = self._values.get(key)
+                    results[key][i] = value.code if isinstance(value, ExcelError) else value
+        finally:
+            self._values.update(saved)
+        return results
+
+    def _collect_vectorized(self, outputs: Sequence[CellKey], n: int) -> Tuple[Dict[CellKey, List[Any]], List[int]]:
+        results: Dict[CellKey, List[Any]] = {}
+        bad = np.zeros(n, dtype=bool)
+        for key in outputs:
+            value = self._values.get(key)
+            if isinstance(value, ExcelError):
+                raise _NotVectorizable("output is an error for the swept values")
+            if _is_array(value):
+                array = np.broadcast_to(value, (n,))
+                if array.dtype.kind == "f":
+                    bad |= ~np.isfinite(array)
+                results[key] = [v.item() for v in array]
+            else:
+                results[key] = [value] * n
+        # NaN/inf marks samples where Excel would show an error: redo those exactly
+        return results, [int(i) for i in np.flatnonzero(bad)]
+
+    def _ancestors(self, keys: Iterable[CellKey]) -> Set[CellKey]:
+        found: Set[CellKey] = set()
+        stack = [k for k in keys]
+        while stack:
+            key = stack.pop()
+            if key in found:
+                continue
+            found.add(key)
+            stack.extend(self._precedents.get(key, ()))
+        return found
+
+    # ------------------------------------------------------------------
+    # Validation
+    # ------------------------------------------------------------------
+    def validate(self, rel_tol: float = 1e-9, abs_tol: float = 1e-9) -> Dict[str, Any]:
+        """
+        Recompute every compiled cell from the saved workbook and compare with
+        the values Excel cached. Mismatches (and their dependents) become unsupported.
+
+        Returns:
+            {"checked": int, "matched": int, "mismatched": {cell: (engine, excel)}, "unsupported": int}
+        """
+        mismatched: Dict[str, Tuple[Any, Any]] = {}
+        checked = matched = 0
+        for key in sorted(self._compiled, key=self._order.get):
+            if key in self.unsupported or key in self.inputs:
+                continue
+            value = self._evaluate_cell(key)
+            if key not in self._cached:
+                continue  # never calculated by Excel (e.g. file written by openpyxl)
+            checked += 1
+            expected = self._cached[key]
+            if self._same(value, expected, rel_tol, abs_tol):
+                matched += 1
+            else:
+                mismatched[f"{key[0]}!{key[1]},{key[2]}"] = (value, expected)
+                self.unsupported[key] = f"result {value!r} differs from Excel's cached {expected!r}"
+                self._values[key] = expected
+        if mismatched:
+            self._propagate_unsupported()
+            logger.warning(f"{len(mismatched)} compiled cells disagree with Excel's cached values")
+        self.validation = {
+            "checked": checked,
+            "matched": matched,
+            "mismatched": mismatched,
+            "unsupported": len(self.unsupported)
+        }
+        return self.validation
+
+    @staticmethod
+    def _same(value: Any, expected: Any, rel_tol: float, abs_tol: float) -> bool:
+        if isinstance(expected, bool) or isinstance(value, bool):
+            return value == expected
+        if isinstance(expected, (int, float)) and isinstance(value, (int, float)):
+            return math.isclose(value, expected, rel_tol=rel_tol, abs_tol=abs_tol)
+        if value is None and expected in ("", 0):
+            return True
+        return value == expected
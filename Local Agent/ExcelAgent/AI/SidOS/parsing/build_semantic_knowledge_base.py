@@ -16,12 +16,15 @@ import json
 import sys
 from pathlib import Path
 from typing import Dict
-from openpyxl import load_workbook
 from openpyxl.utils import get_column_letter
 import os
 from dotenv import load_dotenv
 from openai import OpenAI
-import pandas as pd
+
+try:
+    from .workbook_snapshot import load_workbook_snapshot
+except ImportError:  # run as a script from parsing/
+    from workbook_snapshot import load_workbook_snapshot
 
 # Load environment
 # Check if API key is already set in environment (from command line)
@@ -77,17 +80,16 @@ except Exception as e:
 
 
 def extract_sheet_sample(file_path: Path, sheet_name: str, max_rows=50, max_cols=20):
-    """Extract a sample of sheet data for AI analysis"""
+    """Extract a sample of sheet data (computed values) for AI analysis"""
     try:
-        df = pd.read_excel(file_path, sheet_name=sheet_name, nrows=max_rows, header=None)
+        values = load_workbook_snapshot(file_path).sheet(sheet_name).iter_values(max_row=max_rows, max_col=max_cols)
         
         # Convert to string representation
         sample_data = []
-        for row_idx in range(min(max_rows, len(df))):
+        for row_idx, row_values in enumerate(values):
             row_data = []
-            for col_idx in range(min(max_cols, len(df.columns))):
-                cell_value = df.iloc[row_idx, col_idx]
-                if pd.notna(cell_value):
+            for col_idx, cell_value in enumerate(row_values):
+                if cell_value is not None and cell_value != "":
                     cell_addr = f"{get_column_letter(col_idx + 1)}{row_idx + 1}"
                     row_data.append(f"{cell_addr}: {str(cell_value)[:50]}")
             if row_data:
@@ -451,7 +453,9 @@ Return as JSON:
 
 
 def get_cell_text_color(cell):
-    """Helper to extract RGB text color from openpyxl cell"""
+    """Helper to extract RGB text color from openpyxl cell (snapshot cells carry it precomputed)"""
+    if hasattr(cell, "text_color"):
+        return cell.text_color
     if cell.font and cell.font.color:
         color_obj = cell.font.color
         # Handle standard RGB colors
@@ -478,23 +482,16 @@ def detect_legend_with_ai(file_path: Path, sheet_name: str) -> dict:
     ENHANCED: Now extracts and uses TEXT COLOR as a classification signal.
     """
     try:
-        wb = load_workbook(file_path, data_only=False)
-        ws = wb[sheet_name]
+        ws = load_workbook_snapshot(file_path).sheet(sheet_name)
         
         # Extract all colored cells with their text (potential legend items)
         colored_cells = []
         
-        for row in ws.iter_rows(min_row=1, max_row=100, min_col=1, max_col=50):
+        for row in ws.iter_rows(max_row=100, max_col=50):
             for cell in row:
                 if cell.value:
-                    fill_color = None
-                    text_color = None
-                    
-                    # Extract fill color
-                    if cell.fill and cell.fill.start_color and cell.fill.start_color.rgb:
-                        fill_color = str(cell.fill.start_color.rgb) if cell.fill.start_color.rgb else None
-                    
-                    # Extract text color using helper function
+                    # Fill and text colours are resolved once per style by the snapshot
+                    fill_color = cell.fill_color
                     text_color = get_cell_text_color(cell)
                     
                     # Include cells with interesting fill colors OR text colors
@@ -509,8 +506,6 @@ def detect_legend_with_ai(file_path: Path, sheet_name: str) -> dict:
                             "text_color": text_color
                         })
         
-        wb.close()
-        
         if not colored_cells:
             print(f"      ⚠️ No colored cells found")
             return {"legend_found": False, "color_mappings": {}}
@@ -761,8 +756,7 @@ def classify_cells_by_ai_legend(file_path: Path, sheet_name: str, color_mappings
     if not color_mappings:
         return {"inputs": [], "outputs": [], "calculations": [], "status_indicators": []}
     
-    wb = load_workbook(file_path, data_only=False)
-    ws = wb[sheet_name]
+    ws = load_workbook_snapshot(file_path).sheet(sheet_name)
     
     classified_cells = {
         "inputs": [],
@@ -777,17 +771,13 @@ def classify_cells_by_ai_legend(file_path: Path, sheet_name: str, color_mappings
     # Track cells to process for context extraction
     cells_needing_context = []
     
-    for row in ws.iter_rows(min_row=1, max_row=200, min_col=1, max_col=50):
+    for row in ws.iter_rows(max_row=200, max_col=50):
         for cell in row:
             if not cell.value:
                 continue
             
-            # Get cell's fill color
-            fill_color = None
-            if cell.fill and cell.fill.start_color and cell.fill.start_color.rgb:
-                fill_color = str(cell.fill.start_color.rgb)
-            
-            # Get cell's text color
+            # Get cell's fill and text colors (precomputed per style in the snapshot)
+            fill_color = cell.fill_color
             text_color = get_cell_text_color(cell)
             
             # Look up meaning from AI-detected legend
@@ -889,7 +879,6 @@ def classify_cells_by_ai_legend(file_path: Path, sheet_name: str, color_mappings
         
         print(f"      ✅ Context extraction complete")
     
-    wb.close()
     return classified_cells
 
 
@@ -900,7 +889,8 @@ def analyze_excel_file_semantic(file_path: Path):
     print(f"   Path: {file_path}")
     
     try:
-        wb = load_workbook(file_path, data_only=False)
+        # One snapshot (two read-only XML passes) serves every step below for every sheet
+        wb = load_workbook_snapshot(file_path)
         
         file_analysis = {
             "file_name": file_path.name,
@@ -949,7 +939,7 @@ def analyze_excel_file_semantic(file_path: Path):
         
         for sheet_name in key_sheets:
             print(f"\n   📊 Sheet: {sheet_name}")
-            sheet = wb[sheet_name]
+            sheet = wb.sheet(sheet_name)
             
             # Use workbook-level color mappings for this sheet
             color_mappings = workbook_color_mappings
@@ -1040,8 +1030,6 @@ def analyze_excel_file_semantic(file_path: Path):
                 "semantics": semantics
             }
         
-        wb.close()
-        
         # Analyze overall workflow
         workflow_analysis = analyze_spreadsheet_workflow(
             file_path.name,
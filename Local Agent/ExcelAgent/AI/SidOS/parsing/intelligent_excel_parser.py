@@ -20,11 +20,15 @@ import logging
 import os
 from pathlib import Path
 from typing import Dict, Any, List, Optional, Union
-from openpyxl import load_workbook
 from openpyxl.utils import get_column_letter, column_index_from_string
 from dotenv import load_dotenv
 from openai import OpenAI
 
+try:
+    from .workbook_snapshot import load_workbook_snapshot
+except ImportError:  # run as a script from parsing/
+    from workbook_snapshot import load_workbook_snapshot
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -104,51 +108,18 @@ class IntelligentExcelParser:
             }
         """
         try:
-            wb = load_workbook(file_path, data_only=False)
-            ws = wb[sheet_name]
+            ws = load_workbook_snapshot(file_path).sheet(sheet_name)
             
             # Extract all colored cells with their text (potential legend items)
             colored_cells = []
             
             # Scan entire sheet for colored cells (no assumptions about location)
             # IMPORTANT: Include cells with colors even if they don't have text (for color swatches)
-            for row in ws.iter_rows(min_row=1, max_row=min(100, ws.max_row), min_col=1, max_col=min(50, ws.max_column)):
+            for row in ws.iter_rows(max_row=100, max_col=50):
                 for cell in row:
-                    fill_color = None
-                    text_color = None
-                    
-                    # Extract fill color - handle both RGB string and Color objects
-                    if cell.fill and cell.fill.start_color:
-                        rgb_value = cell.fill.start_color.rgb
-                        if rgb_value:
-                            # Convert to string, handling both string and object types
-                            try:
-                                if isinstance(rgb_value, str):
-                                    fill_color = rgb_value
-                                elif hasattr(rgb_value, '__str__'):
-                                    fill_color = str(rgb_value)
-                                elif hasattr(rgb_value, 'value'):
-                                    fill_color = str(rgb_value.value)
-                                else:
-                                    fill_color = str(rgb_value)
-                            except Exception:
-                                fill_color = None
-                    
-                    # Extract text color
-                    if cell.font and cell.font.color:
-                        if hasattr(cell.font.color, 'rgb') and cell.font.color.rgb:
-                            rgb_value = cell.font.color.rgb
-                            try:
-                                if isinstance(rgb_value, str):
-                                    text_color = rgb_value
-                                elif hasattr(rgb_value, '__str__'):
-                                    text_color = str(rgb_value)
-                                elif hasattr(rgb_value, 'value'):
-                                    text_color = str(rgb_value.value)
-                                else:
-                                    text_color = str(rgb_value)
-                            except Exception:
-                                text_color = None
+                    # Fill and text colours are resolved once per style by the snapshot
+                    fill_color = cell.fill_color
+                    text_color = cell.font_rgb
                     
                     # Check if this cell is in legend area or has legend-related text
                     cell_coord = cell.coordinate
@@ -173,8 +144,6 @@ class IntelligentExcelParser:
                                 # Removed "row" and "column" to match original exactly
                             })
             
-            wb.close()
-            
             if not colored_cells:
                 logger.info(f"   ⚠️ No colored cells found in {sheet_name}")
                 return {"legend_found": False, "color_mappings": {}, "legend_cells": []}
@@ -505,8 +474,7 @@ If uncertain, return confidence < 0.5 and best guess.
                 "labels": []
             }
         
-        wb = load_workbook(file_path, data_only=False)
-        ws = wb[sheet_name]
+        ws = load_workbook_snapshot(file_path).sheet(sheet_name)
         
         classified_cells = {
             "inputs": [],
@@ -532,24 +500,10 @@ If uncertain, return confidence < 0.5 and best guess.
         logger.info(f"   🔍 Color mappings available: {list(normalized_color_mappings.keys())}")
         
         # Scan all cells (include cells without values for color swatches)
-        for row in ws.iter_rows(min_row=1, max_row=min(300, ws.max_row), min_col=1, max_col=min(50, ws.max_column)):
+        for row in ws.iter_rows(max_row=300, max_col=50):
             for cell in row:
-                # Get cell's fill color using same robust extraction as legend detection
-                fill_color = None
-                if cell.fill and cell.fill.start_color:
-                    rgb_value = cell.fill.start_color.rgb
-                    if rgb_value:
-                        try:
-                            if isinstance(rgb_value, str):
-                                fill_color = rgb_value
-                            elif hasattr(rgb_value, '__str__'):
-                                fill_color = str(rgb_value)
-                            elif hasattr(rgb_value, 'value'):
-                                fill_color = str(rgb_value.value)
-                            else:
-                                fill_color = str(rgb_value)
-                        except Exception:
-                            fill_color = None
+                # Get cell's fill color (same extraction as legend detection, done once in the snapshot)
+                fill_color = cell.fill_color
                 
                 # Normalize fill_color for matching
                 if fill_color:
@@ -615,26 +569,16 @@ If uncertain, return confidence < 0.5 and best guess.
                     elif category in ["label", "header", "description"]:
                         classified_cells["labels"].append(cell_info)
                 
-                # Also detect formulas (always calculated) - but only if not already classified
+                # Also detect formulas (always calculated) - each cell is visited once and this
+                # branch only runs when the colour did not classify it, so no duplicate check is needed
                 elif cell.data_type == 'f' and cell.value:
-                    # Check if we already classified this cell
-                    already_classified = False
-                    for cat_list in classified_cells.values():
-                        for existing_cell in cat_list:
-                            if existing_cell.get("cell") == cell.coordinate:
-                                already_classified = True
-                                break
-                        if already_classified:
-                            break
-                    
-                    if not already_classified:
-                        classified_cells["calculations"].append({
-                            "cell": cell.coordinate,
-                            "value": str(cell.value)[:100],
-                            "formula": True,
-                            "category": "formula_detected",
-                            "sheet": sheet_name
-                        })
+                    classified_cells["calculations"].append({
+                        "cell": cell.coordinate,
+                        "value": str(cell.value)[:100],
+                        "formula": True,
+                        "category": "formula_detected",
+                        "sheet": sheet_name
+                    })
         
         # Log classification results
         logger.info(f"   📊 Classification results:")
@@ -661,7 +605,6 @@ If uncertain, return confidence < 0.5 and best guess.
             
             logger.info(f"   ✅ Basic descriptions assigned")
         
-        wb.close()
         return classified_cells
     
     def create_semantic_groups(self, classified_cells: Dict[str, List[Dict]], sheet_name: str) -> Dict[str, Any]:
@@ -859,9 +802,8 @@ CRITICAL:
         logger.info(f"\n📄 Parsing workbook: {file_path.name}")
         
         try:
-            wb = load_workbook(file_path, data_only=False)
-            sheet_names = wb.sheetnames
-            wb.close()
+            # One snapshot serves legend detection and classification for every sheet
+            sheet_names = load_workbook_snapshot(file_path).sheetnames
             
             logger.info(f"   Sheets: {', '.join(sheet_names[:5])}{'...' if len(sheet_names) > 5 else ''}")
             
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Workbook Snapshot - load an Excel workbook once, serve every analysis from memory
+
+The parsers used to call `load_workbook` once per analysis step (legend
+detection per sheet, classification per sheet, labeled-cell scan, sample
+extraction), re-parsing the whole workbook XML each time. A snapshot reads the
+workbook in read-only mode exactly twice - once for formulas and styles, once
+for cached values - and keeps every sheet as compact per-cell records.
+
+Snapshots are cached per path and invalidated when the file's size/mtime AND
+content hash change (a touched-but-identical file keeps its snapshot).
+
+Usage:
+    snapshot = load_workbook_snapshot("design.xlsx")
+    sheet = snapshot.sheet("Beam Design")
+    for row in sheet.iter_rows(max_row=100, max_col=50):
+        for cell in row:
+            print(cell.coordinate, cell.value, cell.fill_color)
+
+Author: Sidian Engineering Team
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from openpyxl import load_workbook
+from openpyxl.cell.read_only import EmptyCell
+from openpyxl.utils import get_column_letter
+
+logger = logging.getLogger(__name__)
+
+# Default (unstyled) fill colour as openpyxl reports it
+DEFAULT_FILL = "00000000"
+
+
+def _color_string(value: Any) -> Optional[str]:
+    """Stringify an openpyxl colour value (str or descriptor object)"""
+    if not value:
+        return None
+    try:
+        if isinstance(value, str):
+            return value
+        if hasattr(value, 'value'):
+            return str(value.value)
+        return str(value)
+    except Exception:
+        return None
+
+
+def _text_color(font) -> Optional[str]:
+    """RGB / THEME_n / INDEX_n label for a font colour, None for default/auto"""
+    if not font or not font.color:
+        return None
+    color_obj = font.color
+    if color_obj.type == 'rgb' and color_obj.rgb:
+        return str(color_obj.rgb)
+    if color_obj.type == 'theme':
+        return f"THEME_{color_obj.theme}"
+    if getattr(color_obj, 'index', None):
+        return f"INDEX_{color_obj.index}"
+    return None
+
+
+class CellSnapshot:
+    """One cell: formula-or-value, cached value and resolved colours"""
+
+    __slots__ = ("row", "column", "value", "cached_value", "data_type", "fill_color", "font_rgb", "text_color")
+
+    def __init__(self, row: int, column: int, value: Any = None, data_type: str = 'n',
+                 fill_color: Optional[str] = DEFAULT_FILL, font_rgb: Optional[str] = None,
+                 text_color: Optional[str] = None):
+        self.row = row
+        self.column = column
+        self.value = value
+        self.cached_value = None
+        self.data_type = data_type
+        self.fill_color = fill_color
+        self.font_rgb = font_rgb
+        self.text_color = text_color
+
+    @property
+    def coordinate(self) -> str:
+        return f"{get_column_letter(self.column)}{self.row}"
+
+    @property
+    def has_formula(self) -> bool:
+        return self.data_type == 'f'
+
+
+@dataclass
+class SheetSnapshot:
+    """
+    All non-empty or styled cells of one sheet, keyed by (row, column).
+
+    Mirrors the small part of the openpyxl worksheet API the parsers use
+    (`title`, `max_row`, `max_column`, `cell(row, column)`, `iter_rows`), so helpers such as
+    neighbourhood extraction accept either a worksheet or a snapshot.
+    """
+    title: str
+    max_row: int = 0
+    max_column: int = 0
+    cells: Dict[Tuple[int, int], CellSnapshot] = field(default_factory=dict)
+
+    def cell(self, row: int, column: int) -> CellSnapshot:
+        found = self.cells.get((row, column))
+        return found if found is not None else CellSnapshot(row, column)
+
+    def iter_rows(self, max_row: Optional[int] = None, max_col: Optional[int] = None) -> Iterator[Tuple[CellSnapshot, ...]]:
+        """Rows of A1:(max_col, max_row), clipped to the used range, like ws.iter_rows over the same range"""
+        last_row = min(max_row, self.max_row) if max_row else self.max_row
+        last_col = min(max_col, self.max_column) if max_col else self.max_column
+        for r in range(1, last_row + 1):
+            yield tuple(self.cell(r, c) for c in range(1, last_col + 1))
+
+    def iter_values(self, max_row: Optional[int] = None, max_col: Optional[int] = None) -> List[List[Any]]:
+        """Cached (computed) values as a row-major 2D list, like a header-less DataFrame"""
+        last_row = min(max_row, self.max_row) if max_row else self.max_row
+        last_col = min(max_col, self.max_column) if max_col else self.max_column
+        return [
+            [self.cells[(r, c)].cached_value if (r, c) in self.cells else None for c in range(1, last_col + 1)]
+            for r in range(1, last_row + 1)
+        ]
+
+
+@dataclass
+class WorkbookSnapshot:
+    """In-memory copy of a workbook's sheets (formulas, cached values and colours)"""
+    path: Path
+    file_size: int
+    file_mtime_ns: int
+    content_hash: str
+    sheetnames: List[str] = field(default_factory=list)
+    sheets: Dict[str, SheetSnapshot] = field(default_factory=dict)
+
+    def sheet(self, sheet_name: str) -> SheetSnapshot:
+        if sheet_name not in self.sheets:
+            raise KeyError(f"Worksheet {sheet_name} does not exist.")
+        return self.sheets[sheet_name]
+
+    def __getitem__(self, sheet_name: str) -> SheetSnapshot:
+        return self.sheet(sheet_name)
+
+
+def _file_hash(path: Path) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_snapshot(path: Path, stat: os.stat_result, content_hash: str) -> WorkbookSnapshot:
+    """Two read-only passes: formulas+styles, then cached values"""
+    snapshot = WorkbookSnapshot(path=path, file_size=stat.st_size, file_mtime_ns=stat.st_mtime_ns,
+                                content_hash=content_hash)
+
+    wb = load_workbook(path, read_only=True, data_only=False)
+    try:
+        snapshot.sheetnames = list(wb.sheetnames)
+        for ws in wb.worksheets:
+            sheet = SheetSnapshot(title=ws.title)
+            # Colours are resolved once per distinct style, not once per cell
+            style_colors: Dict[Tuple[int, int], Tuple[Optional[str], Optional[str], Optional[str]]] = {}
+            for row in ws.iter_rows():
+                for cell in row:
+                    if isinstance(cell, EmptyCell):
+                        continue  # padding between stored cells
+                    # Styled-but-empty cells still count toward the used range, as in a normal load
+                    sheet.max_row = max(sheet.max_row, cell.row)
+                    sheet.max_column = max(sheet.max_column, cell.column)
+                    key = (cell.style_array.fillId, cell.style_array.fontId)
+                    colors = style_colors.get(key)
+                    if colors is None:
+                        fill_color = None
+                        if cell.fill and cell.fill.start_color:
+                            fill_color = _color_string(cell.fill.start_color.rgb)
+                        font_rgb = None
+                        if cell.font and cell.font.color and getattr(cell.font.color, 'rgb', None):
+                            font_rgb = _color_string(cell.font.color.rgb)
+                        colors = style_colors[key] = (fill_color, font_rgb, _text_color(cell.font))
+                    if cell.value is None and colors[0] in (DEFAULT_FILL, None):
+                        continue  # no value and no fill: reads the same as a missing cell
+                    sheet.cells[(cell.row, cell.column)] = CellSnapshot(
+                        cell.row, cell.column, cell.value, cell.data_type, *colors
+                    )
+            snapshot.sheets[ws.title] = sheet
+    finally:
+        wb.close()
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            sheet = snapshot.sheets[ws.title]
+            for row in ws.iter_rows():
+                for cell in row:
+                    if isinstance(cell, EmptyCell) or cell.value is None:
+                        continue
+                    record = sheet.cells.get((cell.row, cell.column))
+                    if record is None:
+                        continue  # formula pass saw no such cell
+                    record.cached_value = cell.value
+    finally:
+        wb.close()
+
+    return snapshot
+
+
+# ============================================================================
+# Snapshot cache
+# ============================================================================
+
+_cache: "OrderedDict[str, WorkbookSnapshot]" = OrderedDict()
+_cache_lock = threading.Lock()
+_CACHE_SIZE = int(os.getenv("WORKBOOK_SNAPSHOT_CACHE_SIZE", "8"))
+
+
+def load_workbook_snapshot(file_path: Union[str, Path]) -> WorkbookSnapshot:
+    """
+    Get a snapshot of a workbook, re-reading it only when the file has changed.
+
+    A matching size/mtime is trusted; otherwise the content hash decides, so a
+    file that was only touched (or copied back unchanged) is not re-parsed.
+    """
+    path = Path(file_path).resolve()
+    stat = path.stat()
+    key = str(path)
+
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached is not None:
+        if cached.file_size == stat.st_size and cached.file_mtime_ns == stat.st_mtime_ns:
+            with _cache_lock:
+                _cache.move_to_end(key)
+            return cached
+        content_hash = _file_hash(path)
+        if content_hash == cached.content_hash:
+            cached.file_size, cached.file_mtime_ns = stat.st_size, stat.st_mtime_ns
+            return cached
+    else:
+        content_hash = _file_hash(path)
+
+    logger.info(f"   📥 Snapshotting workbook: {path.name}")
+    snapshot = _read_snapshot(path, stat, content_hash)
+    with _cache_lock:
+        _cache[key] = snapshot
+        _cache.move_to_end(key)
+        while len(_cache) > max(_CACHE_SIZE, 1):
+            _cache.popitem(last=False)
+    return snapshot
+
+
+def clear_snapshot_cache() -> None:
+    """Drop all cached snapshots"""
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Test Suite for the compiled formula backend
+
+Builds small workbooks with openpyxl and checks that the engine executes the
+workbook's formulas, re-evaluates only what changed, runs sweeps, and reports
+cells it cannot reproduce so they can be computed by Excel.
+
+Author: Sidian Engineering Team
+"""
+
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add local_agent directory to path (modules import each other by name, as in agent_service)
+sys.path.insert(0, str(Path(__file__).parent.parent / "local_agent"))
+
+from openpyxl import Workbook
+
+from excel_tools import ExcelToolAPI
+from formula_engine import FormulaEngine, UnsupportedFormulaError
+
+
+class TestFormulaEngine(unittest.TestCase):
+    """Test cases for FormulaEngine"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.workbook_path = Path(self.temp_dir) / "beam.xlsx"
+
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Beam"
+        ws["B1"] = 6.0                              # span
+        ws["B2"] = 2.5                              # load
+        ws["B3"] = "=B1^2*B2/8"                     # moment
+        ws["B4"] = '=IF(B3>10,"FAIL","OK")'         # check
+        ws["B5"] = "=ROUND(B3,2)+SUM(B1:B2)"
+        ws["B6"] = "=IFERROR(B1/(B2-2.5),-1)"
+        ws["B7"] = "=VLOOKUP(B1,Tables!A1:B3,2)"
+        ws["B8"] = "=OFFSET(B1,1,0)+1"              # unsupported -> Excel
+        ws["C1"] = 100
+        ws["C2"] = "=C1*2"                          # independent of the inputs
+        tables = wb.create_sheet("Tables")
+        for row, (key, value) in enumerate([(1, 10), (5, 20), (10, 30)], start=1):
+            tables.cell(row=row, column=1, value=key)
+            tables.cell(row=row, column=2, value=value)
+        wb.save(self.workbook_path)
+
+        self.span, self.load = ("Beam", 1, 2), ("Beam", 2, 2)
+        self.outputs = {name: ("Beam", row, 2) for name, row in
+                        [("moment", 3), ("check", 4), ("total", 5), ("ratio", 6), ("factor", 7), ("offset", 8)]}
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _engine(self):
+        return FormulaEngine(self.workbook_path, [self.span, self.load], self.outputs.values())
+
+    def test_evaluates_workbook_formulas(self):
+        """Compiled outputs match what the formulas compute in Excel"""
+        engine = self._engine()
+        self.assertEqual(engine.get_value(self.outputs["moment"]), 11.25)
+        self.assertEqual(engine.get_value(self.outputs["check"]), "FAIL")
+        self.assertEqual(engine.get_value(self.outputs["total"]), 19.75)
+        self.assertEqual(engine.get_value(self.outputs["ratio"]), -1)
+        self.assertEqual(engine.get_value(self.outputs["factor"]), 20)
+
+    def test_recalculates_only_dependent_cells(self):
+        """Changing the span re-evaluates its dependents and nothing else"""
+        engine = self._engine()
+        engine.set_value(self.span, 8.0)
+        self.assertEqual(engine.recalculate(), 5)  # B3:B7; B8 needs Excel, C2 is not an output
+        self.assertEqual(engine.get_value(self.outputs["moment"]), 20.0)
+        self.assertEqual(engine.get_value(self.outputs["factor"]), 20)
+        plan = engine._plan(frozenset([self.load]))
+        self.assertEqual(set(plan), {self.outputs[name] for name in ("moment", "check", "total", "ratio")})
+        self.assertEqual(plan[0], self.outputs["moment"])  # precedents before dependents
+        self.assertEqual(engine.recalculate(), 0)
+
+    def test_evaluate_batch_matches_scalar_results(self):
+        """Vectorized and per-sample sweeps agree with one-at-a-time evaluation"""
+        engine = self._engine()
+        spans, loads = [4.0, 6.0, 8.0, 12.0], [2.0, 2.5, 3.0, 2.5]
+        keys = [self.outputs[name] for name in ("moment", "check", "total", "ratio", "factor")]
+        batch = engine.evaluate_batch({self.span: spans, self.load: loads}, keys)
+
+        for i, (span, load) in enumerate(zip(spans, loads)):
+            engine.set_value(self.span, span)
+            engine.set_value(self.load, load)
+            for key in keys:
+                self.assertEqual(batch[key][i], engine.get_value(key))
+
+        # State is restored after a batch
+        engine.set_value(self.span, 6.0)
+        engine.set_value(self.load, 2.5)
+        engine.evaluate_batch({self.span: [1.0, 2.0]}, keys)
+        self.assertEqual(engine.get_value(self.outputs["moment"]), 11.25)
+
+    def test_evaluate_batch_keeps_errors_through_conditions(self):
+        """A sample that hits #DIV/0! stays an error when it feeds a comparison or IF"""
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Beam"
+        ws["B1"] = 6.0
+        ws["B2"] = 2.5
+        ws["C1"] = "=IF(B1/B2>1,10,20)"
+        ws["D1"] = "=IF(B1/B2,7,8)"
+        wb.save(self.workbook_path)
+        keys = [("Beam", 1, 3), ("Beam", 1, 4)]
+        engine = FormulaEngine(self.workbook_path, [self.span, self.load], keys)
+
+        batch = engine.evaluate_batch({self.load: [0.0, 1.0, 2.0]}, keys)
+        self.assertEqual(batch, {keys[0]: ["#DIV/0!", 10, 10], keys[1]: ["#DIV/0!", 7, 7]})
+        for i, load in enumerate([0.0, 1.0, 2.0]):
+            engine.set_value(self.load, load)
+            for key in keys:
+                self.assertEqual(batch[key][i], engine.get_value(key))
+
+    def test_unsupported_cells_are_reported(self):
+        """Functions the engine cannot reproduce are left to Excel"""
+        engine = self._engine()
+        self.assertFalse(engine.is_supported(self.outputs["offset"]))
+        self.assertIn("OFFSET", engine.unsupported[("Beam", 8, 2)])
+        with self.assertRaises(UnsupportedFormulaError):
+            engine.get_value(self.outputs["offset"])
+
+    def test_validation_rejects_mismatched_cached_values(self):
+        """A compiled result that disagrees with Excel's cached value is not trusted"""
+        engine = self._engine()
+        engine._cached[self.outputs["moment"]] = 99.0
+        result = engine.validate()
+        self.assertEqual(result["checked"], 1)
+        self.assertIn("Beam!3,2", result["mismatched"])
+        self.assertFalse(engine.is_supported(self.outputs["check"]))
+
+    def test_tool_api_compiled_backend_without_excel(self):
+        """ExcelToolAPI runs supported outputs headlessly"""
+        metadata = {
+            "inputs": {"span": {"sheet": "Beam", "address": "B1"}, "load": {"sheet": "Beam", "address": "B2"}},
+            "outputs": {"moment": {"sheet": "Beam", "address": "B3"}, "check": {"sheet": "Beam", "address": "B4"}},
+        }
+        with ExcelToolAPI(self.workbook_path, metadata, backend="compiled") as api:
+            api.write_input("span", 4.0)
+            api.recalculate()
+            self.assertEqual(api.read_output("moment"), 5.0)
+            self.assertEqual(api.read_output("check"), "OK")
+            sweep = api.evaluate_batch({"span": [4.0, 8.0]}, ["moment", "check"])
+            self.assertEqual(sweep, {"moment": [5.0, 20.0], "check": ["OK", "FAIL"]})
+            self.assertIsNone(api.wb)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Test Suite for the workbook snapshot layer used by the Excel parsers
+
+Author: Sidian Engineering Team
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add SidOS directory to path so we can import parsing
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import Font, PatternFill
+
+from parsing import workbook_snapshot
+from parsing.workbook_snapshot import clear_snapshot_cache, load_workbook_snapshot
+
+
+class TestWorkbookSnapshot(unittest.TestCase):
+    """Test cases for load_workbook_snapshot"""
+
+    def setUp(self):
+        clear_snapshot_cache()
+        self.temp_dir = tempfile.mkdtemp()
+        self.workbook_path = Path(self.temp_dir) / "design.xlsx"
+
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Beam"
+        ws["A1"] = "Span"
+        ws["B1"] = 6.0
+        ws["B1"].fill = PatternFill("solid", start_color="FFFFFF00")
+        ws["B2"] = "=B1*2"
+        ws["B2"].font = Font(color="FFFF0000")
+        ws["S5"].fill = PatternFill("solid", start_color="FF00FF00")  # colour swatch, no text
+        wb.create_sheet("Loads")["C3"] = "Dead"
+        wb.save(self.workbook_path)
+
+    def tearDown(self):
+        clear_snapshot_cache()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_snapshot_matches_openpyxl_colours_and_formulas(self):
+        """Snapshot cells report the same values, formulas and colours as a normal load"""
+        snapshot = load_workbook_snapshot(self.workbook_path)
+        self.assertEqual(snapshot.sheetnames, ["Beam", "Loads"])
+
+        wb = load_workbook(self.workbook_path, data_only=False)
+        ws = wb["Beam"]
+        sheet = snapshot.sheet("Beam")
+        self.assertEqual((sheet.max_row, sheet.max_column), (ws.max_row, ws.max_column))
+
+        for expected_row, row in zip(ws.iter_rows(max_row=10, max_col=20), sheet.iter_rows(max_row=10, max_col=20)):
+            for expected, cell in zip(expected_row, row):
+                self.assertEqual(cell.coordinate, expected.coordinate)
+                self.assertEqual(cell.value, expected.value)
+                self.assertEqual(cell.data_type == 'f', expected.data_type == 'f')
+                self.assertEqual(cell.fill_color, str(expected.fill.start_color.rgb))
+        wb.close()
+
+        self.assertEqual(sheet.cell(row=2, column=2).text_color, "FFFF0000")
+        self.assertEqual(sheet.cell(row=5, column=19).fill_color, "FF00FF00")
+        self.assertEqual(sheet.iter_values(max_row=1, max_col=2), [["Span", 6.0]])
+
+    def test_snapshot_is_reused_until_content_changes(self):
+        """Unchanged files are not re-read; a touched file is re-hashed, an edited one reloaded"""
+        first = load_workbook_snapshot(self.workbook_path)
+        self.assertIs(load_workbook_snapshot(self.workbook_path), first)
+
+        stat = self.workbook_path.stat()
+        os.utime(self.workbook_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+        self.assertIs(load_workbook_snapshot(self.workbook_path), first)
+
+        wb = load_workbook(self.workbook_path)
+        wb["Beam"]["B1"] = 8.0
+        wb.save(self.workbook_path)
+        second = load_workbook_snapshot(self.workbook_path)
+        self.assertIsNot(second, first)
+        self.assertEqual(second.sheet("Beam").cell(row=1, column=2).value, 8.0)
+
+    def test_parsers_read_each_workbook_once(self):
+        """Repeated analysis calls share one snapshot instead of reloading the workbook"""
+        calls = []
+        original = workbook_snapshot._read_snapshot
+
+        def counting_read(*args, **kwargs):
+            calls.append(args[0])
+            return original(*args, **kwargs)
+
+        workbook_snapshot._read_snapshot = counting_read
+        try:
+            from parsing.build_semantic_knowledge_base import extract_sheet_sample
+            for sheet_name in ("Beam", "Loads", "Beam"):
+                extract_sheet_sample(self.workbook_path, sheet_name)
+        finally:
+            workbook_snapshot._read_snapshot = original
+        self.assertEqual(len(calls), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
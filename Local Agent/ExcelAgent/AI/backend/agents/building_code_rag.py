@@ -13,14 +13,21 @@ Based on SheetMind's approach of using domain knowledge to understand spreadshee
 """
 
 import pickle
+import threading
+from collections import OrderedDict
 import numpy as np
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import json
 from openai import OpenAI
 import os
 from dotenv import load_dotenv
 
+try:
+    from .code_lexical_index import CodeLexicalIndex, is_reference_only, parse_reference
+except ImportError:  # run as a script
+    from code_lexical_index import CodeLexicalIndex, is_reference_only, parse_reference
+
 # Load environment
 # .env is in trainexcel root: backend/agents/building_code_rag.py -> backend/ -> trainexcel/
 env_path = Path(__file__).parent.parent.parent / ".env"
@@ -51,14 +58,39 @@ else:
 class BuildingCodeRAG:
     """
     RAG system for querying building codes to enhance spreadsheet understanding
+
+    All code embeddings are stacked into one row-normalized float32 matrix
+    (memory-mapped from an on-disk cache) with a code-ID column, so a query is
+    a single matrix-vector product followed by argpartition top-k.
+
+    A lexical index over the same rows (CodeLexicalIndex) answers clause/table
+    references and single symbol/keyword queries without an embedding call, adds
+    BM25 to the cosine scores of other queries, and applies include/exclude/boost
+    terms from its postings.
     """
     
     def __init__(self):
         # Path: agents/ -> backend/ -> Building codes/
         self.base_path = Path(__file__).parent.parent / "Building codes"
+        self.index_path = Path(os.getenv("BUILDING_CODE_INDEX_DIR", str(self.base_path / ".index")))
         self.codes = {}
         self.loaded = False
         
+        # Stacked index: matrix rows belong to code_names[code_ids[row]]
+        self.matrix: Optional[np.ndarray] = None
+        self.code_ids: Optional[np.ndarray] = None
+        self.code_names: List[str] = []
+        self.code_ranges: Dict[str, Tuple[int, int]] = {}
+        
+        # Clause/table keys and BM25 postings over the same rows
+        self.lexical: Optional[CodeLexicalIndex] = None
+        self.lexical_weight = float(os.getenv("BUILDING_CODE_LEXICAL_WEIGHT", "0.3"))
+        
+        # LRU cache of normalized query embeddings (text-embedding-3-large calls are slow and billed)
+        self.query_cache_size = int(os.getenv("BUILDING_CODE_QUERY_CACHE_SIZE", "512"))
+        self._query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        
         print("🔧 Initializing Building Code RAG System...")
         print(f"   📂 Looking for codes in: {self.base_path.resolve()}")
         print(f"   📂 Path exists: {self.base_path.exists()}")
@@ -68,8 +100,8 @@ class BuildingCodeRAG:
         """Load embeddings and metadata for a specific building code"""
         try:
             # Find embedding and metadata files (look for simple_embeddings pattern)
-            npy_files = list(folder_path.glob("*.npy"))
-            pkl_files = list(folder_path.glob("*.pkl"))
+            npy_files = sorted(folder_path.glob("*.npy"))
+            pkl_files = sorted(folder_path.glob("*.pkl"))
             
             if not npy_files or not pkl_files:
                 print(f"   ⚠️ {code_name}: No embeddings found in {folder_path}")
@@ -78,8 +110,8 @@ class BuildingCodeRAG:
             
             print(f"   🔍 {code_name}: Found {len(npy_files)} .npy and {len(pkl_files)} .pkl files")
             
-            # Use the first embeddings file found
-            embeddings = np.load(npy_files[0])
+            # Use the first embeddings file found; mmap so stacking doesn't hold two copies
+            embeddings = np.load(npy_files[0], mmap_mode="r")
             
             with open(pkl_files[0], 'rb') as f:
                 metadata = pickle.load(f)
@@ -90,7 +122,8 @@ class BuildingCodeRAG:
                 "embeddings": embeddings,
                 "metadata": metadata,
                 "code_name": code_name,
-                "folder": str(folder_path)
+                "folder": str(folder_path),
+                "source": npy_files[0]
             }
             
         except Exception as e:
@@ -115,14 +148,109 @@ class BuildingCodeRAG:
                 if code_data:
                     self.codes[code_name] = code_data
         
+        if self.codes:
+            self._build_index()
+        
         if self.codes:
             self.loaded = True
-            print(f"✅ Building Code RAG ready with {len(self.codes)} codes\n")
+            print(f"✅ Building Code RAG ready with {len(self.codes)} codes ({len(self.code_ids)} chunks)\n")
         else:
             print("⚠️ No building codes loaded\n")
     
+    # ------------------------------------------------------------------
+    # Stacked embedding index
+    # ------------------------------------------------------------------
+    def _build_index(self):
+        """Stack every code's embeddings into one normalized matrix, reusing the on-disk copy when sources are unchanged"""
+        dims = {name: data["embeddings"].shape[1] for name, data in self.codes.items() if data["embeddings"].ndim == 2}
+        dim = max(set(dims.values()), key=list(dims.values()).count) if dims else 0
+        for name in list(self.codes):
+            if dims.get(name) != dim:
+                print(f"   ⚠️ {name}: embedding shape {self.codes[name]['embeddings'].shape} does not match dim {dim}, skipping")
+                del self.codes[name]
+        if not self.codes:
+            return
+        
+        self.code_names = list(self.codes)
+        offset = 0
+        for name in self.code_names:
+            rows = len(self.codes[name]["embeddings"])
+            self.code_ranges[name] = (offset, offset + rows)
+            offset += rows
+        self.code_ids = np.repeat(
+            np.arange(len(self.code_names), dtype=np.int16),
+            [end - start for start, end in self.code_ranges.values()]
+        )
+        
+        manifest = {
+            "version": 1,
+            "dim": dim,
+            "codes": [
+                {
+                    "code_name": name,
+                    "source": str(self.codes[name]["source"].resolve()),
+                    "size": self.codes[name]["source"].stat().st_size,
+                    "mtime": self.codes[name]["source"].stat().st_mtime,
+                    "rows": end - start
+                }
+                for name, (start, end) in self.code_ranges.items()
+            ]
+        }
+        matrix_file = self.index_path / "stacked_embeddings.npy"
+        manifest_file = self.index_path / "manifest.json"
+        
+        try:
+            if manifest_file.exists() and matrix_file.exists() and json.loads(manifest_file.read_text()) == manifest:
+                self.matrix = np.load(matrix_file, mmap_mode="r")
+                print(f"   ⚡ Reusing stacked code index {matrix_file} {self.matrix.shape}")
+        except Exception as e:
+            print(f"   ⚠️ Stacked code index unreadable, rebuilding: {e}")
+            self.matrix = None
+        
+        if self.matrix is None:
+            try:
+                self.index_path.mkdir(parents=True, exist_ok=True)
+                out = np.lib.format.open_memmap(matrix_file, mode="w+", dtype=np.float32, shape=(offset, dim))
+            except OSError as e:
+                print(f"   ⚠️ Cannot write stacked code index to {self.index_path}, keeping it in memory: {e}")
+                out = np.empty((offset, dim), dtype=np.float32)
+            for name, (start, end) in self.code_ranges.items():
+                block = np.asarray(self.codes[name]["embeddings"], dtype=np.float32)
+                norms = np.linalg.norm(block, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                out[start:end] = block / norms
+            if isinstance(out, np.memmap):
+                out.flush()
+                manifest_file.write_text(json.dumps(manifest, indent=2))
+                del out
+                self.matrix = np.load(matrix_file, mmap_mode="r")
+            else:
+                self.matrix = out
+            print(f"   🧱 Built stacked code index {self.matrix.shape}")
+        
+        # Per-code views into the stacked matrix (normalized rows)
+        for name, (start, end) in self.code_ranges.items():
+            self.codes[name]["embeddings"] = self.matrix[start:end]
+        
+        self.lexical = CodeLexicalIndex.build(
+            (
+                (start + idx, record)
+                for name, (start, end) in self.code_ranges.items()
+                for idx, record in enumerate(self.codes[name]["metadata"][:end - start])
+            ),
+            offset
+        )
+        print(f"   🔤 Built lexical code index ({len(self.lexical.references)} clause/table keys, "
+              f"{len(self.lexical.postings)} terms)")
+    
     def _embed_query(self, query: str) -> np.ndarray:
-        """Create embedding for a query"""
+        """Create a normalized embedding for a query, served from the LRU cache when repeated"""
+        key = " ".join(query.split())
+        with self._query_cache_lock:
+            cached = self._query_cache.get(key)
+            if cached is not None:
+                self._query_cache.move_to_end(key)
+                return cached
         if not client:
             print("❌ OpenAI client not initialized")
             return None
@@ -131,17 +259,106 @@ class BuildingCodeRAG:
                 model="text-embedding-3-large",  # Match the building code embeddings
                 input=query
             )
-            return np.array(response.data[0].embedding)
+            embedding = np.asarray(response.data[0].embedding, dtype=np.float32)
         except Exception as e:
             print(f"❌ Embedding failed: {e}")
             return None
+        norm = np.linalg.norm(embedding)
+        if norm > 0:
+            embedding /= norm
+        if self.query_cache_size > 0:
+            with self._query_cache_lock:
+                self._query_cache[key] = embedding
+                self._query_cache.move_to_end(key)
+                while len(self._query_cache) > self.query_cache_size:
+                    self._query_cache.popitem(last=False)
+        return embedding
     
-    def _cosine_similarity(self, vec1: np.ndarray, vec2: np.ndarray) -> float:
-        """Calculate cosine similarity between two vectors"""
-        dot_product = np.dot(vec1, vec2)
-        norm1 = np.linalg.norm(vec1)
-        norm2 = np.linalg.norm(vec2)
-        return dot_product / (norm1 * norm2) if norm1 > 0 and norm2 > 0 else 0.0
+    def _search_scores(self, query: str, ranges: List[Tuple[int, int]]) -> Optional[np.ndarray]:
+        """
+        Scores of the stacked rows for query (rows outside ranges are -inf).
+        
+        A bare clause/table reference is scored by its lexical index hits. Other
+        queries get cosine + lexical_weight * BM25, with BM25 scaled to 0-1 within
+        each range; a single indexed symbol or keyword is scored by BM25 alone.
+        Neither of those needs an embedding call.
+        """
+        if self.lexical is not None and is_reference_only(query):
+            scores = self._reference_scores(*parse_reference(query))
+            if scores is not None:
+                return scores
+        
+        lexical = self.lexical.bm25(query) if self.lexical is not None and self.lexical_weight > 0 else None
+        query_embedding = None
+        if lexical is None or not self.lexical.has_term(query):
+            query_embedding = self._embed_query(query)
+            if query_embedding is None and (lexical is None or not lexical.any()):
+                return None
+            if query_embedding is not None and query_embedding.shape[0] != self.matrix.shape[1]:
+                print("⚠️ Query embedding does not match the building code index")
+                return None
+        
+        scores = np.full(len(self.code_ids), -np.inf, dtype=np.float32)
+        for start, end in ranges:
+            vector = self.matrix[start:end] @ query_embedding if query_embedding is not None else None
+            scores[start:end] = self._blend(vector, lexical[start:end] if lexical is not None else None, end - start)
+        return scores
+    
+    def _blend(self, vector: Optional[np.ndarray], lexical: Optional[np.ndarray], rows: int) -> np.ndarray:
+        """Hybrid score: cosine + lexical_weight * BM25 scaled to 0-1 (BM25 alone when there is no vector)"""
+        if lexical is None or not lexical.any():
+            return vector if vector is not None else np.full(rows, -np.inf, dtype=np.float32)
+        lexical = lexical / lexical.max()
+        if vector is None:
+            return np.where(lexical > 0, lexical, -np.inf)
+        return vector + self.lexical_weight * lexical
+    
+    def _reference_scores(self, kind: str, ref_id: str) -> Optional[np.ndarray]:
+        """Scores of the rows defining or citing a clause/table (best hit 1.0, -inf elsewhere), None when absent"""
+        hits = self.lexical.lookup(kind, ref_id)
+        if not hits:
+            return None
+        rows = np.fromiter((row for row, _ in hits), dtype=np.int64, count=len(hits))
+        weights = np.fromiter((weight for _, weight in hits), dtype=np.float32, count=len(hits))
+        scores = np.full(len(self.code_ids), -np.inf, dtype=np.float32)
+        scores[rows] = weights / weights.max()
+        return scores
+    
+    @staticmethod
+    def _top_indices(scores: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the k highest scores, best first"""
+        if k <= 0 or scores.size == 0:
+            return np.empty(0, dtype=np.int64)
+        if k < scores.size:
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(scores.size)
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+    
+    def _make_result(self, code_name: str, idx: int, score: float) -> Dict[str, Any]:
+        metadata = self.codes[code_name]["metadata"]
+        return {
+            "code": code_name,
+            "score": float(score),
+            "text": metadata[idx].get("text", ""),
+            "page": metadata[idx].get("page", "N/A"),
+            "chunk_id": idx
+        }
+    
+    def _results_for_code(self, code_name: str, code_scores: np.ndarray, top_k: int,
+                          include_terms: Optional[List[str]],
+                          exclude_terms: Optional[List[str]],
+                          boost_terms: Optional[List[str]]) -> List[Dict[str, Any]]:
+        """Apply lexical include/exclude/boost terms to one code's scores, then take its top candidates"""
+        code_scores = self._apply_terms(code_name, code_scores, include_terms or [], exclude_terms or [], boost_terms or [])
+        metadata = self.codes[code_name]["metadata"]
+        
+        results = []
+        for idx in self._top_indices(code_scores, top_k):
+            idx = int(idx)
+            if idx < len(metadata) and np.isfinite(code_scores[idx]):
+                results.append(self._make_result(code_name, idx, code_scores[idx]))
+        return results
     
     def query_code(self, code_name: str, query: str, top_k: int = 3,
                    include_terms: Optional[List[str]] = None,
@@ -152,7 +369,7 @@ class BuildingCodeRAG:
         
         Args:
             code_name: Which code to query (e.g., 'CSA_S16_Steel')
-            query: Natural language query
+            query: Natural language query, clause/table reference or symbol
             top_k: Number of top results to return
             
         Returns:
@@ -165,44 +382,11 @@ class BuildingCodeRAG:
             print(f"⚠️ Code '{code_name}' not available")
             return []
         
-        code_data = self.codes[code_name]
-        
-        # Embed query
-        query_embedding = self._embed_query(query)
-        if query_embedding is None:
+        start, end = self.code_ranges[code_name]
+        scores = self._search_scores(query, [(start, end)])
+        if scores is None:
             return []
-        
-        # Calculate similarities
-        embeddings = code_data["embeddings"]
-        similarities = []
-        
-        for idx, chunk_embedding in enumerate(embeddings):
-            sim = self._cosine_similarity(query_embedding, chunk_embedding)
-            similarities.append((idx, sim))
-        
-        # Initial ranking by similarity
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        
-        # Format results (we will re-rank after building results list)
-        results = []
-        metadata = code_data["metadata"]
-        
-        for idx, score in similarities[: max(top_k * 3, top_k)]:  # take a larger candidate set for re-ranking
-            if idx < len(metadata):
-                result = {
-                    "code": code_name,
-                    "score": float(score),
-                    "text": metadata[idx].get("text", ""),
-                    "page": metadata[idx].get("page", "N/A"),
-                    "chunk_id": idx
-                }
-                results.append(result)
-        
-        # Optional re-ranking: apply include/exclude/boost terms against text
-        results = self._rerank(results, include_terms or [], exclude_terms or [], boost_terms or [])
-        
-        # Return top_k after re-ranking
-        return results[:top_k]
+        return self._results_for_code(code_name, scores[start:end], top_k, include_terms, exclude_terms, boost_terms)
     
     def query_all_codes(self, query: str, top_k_per_code: int = 2,
                         include_terms: Optional[List[str]] = None,
@@ -211,51 +395,90 @@ class BuildingCodeRAG:
         """
         Query ALL building codes and return results from each
         
-        Useful when you don't know which code is relevant
+        Useful when you don't know which code is relevant. The query is embedded
+        once and scored against the stacked matrix in a single product.
         """
         if not self.loaded:
             return {}
         
-        results = {}
+        scores = self._search_scores(query, list(self.code_ranges.values()))
+        if scores is None:
+            return {}
         
-        for code_name in self.codes.keys():
-            code_results = self.query_code(
-                code_name, query, top_k=top_k_per_code,
-                include_terms=include_terms, exclude_terms=exclude_terms, boost_terms=boost_terms
+        results = {}
+        for code_name, (start, end) in self.code_ranges.items():
+            code_results = self._results_for_code(
+                code_name, scores[start:end], top_k_per_code, include_terms, exclude_terms, boost_terms
             )
             if code_results:
                 results[code_name] = code_results
         
         return results
+    
+    def query(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        """Top-k chunks across all codes in one ranking (each result carries its code)"""
+        if not self.loaded:
+            return []
+        scores = self._search_scores(query, [(0, len(self.code_ids))])
+        if scores is None:
+            return []
+        
+        results = []
+        for row in self._top_indices(scores, top_k):
+            row = int(row)
+            code_name = self.code_names[int(self.code_ids[row])]
+            idx = row - self.code_ranges[code_name][0]
+            if idx < len(self.codes[code_name]["metadata"]) and np.isfinite(scores[row]):
+                results.append(self._make_result(code_name, idx, scores[row]))
+        return results
+    
+    def lookup_reference(self, kind: str, ref_id: str, top_k_per_code: int = 3) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Chunks defining or citing a clause ("clause", "5.5.12") or table ("table", "4.1.6.2"), per code
+        
+        A dictionary lookup in the lexical index (no embedding call). Chunks where
+        the clause is a heading rank above chunks that only cite it.
+        """
+        if not self.loaded or self.lexical is None:
+            return {}
+        scores = self._reference_scores(kind, ref_id)
+        if scores is None:
+            return {}
+        
+        results = {}
+        for code_name, (start, end) in self.code_ranges.items():
+            code_results = self._results_for_code(code_name, scores[start:end], top_k_per_code, None, None, None)
+            if code_results:
+                results[code_name] = code_results
+        return results
 
-    def _rerank(self, results: List[Dict[str, Any]],
-                include_terms: List[str], exclude_terms: List[str], boost_terms: List[str]) -> List[Dict[str, Any]]:
-        """Re-rank results with simple lexical constraints.
+    def _apply_terms(self, code_name: str, code_scores: np.ndarray,
+                     include_terms: List[str], exclude_terms: List[str], boost_terms: List[str]) -> np.ndarray:
+        """Adjust one code's scores with simple lexical constraints, looked up in the term postings.
         - Exclude chunks containing any exclude_terms
         - Apply small boosts for include_terms
         - Apply larger boosts for boost_terms (e.g., selected cell symbol/label)
         """
-        if not results:
-            return results
-        def score_with_terms(r: Dict[str, Any]) -> float:
-            s = float(r.get("score", 0.0))
-            text = (r.get("text") or "").lower()
-            # Exclude
-            for term in exclude_terms:
-                if term and term.lower() in text:
-                    return -1e9  # push to bottom
-            # Include boosts
-            for term in include_terms:
-                if term and term.lower() in text:
-                    s += 0.05
-            for term in boost_terms:
-                if term and term.lower() in text:
-                    s += 0.15
-            return s
-        reranked = sorted(results, key=score_with_terms, reverse=True)
-        # Filter out excluded ones
-        reranked = [r for r in reranked if r.get("score", 0.0) > -1e8]
-        return reranked
+        if self.lexical is None or not (include_terms or exclude_terms or boost_terms):
+            return code_scores
+        start, end = self.code_ranges[code_name]
+        
+        def rows_containing(term: str) -> np.ndarray:
+            rows = self.lexical.contains(term)
+            return rows[(rows >= start) & (rows < end)] - start
+        
+        scores = np.array(code_scores, dtype=np.float32)
+        for term in include_terms:
+            if term:
+                scores[rows_containing(term)] += 0.05
+        for term in boost_terms:
+            if term:
+                scores[rows_containing(term)] += 0.15
+        # Exclude (after boosts so nothing lifts an excluded chunk back)
+        for term in exclude_terms:
+            if term:
+                scores[rows_containing(term)] = -np.inf
+        return scores
     
     def synthesize_response(self, results: List[Dict[str, Any]], user_context: str = "", 
                            material_type: str = "", sheet_type: str = "", model: str = "gpt-4o-mini") -> Optional[str]:
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Lexical index over building code chunks
+
+Built by BuildingCodeRAG when the code embeddings and metadata load. Rows are
+the rows of the stacked embedding matrix, so lexical and vector scores line up
+without any id mapping:
+
+- Reference keys: clause IDs ("12.3.1", "A.5.3.5", OBC "4.1.6.2.") and table IDs
+  ("Table 4.1.6.2") map to the chunks that define or cite them. A clause or
+  table lookup is a dictionary hit, with no embedding call.
+- Term postings: normalized words, clause numbers and symbols (K_D, f'c, PE)
+  with BM25 weights precomputed per posting, so a BM25 query only touches the
+  postings of its own terms.
+- contains(term) answers include/exclude/boost filters with the same substring
+  match as before, confirmed only on rows whose indexed terms can contain it.
+"""
+
+import bisect
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Clause IDs: optional annex letter, then 2+ numeric levels ("12.3", "4.1.6.2", "A.5.3.5")
+CLAUSE_ID = r"(?:[a-z]\.)?\d{1,2}(?:\.\d{1,3}){1,5}"
+
+_HEADING_RE = re.compile(rf"^[^\w\n]{{0,3}}({CLAUSE_ID})\.?[ \t]+[a-z(]", re.MULTILINE)
+_CITED_RE = re.compile(rf"\b(clauses?|cl|sections?|articles?|sentences?|table|figure)\.?\s+({CLAUSE_ID}|(?:[a-z]\.)?\d{{1,2}}\b)")
+_MENTION_RE = re.compile(rf"(?<![\w.])(?<!table )(?<!figure )({CLAUSE_ID})(?!\w|\.\d)")
+_TOKEN_RE = re.compile(rf"(?<![\w.]){CLAUSE_ID}(?!\w|\.\d)|[^\W_]+(?:['’′_][^\W_]+)*")
+_RUN_RE = re.compile(r"[^\W_]+")
+
+# Words that say "this is a reference" rather than what it is about
+REFERENCE_WORDS = {"clause", "clauses", "cl", "section", "sections", "article", "sentence", "table", "figure",
+                   "see", "show", "me", "what", "does", "say", "about", "tell", "of", "in", "the", "a", "is"}
+STOPWORDS = {"a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on",
+             "or", "shall", "that", "the", "this", "to", "with", "what", "which", "been", "not"}
+
+# Weights of a reference key in a chunk
+HEADING_WEIGHT = 3.0
+SECTION_WEIGHT = 3.0
+CITED_WEIGHT = 1.0
+
+
+def normalize_clause(value: str) -> Optional[str]:
+    """Canonical clause/table ID ("A.5.3.5." -> "a.5.3.5"), or None if value is not one"""
+    value = (value or "").strip().lower().rstrip(".")
+    return value if re.fullmatch(rf"{CLAUSE_ID}|(?:[a-z]\.)?\d{{1,2}}", value) else None
+
+
+def _normalize_word(token: str) -> str:
+    # Light plural folding so "loads" finds "load"; clause numbers and symbols are kept as-is
+    if len(token) > 4 and token.isalpha() and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def _words(text: str) -> List[List[str]]:
+    """Each word of text as its term variants (K_D -> ["k_d", "kd"], f'c -> ["f'c", "fc"])"""
+    words = []
+    for token in _TOKEN_RE.findall((text or "").lower()):
+        token = token.replace("’", "'").replace("′", "'")
+        if token in STOPWORDS:
+            continue
+        variants = [_normalize_word(token)]
+        collapsed = token.replace("_", "").replace("'", "")
+        if collapsed != token:
+            variants.append(collapsed)
+        words.append(variants)
+    return words
+
+
+def tokenize(text: str) -> List[str]:
+    """Normalized terms of text: words, clause numbers and symbols (with their collapsed forms)"""
+    return [term for variants in _words(text) for term in variants]
+
+
+def parse_reference(query: str) -> Optional[Tuple[str, str]]:
+    """
+    ("clause" | "table", ID) when the query asks for one clause or table, e.g.
+    "clause 5.5.12", "cl. 7.5.6", "5.5.12", "Table 4.1.6.2"; None otherwise.
+    """
+    text = (query or "").lower()
+    match = re.search(rf"\btable\s+({CLAUSE_ID}|(?:[a-z]\.)?\d{{1,2}}\b)", text)
+    if match:
+        return "table", normalize_clause(match.group(1))
+    match = re.search(rf"\b(?:cl(?:ause)?|section|article|sentence)\s*\.?\s*({CLAUSE_ID}|(?:[a-z]\.)?\d{{1,2}}\b)", text)
+    if match:
+        return "clause", normalize_clause(match.group(1))
+    match = re.search(rf"(?<![\w.])((?:[a-z]\.)?\d{{1,2}}(?:\.\d{{1,3}}){{2,5}})(?!\w|\.\d)", text)
+    if match:
+        return "clause", normalize_clause(match.group(1))
+    return None
+
+
+def is_reference_only(query: str) -> bool:
+    """Whether the query is just a clause/table reference (nothing else to search semantically)"""
+    words = [t for t in _TOKEN_RE.findall((query or "").lower()) if t not in REFERENCE_WORDS]
+    return parse_reference(query) is not None and len(words) <= 1
+
+
+class CodeLexicalIndex:
+    """Reference keys and BM25 term postings over the stacked building code rows"""
+
+    def __init__(self):
+        self.n_rows = 0
+        self.texts: List[str] = []
+        self.references: Dict[str, Dict[int, float]] = {}
+        self.reference_keys: List[str] = []  # sorted, for sub-clause prefix lookups
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.idf: Dict[str, float] = {}
+        self._substring_rows: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    @classmethod
+    def build(cls, chunks: Iterable[Tuple[int, Dict[str, Any]]], n_rows: int) -> "CodeLexicalIndex":
+        """
+        Args:
+            chunks: (stacked row, metadata record) pairs; records carry "text" and
+                optionally "page" / metadata.section_number
+            n_rows: Rows in the stacked matrix (rows without a chunk stay empty)
+        """
+        index = cls()
+        index.n_rows = n_rows
+        index.texts = [""] * n_rows
+        references: Dict[str, Dict[int, float]] = defaultdict(lambda: defaultdict(float))
+        term_counts: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        lengths = np.zeros(n_rows, dtype=np.float32)
+
+        for row, record in chunks:
+            text = (record.get("text") or "") if isinstance(record, dict) else str(record)
+            index.texts[row] = text.lower()
+            for key, weight in index._reference_keys(record, index.texts[row]):
+                references[key][row] += weight
+            counts = Counter(tokenize(text))
+            lengths[row] = sum(counts.values())
+            for term, count in counts.items():
+                term_counts[term].append((row, count))
+
+        index.references = {key: dict(rows) for key, rows in references.items()}
+        index.reference_keys = sorted(index.references)
+
+        # Precompute each posting's BM25 term-frequency part; queries then only sum idf * weight
+        avgdl = float(lengths[lengths > 0].mean()) if np.any(lengths > 0) else 1.0
+        n_docs = max(1, int(np.count_nonzero(lengths)))
+        for term, postings in term_counts.items():
+            rows = np.fromiter((r for r, _ in postings), dtype=np.int64, count=len(postings))
+            tf = np.fromiter((c for _, c in postings), dtype=np.float32, count=len(postings))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[rows] / avgdl)
+            index.postings[term] = (rows, tf * (BM25_K1 + 1) / (tf + norm))
+            index.idf[term] = float(np.log(1 + (n_docs - len(rows) + 0.5) / (len(rows) + 0.5)))
+        return index
+
+    @staticmethod
+    def _reference_keys(record: Dict[str, Any], text: str) -> Iterable[Tuple[str, float]]:
+        """Reference keys of one chunk with their weights (defined here > cited here)"""
+        nested = record.get("metadata") if isinstance(record, dict) else None
+        for value in (record.get("page") if isinstance(record, dict) else None,
+                      nested.get("section_number") if isinstance(nested, dict) else None):
+            clause = normalize_clause(str(value)) if value is not None else None
+            if clause and "." in clause:
+                yield f"clause:{clause}", SECTION_WEIGHT
+        for match in _HEADING_RE.finditer(text):
+            yield f"clause:{normalize_clause(match.group(1))}", HEADING_WEIGHT
+        for kind, value in _CITED_RE.findall(text):
+            prefix = "table" if kind == "table" else "figure" if kind == "figure" else "clause"
+            if prefix != "clause" or value.count(".") < 2:  # deeper clause IDs are counted as mentions below
+                yield f"{prefix}:{normalize_clause(value)}", CITED_WEIGHT
+        for value in _MENTION_RE.findall(text):
+            if value.count(".") >= 2:  # "0.65" is a number, "4.1.6.2" is a clause
+                yield f"clause:{normalize_clause(value)}", CITED_WEIGHT
+
+    # -----------------------------
+    # Lookups
+    # -----------------------------
+    def lookup(self, kind: str, ref_id: str, include_children: bool = True) -> List[Tuple[int, float]]:
+        """
+        Rows defining or citing a clause/table, best first, as (row, weight).
+        A clause with no chunks of its own falls back to its sub-clauses (5.5 -> 5.5.1, 5.5.2, ...).
+        """
+        ref_id = normalize_clause(ref_id)
+        if not ref_id:
+            return []
+        key = f"{kind}:{ref_id}"
+        hits = dict(self.references.get(key, {}))
+        if not hits and include_children:
+            prefix = key + "."
+            start = bisect.bisect_left(self.reference_keys, prefix)
+            for child in self.reference_keys[start:]:
+                if not child.startswith(prefix):
+                    break
+                for row, weight in self.references[child].items():
+                    hits[row] = hits.get(row, 0.0) + weight
+        return sorted(hits.items(), key=lambda item: (-item[1], item[0]))
+
+    def bm25(self, query: str) -> np.ndarray:
+        """BM25 score of every row for query (zeros where no term matches)"""
+        scores = np.zeros(self.n_rows, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is not None:
+                rows, weights = posting
+                scores[rows] += self.idf[term] * weights
+        return scores
+
+    def has_term(self, query: str) -> bool:
+        """Whether query is a single indexed word (a symbol or keyword lookup)"""
+        words = _words(query)
+        return len(words) == 1 and any(term in self.postings for term in words[0])
+
+    def contains(self, term: str) -> np.ndarray:
+        """
+        Rows whose text contains term as a substring ("clt" matches "CLTs", "bars"
+        matches "rebars", "the" matches "the"). Every run of letters/digits in the
+        text is part of an indexed term or a stopword, so candidates come from the
+        indexed terms containing each run of the term; the substring is then
+        confirmed on those rows only.
+        """
+        phrase = (term or "").lower()
+        if not phrase:
+            return np.empty(0, dtype=np.int64)
+        rows = None
+        for run in set(_RUN_RE.findall(phrase)):
+            # Indexed terms drop a plural "s" and stopwords are not indexed at all
+            key = run[:-1] if len(run) > 1 and run.endswith("s") else run
+            if any(key in word for word in STOPWORDS):
+                continue
+            run_rows = self._rows_with_substring(key)
+            rows = run_rows if rows is None else np.intersect1d(rows, run_rows, assume_unique=True)
+        candidates = range(self.n_rows) if rows is None else rows
+        return np.array([r for r in candidates if phrase in self.texts[r]], dtype=np.int64)
+
+    def _rows_with_substring(self, key: str) -> np.ndarray:
+        """Sorted rows having an indexed term that contains key"""
+        rows = self._substring_rows.get(key)
+        if rows is None:
+            postings = [posting[0] for term, posting in self.postings.items() if key in term]
+            rows = np.unique(np.concatenate(postings)) if postings else np.empty(0, dtype=np.int64)
+            self._substring_rows[key] = rows
+        return rows
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Shared async OpenAI client for the Excel add-in backend
+
+One AsyncOpenAI client (and one pooled httpx.AsyncClient) is created per
+process and reused by every request handler, so add-in commands await the LLM
+instead of blocking the event loop, and keep-alive connections are reused
+instead of paying TLS/connection setup on every call.
+"""
+
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+import httpx
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+# Connection pool / timeout tuning (seconds)
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+# Per-request timeouts: short classification calls should fail fast
+ROUTER_TIMEOUT = float(os.getenv("OPENAI_ROUTER_TIMEOUT", "15"))
+ANALYSIS_TIMEOUT = float(os.getenv("OPENAI_ANALYSIS_TIMEOUT", "30"))
+
+_async_client: Optional[AsyncOpenAI] = None
+
+
+def get_async_openai_client() -> Optional[AsyncOpenAI]:
+    """Get (or create) the shared AsyncOpenAI client; None when OPENAI_API_KEY is not set"""
+    global _async_client
+    if _async_client is not None:
+        return _async_client
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        logger.warning("⚠️ OPENAI_API_KEY not set - AI features disabled")
+        return None
+
+    try:
+        http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+                keepalive_expiry=30.0
+            )
+        )
+        _async_client = AsyncOpenAI(
+            api_key=api_key,
+            http_client=http_client,
+            timeout=OPENAI_TIMEOUT,
+            max_retries=OPENAI_MAX_RETRIES
+        )
+        logger.info(f"✅ Async OpenAI client initialized (pool: {OPENAI_MAX_CONNECTIONS} connections)")
+    except Exception as e:
+        logger.error(f"⚠️ Failed to initialize async OpenAI client: {e}")
+        _async_client = None
+    return _async_client
+
+
+async def chat_completion(messages: List[Dict[str, Any]], model: str = "gpt-4o-mini",
+                          temperature: float = 0.1, max_tokens: int = 500,
+                          timeout: Optional[float] = None) -> str:
+    """
+    Await one chat completion on the shared client and return the stripped message text.
+
+    Raises:
+        RuntimeError: If no OpenAI client is configured
+        openai.APITimeoutError: If the request exceeds `timeout` (default OPENAI_TIMEOUT)
+    """
+    client = get_async_openai_client()
+    if client is None:
+        raise RuntimeError("OpenAI API key not set")
+    response = await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        timeout=timeout if timeout is not None else OPENAI_TIMEOUT
+    )
+    return (response.choices[0].message.content or "").strip()
+
+
+async def close_async_openai_client() -> None:
+    """Close the shared client's connection pool (call on application shutdown)"""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
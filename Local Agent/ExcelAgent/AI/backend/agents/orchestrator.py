@@ -4,36 +4,19 @@ Intelligent Orchestrator for Excel Add-in
 Processes commands and returns structured Excel actions
 """
 
+import asyncio
 import json
 import logging
 import os
 import re
 from typing import Dict, Any, List, Optional
-from openai import OpenAI
+
+from .llm_client import get_async_openai_client, chat_completion, ROUTER_TIMEOUT, ANALYSIS_TIMEOUT
 
 logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client
-openai_client = None
-try:
-    api_key = os.getenv("OPENAI_API_KEY")
-    if api_key:
-        # Use explicit initialization to avoid proxy/environment issues
-        # httpx_client parameter ensures we control the HTTP client
-        import httpx
-        http_client = httpx.Client(timeout=60.0)
-        openai_client = OpenAI(
-            api_key=api_key,
-            http_client=http_client,
-            timeout=60.0,
-            max_retries=2
-        )
-        logger.info("✅ OpenAI client initialized")
-    else:
-        logger.warning("⚠️ OPENAI_API_KEY not set - AI features disabled")
-except Exception as e:
-    logger.error(f"⚠️ Failed to initialize OpenAI client: {e}")
-    openai_client = None
+# Shared async OpenAI client (pooled connections; handlers await it instead of blocking the event loop)
+openai_client = get_async_openai_client()
 
 # Initialize Building Code RAG
 CODE_RAG_AVAILABLE = False
@@ -44,6 +27,7 @@ LAST_CODE_RESULTS: List[Dict[str, Any]] = []
 LAST_CODE_QUERY: str = ""
 try:
     from .building_code_rag import get_building_code_rag
+    from .code_lexical_index import parse_reference
     _code_rag = None
     CODE_RAG_AVAILABLE = True
     logger.info("✅ Building Code RAG available")
@@ -355,17 +339,16 @@ async def intelligent_route_command(command: str) -> str:
         if any(p in cl for p in ["more information", "these clauses", "expand", "show details"]):
             return "building_code"
         prompt = ROUTER_PROMPT.format(command=command)
-        response = openai_client.chat.completions.create(
+        route = (await chat_completion(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are a strict router. Return ONLY one word."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.1,
-            max_tokens=20
-        )
-        
-        route = response.choices[0].message.content.strip().lower()
+            max_tokens=20,
+            timeout=ROUTER_TIMEOUT
+        )).lower()
         
         # Validate route
         valid_routes = ["building_code", "update_value", "sheet_analysis", "formula_verification", "calculation", "query"]
@@ -427,7 +410,7 @@ Create a clear, engineering-focused summary explaining:
 
 Be concise and professional."""
                 
-                response = openai_client.chat.completions.create(
+                summary = await chat_completion(
                     model="gpt-4o-mini",
                     messages=[
                         {"role": "system", "content": "You are an expert structural engineer explaining Excel design sheets."},
@@ -436,8 +419,6 @@ Be concise and professional."""
                     temperature=0.3,
                     max_tokens=500
                 )
-                
-                summary = response.choices[0].message.content.strip()
             else:
                 # Fallback summary
                 summary = f"This sheet '{sheet_name}' contains {len(key_params)} design parameters including: {', '.join(key_params[:10])}."
@@ -533,12 +514,10 @@ async def handle_formula_verification(command: str, context: Dict[str, Any]) ->
         
         # Get building code context for the formula type
         code_context = ""
-        if CODE_RAG_AVAILABLE:
+        if CODE_RAG_AVAILABLE and openai_client:
             try:
-                code_rag = get_building_code_rag()
-                if code_rag and code_rag.loaded:
-                    # Extract what the formula might be calculating
-                    formula_type_prompt = f"""Analyze this Excel formula and determine what engineering calculation it represents.
+                # Extract what the formula might be calculating
+                formula_type_prompt = f"""Analyze this Excel formula and determine what engineering calculation it represents.
 
 Formula: {formula}
 Sheet: {sheet_name}
@@ -546,24 +525,27 @@ Cell References and Meanings:
 {json.dumps(cell_meanings, indent=2, default=str)}
 
 What engineering calculation does this formula perform? (e.g., "Euler buckling load", "moment resistance", "deflection")"""
-                    
-                    if openai_client:
-                        response = openai_client.chat.completions.create(
-                            model="gpt-4o-mini",
-                            messages=[
-                                {"role": "system", "content": "You are an expert structural engineer analyzing Excel formulas."},
-                                {"role": "user", "content": formula_type_prompt}
-                            ],
-                            temperature=0.1,
-                            max_tokens=100
-                        )
-                        calc_type = response.choices[0].message.content.strip()
-                        
-                        # Query building codes for relevant formulas
-                        code_query = f"{calc_type} {sheet_type} design formula"
-                        code_results = code_rag.query(code_query, top_k=3)
-                        code_context = "\n\n".join([f"[{r['code']}]\n{r['text'][:500]}" for r in code_results])
-                        logger.info(f"📚 Retrieved {len(code_results)} code sections for formula verification")
+                
+                # The classification call does not need the code index, so fetch (or load) it meanwhile
+                calc_type, code_rag = await asyncio.gather(
+                    chat_completion(
+                        model="gpt-4o-mini",
+                        messages=[
+                            {"role": "system", "content": "You are an expert structural engineer analyzing Excel formulas."},
+                            {"role": "user", "content": formula_type_prompt}
+                        ],
+                        temperature=0.1,
+                        max_tokens=100,
+                        timeout=ANALYSIS_TIMEOUT
+                    ),
+                    asyncio.to_thread(get_building_code_rag)
+                )
+                if code_rag and code_rag.loaded:
+                    # Query building codes for relevant formulas
+                    code_query = f"{calc_type} {sheet_type} design formula"
+                    code_results = await asyncio.to_thread(code_rag.query, code_query, 3)
+                    code_context = "\n\n".join([f"[{r['code']}]\n{r['text'][:500]}" for r in code_results])
+                    logger.info(f"📚 Retrieved {len(code_results)} code sections for formula verification")
             except Exception as e:
                 logger.error(f"⚠️ Error retrieving code context: {e}")
         
@@ -602,7 +584,7 @@ Recommendations: [suggestions]
 
 Be specific about which parts are correct or incorrect."""
             
-            response = openai_client.chat.completions.create(
+            verification = await chat_completion(
                 model="gpt-4o",
                 messages=[
                     {"role": "system", "content": "You are an expert structural engineer and Excel formula validator."},
@@ -612,8 +594,6 @@ Be specific about which parts are correct or incorrect."""
                 max_tokens=800
             )
             
-            verification = response.choices[0].message.content.strip()
-            
             return {
                 "action": "message",
                 "message": f"🔍 Formula Verification Report for {address}:\n\n{verification}\n\nFormula: `{formula}`\nCurrent Value: {values}",
@@ -651,7 +631,7 @@ async def handle_building_code_query(command: str, context: Dict[str, Any]) -> D
     
     try:
         # Get building code RAG instance
-        code_rag = get_building_code_rag()
+        code_rag = await asyncio.to_thread(get_building_code_rag)
         if not code_rag or not code_rag.loaded:
             return {
                 "action": "message",
@@ -727,10 +707,14 @@ async def handle_building_code_query(command: str, context: Dict[str, Any]) -> D
                 # Find applicable code for the sheet
                 query_text = f"Building code requirements for {sheet_type} design in {sheet_name}"
         
+        # Explicit clause/table reference (e.g. "clause 7.5.6", "cl 7.5.6", "5.5.12", "Table 4.1.6.2"),
+        # ignoring the selected-cell context the frontend appends
+        reference = parse_reference(re.sub(r'\(Context:[\s\S]+?\)', '', command))
+        
         # Follow-up handling: if user asks for more information on previous clauses
         follow_up = False
         cl = command.lower()
-        if any(p in cl for p in ["more information", "these clauses", "expand", "more details", "give me more"]):
+        if not reference and any(p in cl for p in ["more information", "these clauses", "expand", "more details", "give me more"]):
             if LAST_CODE_RESULTS:
                 code_text = "\n\n".join([
                     f"[{r['code']} - Page {r.get('page','N/A')}]\n{r.get('text','')[:1200]}"
@@ -755,16 +739,16 @@ async def handle_building_code_query(command: str, context: Dict[str, Any]) -> D
         
         logger.info(f"📋 Available codes: {list(code_rag.codes.keys())}")
         
-        # Check if user is asking about a specific clause (e.g., "clause 7.5.6" or "cl 7.5.6")
-        command_lower = command.lower()
-        clause_match = re.search(r'cl(?:ause)?\s*\.?\s*(\d+(?:\.\d+)*(?:\.\d+)?)', command_lower)
-        if clause_match:
-            clause_num = clause_match.group(1)
-            logger.info(f"🔍 User asking about specific clause: {clause_num}")
+        # Specific clause/table: exact lookup in the lexical index, embedding search only if it has no hits
+        if reference:
+            ref_kind, ref_id = reference
+            ref_label = f"{ref_kind.capitalize()} {ref_id.upper()}"
+            logger.info(f"🔍 User asking about specific {ref_kind}: {ref_id}")
             
-            # Query all codes for this clause number
-            clause_query = f"clause {clause_num}"
-            all_clause_results = code_rag.query_all_codes(clause_query, top_k_per_code=3)
+            all_clause_results = code_rag.lookup_reference(ref_kind, ref_id, top_k_per_code=3)
+            if not all_clause_results:
+                logger.info(f"🔍 {ref_label} not in lexical index, falling back to semantic search")
+                all_clause_results = await asyncio.to_thread(code_rag.query_all_codes, f"{ref_kind} {ref_id}", top_k_per_code=3)
             
             if all_clause_results:
                 # Build comprehensive clause information
@@ -774,10 +758,14 @@ async def handle_building_code_query(command: str, context: Dict[str, Any]) -> D
                         for r in results[:2]:  # Top 2 from each code
                             clause_info.append(f"[{code_name}]\n{r['text'][:600]}...\n(Page {r['page']})\n")
                 
+                # Keep for "more information" follow-ups
+                LAST_CODE_RESULTS = [r for results in all_clause_results.values() for r in results]
+                LAST_CODE_QUERY = ref_label
+                
                 return {
                     "action": "message",
-                    "message": f"📖 Clause {clause_num} Information:\n\n" + "\n".join(clause_info),
-                    "reasoning": f"Found clause {clause_num} references in building codes",
+                    "message": f"📖 {ref_label} Information:\n\n" + "\n".join(clause_info),
+                    "reasoning": f"Found {ref_label} references in building codes",
                     "code_references": [
                         {"code": code, "page": r["page"], "text": r["text"][:300]}
                         for code, results in all_clause_results.items()
@@ -823,10 +811,10 @@ async def handle_building_code_query(command: str, context: Dict[str, Any]) -> D
             logger.info(f"   Exclude terms: {exclude_terms}")
             logger.info(f"   Boost terms: {boost_terms}")
             
-            results = code_rag.query_code(target_code, query_text, top_k=10,
-                                          include_terms=include_terms,
-                                          exclude_terms=exclude_terms,
-                                          boost_terms=boost_terms)
+            results = await asyncio.to_thread(code_rag.query_code, target_code, query_text, top_k=10,
+                                              include_terms=include_terms,
+                                              exclude_terms=exclude_terms,
+                                              boost_terms=boost_terms)
             
             logger.info(f"📥 RAG returned {len(results)} chunks")
             for i, r in enumerate(results[:3], 1):
@@ -851,7 +839,8 @@ async def handle_building_code_query(command: str, context: Dict[str, Any]) -> D
                 }
                 
                 # Use RAG's synthesis helper (centralizes all LLM synthesis logic)
-                synthesized = code_rag.synthesize_response(
+                synthesized = await asyncio.to_thread(
+                    code_rag.synthesize_response,
                     results=results,
                     user_context=selected_cell_context or "",
                     material_type=material_type,
@@ -899,7 +888,7 @@ async def handle_building_code_query(command: str, context: Dict[str, Any]) -> D
         
         # Query all codes and return most relevant (fallback)
         logger.info(f"📚 Querying all codes as fallback...")
-        all_results = code_rag.query_all_codes(query_text, top_k_per_code=2)
+        all_results = await asyncio.to_thread(code_rag.query_all_codes, query_text, top_k_per_code=2)
         
         if all_results:
             # Find best matching code
@@ -982,18 +971,18 @@ async def analyze_command_with_ai(command: str, workbook: str, sheet: str, sampl
     )
     
     try:
-        response = openai_client.chat.completions.create(
+        content = await chat_completion(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are an expert structural engineer analyzing Excel commands."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.1,
-            max_tokens=500
+            max_tokens=500,
+            timeout=ANALYSIS_TIMEOUT
         )
         
         # Parse JSON response
-        content = response.choices[0].message.content.strip()
         
         # Extract JSON from response
         json_match = re.search(r'\{.*\}', content, flags=re.DOTALL)
@@ -1080,7 +1069,7 @@ async def perform_calculations(analysis: Dict[str, Any], context: Dict[str, Any]
     code_context = ""
     if CODE_RAG_AVAILABLE and sheet_type != "unknown":
         try:
-            code_rag = get_building_code_rag()
+            code_rag = await asyncio.to_thread(get_building_code_rag)
             code_mapping = {
                 "timber": "CSA_O86_Timber",
                 "wood": "CSA_O86_Timber",
@@ -1093,7 +1082,7 @@ async def perform_calculations(analysis: Dict[str, Any], context: Dict[str, Any]
                 if code_name in code_rag.codes:
                     # Get relevant code sections for validation
                     query = f"{element} design requirements and limits"
-                    code_results = code_rag.query_code(code_name, query, top_k=2)
+                    code_results = await asyncio.to_thread(code_rag.query_code, code_name, query, top_k=2)
                     if code_results:
                         code_context = "\n".join([r['text'][:200] for r in code_results])
         except Exception as e:
@@ -4,6 +4,7 @@ FastAPI Server for Mantle Excel Add-in Backend
 Provides intelligent engineering assistance for Excel
 """
 
+import asyncio
 import logging
 import os
 import json
@@ -21,6 +22,9 @@ from pathlib import Path
 env_path = Path(__file__).parent.parent / ".env"
 load_dotenv(env_path)
 
+# Imported after load_dotenv so pool/timeout settings in .env apply
+from agents.llm_client import get_async_openai_client, chat_completion, close_async_openai_client, ANALYSIS_TIMEOUT
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -32,6 +36,15 @@ app = FastAPI(
     version="1.0.0"
 )
 
+@app.on_event("shutdown")
+async def shutdown_openai_pool():
+    """Close the shared OpenAI connection pool"""
+    await close_async_openai_client()
+
+# Label-parsing requests are split into batches of this many cells, resolved concurrently
+LABEL_PARSE_BATCH_SIZE = int(os.getenv("LABEL_PARSE_BATCH_SIZE", "20"))
+LABEL_PARSE_MAX_CELLS = int(os.getenv("LABEL_PARSE_MAX_CELLS", "100"))
+
 # Enable CORS for Excel Add-in
 app.add_middleware(
     CORSMiddleware,
@@ -128,9 +141,7 @@ async def analyze_layout_handler(request: dict):
         
         logger.info(f"📐 Analyzing layout for {workbook_name}/{sheet_name}")
         
-        from openai import OpenAI
-        openai_key = os.getenv("OPENAI_API_KEY")
-        if not openai_key:
+        if not get_async_openai_client():
             return {
                 "layout_pattern": "unknown",
                 "label_column": "B",
@@ -139,19 +150,6 @@ async def analyze_layout_handler(request: dict):
                 "error": "OpenAI API key not set"
             }
         
-        try:
-            import httpx
-            http_client = httpx.Client(timeout=60.0)
-            openai_client = OpenAI(
-                api_key=openai_key,
-                http_client=http_client,
-                timeout=60.0,
-                max_retries=2
-            )
-        except Exception as e:
-            logger.error(f"Failed to create OpenAI client: {e}")
-            return {"layout_pattern": "unknown", "error": str(e)}
-        
         prompt = f"""Analyze the LAYOUT STRUCTURE of this engineering spreadsheet.
 
 Workbook: {workbook_name}
@@ -188,18 +186,17 @@ If labels can be in multiple positions, specify an array:
 
 Return ONLY valid JSON."""
         
-        response = openai_client.chat.completions.create(
+        content = await chat_completion(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are an expert at analyzing Excel spreadsheet layouts. Return only valid JSON."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.1,
-            max_tokens=500
+            max_tokens=500,
+            timeout=ANALYSIS_TIMEOUT
         )
         
-        content = response.choices[0].message.content.strip()
-        
         # Strip markdown if present
         if content.startswith("```json"):
             content = content[7:]
@@ -239,25 +236,7 @@ async def detect_legend_handler(request: dict):
             return {"legendFound": False, "colorMappings": {}}
         
         # Use OpenAI to classify legend intelligently
-        from openai import OpenAI
-        openai_key = os.getenv("OPENAI_API_KEY")
-        if openai_key:
-            try:
-                import httpx
-                http_client = httpx.Client(timeout=60.0)
-                openai_client = OpenAI(
-                    api_key=openai_key,
-                    http_client=http_client,
-                    timeout=60.0,
-                    max_retries=2
-                )
-            except Exception as e:
-                logger.error(f"Failed to create OpenAI client: {e}")
-                openai_client = None
-        else:
-            openai_client = None
-            
-        if openai_client:
+        if get_async_openai_client():
             prompt = f"""You are analyzing a spreadsheet legend to understand what colors mean.
 
 Sheet: {sheet_name}
@@ -289,17 +268,16 @@ Return ONLY valid JSON:
 
 CRITICAL: Return valid JSON only. No markdown."""
             
-            response = openai_client.chat.completions.create(
+            content = await chat_completion(
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": "You are an expert at analyzing spreadsheet legends. Return only valid JSON."},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.1,
-                max_tokens=1000
+                max_tokens=1000,
+                timeout=ANALYSIS_TIMEOUT
             )
-            
-            content = response.choices[0].message.content.strip()
             # Strip markdown if present
             if content.startswith("```json"):
                 content = content[7:]
@@ -315,60 +293,28 @@ CRITICAL: Return valid JSON only. No markdown."""
         logger.error(f"Legend detection error: {e}")
         return {"legendFound": False, "colorMappings": {}, "error": str(e)}
 
-@app.post("/api/excel/parse-labels")
-async def parse_labels_handler(request: dict):
-    """
-    Use LLM to resolve ambiguous label-to-value mappings
-    Only called when heuristics fail for complex layouts
-    """
-    try:
-        ambiguous_cells = request.get("ambiguousCells", [])
-        layout_structure = request.get("layoutStructure", {})
-        sheet_name = request.get("sheetName", "Sheet")
-        workbook_name = request.get("workbookName", "Unknown")
-        
-        if not ambiguous_cells:
-            return {"mappings": []}
-        
-        logger.info(f"🧠 Parsing {len(ambiguous_cells)} ambiguous label mappings via LLM")
-        
-        from openai import OpenAI
-        openai_key = os.getenv("OPENAI_API_KEY")
-        if not openai_key:
-            return {"mappings": [], "error": "OpenAI API key not set"}
+async def _resolve_label_batch(ambiguous_cells: List[Dict[str, Any]], layout_structure: Dict[str, Any],
+                               sheet_name: str, workbook_name: str) -> List[Dict[str, Any]]:
+    """Ask the LLM to label one batch of ambiguous value cells"""
+    # Build prompt with all ambiguous cells and their neighborhoods
+    cells_context = []
+    for cell_info in ambiguous_cells:
+        cell_addr = cell_info.get("cell", "")
+        neighborhood = cell_info.get("neighborhood", {})
+        candidates = cell_info.get("candidates", [])
         
-        try:
-            import httpx
-            http_client = httpx.Client(timeout=60.0)
-            openai_client = OpenAI(
-                api_key=openai_key,
-                http_client=http_client,
-                timeout=60.0,
-                max_retries=2
-            )
-        except Exception as e:
-            logger.error(f"Failed to create OpenAI client: {e}")
-            return {"mappings": [], "error": str(e)}
+        neighborhood_str = "\n".join([f"  {pos}: {value}" for pos, value in list(sorted(neighborhood.items())[:10])])
+        candidates_str = ", ".join(candidates) if candidates else "none"
         
-        # Build prompt with all ambiguous cells and their neighborhoods
-        cells_context = []
-        for cell_info in ambiguous_cells[:20]:  # Limit to 20 to avoid token limits
-            cell_addr = cell_info.get("cell", "")
-            neighborhood = cell_info.get("neighborhood", {})
-            candidates = cell_info.get("candidates", [])
-            
-            neighborhood_str = "\n".join([f"  {pos}: {value}" for pos, value in list(sorted(neighborhood.items())[:10])])
-            candidates_str = ", ".join(candidates) if candidates else "none"
-            
-            cells_context.append(f"""
+        cells_context.append(f"""
 Cell {cell_addr}:
   Value: {cell_info.get('value', 'unknown')}
   Neighborhood cells:
 {neighborhood_str}
   Candidate labels found: {candidates_str}
 """)
-        
-        prompt = f"""You are analyzing an engineering spreadsheet to map parameter labels to their value cells.
+    
+    prompt = f"""You are analyzing an engineering spreadsheet to map parameter labels to their value cells.
 
 Workbook: {workbook_name}
 Sheet: {sheet_name}
@@ -403,31 +349,73 @@ Return ONLY valid JSON array:
 ]
 
 If no label can be determined, set confidence < 0.5."""
+    
+    content = await chat_completion(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": "You are an expert at understanding engineering spreadsheet structures. Return only valid JSON arrays."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.1,
+        max_tokens=1500,
+        timeout=ANALYSIS_TIMEOUT
+    )
+    
+    # Strip markdown if present
+    if content.startswith("```json"):
+        content = content[7:]
+    if content.startswith("```"):
+        content = content[3:]
+    if content.endswith("```"):
+        content = content[:-3]
+    
+    return json.loads(content.strip())
+
+@app.post("/api/excel/parse-labels")
+async def parse_labels_handler(request: dict):
+    """
+    Use LLM to resolve ambiguous label-to-value mappings
+    Only called when heuristics fail for complex layouts.
+    Cells are sent in batches (to stay within token limits), resolved concurrently.
+    """
+    try:
+        ambiguous_cells = request.get("ambiguousCells", [])
+        layout_structure = request.get("layoutStructure", {})
+        sheet_name = request.get("sheetName", "Sheet")
+        workbook_name = request.get("workbookName", "Unknown")
         
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are an expert at understanding engineering spreadsheet structures. Return only valid JSON arrays."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.1,
-            max_tokens=1500
-        )
+        if not ambiguous_cells:
+            return {"mappings": []}
         
-        content = response.choices[0].message.content.strip()
+        logger.info(f"🧠 Parsing {len(ambiguous_cells)} ambiguous label mappings via LLM")
         
-        # Strip markdown if present
-        if content.startswith("```json"):
-            content = content[7:]
-        if content.startswith("```"):
-            content = content[3:]
-        if content.endswith("```"):
-            content = content[:-3]
+        if not get_async_openai_client():
+            return {"mappings": [], "error": "OpenAI API key not set"}
         
-        mappings = json.loads(content.strip())
-        logger.info(f"✅ LLM resolved {len(mappings)} label mappings")
+        cells = ambiguous_cells[:LABEL_PARSE_MAX_CELLS]
+        truncated = len(ambiguous_cells) - len(cells)
+        if truncated:
+            logger.warning(f"⚠️ Label parsing capped at {LABEL_PARSE_MAX_CELLS} cells; {truncated} cells not sent")
+        batches = [cells[i:i + LABEL_PARSE_BATCH_SIZE] for i in range(0, len(cells), LABEL_PARSE_BATCH_SIZE)]
+        batch_results = await asyncio.gather(
+            *(_resolve_label_batch(batch, layout_structure, sheet_name, workbook_name) for batch in batches),
+            return_exceptions=True
+        )
         
-        return {"mappings": mappings}
+        mappings = []
+        errors = []
+        for result in batch_results:
+            if isinstance(result, Exception):
+                logger.error(f"Label batch failed: {result}")
+                errors.append(str(result))
+            else:
+                mappings.extend(result)
+        if errors and not mappings:
+            return {"mappings": [], "error": errors[0], "truncated": truncated}
+        logger.info(f"✅ LLM resolved {len(mappings)} label mappings ({len(batches)} batches)")
+        
+        # Cells past LABEL_PARSE_MAX_CELLS were not resolved; the caller can resend them
+        return {"mappings": mappings, "truncated": truncated}
         
     except Exception as e:
         logger.error(f"Label parsing error: {e}")
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Test Suite for building code search
+
+Loads a two-code library of synthetic embeddings and metadata through
+BuildingCodeRAG and checks clause/table lookups, substring term filters and the
+cosine + BM25 hybrid scores.
+"""
+
+import contextlib
+import io
+import pickle
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agents.building_code_rag import BuildingCodeRAG
+
+CODES = {
+    "concrete": [
+        ("10.5 Flexure. Reinforcement ratio of the section.", [1.0, 0.0, 0.0]),
+        ("Shear design follows Clause 11.3 for beams.", [0.0, 1.0, 0.0]),
+    ],
+    "steel": [
+        ("13.2 Axial compression. The factored compressive resistance Cr of a member.", [1.0, 0.0, 0.0]),
+        ("Members in compression satisfy Clause 13.2 and Table 4.1.", [0.6, 0.8, 0.0]),
+        ("CLTs and rebars: K_D is the load duration factor.", [0.0, 0.0, 1.0]),
+        ("Bolted connections in tension.", [0.0, 1.0, 0.0]),
+    ],
+}
+
+
+class TestBuildingCodeRAG(unittest.TestCase):
+    """Test cases for BuildingCodeRAG over a synthetic index"""
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        for folder, chunks in CODES.items():
+            (self.temp_dir / folder).mkdir()
+            np.save(self.temp_dir / folder / "embeddings.npy", np.array([v for _, v in chunks], dtype=np.float32))
+            with open(self.temp_dir / folder / "metadata.pkl", "wb") as f:
+                pickle.dump([{"text": text, "page": i + 1} for i, (text, _) in enumerate(chunks)], f)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            with mock.patch.object(BuildingCodeRAG, "_load_all_codes"):
+                self.rag = BuildingCodeRAG()
+            self.rag.base_path = self.temp_dir
+            self.rag.index_path = self.temp_dir / ".index"
+            self.rag._load_all_codes()
+        self.steel_start = self.rag.code_ranges["CSA_S16_Steel"][0]
+        self.texts = [text.lower() for folder in ("concrete", "steel") for text, _ in CODES[folder]]
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_lookup_reference_ranks_definitions_above_citations(self):
+        """A clause heading outranks a chunk that only cites it; tables are keyed separately"""
+        clause = self.rag.lookup_reference("clause", "13.2")
+        self.assertEqual(list(clause), ["CSA_S16_Steel"])
+        self.assertEqual([r["chunk_id"] for r in clause["CSA_S16_Steel"]], [0, 1])
+        self.assertEqual(clause["CSA_S16_Steel"][0]["score"], 1.0)
+
+        table = self.rag.lookup_reference("table", "4.1")
+        self.assertEqual([r["chunk_id"] for r in table["CSA_S16_Steel"]], [1])
+        self.assertEqual(self.rag.lookup_reference("clause", "99.9"), {})
+
+    def test_contains_matches_substrings(self):
+        """Term filters keep substring semantics: stopwords, plurals and partial words match"""
+        lexical = self.rag.lexical
+        steel = self.steel_start
+        self.assertEqual(list(lexical.contains("CLT")), [steel + 2])
+        self.assertEqual(list(lexical.contains("bars")), [steel + 2])
+        self.assertEqual(list(lexical.contains("K_D")), [steel + 2])
+        self.assertEqual(list(lexical.contains("load duration")), [steel + 2])
+        self.assertEqual(list(lexical.contains("clause 13.2")), [steel + 1])
+        self.assertEqual(list(lexical.contains("beam")), [1])
+        for term in ("the", "a", "tion", "in compression", "13", "4.1", "cr ", "timber"):
+            expected = [r for r, text in enumerate(self.texts) if term in text]
+            self.assertEqual(list(lexical.contains(term)), expected, term)
+
+    def test_hybrid_scores_add_scaled_bm25_to_cosine(self):
+        """Queries score cosine + lexical_weight * BM25 scaled to the best lexical hit"""
+        query_vector = np.array([0.0, 1.0, 0.0], dtype=np.float32)
+        with mock.patch.object(self.rag, "_embed_query", return_value=query_vector):
+            results = self.rag.query_code("CSA_S16_Steel", "bolted tension", top_k=4)
+
+        start, end = self.rag.code_ranges["CSA_S16_Steel"]
+        bm25 = self.rag.lexical.bm25("bolted tension")[start:end]
+        cosine = np.asarray(self.rag.matrix[start:end]) @ query_vector
+        expected = cosine + self.rag.lexical_weight * bm25 / bm25.max()
+        self.assertEqual(results[0]["chunk_id"], 3)
+        for result in results:
+            self.assertAlmostEqual(result["score"], float(expected[result["chunk_id"]]), places=5)
+
+    def test_single_symbol_query_skips_embedding(self):
+        """A lone indexed symbol is scored by BM25 alone, without an embedding call"""
+        with mock.patch.object(self.rag, "_embed_query") as embed:
+            results = self.rag.query_code("CSA_S16_Steel", "K_D", top_k=3)
+        embed.assert_not_called()
+        self.assertEqual([r["chunk_id"] for r in results], [2])
+        self.assertEqual(results[0]["score"], 1.0)
+
+    def test_exclude_and_boost_terms(self):
+        """Excluded chunks drop out; boosted chunks move up"""
+        query_vector = np.array([1.0, 0.0, 0.0], dtype=np.float32)
+        with mock.patch.object(self.rag, "_embed_query", return_value=query_vector):
+            plain = self.rag.query_code("CSA_S16_Steel", "compressive resistance", top_k=4)
+            filtered = self.rag.query_code("CSA_S16_Steel", "compressive resistance", top_k=4,
+                                           exclude_terms=["the"], boost_terms=["bolt"])
+        self.assertEqual(plain[0]["chunk_id"], 0)
+        self.assertNotIn(0, [r["chunk_id"] for r in filtered])
+        self.assertNotIn(2, [r["chunk_id"] for r in filtered])
+        boosted = next(r for r in filtered if r["chunk_id"] == 3)
+        original = next(r for r in plain if r["chunk_id"] == 3)
+        self.assertAlmostEqual(boosted["score"], original["score"] + 0.15, places=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,11 +2,14 @@
 # -*- coding: utf-8 -*-
 """
 Batch processor for building synthesis on new projects
-This script runs synthesize_building_info.py on projects that have structured JSON but no building_info yet.
+This script runs synthesize_building_info.py on projects that have structured JSON but no building_info yet,
+and re-synthesizes projects whose structured JSON changed since their building_info was written (cached
+map/merge partials are reused, so only the changed pages cost new requests).
 """
 
 import os
 import sys
+import asyncio
 from pathlib import Path
 
 # Load environment variables from .env file if it exists
@@ -33,7 +36,7 @@ SCRIPT_DIR = Path(__file__).parent
 sys.path.insert(0, str(SCRIPT_DIR))
 
 def find_projects_needing_synthesis():
-    """Find projects that have structured JSON but no building_info yet"""
+    """Find projects that have structured JSON but no (or an outdated) building_info"""
     structured_path = Path(STRUCTURED_JSON_DIR)
     building_synthesis_path = Path(BUILDING_SYNTHESIS_DIR)
     
@@ -52,20 +55,29 @@ def find_projects_needing_synthesis():
     # Check which ones already have building_info
     projects_needing_synthesis = []
     projects_already_done = []
+    projects_outdated = []
     
     for project_id in projects_with_structured:
         building_info_file = building_synthesis_path / f"building_info_{project_id}.json"
-        if building_info_file.exists():
-            projects_already_done.append(project_id)
-        else:
+        if not building_info_file.exists():
+            projects_needing_synthesis.append(project_id)
+            continue
+        # Re-synthesize when the extractions (or page metadata) changed after the last synthesis
+        inputs = [structured_path / project_id / f"structured_{project_id}.json",
+                  structured_path / project_id / f"page_metadata_{project_id}.json"]
+        synthesized_at = building_info_file.stat().st_mtime
+        if any(path.exists() and path.stat().st_mtime > synthesized_at for path in inputs):
+            projects_outdated.append(project_id)
             projects_needing_synthesis.append(project_id)
+        else:
+            projects_already_done.append(project_id)
     
-    return sorted(projects_needing_synthesis), sorted(projects_already_done)
+    return sorted(projects_needing_synthesis), sorted(projects_already_done), sorted(projects_outdated)
 
-def run_synthesis_for_project(project_id):
-    """Run the building synthesis script for a single project"""
+def run_synthesis_for_projects(project_ids):
+    """Run the building synthesis for all projects in one run (shared rate limits); returns {project_id: success}"""
     print(f"\n{'='*60}")
-    print(f"Synthesizing building info for project: {project_id}")
+    print(f"Synthesizing building info for {len(project_ids)} project(s)")
     print(f"{'='*60}")
     
     original_env = None
@@ -89,27 +101,21 @@ def run_synthesis_for_project(project_id):
             importlib.reload(sys.modules['synthesize_building_info'])
         import synthesize_building_info
         
-        # Initialize the client if needed
-        if synthesize_building_info.client is None:
-            from openai import OpenAI
-            # Check API_KEY first (from .env), then OPENAI_API_KEY, then the module's API_KEY
-            api_key = os.getenv("API_KEY") or os.getenv("OPENAI_API_KEY") or synthesize_building_info.API_KEY
-            if not api_key or len(api_key.strip()) < 20:
-                print("❌ ERROR: OpenAI API key not set or invalid!")
-                print("   Set API_KEY or OPENAI_API_KEY in .env file or environment variable")
-                return False
-            synthesize_building_info.client = OpenAI(api_key=api_key)
+        # Check API_KEY first (from .env), then OPENAI_API_KEY, then the module's API_KEY
+        api_key = os.getenv("API_KEY") or os.getenv("OPENAI_API_KEY") or synthesize_building_info.API_KEY
+        if not api_key or len(api_key.strip()) < 20:
+            print("❌ ERROR: OpenAI API key not set or invalid!")
+            print("   Set API_KEY or OPENAI_API_KEY in .env file or environment variable")
+            return {project_id: False for project_id in project_ids}
         
-        # Call process_project directly
-        synthesize_building_info.process_project(project_id, synthesize_building_info.client)
-        
-        return True
+        # Synthesize all projects with one engine
+        return asyncio.run(synthesize_building_info.run_synthesis(project_ids, api_key))
             
     except Exception as e:
-        print(f"❌ Error processing {project_id}: {e}")
+        print(f"❌ Error processing projects: {e}")
         import traceback
         traceback.print_exc()
-        return False
+        return {project_id: False for project_id in project_ids}
     finally:
         # Restore original env var
         if original_env is not None:
@@ -125,7 +131,7 @@ def main():
     
     # Find projects needing synthesis
     print(f"\nChecking for projects needing building synthesis...")
-    projects_to_process, projects_done = find_projects_needing_synthesis()
+    projects_to_process, projects_done, projects_outdated = find_projects_needing_synthesis()
     
     if not projects_to_process and not projects_done:
         print(f"❌ No projects with structured JSON found in {STRUCTURED_JSON_DIR}")
@@ -146,7 +152,8 @@ def main():
     if projects_to_process:
         print(f"\n🆕 NEEDS SYNTHESIS ({len(projects_to_process)} projects) - Will process:")
         for proj_id in projects_to_process[:20]:  # Show first 20
-            print(f"   {proj_id}")
+            suffix = " (structured JSON changed since last synthesis)" if proj_id in projects_outdated else ""
+            print(f"   {proj_id}{suffix}")
         if len(projects_to_process) > 20:
             print(f"   ... and {len(projects_to_process) - 20} more")
     
@@ -168,15 +175,10 @@ def main():
         print("Cancelled.")
         return
     
-    # Process each project
-    successful = 0
-    failed = 0
-    
-    for project_id in projects_to_process:
-        if run_synthesis_for_project(project_id):
-            successful += 1
-        else:
-            failed += 1
+    # Process all projects (concurrently, under shared rate limits)
+    results = run_synthesis_for_projects(projects_to_process)
+    successful = sum(1 for project_id in projects_to_process if results.get(project_id))
+    failed = len(projects_to_process) - successful
     
     # Summary
     print(f"\n{'='*60}")
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bulk, idempotent upserts of embedding records into Supabase (Postgres + pgvector)
+
+Shared by embed_screenshots.py (image_embeddings) and json_to_supabase.py
+(image_descriptions, also used by batch_upload_to_supabase.py):
+
+- PostgresCopyLoader streams rows with binary COPY into a per-connection staging
+  table and merges them with INSERT ... ON CONFLICT DO UPDATE, so reruns update
+  rows instead of duplicating them. Vectors are sent in pgvector's binary format.
+  Rows may omit keys (json_to_supabase drops None values): a batch stages the
+  union of its rows' columns, and a missing value never overwrites a stored one.
+- RestUpsertLoader is the fallback when no database URL is configured: chunked
+  PostgREST upserts with the same conflict key.
+- Both run in a background thread fed by a bounded queue, so uploads overlap
+  with embedding; put() blocks when the uploader falls behind.
+
+Usage:
+    loader = open_loader("image_embeddings", ["id"], supabase_client=supabase)
+    with loader:
+        for batch in batches:
+            loader.put(records_for(batch))
+    print(loader.stats)
+
+The Postgres path is used when SUPABASE_DB_URL (or DATABASE_URL) is set, e.g.
+postgresql://postgres:<password>@db.<project>.supabase.co:5432/postgres, or a
+local Postgres with the pgvector extension for testing.
+"""
+
+import os
+import queue
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import psycopg
+    from psycopg import sql
+    from psycopg.adapt import Dumper
+    from psycopg.pq import Format
+    from psycopg.types import TypeInfo
+    PSYCOPG_AVAILABLE = True
+except ImportError:
+    PSYCOPG_AVAILABLE = False
+
+SUPABASE_DB_URL = os.getenv("SUPABASE_DB_URL") or os.getenv("DATABASE_URL")
+
+# Rows per COPY + merge transaction / per PostgREST request
+COPY_BATCH_ROWS = 5000
+REST_BATCH_ROWS = 100
+QUEUE_SIZE = 8  # Pending put() calls before producers block
+
+_STOP = object()
+
+
+@dataclass
+class LoadStats:
+    rows: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self) -> str:
+        return f"{self.rows} rows in {self.seconds:.1f}s ({self.rows_per_sec:.0f} rows/s), {self.failed} failed"
+
+
+def vector_to_binary(values: Any) -> bytes:
+    """pgvector binary representation: int16 dim, int16 unused, dim x float4 (big-endian)"""
+    array = np.asarray(values, dtype=">f4").ravel()
+    return struct.pack(">HH", array.shape[0], 0) + array.tobytes()
+
+
+if PSYCOPG_AVAILABLE:
+    class _VectorBinaryDumper(Dumper):
+        format = Format.BINARY
+
+        def dump(self, obj: Any) -> bytes:
+            return vector_to_binary(obj)
+
+
+class _QueuedLoader:
+    """Background writer fed by a bounded queue; subclasses implement _write(rows)"""
+
+    batch_rows = 1000
+
+    def __init__(self, table: str, conflict_columns: Sequence[str],
+                 prepare: Optional[Callable[[Any], Optional[Dict[str, Any]]]] = None,
+                 queue_size: int = QUEUE_SIZE):
+        self.table = table
+        self.conflict_columns = list(conflict_columns)
+        self.prepare = prepare
+        self.stats = LoadStats()
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._error: Optional[BaseException] = None
+
+    # -----------------------------
+    # Synchronous API
+    # -----------------------------
+    def load(self, items: Iterable[Any]) -> LoadStats:
+        """Prepare and upsert items in batches of batch_rows"""
+        rows: List[Dict[str, Any]] = []
+        for item in items:
+            row = self._prepare(item)
+            if row is not None:
+                rows.append(row)
+            if len(rows) >= self.batch_rows:
+                self._flush(rows)
+                rows = []
+        if rows:
+            self._flush(rows)
+        return self.stats
+
+    # -----------------------------
+    # Background API
+    # -----------------------------
+    def start(self) -> "_QueuedLoader":
+        self._thread = threading.Thread(target=self._run, name=f"{self.table}-loader", daemon=True)
+        self._thread.start()
+        return self
+
+    def put(self, items: List[Any]):
+        """Queue items for upload (blocks while the queue is full)"""
+        if self._error is not None:
+            raise RuntimeError(f"{self.table} loader failed: {self._error}") from self._error
+        if items:
+            self._queue.put(list(items))
+
+    def close(self) -> LoadStats:
+        """Flush everything queued and stop the background thread"""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        self._close_connection()
+        if self._error is not None:
+            raise RuntimeError(f"{self.table} loader failed: {self._error}") from self._error
+        return self.stats
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _run(self):
+        stopped = False
+
+        def items():
+            nonlocal stopped
+            while True:
+                chunk = self._queue.get()
+                if chunk is _STOP:
+                    stopped = True
+                    return
+                yield from chunk
+
+        try:
+            self.load(items())
+        except BaseException as e:
+            self._error = e
+            # Keep draining so producers blocked in put() are released
+            while not stopped:
+                stopped = self._queue.get() is _STOP
+
+    def _prepare(self, item: Any) -> Optional[Dict[str, Any]]:
+        if self.prepare is None:
+            return item
+        try:
+            return self.prepare(item)
+        except Exception as e:
+            print(f"  WARNING: Skipping record: {e}")
+            self.stats.failed += 1
+            return None
+
+    def _flush(self, rows: List[Dict[str, Any]]):
+        # Timed per write, so rows/s reflects the database, not time spent waiting for producers
+        start = time.perf_counter()
+        self.stats.rows += self._write(rows)
+        self.stats.seconds += time.perf_counter() - start
+
+    def _write(self, rows: List[Dict[str, Any]]) -> int:
+        """Upsert rows, returning how many were written"""
+        raise NotImplementedError
+
+    def _close_connection(self):
+        pass
+
+
+class PostgresCopyLoader(_QueuedLoader):
+    """COPY (binary) into a staging table, then INSERT ... ON CONFLICT DO UPDATE into the target"""
+
+    batch_rows = COPY_BATCH_ROWS
+
+    def __init__(self, dsn: str, table: str, conflict_columns: Sequence[str], **kwargs):
+        if not PSYCOPG_AVAILABLE:
+            raise ImportError("psycopg not installed. Install with: pip install \"psycopg[binary]\"")
+        super().__init__(table, conflict_columns, **kwargs)
+        self.dsn = dsn
+        self._conn = None
+        self._column_oids: Dict[str, int] = {}
+        self._staged_columns: Optional[List[str]] = None
+
+    def _connect(self):
+        if self._conn is not None:
+            return self._conn
+        self._conn = psycopg.connect(self.dsn)
+        vector_info = TypeInfo.fetch(self._conn, "vector")
+        if vector_info is not None:
+            dumper = type("VectorBinaryDumper", (_VectorBinaryDumper,), {"oid": vector_info.oid})
+            self._conn.adapters.register_dumper(np.ndarray, dumper)
+        with self._conn.cursor() as cur:
+            cur.execute(
+                "SELECT attname, atttypid FROM pg_attribute "
+                "WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped ORDER BY attnum",
+                (self.table,)
+            )
+            self._column_oids = {name: oid for name, oid in cur.fetchall()}
+        self._conn.commit()
+        return self._conn
+
+    def _stage(self, columns: List[str]):
+        """(Re)create the session's staging table for these columns"""
+        conn = self._conn
+        with conn.cursor() as cur:
+            cur.execute("DROP TABLE IF EXISTS pg_temp._bulk_stage")
+            cur.execute(sql.SQL(
+                "CREATE TEMP TABLE _bulk_stage AS SELECT {cols} FROM {table} WITH NO DATA"
+            ).format(cols=sql.SQL(", ").join(map(sql.Identifier, columns)), table=sql.Identifier(self.table)))
+            # Arrival order, so the last copy of a duplicated key wins the merge
+            cur.execute("ALTER TABLE _bulk_stage ADD COLUMN _seq BIGSERIAL")
+        conn.commit()
+        self._staged_columns = columns
+
+    def _merge_sql(self, columns: List[str]):
+        cols = sql.SQL(", ").join(map(sql.Identifier, columns))
+        keys = sql.SQL(", ").join(map(sql.Identifier, self.conflict_columns))
+        updates = [c for c in columns if c not in self.conflict_columns]
+        if updates:
+            # A key missing from a row stages as NULL; keep the stored value rather than erasing it
+            action = sql.SQL("DO UPDATE SET ") + sql.SQL(", ").join(
+                sql.SQL("{c} = COALESCE(EXCLUDED.{c}, t.{c})").format(c=sql.Identifier(c)) for c in updates
+            )
+        else:
+            action = sql.SQL("DO NOTHING")
+        return sql.SQL(
+            "INSERT INTO {table} AS t ({cols}) "
+            "SELECT DISTINCT ON ({keys}) {cols} FROM _bulk_stage ORDER BY {keys}, _seq DESC "
+            "ON CONFLICT ({keys}) {action}"
+        ).format(table=sql.Identifier(self.table), cols=cols, keys=keys, action=action)
+
+    def _write(self, rows: List[Dict[str, Any]]) -> int:
+        conn = self._connect()
+        # Union of every row's keys, in table column order (rows need not share a key set)
+        keys = set().union(*(row.keys() for row in rows))
+        missing = sorted(keys.difference(self._column_oids))
+        if missing:
+            raise ValueError(f"Columns not in {self.table}: {', '.join(missing)}")
+        columns = [c for c in self._column_oids if c in keys or c in self.conflict_columns]
+        if columns != self._staged_columns:
+            self._stage(columns)
+
+        try:
+            with conn.cursor() as cur:
+                copy_sql = sql.SQL("COPY _bulk_stage ({cols}) FROM STDIN (FORMAT BINARY)").format(
+                    cols=sql.SQL(", ").join(map(sql.Identifier, columns))
+                )
+                with cur.copy(copy_sql) as copy:
+                    copy.set_types([self._column_oids[c] for c in columns])
+                    for row in rows:
+                        copy.write_row([row.get(c) for c in columns])
+                cur.execute(self._merge_sql(columns))
+                cur.execute("TRUNCATE _bulk_stage")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            self.stats.failed += len(rows)
+            raise
+        return len(rows)
+
+    def _close_connection(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class RestUpsertLoader(_QueuedLoader):
+    """PostgREST upserts (supabase-py) on the conflict key, for when no database URL is configured"""
+
+    batch_rows = REST_BATCH_ROWS
+
+    def __init__(self, supabase_client, table: str, conflict_columns: Sequence[str], **kwargs):
+        super().__init__(table, conflict_columns, **kwargs)
+        self.client = supabase_client
+
+    def _write(self, rows: List[Dict[str, Any]]) -> int:
+        on_conflict = ",".join(self.conflict_columns)
+        # PostgREST serializes vectors as JSON arrays
+        payload = [{k: (v.tolist() if isinstance(v, np.ndarray) else v) for k, v in row.items()} for row in rows]
+        try:
+            self.client.table(self.table).upsert(payload, on_conflict=on_conflict).execute()
+            return len(rows)
+        except Exception as e:
+            print(f"  ERROR: Upsert of {len(rows)} rows into {self.table} failed: {e}")
+            # Row by row, to isolate the bad record; upserts keep retries idempotent
+            written = 0
+            for row in payload:
+                try:
+                    self.client.table(self.table).upsert(row, on_conflict=on_conflict).execute()
+                    written += 1
+                except Exception as e2:
+                    print(f"    ERROR: Failed to upsert {[row.get(c) for c in self.conflict_columns]}: {e2}")
+            self.stats.failed += len(rows) - written
+            return written
+
+
+def open_loader(table: str, conflict_columns: Sequence[str], supabase_client=None,
+                dsn: Optional[str] = None, **kwargs) -> Optional[_QueuedLoader]:
+    """
+    Loader for table: COPY + merge when a database URL and psycopg are available,
+    else PostgREST upserts through supabase_client, else None.
+    """
+    dsn = dsn or SUPABASE_DB_URL
+    if dsn and PSYCOPG_AVAILABLE:
+        return PostgresCopyLoader(dsn, table, conflict_columns, **kwargs)
+    if dsn:
+        print("WARNING: SUPABASE_DB_URL is set but psycopg is not installed; using PostgREST upserts")
+    if supabase_client is not None:
+        return RestUpsertLoader(supabase_client, table, conflict_columns, **kwargs)
+    return None
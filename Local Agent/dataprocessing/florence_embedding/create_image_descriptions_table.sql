@@ -55,9 +55,26 @@ CREATE INDEX IF NOT EXISTS idx_image_descriptions_summary_embedding ON image_des
 CREATE INDEX IF NOT EXISTS idx_image_descriptions_search_text ON image_descriptions 
   USING gin(to_tsvector('english', coalesce(summary, '') || ' ' || coalesce(text_verbatim, '')));
 
--- Composite unique constraint to prevent duplicates
+-- Composite unique constraint to prevent duplicates.
+-- This is the ON CONFLICT key of json_to_supabase.py (CONFLICT_COLUMNS) for both
+-- the COPY merge and PostgREST upserts. NULLS NOT DISTINCT (Postgres 15+) makes
+-- page-level rows (region_number NULL) conflict too, instead of duplicating.
 CREATE UNIQUE INDEX IF NOT EXISTS idx_image_descriptions_unique 
-  ON image_descriptions(project_key, page_num, region_number);
+  ON image_descriptions(project_key, page_num, region_number) NULLS NOT DISTINCT;
+
+-- Migration for tables created before this index (or with the older NULLS DISTINCT
+-- version of it): remove duplicate rows, keeping the most recent, then rebuild the index.
+--
+--   DELETE FROM image_descriptions a
+--     USING image_descriptions b
+--    WHERE a.project_key = b.project_key
+--      AND a.page_num = b.page_num
+--      AND a.region_number IS NOT DISTINCT FROM b.region_number
+--      AND (a.updated_at, a.id) < (b.updated_at, b.id);
+--
+--   DROP INDEX IF EXISTS idx_image_descriptions_unique;
+--   CREATE UNIQUE INDEX idx_image_descriptions_unique
+--     ON image_descriptions(project_key, page_num, region_number) NULLS NOT DISTINCT;
 
 -- Comments for documentation
 COMMENT ON TABLE image_descriptions IS 'Structured descriptions of engineering drawing regions with text embeddings';
@@ -22,6 +22,8 @@ Usage:
 import os
 import json
 import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 from typing import List, Dict, Any, Optional
@@ -66,6 +68,9 @@ from PIL import Image
 import cv2
 import hashlib
 
+from image_catalog import ImageCatalog, open_catalog, STAGE_FLORENCE_EMBEDDING
+from bulk_loader import open_loader
+
 try:
     from supabase import create_client, Client
     SUPABASE_AVAILABLE = True
@@ -85,6 +90,10 @@ if TRANSFORMERS_AVAILABLE:
 DEFAULT_CONFIG = {
     "model_id": "microsoft/Florence-2-base-ft",  # Florence-2 model: base-ft (works on Windows, no flash_attn needed)
     "batch_size": 8,  # Can use larger batch size with base model
+    "num_workers": min(8, os.cpu_count() or 1),  # Threads decoding/preprocessing images ahead of the model
+    "prefetch_batches": 2,  # Batches prepared ahead of the forward pass
+    "num_threads": None,  # torch intra-op threads (None = torch default)
+    "precision": "fp32",  # "fp32", "bf16" (autocast) or "int8" (dynamic quantization, CPU only)
     "device": _device,
     "embedding_dim": 1024,  # Florence-2-base-ft: 1024 dimensions
     "preprocess_mode": "normalize_lines",  # Options: "none", "normalize_lines", "edge_detection", "adaptive_threshold"
@@ -395,211 +404,288 @@ def preprocess_image(image: Image.Image, mode: str = "normalize_lines") -> Image
 # =============================
 # Image Embedding
 # =============================
-def embed_image(image_path: str, model, processor, device: str = "cpu", 
-                preprocess_mode: str = "normalize_lines") -> np.ndarray:
-    """Generate embedding for a single image using Florence-2 vision encoder"""
+def load_and_preprocess_image(image_path: str, preprocess_mode: str = "normalize_lines") -> Optional[Image.Image]:
+    """Decode and preprocess one image (CPU work that runs in the loader's worker threads)"""
     try:
-        image = Image.open(image_path).convert("RGB")
-        
+        with Image.open(image_path) as img:
+            image = img.convert("RGB")
         # Preprocess image to normalize line weights (optional, but can help for technical drawings)
-        image = preprocess_image(image, mode=preprocess_mode)
-        
-        # Process image with Florence-2 processor
-        inputs = processor(images=image, return_tensors="pt")
-        pixel_values = inputs["pixel_values"].to(device)
+        return preprocess_image(image, mode=preprocess_mode)
+    except Exception as e:
+        print(f"  WARNING: Error loading {image_path}: {e}")
+        return None
+
+
+def prepare_batch(image_paths: List[str], processor, preprocess_mode: str = "normalize_lines",
+                  executor: Optional[ThreadPoolExecutor] = None):
+    """
+    Decode, preprocess and run the Florence-2 processor for a batch of images.
+    
+    Returns:
+        (pixel_values, valid_positions): stacked [n_valid, 3, H, W] tensor (None if no image
+        loaded) and the positions in image_paths that it covers
+    """
+    if executor is not None:
+        images = list(executor.map(lambda p: load_and_preprocess_image(p, preprocess_mode), image_paths))
+    else:
+        images = [load_and_preprocess_image(p, preprocess_mode) for p in image_paths]
+    
+    valid_positions = [i for i, image in enumerate(images) if image is not None]
+    if not valid_positions:
+        return None, []
+    
+    # One processor call resizes/normalizes the whole batch into a single stacked tensor
+    inputs = processor(images=[images[i] for i in valid_positions], return_tensors="pt")
+    return inputs["pixel_values"], valid_positions
+
+
+def _model_dtype(model):
+    """Floating dtype the model's (non-quantized) weights use"""
+    for param in model.parameters():
+        if param.is_floating_point():
+            return param.dtype
+    return torch.float32
+
+
+def _encode_pixel_values(model, processor, pixel_values, device: str):
+    """Run the vision encoder on a stacked batch; returns features [batch, seq_len, hidden_dim] or [batch, hidden_dim]"""
+    # Method 1: Use _encode_image if available (preferred method)
+    if hasattr(model, '_encode_image'):
+        vision_outputs = model._encode_image(pixel_values)
+        # _encode_image returns (batch, seq_len, hidden_dim) or tuple
+        return vision_outputs[0] if isinstance(vision_outputs, tuple) else vision_outputs
+    
+    # Method 2: Access vision_tower directly
+    vision_tower = None
+    if hasattr(model, 'vision_tower'):
+        vision_tower = model.vision_tower
+    elif hasattr(model, 'model') and hasattr(model.model, 'vision_tower'):
+        vision_tower = model.model.vision_tower
+    if vision_tower is not None:
+        vision_outputs = vision_tower(pixel_values)
+        if isinstance(vision_outputs, tuple):
+            return vision_outputs[0]
+        if hasattr(vision_outputs, 'last_hidden_state'):
+            return vision_outputs.last_hidden_state
+        return vision_outputs
+    
+    # Method 3: Use forward pass with a minimal prompt (one prompt per image in the batch)
+    inputs_text = processor(text=["<CAPTION>"] * pixel_values.shape[0], return_tensors="pt", padding=True)
+    inputs_text = {k: v.to(device) for k, v in inputs_text.items()}
+    outputs = model(pixel_values=pixel_values, **inputs_text, output_hidden_states=True)
+    
+    # Extract vision encoder outputs from hidden states
+    if hasattr(outputs, 'vision_hidden_states') and outputs.vision_hidden_states:
+        return outputs.vision_hidden_states[-1]  # Last layer
+    if hasattr(outputs, 'hidden_states') and outputs.hidden_states:
+        # Use first hidden state (vision encoder output)
+        return outputs.hidden_states[0]
+    raise ValueError("Could not find vision encoder outputs in model. Available attributes: " +
+                     str(dir(outputs)))
+
+
+def encode_batch(pixel_values, model, processor, device: str = "cpu", precision: str = "fp32") -> np.ndarray:
+    """
+    One forward pass for a stacked batch of pixel values.
+    
+    Returns:
+        L2-normalized float32 embeddings, shape [batch, hidden_dim]
+    """
+    pixel_values = pixel_values.to(device, dtype=_model_dtype(model))
+    
+    with torch.inference_mode():
+        if precision == "bf16":
+            with torch.autocast(device_type="cuda" if device.startswith("cuda") else "cpu", dtype=torch.bfloat16):
+                vision_features = _encode_pixel_values(model, processor, pixel_values, device)
+        else:
+            vision_features = _encode_pixel_values(model, processor, pixel_values, device)
         
-        # Extract vision encoder features
-        with torch.no_grad():
-            # Method 1: Use _encode_image if available (preferred method)
-            if hasattr(model, '_encode_image'):
-                vision_outputs = model._encode_image(pixel_values)
-                # _encode_image returns (batch, seq_len, hidden_dim) or tuple
-                if isinstance(vision_outputs, tuple):
-                    vision_features = vision_outputs[0]
-                else:
-                    vision_features = vision_outputs
-            # Method 2: Access vision_tower directly
-            elif hasattr(model, 'vision_tower'):
-                vision_outputs = model.vision_tower(pixel_values)
-                if isinstance(vision_outputs, tuple):
-                    vision_features = vision_outputs[0]
-                elif hasattr(vision_outputs, 'last_hidden_state'):
-                    vision_features = vision_outputs.last_hidden_state
-                else:
-                    vision_features = vision_outputs
-            elif hasattr(model, 'model') and hasattr(model.model, 'vision_tower'):
-                vision_outputs = model.model.vision_tower(pixel_values)
-                if isinstance(vision_outputs, tuple):
-                    vision_features = vision_outputs[0]
-                elif hasattr(vision_outputs, 'last_hidden_state'):
-                    vision_features = vision_outputs.last_hidden_state
-                else:
-                    vision_features = vision_outputs
-            else:
-                # Method 3: Use forward pass with a minimal prompt
-                # Use a simple task prompt to extract vision features
-                inputs_text = processor(text="<CAPTION>", return_tensors="pt", padding=True)
-                inputs_text = {k: v.to(device) for k, v in inputs_text.items()}
-                
-                # Forward pass to get vision features
-                outputs = model(pixel_values=pixel_values, **inputs_text, output_hidden_states=True)
-                
-                # Extract vision encoder outputs from hidden states
-                if hasattr(outputs, 'vision_hidden_states') and outputs.vision_hidden_states:
-                    vision_features = outputs.vision_hidden_states[-1]  # Last layer
-                elif hasattr(outputs, 'hidden_states') and outputs.hidden_states:
-                    # Use first hidden state (vision encoder output)
-                    vision_features = outputs.hidden_states[0]
-                else:
-                    raise ValueError("Could not find vision encoder outputs in model. Available attributes: " + 
-                                   str(dir(outputs)))
-            
-            # Aggregate vision tokens into a single embedding vector
-            # Vision features shape: [batch, seq_len, hidden_dim] for DaViT
-            if len(vision_features.shape) == 3:  # [batch, seq_len, hidden_dim]
-                # Mean pool over sequence dimension to get a single vector per image
-                embedding = vision_features.mean(dim=1).squeeze(0)  # [hidden_dim]
-            elif len(vision_features.shape) == 2:  # [batch, hidden_dim] - already pooled
-                embedding = vision_features.squeeze(0)  # [hidden_dim]
-            else:
-                # Flatten if needed
-                embedding = vision_features.flatten()
-                # If too large, take first N dimensions (shouldn't happen)
-                if len(embedding) > 2048:
-                    embedding = embedding[:2048]
-            
-            # Convert to numpy and normalize
-            embedding = embedding.cpu().numpy()
-            
-            # Ensure it's 1D
-            if len(embedding.shape) > 1:
-                embedding = embedding.flatten()
-            
-            # Normalize embedding (L2 normalization for cosine similarity)
-            norm = np.linalg.norm(embedding)
-            if norm > 0:
-                embedding = embedding / norm
-            else:
-                # If norm is zero, return zeros (shouldn't happen)
-                embedding = np.zeros_like(embedding)
+        # Aggregate vision tokens into a single embedding vector per image
+        # Vision features shape: [batch, seq_len, hidden_dim] for DaViT
+        if vision_features.dim() == 3:
+            # Mean pool over sequence dimension
+            embeddings = vision_features.mean(dim=1)
+        elif vision_features.dim() == 2:  # [batch, hidden_dim] - already pooled
+            embeddings = vision_features
+        else:
+            # Flatten per image if needed; if too large, take first N dimensions (shouldn't happen)
+            embeddings = vision_features.reshape(vision_features.shape[0], -1)[:, :2048]
         
-        return embedding.astype(np.float32)
+        embeddings = embeddings.float().cpu().numpy()
     
-    except Exception as e:
-        print(f"  WARNING: Error embedding {image_path}: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
+    # Normalize embeddings (L2 normalization for cosine similarity); zero vectors stay zero
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    embeddings = np.divide(embeddings, norms, out=np.zeros_like(embeddings), where=norms > 0)
+    return embeddings.astype(np.float32)
 
 
 def embed_images_batch(image_paths: List[str], model, processor, device: str = "cpu",
-                       preprocess_mode: str = "normalize_lines") -> List[np.ndarray]:
-    """Generate embeddings for a batch of images"""
-    embeddings = []
-    
-    for image_path in image_paths:
-        embedding = embed_image(image_path, model, processor, device, preprocess_mode)
-        if embedding is not None:
-            embeddings.append(embedding)
-        else:
-            embeddings.append(None)
+                       preprocess_mode: str = "normalize_lines", precision: str = "fp32",
+                       executor: Optional[ThreadPoolExecutor] = None) -> List[Optional[np.ndarray]]:
+    """
+    Generate embeddings for a batch of images with a single forward pass.
+    
+    Returns a list aligned with image_paths (None for images that failed).
+    """
+    pixel_values, valid_positions = prepare_batch(image_paths, processor, preprocess_mode, executor)
+    return _embed_prepared(image_paths, pixel_values, valid_positions, model, processor, device, precision)
+
+
+def _embed_prepared(image_paths: List[str], pixel_values, valid_positions: List[int],
+                    model, processor, device: str, precision: str) -> List[Optional[np.ndarray]]:
+    """Encode a prepared batch; if the batched pass fails, retry image by image to isolate the bad one"""
+    results: List[Optional[np.ndarray]] = [None] * len(image_paths)
+    if pixel_values is None:
+        return results
     
-    return embeddings
+    try:
+        embeddings = encode_batch(pixel_values, model, processor, device, precision)
+        for row, position in enumerate(valid_positions):
+            results[position] = embeddings[row]
+    except Exception as e:
+        print(f"  WARNING: Batched forward pass failed ({e}); retrying images individually")
+        for row, position in enumerate(valid_positions):
+            try:
+                results[position] = encode_batch(pixel_values[row:row + 1], model, processor, device, precision)[0]
+            except Exception as e2:
+                print(f"  WARNING: Error embedding {image_paths[position]}: {e2}")
+    return results
+
+
+def embed_image(image_path: str, model, processor, device: str = "cpu", 
+                preprocess_mode: str = "normalize_lines", precision: str = "fp32") -> np.ndarray:
+    """Generate embedding for a single image using Florence-2 vision encoder"""
+    return embed_images_batch([image_path], model, processor, device, preprocess_mode, precision)[0]
+
+
+def iter_embedded_batches(images: List[Dict[str, Any]], model, processor, device: str = "cpu",
+                          batch_size: int = 8, preprocess_mode: str = "normalize_lines",
+                          precision: str = "fp32", num_workers: int = 4, prefetch: int = 2):
+    """
+    DataLoader-style pipeline: worker threads decode/preprocess upcoming batches
+    while the current batch runs through the model.
+    
+    Yields:
+        (batch_image_infos, embeddings) with embeddings aligned to the batch (None = failed)
+    """
+    batches = [images[i:i + batch_size] for i in range(0, len(images), batch_size)]
+    num_workers = max(1, num_workers)
+    
+    # Decoding/preprocessing (PIL, OpenCV) releases the GIL, so threads overlap with the forward pass
+    with ThreadPoolExecutor(max_workers=num_workers) as image_pool, \
+            ThreadPoolExecutor(max_workers=max(1, prefetch)) as batch_pool:
+        def submit(batch):
+            paths = [img["image_path"] for img in batch]
+            return batch_pool.submit(prepare_batch, paths, processor, preprocess_mode, image_pool)
+        
+        pending = deque()
+        next_batch = 0
+        while next_batch < len(batches) and len(pending) < max(1, prefetch):
+            pending.append((batches[next_batch], submit(batches[next_batch])))
+            next_batch += 1
+        
+        while pending:
+            batch, future = pending.popleft()
+            if next_batch < len(batches):
+                pending.append((batches[next_batch], submit(batches[next_batch])))
+                next_batch += 1
+            paths = [img["image_path"] for img in batch]
+            try:
+                pixel_values, valid_positions = future.result()
+            except Exception as e:
+                print(f"  WARNING: Error preparing batch: {e}")
+                pixel_values, valid_positions = None, []
+            yield batch, _embed_prepared(paths, pixel_values, valid_positions, model, processor, device, precision)
+
+
+def optimize_model_for_inference(model, device: str = "cpu", precision: str = "fp32", num_threads: Optional[int] = None):
+    """
+    Apply CPU inference settings.
+    
+    Args:
+        precision: "fp32", "bf16" (autocast during encode_batch) or "int8"
+            (dynamic quantization of Linear layers, CPU only)
+        num_threads: torch intra-op threads (default: torch's choice)
+    """
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if precision == "int8":
+        if device != "cpu":
+            print("WARNING: int8 dynamic quantization is CPU-only; using fp32 weights")
+            return model
+        print("   Applying int8 dynamic quantization to Linear layers...")
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        model.eval()
+    return model
 
 
 # =============================
 # Find All Images
 # =============================
-def find_all_images(output_dir: Path, only_page_subfolders: bool = True, start_from_project: Optional[str] = None) -> List[Dict[str, Any]]:
+def find_all_images(output_dir: Path, only_page_subfolders: bool = True, start_from_project: Optional[str] = None,
+                    catalog: Optional[ImageCatalog] = None) -> List[Dict[str, Any]]:
     """Find all PNG images in output directory, preserving structure
     
+    Discovery goes through the persistent image catalog: only new or changed files
+    are hashed, and manifest entries are matched to files by path.
+    
     Args:
         output_dir: Directory to scan for images
         only_page_subfolders: If True, only include images in page_XXX subfolders (skip root images)
+        start_from_project: Skip projects before this project number
+        catalog: Catalog to use (default: open_catalog(output_dir))
     """
-    images = []
-    
-    # Walk through output directory
-    for project_dir in sorted(output_dir.iterdir()):
-        if not project_dir.is_dir():
-            continue
-        
-        project_number = project_dir.name
-        
-        # Skip projects before start_from_project if specified
-        if start_from_project and project_number < start_from_project:
-            continue
-        
-        # Look for manifest.json
-        manifest_path = project_dir / "manifest.json"
-        if manifest_path.exists():
-            try:
-                with open(manifest_path, 'r', encoding='utf-8') as f:
-                    manifest = json.load(f)
-                
-                # Process each image from manifest
-                for img_info in manifest.get("images", []):
-                    filename = img_info.get("filename")
-                    relative_path = img_info.get("relative_path", filename)
-                    
-                    # Skip full page images if only_page_subfolders is True
-                    if only_page_subfolders and img_info.get("type") == "full_page":
-                        continue
-                    
-                    # Determine full path
-                    if img_info.get("type") == "full_page":
-                        image_path = project_dir / filename
-                    else:
-                        # Region crop - use relative_path
-                        image_path = project_dir / relative_path
-                    
-                    if image_path.exists() and image_path.suffix.lower() == ".png":
-                        images.append({
-                            "image_path": str(image_path),
-                            "project_number": project_number,
-                            "filename": filename,
-                            "relative_path": relative_path if img_info.get("type") == "region_crop" else filename,
-                            "type": img_info.get("type", "unknown"),
-                            "page_number": img_info.get("page_number"),
-                            "metadata": img_info
-                        })
-            except Exception as e:
-                print(f"  WARNING: Error reading manifest {manifest_path}: {e}")
-        
-        # Also scan for PNG files directly (fallback)
-        for png_file in project_dir.rglob("*.png"):
-            # Skip if already in manifest
-            if any(img["image_path"] == str(png_file) for img in images):
-                continue
-            
-            # If only_page_subfolders, check if image is in a page_XXX subfolder
-            if only_page_subfolders:
-                rel_path = png_file.relative_to(project_dir)
-                # Check if path contains page_XXX pattern
-                path_parts = rel_path.parts
-                is_in_page_folder = any(part.startswith("page_") for part in path_parts)
-                if not is_in_page_folder:
-                    continue  # Skip images not in page subfolders
-            
-            rel_path = png_file.relative_to(project_dir)
-            images.append({
-                "image_path": str(png_file),
-                "project_number": project_number,
-                "filename": png_file.name,
-                "relative_path": str(rel_path),
-                "type": "region_crop" if only_page_subfolders else "unknown",
-                "page_number": None,
-                "metadata": {}
-            })
-    
-    return images
+    owns_catalog = catalog is None
+    if owns_catalog:
+        catalog = open_catalog(output_dir)
+    try:
+        stats = catalog.scan(output_dir, extensions=(".png",), start_from_project=start_from_project)
+        print(f"   Catalog: {stats['added']} new, {stats['updated']} changed, "
+              f"{stats['removed']} removed, {stats['unchanged']} unchanged")
+        images = catalog.images(output_dir, only_page_subfolders=only_page_subfolders,
+                                start_from_project=start_from_project)
+    finally:
+        if owns_catalog:
+            catalog.close()
+    # Root-level files belong to no project
+    return [img for img in images if img["project_number"]]
 
 
 # =============================
 # Save Embeddings
 # =============================
+def prepare_supabase_record(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """image_embeddings row for one embedded image (uploads the image to the bucket); None to skip"""
+    project_key = item.get("project_number", "")
+    page_number = item.get("page_number")
+    image_path = item.get("image_path", "")
+    
+    if not project_key or page_number is None or not image_path:
+        return None
+    
+    # Upload image to bucket and get URL
+    image_url = upload_image_to_bucket(image_path, SUPABASE_CONFIG["bucket_name"])
+    if not image_url:
+        print(f"  WARNING: Skipping {image_path} - upload failed")
+        return None
+    
+    return {
+        "id": generate_id(project_key, page_number, image_path),
+        "project_key": project_key,
+        "page_number": page_number,
+        "embedding": item["embedding"],
+        "image_url": image_url,
+    }
+
+
+def open_supabase_loader():
+    """Upsert loader for image_embeddings keyed by id (COPY + merge when SUPABASE_DB_URL is set), or None"""
+    return open_loader("image_embeddings", ["id"], supabase_client=get_supabase_client(),
+                       prepare=prepare_supabase_record)
+
+
 def save_embeddings(embeddings: np.ndarray, metadata: List[Dict[str, Any]], 
-                   embeddings_dir: Path, embedding_dim: int):
+                   embeddings_dir: Path, embedding_dim: int, upload_to_supabase: bool = True):
     """Save embeddings to FAISS HNSW index, metadata, and Supabase"""
     embeddings_dir.mkdir(parents=True, exist_ok=True)
     
@@ -634,58 +720,18 @@ def save_embeddings(embeddings: np.ndarray, metadata: List[Dict[str, Any]],
         json.dump(config, f, indent=2, ensure_ascii=False)
     print(f"[OK] Saved config: {config_path}")
     
-    # Save to Supabase
-    supabase = get_supabase_client()
-    if supabase:
-        print(f"\nSaving {len(metadata)} embeddings to Supabase...")
-        bucket_name = SUPABASE_CONFIG["bucket_name"]
-        records = []
-        
-        for embedding, meta in tqdm(zip(embeddings, metadata), desc="Preparing records", total=len(metadata)):
-            project_key = meta.get("project_number", "")
-            page_number = meta.get("page_number")
-            image_path = meta.get("image_path", "")
-            
-            if not project_key or page_number is None or not image_path:
-                continue
-            
-            # Upload image to bucket and get URL
-            image_url = upload_image_to_bucket(image_path, bucket_name)
-            if not image_url:
-                print(f"  WARNING: Skipping {image_path} - upload failed")
-                continue
-            
-            records.append({
-                "id": generate_id(project_key, page_number, image_path),
-                "project_key": project_key,
-                "page_number": page_number,
-                "embedding": embedding.tolist(),
-                "image_url": image_url,
-            })
-        
-        # Batch insert to Supabase
-        if records:
-            chunk_size = 100
-            total_inserted = 0
-            for i in tqdm(range(0, len(records), chunk_size), desc="Uploading to Supabase"):
-                try:
-                    supabase.table("image_embeddings").insert(records[i:i+chunk_size]).execute()
-                    total_inserted += len(records[i:i+chunk_size])
-                except Exception as e:
-                    print(f"  ERROR: Batch {i//chunk_size + 1}: {e}")
-                    # Try one by one
-                    for record in records[i:i+chunk_size]:
-                        try:
-                            supabase.table("image_embeddings").insert(record).execute()
-                            total_inserted += 1
-                        except Exception as e2:
-                            print(f"    ERROR: Failed to insert: {record.get('id', 'unknown')}: {e2}")
-            
-            print(f"[OK] Saved {total_inserted}/{len(records)} embeddings to Supabase")
+    # Save to Supabase (skipped when records were already streamed during embedding)
+    if upload_to_supabase:
+        loader = open_supabase_loader()
+        if loader:
+            print(f"\nSaving {len(metadata)} embeddings to Supabase...")
+            try:
+                loader.load({**meta, "embedding": embedding} for embedding, meta in zip(embeddings, metadata))
+            finally:
+                stats = loader.close()
+            print(f"[OK] Upserted embeddings to Supabase: {stats}")
         else:
-            print("WARNING: No valid records to upload to Supabase")
-    else:
-        print("WARNING: Supabase client not available, skipping Supabase save")
+            print("WARNING: Supabase client not available, skipping Supabase save")
     
     return index_path, metadata_path
 
@@ -722,6 +768,15 @@ Examples:
                        help=f"Batch size for processing (default: {DEFAULT_CONFIG['batch_size']})")
     parser.add_argument("--device", type=str, default=None,
                        help="Device to use (cuda/cpu, default: auto-detect)")
+    parser.add_argument("--num-workers", type=int, default=DEFAULT_CONFIG["num_workers"],
+                       help=f"Image decoding/preprocessing threads (default: {DEFAULT_CONFIG['num_workers']})")
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_CONFIG["prefetch_batches"],
+                       help=f"Batches prepared ahead of the model (default: {DEFAULT_CONFIG['prefetch_batches']})")
+    parser.add_argument("--num-threads", type=int, default=DEFAULT_CONFIG["num_threads"],
+                       help="torch intra-op threads for inference (default: torch default)")
+    parser.add_argument("--precision", type=str, default=DEFAULT_CONFIG["precision"],
+                       choices=["fp32", "bf16", "int8"],
+                       help="Inference precision: fp32, bf16 autocast, or int8 dynamic quantization (CPU) (default: fp32)")
     parser.add_argument("--include-full-pages", action="store_true",
                        help="Include full page images from root (default: only page subfolder images)")
     parser.add_argument("--preprocess-mode", type=str, default="normalize_lines",
@@ -778,6 +833,8 @@ Examples:
     print(f"Model: {args.model_id}")
     print(f"Device: {device}")
     print(f"Batch size: {args.batch_size}")
+    print(f"Loader workers: {args.num_workers} (prefetch {args.prefetch} batches)")
+    print(f"Precision: {args.precision}")
     print(f"Preprocess mode: {args.preprocess_mode}")
     print(f"Embedding dimension: {DEFAULT_CONFIG['embedding_dim']}")
     print(f"{'='*60}\n")
@@ -789,8 +846,10 @@ Examples:
         print("   Filter: Only including images in page_XXX subfolders (skipping root full-page images)")
     if args.start_from_project:
         print(f"   Starting from project: {args.start_from_project}")
-    images = find_all_images(output_dir, only_page_subfolders=only_page_subfolders, start_from_project=args.start_from_project)
-    print(f"[OK] Found {len(images)} images")
+    catalog = open_catalog(output_dir)
+    images = find_all_images(output_dir, only_page_subfolders=only_page_subfolders,
+                             start_from_project=args.start_from_project, catalog=catalog)
+    print(f"[OK] Found {len(images)} images ({len(catalog.pending(STAGE_FLORENCE_EMBEDDING, images))} not yet embedded)")
     
     if len(images) == 0:
         print("ERROR: No images found!")
@@ -801,6 +860,7 @@ Examples:
     try:
         cache_dir = DEFAULT_CONFIG.get("cache_dir")
         model, processor = load_florence2_model(args.model_id, device, cache_dir=cache_dir)
+        model = optimize_model_for_inference(model, device, args.precision, args.num_threads)
     except Exception as e:
         print(f"ERROR: Error loading model: {e}")
         return
@@ -809,18 +869,31 @@ Examples:
     print(f"\nStep 3: Generating embeddings...")
     embeddings_list = []
     metadata_list = []
+    embedded_images = []
     failed_count = 0
     
-    # Process in batches
-    for i in tqdm(range(0, len(images), args.batch_size), desc="Processing batches"):
-        batch = images[i:i + args.batch_size]
-        image_paths = [img["image_path"] for img in batch]
-        
-        batch_embeddings = embed_images_batch(image_paths, model, processor, device, args.preprocess_mode)
-        
+    # Upload to Supabase while embedding continues (bounded queue applies backpressure)
+    supabase_loader = open_supabase_loader()
+    if supabase_loader:
+        supabase_loader.start()
+    else:
+        print("WARNING: Supabase client not available, skipping Supabase save")
+    
+    # Process in batches: one forward pass per batch, next batches decoded meanwhile
+    batches = iter_embedded_batches(
+        images, model, processor, device,
+        batch_size=args.batch_size,
+        preprocess_mode=args.preprocess_mode,
+        precision=args.precision,
+        num_workers=args.num_workers,
+        prefetch=args.prefetch
+    )
+    total_batches = (len(images) + args.batch_size - 1) // args.batch_size
+    for batch, batch_embeddings in tqdm(batches, desc="Processing batches", total=total_batches):
         for img_info, embedding in zip(batch, batch_embeddings):
             if embedding is not None:
                 embeddings_list.append(embedding)
+                embedded_images.append(img_info)
                 metadata_list.append({
                     "index": len(embeddings_list) - 1,
                     "image_path": img_info["image_path"],
@@ -833,6 +906,15 @@ Examples:
                 })
             else:
                 failed_count += 1
+        if supabase_loader:
+            supabase_loader.put([{**img_info, "embedding": embedding}
+                                 for img_info, embedding in zip(batch, batch_embeddings) if embedding is not None])
+    
+    if supabase_loader:
+        try:
+            print(f"[OK] Upserted embeddings to Supabase: {supabase_loader.close()}")
+        except Exception as e:
+            print(f"ERROR: Supabase upload failed: {e}")
     
     if len(embeddings_list) == 0:
         print("ERROR: No embeddings generated!")
@@ -849,8 +931,10 @@ Examples:
             embeddings_array,
             metadata_list,
             embeddings_dir,
-            DEFAULT_CONFIG["embedding_dim"]
+            DEFAULT_CONFIG["embedding_dim"],
+            upload_to_supabase=False
         )
+        catalog.mark_done(STAGE_FLORENCE_EMBEDDING, embedded_images, {"model_id": args.model_id})
         
         print(f"\n{'='*60}")
         print(f"[OK] Embedding complete!")
@@ -864,6 +948,8 @@ Examples:
         print(f"ERROR: Error saving embeddings: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        catalog.close()
 
 
 if __name__ == "__main__":
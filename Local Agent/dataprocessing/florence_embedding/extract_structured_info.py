@@ -22,11 +22,15 @@ import os
 import json
 import base64
 import re
+import asyncio
 from pathlib import Path
-from typing import Dict, Any, List
-from openai import OpenAI
+from typing import Dict, Any, List, Callable
+from openai import OpenAI, AsyncOpenAI
 from tqdm import tqdm
 
+from image_catalog import ImageCatalog, open_catalog, STAGE_STRUCTURED_EXTRACTION
+from extraction_engine import ExtractionEngine, RateLimiter, EngineResponse, CheckpointLog, materialize, write_json_atomic
+
 # Load environment variables from .env file if it exists
 try:
     from dotenv import load_dotenv
@@ -48,6 +52,14 @@ BASE_DIR = r"C:\Users\brian\OneDrive\Desktop\dataprocessing"
 TEST_EMBEDDINGS_DIR = os.getenv("PROJECT_INPUT_DIR", os.path.join(BASE_DIR, "test_embeddings"))
 OUTPUT_DIR = os.path.join(BASE_DIR, "florence_embedding", "structured_json")
 BATCH_SIZE = 5  # Process multiple images per API call
+
+# Concurrency / rate limits (set to your OpenAI tier; refined from response headers at runtime)
+MAX_IN_FLIGHT = int(os.getenv("EXTRACTION_MAX_IN_FLIGHT", "8"))  # Concurrent API requests
+PROJECT_CONCURRENCY = int(os.getenv("EXTRACTION_PROJECT_CONCURRENCY", "4"))  # Projects processed at once
+REQUESTS_PER_MINUTE = float(os.getenv("EXTRACTION_RPM", "500"))
+TOKENS_PER_MINUTE = float(os.getenv("EXTRACTION_TPM", "30000"))
+MAX_RETRIES = int(os.getenv("EXTRACTION_MAX_RETRIES", "5"))
+IMAGE_TOKEN_ESTIMATE = 1105  # Upper bound for one high-detail image tile set
 # =================================================
 
 # System prompt for GPT-4o vision
@@ -246,6 +258,8 @@ Guidelines:
 
 # Initialize client (will be validated in main)
 client = None
+async_client = None
+catalog = None
 
 
 def encode_image(image_path: str) -> str:
@@ -403,12 +417,71 @@ def find_full_page_images(project_dir: Path) -> List[Dict[str, Any]]:
     return full_pages
 
 
-def extract_page_metadata(project_dir: Path, project_id: str) -> Dict[int, Dict[str, Any]]:
+async def vision_completion(engine: ExtractionEngine, system_prompt: str, build_content: Callable[[], List[Dict[str, Any]]],
+                            image_count: int, max_tokens: int, label: str) -> str:
+    """Run one GPT-4o vision request through the engine and return the response text.
+
+    build_content is run (in a worker thread) only once the request holds an
+    in-flight slot, so base64 payloads exist only for requests being sent.
+    """
+    content = None
+
+    async def request() -> EngineResponse:
+        nonlocal content
+        if content is None:
+            content = await asyncio.to_thread(build_content)
+        raw = await async_client.chat.completions.with_raw_response.create(
+            model="gpt-4o",
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": content}
+            ],
+            max_tokens=max_tokens,
+            temperature=0.2,
+            response_format={"type": "json_object"}
+        )
+        response = raw.parse()
+        used_tokens = response.usage.total_tokens if response.usage else None
+        return EngineResponse(response.choices[0].message.content, raw.headers, used_tokens)
+
+    # OpenAI counts max_tokens against the TPM budget when admitting a request
+    estimated_tokens = image_count * IMAGE_TOKEN_ESTIMATE + len(system_prompt) // 4 + max_tokens
+    return await engine.submit(request, estimated_tokens, label=label)
+
+
+def build_page_content(full_pages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """User message content for the page-level pass (all full pages in one request)"""
+    user_content: List[Dict[str, Any]] = [
+        {
+            "type": "text",
+            "text": "Analyze these FULL-PAGE structural drawing sheets and return page-level metadata as described in the system prompt. Output a JSON object with a single key 'pages' containing an array of page metadata objects.",
+        }
+    ]
+
+    for page in full_pages:
+        base64_img = encode_image(str(page["path"]))
+        user_content.append(
+            {
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:image/png;base64,{base64_img}",
+                    "detail": "high",
+                },
+            }
+        )
+        context_text = f"Full page image: {page['filename']}"
+        if page.get("page_number") is not None:
+            context_text += f"\nPage Number: {page['page_number']}"
+        user_content.append({"type": "text", "text": context_text})
+
+    return user_content
+
+
+async def extract_page_metadata(engine: ExtractionEngine, project_dir: Path, project_id: str) -> Dict[int, Dict[str, Any]]:
     """Run a first-pass analysis over full-page images to get sheet-level context.
 
     Returns a mapping: page_number -> page_metadata_dict
     """
-    global client
 
     # Check if page metadata already exists
     output_dir = Path(OUTPUT_DIR) / project_id
@@ -435,44 +508,13 @@ def extract_page_metadata(project_dir: Path, project_id: str) -> Dict[int, Dict[
 
     print(f"   📄 Found {len(full_pages)} full-page images for page-level analysis")
 
-    # Build a single multi-image request for all full pages
-    user_content: List[Dict[str, Any]] = [
-        {
-            "type": "text",
-            "text": "Analyze these FULL-PAGE structural drawing sheets and return page-level metadata as described in the system prompt. Output a JSON object with a single key 'pages' containing an array of page metadata objects.",
-        }
-    ]
-
-    for page in full_pages:
-        base64_img = encode_image(str(page["path"]))
-        user_content.append(
-            {
-                "type": "image_url",
-                "image_url": {
-                    "url": f"data:image/png;base64,{base64_img}",
-                    "detail": "high",
-                },
-            }
-        )
-        context_text = f"Full page image: {page['filename']}"
-        if page.get("page_number") is not None:
-            context_text += f"\nPage Number: {page['page_number']}"
-        user_content.append({"type": "text", "text": context_text})
-
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": PAGE_EXTRACTION_PROMPT},
-                {"role": "user", "content": user_content},
-            ],
-            max_tokens=8192,
-            temperature=0.2,
-            response_format={"type": "json_object"},
+        # Single multi-image request for all full pages
+        result_text = await vision_completion(
+            engine, PAGE_EXTRACTION_PROMPT, lambda: build_page_content(full_pages),
+            image_count=len(full_pages), max_tokens=8192, label=f"{project_id} page metadata"
         )
-
-        result_text = response.choices[0].message.content
-        result_json = parse_json_with_retry(result_text)
+        result_json = await asyncio.to_thread(parse_json_with_retry, result_text)
 
         pages_array = result_json.get("pages", [])
         page_context: Dict[int, Dict[str, Any]] = {}
@@ -504,8 +546,7 @@ def extract_page_metadata(project_dir: Path, project_id: str) -> Dict[int, Dict[
         output_dir = Path(OUTPUT_DIR) / project_id
         output_dir.mkdir(parents=True, exist_ok=True)
         page_meta_file = output_dir / f"page_metadata_{project_id}.json"
-        with open(page_meta_file, "w", encoding="utf-8") as f:
-            json.dump({"pages": list(page_context.values())}, f, indent=2, ensure_ascii=False)
+        write_json_atomic(page_meta_file, {"pages": list(page_context.values())})
 
         print(f"   💾 Saved page-level metadata to: {page_meta_file}")
 
@@ -519,42 +560,45 @@ def extract_page_metadata(project_dir: Path, project_id: str) -> Dict[int, Dict[
         return {}
 
 
+def get_catalog() -> ImageCatalog:
+    """Shared image catalog for TEST_EMBEDDINGS_DIR (opened on first use)"""
+    global catalog
+    if catalog is None:
+        catalog = open_catalog(TEST_EMBEDDINGS_DIR)
+    return catalog
+
+
 def find_all_region_images(project_dir: Path) -> List[Dict[str, Any]]:
-    """Find all region images in a project directory"""
-    images = []
+    """Find all region images (page_XXX/region_*_red_box.png) in a project directory via the image catalog"""
+    image_catalog = get_catalog()
+    image_catalog.scan(project_dir.parent, project=project_dir.name)
     
-    # Look for page_XXX subdirectories
-    for page_dir in sorted(project_dir.glob("page_*")):
-        if not page_dir.is_dir():
+    images = []
+    for img in image_catalog.images(project_dir.parent, project=project_dir.name, name_pattern="region_*_red_box.png"):
+        img_path = Path(img["image_path"])
+        rel_parts = img_path.relative_to(project_dir).parts
+        # Only crops directly inside a page_XXX subdirectory
+        if len(rel_parts) != 2 or not re.match(r'page_\d+', rel_parts[0]):
             continue
         
-        # Extract page number
-        page_match = re.search(r'page_(\d+)', page_dir.name)
-        page_number = int(page_match.group(1)) if page_match else None
-        
-        # Find all region images in this page directory
-        for img_path in sorted(page_dir.glob("region_*_red_box.png")):
-            # Extract region number
-            region_match = re.search(r'region_(\d+)_red_box', img_path.name)
-            region_number = int(region_match.group(1)) if region_match else None
-            
-            images.append({
-                "path": img_path,
-                "filename": img_path.name,
-                "page_number": page_number,
-                "region_number": region_number,
-                "relative_path": f"{page_dir.name}/{img_path.name}"
-            })
+        page_match = re.search(r'page_(\d+)', rel_parts[0])
+        images.append({
+            "path": img_path,
+            "filename": img_path.name,
+            "page_number": int(page_match.group(1)),
+            "region_number": img["region_number"],
+            "relative_path": f"{rel_parts[0]}/{img_path.name}",
+            "catalog_record": img
+        })
     
     return images
 
 
-def process_image_batch(
+def build_region_content(
     image_data_list: List[Dict[str, Any]],
-    project_id: str,
     page_context: Dict[int, Dict[str, Any]] | None = None,
 ) -> List[Dict[str, Any]]:
-    """Process a batch of region images with GPT-4o vision.
+    """User message content for one batch of region images.
 
     If page_context is provided, it should be a mapping from page_number to the
     page-level metadata returned by extract_page_metadata, and that context
@@ -610,23 +654,27 @@ def process_image_batch(
         context_text = "\n".join(context_lines)
         user_content.append({"type": "text", "text": context_text})
     
+    return user_content
+
+
+async def process_image_batch(
+    engine: ExtractionEngine,
+    image_data_list: List[Dict[str, Any]],
+    project_id: str,
+    page_context: Dict[int, Dict[str, Any]] | None = None,
+    label: str = "batch",
+) -> List[Dict[str, Any]]:
+    """Process a batch of region images with GPT-4o vision (see build_region_content for page_context)"""
+    
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": EXTRACTION_PROMPT},
-                {"role": "user", "content": user_content}
-            ],
-            max_tokens=16384,
-            temperature=0.2,
-            response_format={"type": "json_object"}
+        result_text = await vision_completion(
+            engine, EXTRACTION_PROMPT, lambda: build_region_content(image_data_list, page_context),
+            image_count=len(image_data_list), max_tokens=16384, label=label
         )
         
-        result_text = response.choices[0].message.content
-        
         # Parse JSON with retry and repair
         try:
-            result_json = parse_json_with_retry(result_text)
+            result_json = await asyncio.to_thread(parse_json_with_retry, result_text)
         except json.JSONDecodeError as e:
             print(f"      ⚠️ JSON parsing failed after retries. Saving raw response for debugging...")
             # Save raw response for debugging
@@ -659,14 +707,14 @@ def process_image_batch(
         return images_array
     
     except Exception as e:
-        print(f"      ❌ Batch failed: {e}")
+        print(f"      ❌ {label} failed: {e}")
         import traceback
         traceback.print_exc()
         return []
 
 
-def process_project(project_id: str):
-    """Process all region images for a single project"""
+async def process_project_async(engine: ExtractionEngine, project_id: str):
+    """Process all region images for a single project, all batches concurrently through the engine"""
     
     project_dir = Path(TEST_EMBEDDINGS_DIR) / project_id
     output_dir = Path(OUTPUT_DIR) / project_id
@@ -679,13 +727,14 @@ def process_project(project_id: str):
     output_dir.mkdir(parents=True, exist_ok=True)
     
     output_file = output_dir / f"structured_{project_id}.json"
+    checkpoint = CheckpointLog(output_dir / f"checkpoint_{project_id}.jsonl")
     
     print(f"\n--- Processing Project: {project_id} ---")
     print(f"   Input: {project_dir}")
     print(f"   Output: {output_file}")
     
     # Find all region images first to check if we need to do anything
-    region_images = find_all_region_images(project_dir)
+    region_images = await asyncio.to_thread(find_all_region_images, project_dir)
     
     if not region_images:
         print(f"   ⚠️ No region images found in {project_dir}")
@@ -695,19 +744,33 @@ def process_project(project_id: str):
     
     # Load existing data if resuming
     existing_data = {"images": []}
-    existing_ids = set()
     
     if output_file.exists():
         try:
             with open(output_file, 'r', encoding='utf-8') as f:
                 existing_data = json.load(f)
-                existing_ids = {img.get("image_id") for img in existing_data.get("images", [])}
-            print(f"   📂 Resuming: {len(existing_ids)} images already processed")
         except Exception as e:
             print(f"   ⚠️ Could not load existing file: {e}")
     
+    # Keyed by page/region path: region filenames repeat across pages
+    def result_key(img: Dict[str, Any]) -> str:
+        return img.get("relative_path") or img.get("image_id")
+    
+    # Fold results checkpointed by an interrupted run into the project JSON
+    checkpointed = checkpoint.load()
+    if checkpointed:
+        print(f"   📂 Recovering {len(checkpointed)} images from checkpoint log")
+        existing_data = await asyncio.to_thread(materialize, checkpoint, output_file, existing_data, result_key)
+    existing_paths = {result_key(img) for img in existing_data.get("images", [])}
+    if existing_paths:
+        print(f"   📂 Resuming: {len(existing_paths)} images already processed")
+    
     # Filter out already processed images
-    images_to_process = [img for img in region_images if img["filename"] not in existing_ids]
+    images_to_process = [img for img in region_images if img["relative_path"] not in existing_paths]
+    get_catalog().mark_done(
+        STAGE_STRUCTURED_EXTRACTION,
+        [img["catalog_record"] for img in region_images if img["relative_path"] in existing_paths]
+    )
     
     if not images_to_process:
         print(f"   ✅ All images already processed!")
@@ -715,38 +778,76 @@ def process_project(project_id: str):
     
     # Only run page-level analysis if we have new images to process
     # First pass: analyze full-page images to get sheet-level context
-    page_context: Dict[int, Dict[str, Any]] = extract_page_metadata(project_dir, project_id)
+    page_context: Dict[int, Dict[str, Any]] = await extract_page_metadata(engine, project_dir, project_id)
     
-    print(f"   ⚙️ Processing {len(images_to_process)} new images...")
+    batches = [images_to_process[i:i + BATCH_SIZE] for i in range(0, len(images_to_process), BATCH_SIZE)]
+    print(f"   ⚙️ Processing {len(images_to_process)} new images in {len(batches)} batches...")
     
-    # Process in batches
-    session_input_tokens = 0
-    session_output_tokens = 0
-    
-    for i in range(0, len(images_to_process), BATCH_SIZE):
-        batch = images_to_process[i:i + BATCH_SIZE]
-        batch_num = i // BATCH_SIZE + 1
-        total_batches = (len(images_to_process) + BATCH_SIZE - 1) // BATCH_SIZE
-        
-        print(f"   ⚙️ Processing Batch {batch_num}/{total_batches} ({len(batch)} images)...")
+    async def run_batch(batch_num: int, batch: List[Dict[str, Any]]) -> int:
+        label = f"{project_id} batch {batch_num}/{len(batches)}"
+        results = await process_image_batch(engine, batch, project_id, page_context=page_context, label=label)
+        if not results:
+            print(f"      ⚠️ No results for {label}")
+            return 0
         
-        results = process_image_batch(batch, project_id, page_context=page_context)
-        
-        if results:
-            existing_data["images"].extend(results)
-            
-            # Save incrementally
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(existing_data, f, indent=2, ensure_ascii=False)
-            
-            print(f"      ✅ Saved {len(results)} images")
-        else:
-            print(f"      ⚠️ No results for this batch")
+        # Durable as soon as the batch returns; folded into the project JSON at the end
+        await asyncio.to_thread(checkpoint.append, results)
+        saved_paths = {img.get("relative_path") for img in results}
+        get_catalog().mark_done(
+            STAGE_STRUCTURED_EXTRACTION,
+            [img["catalog_record"] for img in batch if img["relative_path"] in saved_paths]
+        )
+        print(f"      ✅ Saved {len(results)} images ({label})")
+        return len(results)
+    
+    try:
+        await asyncio.gather(*(run_batch(n, batch) for n, batch in enumerate(batches, start=1)))
+    finally:
+        existing_data = await asyncio.to_thread(materialize, checkpoint, output_file, existing_data, result_key)
     
     print(f"   ✅ Complete! Total images: {len(existing_data['images'])}")
     print(f"   💾 Saved to: {output_file}")
 
 
+async def run_extraction(project_ids: List[str]):
+    """Extract every project, sharing one engine (and rate-limit budget) across projects"""
+    global async_client
+    
+    async_client = AsyncOpenAI(api_key=API_KEY, max_retries=0)  # Retries are handled by the engine
+    engine = ExtractionEngine(
+        RateLimiter(requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE),
+        max_in_flight=MAX_IN_FLIGHT,
+        max_retries=MAX_RETRIES
+    )
+    project_slots = asyncio.Semaphore(max(1, PROJECT_CONCURRENCY))
+    
+    async def run_project(project_id: str):
+        async with project_slots:
+            try:
+                await process_project_async(engine, project_id)
+            except Exception as e:
+                print(f"❌ Error processing {project_id}: {e}")
+                import traceback
+                traceback.print_exc()
+    
+    try:
+        await asyncio.gather(*(run_project(project_id) for project_id in project_ids))
+    finally:
+        await async_client.close()
+        async_client = None
+    
+    stats = engine.stats
+    print(f"\n📊 API requests: {stats['requests']}, retries: {stats['retries']}, failed: {stats['failures']}")
+
+
+def process_project(project_id: str):
+    """Process all region images for a single project"""
+    global client
+    if client is None:
+        client = OpenAI(api_key=API_KEY)  # Used for JSON repair
+    asyncio.run(run_extraction([project_id]))
+
+
 def main():
     """Main entry point"""
     global client
@@ -768,7 +869,7 @@ def main():
     import sys
     if len(sys.argv) > 1:
         project_id = sys.argv[1]
-        process_project(project_id)
+        asyncio.run(run_extraction([project_id]))
     else:
         # Process all projects in test_embeddings directory
         test_embeddings_path = Path(TEST_EMBEDDINGS_DIR)
@@ -785,16 +886,10 @@ def main():
             return
         
         print(f"Found {len(projects)} project(s): {', '.join(projects)}")
+        print(f"⚙️ Up to {MAX_IN_FLIGHT} requests in flight across {PROJECT_CONCURRENCY} projects at a time")
         print()
         
-        for project_id in projects:
-            try:
-                process_project(project_id)
-            except Exception as e:
-                print(f"❌ Error processing {project_id}: {e}")
-                import traceback
-                traceback.print_exc()
-                continue
+        asyncio.run(run_extraction(projects))
     
     print("\n" + "="*60)
     print("✨ Processing Complete!")
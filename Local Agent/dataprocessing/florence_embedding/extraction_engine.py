@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Concurrent, rate-limit-aware engine for vision extraction requests
+
+Used by extract_structured_info.py (GPT-4o) and google/extract_structured_info_google.py
+(Gemini) so archive-wide extraction is bounded by the provider's rate limits
+instead of per-call latency:
+
+1. ExtractionEngine keeps up to max_in_flight requests running at once.
+2. RateLimiter holds a requests-per-minute and a tokens-per-minute token bucket.
+   Buckets start from configured limits and are re-synced from the provider's
+   x-ratelimit-* response headers when present (OpenAI); 429s pause all callers.
+3. Retryable failures (429, 5xx, timeouts, connection errors) are retried with
+   exponential backoff and jitter, honouring Retry-After.
+4. CheckpointLog appends each finished batch to a per-project JSONL log (one
+   write + fsync per batch), so a crash loses at most the in-flight requests;
+   materialize() folds the log into the project JSON with an atomic replace.
+
+Usage:
+    engine = ExtractionEngine(RateLimiter(requests_per_minute=500, tokens_per_minute=30000), max_in_flight=8)
+
+    async def request():
+        raw = await async_client.chat.completions.with_raw_response.create(...)
+        response = raw.parse()
+        return EngineResponse(response.choices[0].message.content, raw.headers, response.usage.total_tokens)
+
+    text = await engine.submit(request, estimated_tokens=20000, label="batch 3")
+"""
+
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Mapping, Optional, Union
+
+# Status codes worth retrying
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# Exception class names worth retrying (OpenAI and google-api-core), matched by name
+# so neither SDK has to be importable here
+RETRYABLE_ERRORS = {
+    "APITimeoutError", "APIConnectionError", "RateLimitError", "InternalServerError",
+    "ResourceExhausted", "ServiceUnavailable", "DeadlineExceeded", "TimeoutError",
+}
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds from an x-ratelimit-reset-* value such as "1s", "6m0s" or "120ms" """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    units = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None  # e.g. grpc StatusCode enums
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Whether a failed request should be retried"""
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    if _status_code(exc) in RETRYABLE_STATUS:
+        return True
+    return type(exc).__name__ in RETRYABLE_ERRORS
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Server-suggested wait (Retry-After / x-ratelimit-reset-*) from an API error, if any"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    for key in ("retry-after-ms", "retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        value = headers.get(key)
+        if value is None:
+            continue
+        if key == "retry-after-ms":
+            try:
+                return float(value) / 1000.0
+            except ValueError:
+                continue
+        seconds = parse_reset_duration(value)
+        if seconds is not None:
+            return seconds
+    return None
+
+
+# =============================
+# Rate limiting
+# =============================
+class TokenBucket:
+    """Continuously refilling bucket: capacity units per period seconds"""
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = float(capacity)
+        self.period = period
+        self.level = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount units are available (0 if available now)"""
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+    def sync(self, limit: Optional[float], remaining: Optional[float], reset: Optional[float], now: float):
+        """Adopt the server's view of the bucket (x-ratelimit-* headers)"""
+        self._refill(now)
+        if limit:
+            self.capacity = float(limit)
+        if remaining is not None:
+            self.level = min(self.level, float(remaining))
+            if remaining <= 0 and reset:
+                self.blocked_until = max(self.blocked_until, now + reset)
+
+    def block(self, seconds: float, now: float):
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limiter shared by all in-flight requests"""
+
+    def __init__(self, requests_per_minute: float = 500, tokens_per_minute: float = 30000):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, estimated_tokens: int):
+        """Wait until one request of estimated_tokens fits in both buckets, then take it"""
+        async with self._lock:  # callers are admitted in arrival order
+            while True:
+                now = time.monotonic()
+                wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(estimated_tokens, now))
+                if wait <= 0:
+                    self.requests.take(1)
+                    self.tokens.take(estimated_tokens)
+                    return
+                await asyncio.sleep(wait)
+
+    def observe(self, headers: Optional[Mapping[str, str]], estimated_tokens: int, used_tokens: Optional[int]):
+        """Refund over-estimated tokens and re-sync the buckets from response headers"""
+        now = time.monotonic()
+        if used_tokens is not None and used_tokens < estimated_tokens:
+            self.tokens.refund(estimated_tokens - used_tokens)
+        if not headers:
+            return
+
+        def number(key: str) -> Optional[float]:
+            value = headers.get(key)
+            try:
+                return float(value) if value is not None else None
+            except ValueError:
+                return None
+
+        self.requests.sync(number("x-ratelimit-limit-requests"), number("x-ratelimit-remaining-requests"),
+                           parse_reset_duration(headers.get("x-ratelimit-reset-requests")), now)
+        self.tokens.sync(number("x-ratelimit-limit-tokens"), number("x-ratelimit-remaining-tokens"),
+                         parse_reset_duration(headers.get("x-ratelimit-reset-tokens")), now)
+
+    def pause(self, seconds: float):
+        """Hold every caller for seconds (after a 429)"""
+        now = time.monotonic()
+        self.requests.block(seconds, now)
+        self.tokens.block(seconds, now)
+
+
+# =============================
+# Engine
+# =============================
+@dataclass
+class EngineResponse:
+    """What a request callable returns: the value plus optional rate-limit feedback"""
+    value: Any
+    headers: Optional[Mapping[str, str]] = None
+    used_tokens: Optional[int] = None
+
+
+class ExtractionEngine:
+    """Runs request callables with bounded concurrency, rate limiting and retries"""
+
+    def __init__(self, limiter: RateLimiter, max_in_flight: int = 8, max_retries: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        self.limiter = limiter
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        self.stats = {"requests": 0, "retries": 0, "failures": 0}
+
+    async def submit(self, request: Callable[[], Awaitable[EngineResponse]], estimated_tokens: int,
+                     label: str = "request") -> Any:
+        """
+        Run request() once a slot and rate-limit budget are available, retrying transient failures.
+
+        request is called again on each retry, so it must build its payload itself
+        (lazily, so payloads only exist for requests that hold a slot).
+
+        Returns:
+            The EngineResponse.value of the first successful attempt
+
+        Raises:
+            The last exception if the request is not retryable or retries are exhausted
+        """
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self.limiter.acquire(estimated_tokens)
+                self.stats["requests"] += 1
+                try:
+                    response = await request()
+                except Exception as e:
+                    if attempt >= self.max_retries or not is_retryable(e):
+                        self.stats["failures"] += 1
+                        raise
+                    delay = retry_after(e)
+                    if delay is None:
+                        delay = min(self.max_delay, self.base_delay * (2 ** attempt)) * (0.5 + random.random() / 2)
+                    if _status_code(e) == 429 or type(e).__name__ in ("RateLimitError", "ResourceExhausted"):
+                        self.limiter.pause(delay)
+                    self.stats["retries"] += 1
+                    print(f"      ⏳ {label}: {type(e).__name__}, retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                self.limiter.observe(response.headers, estimated_tokens, response.used_tokens)
+                return response.value
+
+
+# =============================
+# Checkpointing
+# =============================
+class CheckpointLog:
+    """Append-only JSONL log of extracted records for one project"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Records from earlier runs (a torn last line from a crash is ignored)"""
+        if not self.path.exists():
+            return []
+        records = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print(f"   ⚠️ Skipping incomplete checkpoint line in {self.path.name}")
+        return records
+
+    def append(self, records: Iterable[Dict[str, Any]]):
+        """Durably append records in a single write"""
+        payload = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        if not payload:
+            return
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if self.path.exists() and self.path.stat().st_size:
+                with open(self.path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        payload = "\n" + payload  # keep a torn line from a crash on its own line
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def clear(self):
+        with self._lock:
+            if self.path.exists():
+                self.path.unlink()
+
+
+def write_json_atomic(path: Union[str, Path], data: Any):
+    """Write JSON to a temp file and swap it in, so readers never see a half-written file"""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def materialize(checkpoint: CheckpointLog, output_file: Union[str, Path], data: Dict[str, Any],
+                key: Callable[[Dict[str, Any]], Any]) -> Dict[str, Any]:
+    """
+    Fold checkpointed records into data["images"] (de-duplicated by key), write
+    output_file atomically and clear the checkpoint.
+    """
+    images = data.setdefault("images", [])
+    seen = {key(img) for img in images}
+    for record in checkpoint.load():
+        record_key = key(record)
+        if record_key not in seen:
+            seen.add(record_key)
+            images.append(record)
+    write_json_atomic(output_file, data)
+    checkpoint.clear()
+    return data
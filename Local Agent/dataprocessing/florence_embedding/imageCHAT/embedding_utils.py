@@ -5,6 +5,7 @@ Embedding Utilities for CLIP and Text Embeddings
 """
 
 import os
+from collections import OrderedDict
 from pathlib import Path
 from typing import Optional, List
 import numpy as np
@@ -42,12 +43,14 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY") or os.getenv("API_KEY", "")
 CLIP_MODEL_NAME = "ViT-H-14"
 CLIP_PRETRAINED = "laion2b_s32b_b79k"
 CLIP_EMBEDDING_DIM = 1024
+TEXT_EMBEDDING_CACHE_SIZE = 512  # Recent query embeddings kept per process
 
 # Global model caches
 _clip_model = None
 _clip_preprocess = None
 _clip_device = None
 _openai_client = None
+_text_embedding_cache: "OrderedDict[str, List[float]]" = OrderedDict()
 
 
 def get_openai_client():
@@ -170,14 +173,24 @@ def embed_text_openai(text: str) -> Optional[List[float]]:
         if not OPENAI_AVAILABLE:
             raise ImportError("openai not available")
         
+        text = text.strip()
+        cached = _text_embedding_cache.get(text)
+        if cached is not None:
+            _text_embedding_cache.move_to_end(text)
+            return list(cached)
+        
         client = get_openai_client()
         
         response = client.embeddings.create(
             model="text-embedding-3-small",
-            input=text.strip()
+            input=text
         )
         
-        return response.data[0].embedding
+        embedding = response.data[0].embedding
+        _text_embedding_cache[text] = embedding
+        if len(_text_embedding_cache) > TEXT_EMBEDDING_CACHE_SIZE:
+            _text_embedding_cache.popitem(last=False)
+        return list(embedding)
     
     except Exception as e:
         print(f"Error generating text embedding: {e}")
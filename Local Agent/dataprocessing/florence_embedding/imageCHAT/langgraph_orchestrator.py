@@ -79,7 +79,8 @@ def classify_query(
 def route_text_to_text(
     text_query: str,
     conversation_history: List[Dict[str, str]] = None,
-    top_k: int = 3
+    top_k: int = 3,
+    project_key: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Route: Text Query → Text Response
@@ -88,6 +89,7 @@ def route_text_to_text(
         text_query: User's text question
         conversation_history: Previous conversation messages
         top_k: Number of results to retrieve
+        project_key: Optional project to restrict the search to
     
     Returns:
         Dict with 'response' (text) and 'sources' (list of descriptions)
@@ -102,7 +104,7 @@ def route_text_to_text(
         }
     
     # Search text embeddings
-    descriptions = search_text_embeddings(query_embedding, top_k=top_k, use_summary=True)
+    descriptions = search_text_embeddings(query_embedding, top_k=top_k, use_summary=True, project_key=project_key)
     
     if not descriptions:
         return {
@@ -123,7 +125,8 @@ def route_text_to_text(
 
 def route_text_to_images(
     text_query: str,
-    top_k: int = 3
+    top_k: int = 3,
+    project_key: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Route: Text Query → Images
@@ -131,6 +134,7 @@ def route_text_to_images(
     Args:
         text_query: User's text query
         top_k: Number of images to return
+        project_key: Optional project to restrict the search to
     
     Returns:
         Dict with 'response' (text summary), 'sources' (descriptions), and 'images' (list of image URLs)
@@ -145,7 +149,7 @@ def route_text_to_images(
         }
     
     # Search text embeddings
-    descriptions = search_text_embeddings(query_embedding, top_k=top_k, use_summary=True)
+    descriptions = search_text_embeddings(query_embedding, top_k=top_k, use_summary=True, project_key=project_key)
     
     if not descriptions:
         return {
@@ -192,7 +196,8 @@ def route_text_to_images(
 def route_image_to_images(
     image: Image.Image,
     top_k: int = 3,
-    image_method: str = "clip"
+    image_method: str = "clip",
+    project_key: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Route: Image Upload → Similar Images
@@ -201,6 +206,7 @@ def route_image_to_images(
         image: User's uploaded image
         top_k: Number of similar images to return
         image_method: "clip" for visual similarity or "gpt4o" for semantic similarity
+        project_key: Optional project to restrict the search to
     
     Returns:
         Dict with 'response' (text), 'sources' (matches), and 'images' (list of image URLs)
@@ -217,7 +223,7 @@ def route_image_to_images(
                 # Embed the description and search text embeddings
                 desc_embedding = embed_text_openai(vision_description)
                 if desc_embedding:
-                    text_matches = search_text_embeddings(desc_embedding, top_k=top_k, use_summary=True)
+                    text_matches = search_text_embeddings(desc_embedding, top_k=top_k, use_summary=True, project_key=project_key)
         except Exception as e:
             import traceback
             print(f"GPT-4o Vision error: {str(e)}")
@@ -278,7 +284,7 @@ def route_image_to_images(
     try:
         image_embedding = embed_image_clip(image)
         if image_embedding:
-            clip_matches = search_image_embeddings(image_embedding, top_k=top_k)
+            clip_matches = search_image_embeddings(image_embedding, top_k=top_k, project_key=project_key)
     except Exception as e:
         clip_error = str(e)
         import traceback
@@ -337,7 +343,8 @@ def route_image_to_text(
     text_query: Optional[str] = None,
     conversation_history: List[Dict[str, str]] = None,
     top_k: int = 3,
-    image_method: str = "clip"
+    image_method: str = "clip",
+    project_key: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Route: Image Upload → Text Response
@@ -350,6 +357,7 @@ def route_image_to_text(
         conversation_history: Previous conversation messages
         top_k: Number of results
         image_method: "clip" for visual similarity or "gpt4o" for semantic similarity
+        project_key: Optional project to restrict the search to
     
     Returns:
         Dict with 'response' (text), 'sources' (descriptions), and 'images' (list)
@@ -365,7 +373,7 @@ def route_image_to_text(
             # Embed the description
             desc_embedding = embed_text_openai(vision_description)
             if desc_embedding:
-                text_matches = search_text_embeddings(desc_embedding, top_k=top_k, use_summary=True)
+                text_matches = search_text_embeddings(desc_embedding, top_k=top_k, use_summary=True, project_key=project_key)
         
         # Add text matches
         for text_match in text_matches:
@@ -377,7 +385,7 @@ def route_image_to_text(
         try:
             image_embedding = embed_image_clip(image)
             if image_embedding:
-                clip_matches = search_image_embeddings(image_embedding, top_k=top_k)
+                clip_matches = search_image_embeddings(image_embedding, top_k=top_k, project_key=project_key)
         except Exception as e:
             # Log error but continue
             print(f"CLIP embedding failed: {e}")
@@ -444,7 +452,8 @@ def orchestrate_query(
     image: Optional[Image.Image] = None,
     conversation_history: List[Dict[str, str]] = None,
     top_k: int = 3,
-    image_method: str = "clip"
+    image_method: str = "clip",
+    project_key: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Main orchestrator function that routes queries to appropriate handlers
@@ -455,6 +464,7 @@ def orchestrate_query(
         conversation_history: Previous conversation messages
         top_k: Number of results to return
         image_method: "clip" for visual similarity or "gpt4o" for semantic similarity
+        project_key: Optional project to restrict retrieval to (filtered in memory)
     
     Returns:
         Dict with response, sources, images, and metadata
@@ -474,16 +484,16 @@ def orchestrate_query(
     
     # Route to appropriate handler
     if query_type == QueryType.TEXT_TO_TEXT:
-        return route_text_to_text(text_query, conversation_history, top_k)
+        return route_text_to_text(text_query, conversation_history, top_k, project_key)
     
     elif query_type == QueryType.TEXT_TO_IMAGES:
-        return route_text_to_images(text_query, top_k)
+        return route_text_to_images(text_query, top_k, project_key)
     
     elif query_type == QueryType.IMAGE_TO_IMAGES:
-        return route_image_to_images(image, top_k, image_method)
+        return route_image_to_images(image, top_k, image_method, project_key)
     
     elif query_type == QueryType.IMAGE_TO_TEXT:
-        return route_image_to_text(image, text_query, conversation_history, top_k, image_method)
+        return route_image_to_text(image, text_query, conversation_history, top_k, image_method, project_key)
     
     else:
         return {
@@ -11,6 +11,7 @@ from typing import List, Dict, Any
 import time
 
 from langgraph_orchestrator import orchestrate_query
+from supabase_utils import get_local_index, USE_LOCAL_INDEX
 
 # Page config
 st.set_page_config(
@@ -27,6 +28,12 @@ if "conversation_history" not in st.session_state:
     st.session_state.conversation_history = []
 
 
+@st.cache_resource(show_spinner="Loading search indexes...")
+def load_search_indexes() -> bool:
+    """Load the in-memory search indexes once per server process (shared by all sessions)"""
+    return get_local_index("summary_embedding") is not None
+
+
 def format_conversation_history() -> List[Dict[str, str]]:
     """Format conversation history for GPT-4o"""
     history = []
@@ -67,10 +74,19 @@ def main():
     st.title("🏗️ Engineering Drawing Assistant")
     st.markdown("Ask questions or upload images to search through engineering drawings. Supports text and image inputs/outputs.")
     
+    # Warm the shared indexes before the first query
+    if USE_LOCAL_INDEX and not load_search_indexes():
+        st.warning("Local search index unavailable, searching Supabase instead.")
+    
     # Sidebar for settings
     with st.sidebar:
         st.header("Settings")
         top_k = st.slider("Number of results", 1, 10, 3)
+        project_filter = st.text_input(
+            "Project filter (optional)",
+            placeholder="e.g. 25-01-006",
+            help="Only search drawings from this project"
+        ).strip()
         
         st.markdown("---")
         st.subheader("Image Processing Method")
@@ -177,7 +193,8 @@ def main():
                             image=image_obj,
                             conversation_history=conversation_history,
                             top_k=top_k,
-                            image_method=image_method_short
+                            image_method=image_method_short,
+                            project_key=project_filter or None
                         )
                         
                         # Display response
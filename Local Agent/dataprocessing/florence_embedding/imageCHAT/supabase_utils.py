@@ -2,15 +2,22 @@
 # -*- coding: utf-8 -*-
 """
 Supabase Utilities for Image Descriptions and Image Embeddings Tables
+
+Similarity searches run against in-memory indexes (vector_index.py) that are
+loaded once per process from Supabase, or from a local snapshot when offline,
+and shared by every Streamlit session. Supabase RPC / Python-side search is the
+fallback when no local index can be loaded.
 """
 
 import os
+import threading
+import time
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 from supabase import create_client, Client
 import numpy as np
-import json
-import ast
+
+from vector_index import VectorIndex, fetch_table, parse_embedding
 
 # Load environment variables
 try:
@@ -26,7 +33,31 @@ except ImportError:
 SUPABASE_URL = os.getenv("SUPABASE_URL", "https://nxrhvostwdtixojqyvro.supabase.co")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY", "")
 
+# Local in-memory indexes
+USE_LOCAL_INDEX = os.getenv("IMAGECHAT_LOCAL_INDEX", "1") != "0"
+INDEX_DIR = Path(os.getenv("IMAGECHAT_INDEX_DIR", str(Path(__file__).resolve().parent / "index_cache")))
+INDEX_MAX_AGE_HOURS = float(os.getenv("IMAGECHAT_INDEX_MAX_AGE_HOURS", "24"))  # Snapshot age before re-fetching
+
+DESCRIPTION_COLUMNS = (
+    "id, project_key, page_num, region_number, image_id, relative_path, "
+    "classification, location, level, orientation, element_type, "
+    "grid_references, section_callouts, element_callouts, key_components, "
+    "text_verbatim, summary"
+)
+IMAGE_COLUMNS = "id, project_key, page_number, image_url"
+
+# Index name -> (table, metadata columns, embedding column)
+LOCAL_INDEXES = {
+    "summary_embedding": ("image_descriptions", DESCRIPTION_COLUMNS, "summary_embedding"),
+    "text_verbatim_embedding": ("image_descriptions", DESCRIPTION_COLUMNS, "text_verbatim_embedding"),
+    "image_embedding": ("image_embeddings", IMAGE_COLUMNS, "embedding"),
+}
+
 _supabase_client: Optional[Client] = None
+_local_indexes: Dict[str, VectorIndex] = {}
+_descriptions_by_path: Dict[tuple, Dict[str, Any]] = {}
+_local_index_error: Optional[Exception] = None
+_index_lock = threading.Lock()
 
 
 def get_supabase_client() -> Client:
@@ -39,10 +70,89 @@ def get_supabase_client() -> Client:
     return _supabase_client
 
 
+def load_local_indexes(refresh: bool = False) -> Dict[str, VectorIndex]:
+    """
+    Load every local index once per process
+    
+    Each index comes from its snapshot in INDEX_DIR when that is newer than
+    INDEX_MAX_AGE_HOURS, otherwise from Supabase (and is re-snapshotted); a stale
+    snapshot is used when Supabase is unreachable.
+    
+    Args:
+        refresh: Re-fetch from Supabase even if indexes are loaded / snapshots are fresh
+    
+    Returns:
+        Dict of index name -> VectorIndex
+    """
+    global _local_index_error
+    with _index_lock:
+        tables: Dict[str, List[Dict[str, Any]]] = {}
+        for name, (table, columns, embedding_column) in LOCAL_INDEXES.items():
+            if name in _local_indexes and not refresh:
+                continue
+            
+            start = time.perf_counter()
+            path = INDEX_DIR / f"{name}.npz"
+            is_fresh = path.exists() and time.time() - path.stat().st_mtime < INDEX_MAX_AGE_HOURS * 3600
+            if is_fresh and not refresh:
+                index = VectorIndex.load(path)
+                source = "snapshot"
+            else:
+                try:
+                    # One fetch per table, shared by its embedding columns
+                    embedding_columns = [c for t, _, c in LOCAL_INDEXES.values() if t == table]
+                    if table not in tables:
+                        rows = fetch_table(get_supabase_client(), table, columns, embedding_columns)
+                        # image_embeddings uses page_number (not page_num like image_descriptions)
+                        for row in rows:
+                            if "page_number" in row:
+                                row["page_num"] = row.pop("page_number")
+                        tables[table] = rows
+                    index = VectorIndex.from_rows(tables[table], embedding_column, exclude=embedding_columns)
+                    index.save(path)
+                    source = "Supabase"
+                except Exception as e:
+                    if not path.exists():
+                        raise
+                    print(f"⚠️ Could not refresh {name} index from Supabase ({e}); using snapshot")
+                    index = VectorIndex.load(path)
+                    source = "stale snapshot"
+            
+            _local_indexes[name] = index
+            print(f"✅ Loaded {name} index from {source}: {len(index)} rows, {index.kind} "
+                  f"({time.perf_counter() - start:.1f}s)")
+        
+        _descriptions_by_path.clear()
+        for name in ("summary_embedding", "text_verbatim_embedding"):
+            for record in _local_indexes[name].records:
+                _descriptions_by_path.setdefault((record.get("project_key"), record.get("relative_path")), record)
+        _local_index_error = None
+        return dict(_local_indexes)
+
+
+def get_local_index(name: str) -> Optional[VectorIndex]:
+    """Shared local index by name, or None if local indexes are disabled or could not be loaded"""
+    global _local_index_error
+    if not USE_LOCAL_INDEX or _local_index_error is not None:
+        return None
+    index = _local_indexes.get(name)
+    if index is None:
+        try:
+            index = load_local_indexes()[name]
+        except Exception as e:
+            # Remember the failure so every query doesn't retry a full load
+            _local_index_error = e
+            print(f"⚠️ Local index unavailable, searching Supabase instead: {e}")
+            return None
+    return index
+
+
 def search_text_embeddings(
     query_embedding: List[float],
     top_k: int = 3,
-    use_summary: bool = True
+    use_summary: bool = True,
+    project_key: Optional[str] = None,
+    page_num: Optional[int] = None
 ) -> List[Dict[str, Any]]:
     """
     Search image_descriptions table using text embedding similarity
@@ -51,14 +161,24 @@ def search_text_embeddings(
         query_embedding: Text embedding vector (1536-dim from text-embedding-3-small)
         top_k: Number of results to return
         use_summary: If True, search summary_embedding; if False, search text_verbatim_embedding
+        project_key: Optional project filter
+        page_num: Optional page filter
     
     Returns:
         List of matching image descriptions with similarity scores
     """
-    client = get_supabase_client()
-    
     embedding_column = "summary_embedding" if use_summary else "text_verbatim_embedding"
     
+    index = get_local_index(embedding_column)
+    if index is not None:
+        results = index.search(query_embedding, top_k, project_key=project_key, page_num=page_num)
+        for result in results:
+            result["search_type"] = "text_embedding"
+        return results
+    
+    client = get_supabase_client()
+    has_filters = project_key is not None or page_num is not None
+    
     # Try to use RPC function for vector search (if it exists in your database)
     # You can create this function in Supabase SQL Editor:
     # CREATE OR REPLACE FUNCTION search_text_embeddings(
@@ -70,7 +190,9 @@ def search_text_embeddings(
     # $$ LANGUAGE plpgsql;
     
     try:
-        # Attempt RPC call (will fail if function doesn't exist)
+        # Attempt RPC call (will fail if function doesn't exist; it has no metadata filters)
+        if has_filters:
+            raise ValueError("RPC search does not support filters")
         response = client.rpc(
             'search_text_embeddings',
             {
@@ -88,12 +210,14 @@ def search_text_embeddings(
     
     # Fallback: Fetch records and compute similarity in Python
     # Note: This is less efficient for large datasets. For production, create the RPC function above.
-    response = client.table("image_descriptions").select(
-        "id, project_key, page_num, region_number, image_id, relative_path, "
-        "classification, location, level, orientation, element_type, "
-        "grid_references, section_callouts, element_callouts, key_components, "
-        "text_verbatim, summary, " + embedding_column
-    ).not_.is_(embedding_column, "null").limit(5000).execute()  # Increased limit for better coverage
+    query = client.table("image_descriptions").select(
+        DESCRIPTION_COLUMNS + ", " + embedding_column
+    ).not_.is_(embedding_column, "null")
+    if project_key is not None:
+        query = query.eq("project_key", project_key)
+    if page_num is not None:
+        query = query.eq("page_num", page_num)
+    response = query.limit(5000).execute()  # Increased limit for better coverage
     
     if not response.data:
         return []
@@ -112,19 +236,9 @@ def search_text_embeddings(
             continue
         
         # Handle string representation of embeddings (from Supabase)
-        if isinstance(stored_embedding, str):
-            try:
-                # Try to parse as JSON array first
-                stored_embedding = json.loads(stored_embedding)
-            except (json.JSONDecodeError, ValueError):
-                # If that fails, try ast.literal_eval for Python list format
-                try:
-                    stored_embedding = ast.literal_eval(stored_embedding)
-                except (ValueError, SyntaxError):
-                    # If both fail, skip this embedding
-                    continue
-        
-        stored_vec = np.array(stored_embedding, dtype=np.float32)
+        stored_vec = parse_embedding(stored_embedding)
+        if stored_vec is None:
+            continue
         stored_norm = np.linalg.norm(stored_vec)
         
         if stored_norm == 0:
@@ -149,7 +263,9 @@ def search_text_embeddings(
 
 def search_image_embeddings(
     query_embedding: List[float],
-    top_k: int = 3
+    top_k: int = 3,
+    project_key: Optional[str] = None,
+    page_num: Optional[int] = None
 ) -> List[Dict[str, Any]]:
     """
     Search image_embeddings table using CLIP image embedding similarity
@@ -157,14 +273,26 @@ def search_image_embeddings(
     Args:
         query_embedding: CLIP image embedding vector (1024-dim from ViT-H-14)
         top_k: Number of results to return
+        project_key: Optional project filter
+        page_num: Optional page filter
     
     Returns:
         List of matching image embeddings with similarity scores
     """
+    index = get_local_index("image_embedding")
+    if index is not None:
+        results = index.search(query_embedding, top_k, project_key=project_key, page_num=page_num)
+        for result in results:
+            result["search_type"] = "image_embedding"
+        return results
+    
     client = get_supabase_client()
+    has_filters = project_key is not None or page_num is not None
     
-    # Try RPC function first (if it exists)
+    # Try RPC function first (if it exists; it has no metadata filters)
     try:
+        if has_filters:
+            raise ValueError("RPC search does not support filters")
         response = client.rpc(
             'search_image_embeddings',
             {
@@ -180,9 +308,14 @@ def search_image_embeddings(
     
     # Fallback: Fetch and compute similarity
     # Note: image_embeddings table uses page_number (not page_num like image_descriptions)
-    response = client.table("image_embeddings").select(
-        "id, project_key, page_number, embedding, image_url"
-    ).not_.is_("embedding", "null").limit(5000).execute()  # Increased limit
+    query = client.table("image_embeddings").select(
+        IMAGE_COLUMNS + ", embedding"
+    ).not_.is_("embedding", "null")
+    if project_key is not None:
+        query = query.eq("project_key", project_key)
+    if page_num is not None:
+        query = query.eq("page_number", page_num)
+    response = query.limit(5000).execute()  # Increased limit
     
     if not response.data:
         return []
@@ -201,19 +334,9 @@ def search_image_embeddings(
             continue
         
         # Handle string representation of embeddings (from Supabase)
-        if isinstance(stored_embedding, str):
-            try:
-                # Try to parse as JSON array first
-                stored_embedding = json.loads(stored_embedding)
-            except (json.JSONDecodeError, ValueError):
-                # If that fails, try ast.literal_eval for Python list format
-                try:
-                    stored_embedding = ast.literal_eval(stored_embedding)
-                except (ValueError, SyntaxError):
-                    # If both fail, skip this embedding
-                    continue
-        
-        stored_vec = np.array(stored_embedding, dtype=np.float32)
+        stored_vec = parse_embedding(stored_embedding)
+        if stored_vec is None:
+            continue
         stored_norm = np.linalg.norm(stored_vec)
         
         if stored_norm == 0:
@@ -253,9 +376,22 @@ def get_image_descriptions_by_paths(
     Returns:
         List of matching image descriptions
     """
+    results = []
+    if get_local_index("summary_embedding") is not None:
+        # Served from the loaded descriptions; only unknown paths go to Supabase
+        missing = []
+        for rel_path in relative_paths:
+            record = _descriptions_by_path.get((project_key, rel_path))
+            if record is not None:
+                results.append(dict(record))
+            else:
+                missing.append(rel_path)
+        relative_paths = missing
+        if not relative_paths:
+            return results
+    
     client = get_supabase_client()
     
-    results = []
     for rel_path in relative_paths:
         response = client.table("image_descriptions").select("*").eq(
             "project_key", project_key
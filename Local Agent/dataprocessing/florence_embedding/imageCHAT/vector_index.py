@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+In-Memory Vector Index for Image Chat Retrieval
+
+Holds an embedding table (L2-normalized float32 matrix + row metadata) in
+memory and answers top-k cosine similarity queries without a database round trip:
+
+- FAISS HNSW (inner product) when faiss is installed and the table has at least
+  HNSW_MIN_ROWS rows; otherwise an exact flat inner-product search with numpy.
+- project_key / page_num filters are applied in memory. Filtered queries score
+  only the matching rows (exact), so a filter never starves the top-k.
+- Indexes are saved as .npz snapshots (plus a .index file for HNSW), so the app
+  can start and search offline.
+
+Built and shared process-wide by supabase_utils.load_local_indexes().
+"""
+
+import ast
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+# FAISS for approximate search on large tables
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+# Configuration
+HNSW_MIN_ROWS = int(os.getenv("IMAGECHAT_HNSW_MIN_ROWS", "20000"))  # Below this, exact search is as fast
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 128
+FETCH_PAGE_SIZE = 1000  # PostgREST returns at most 1000 rows per request by default
+
+
+def parse_embedding(value: Any) -> Optional[np.ndarray]:
+    """Parse a pgvector value from Supabase (list, or its JSON / Python string form)"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except (json.JSONDecodeError, ValueError):
+            try:
+                value = ast.literal_eval(value)
+            except (ValueError, SyntaxError):
+                return None
+    return np.asarray(value, dtype=np.float32)
+
+
+def fetch_table(client, table: str, columns: str, embedding_columns: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    Fetch every row of a Supabase table, paging by id
+
+    Args:
+        client: Supabase client
+        table: Table name
+        columns: Comma-separated metadata columns (must include id)
+        embedding_columns: Vector columns, parsed to float32 arrays (None when missing)
+
+    Returns:
+        List of row dicts
+    """
+    select = ", ".join([columns] + list(embedding_columns))
+    rows = []
+    while True:
+        response = client.table(table).select(select).order("id").range(
+            len(rows), len(rows) + FETCH_PAGE_SIZE - 1
+        ).execute()
+        page = response.data or []
+        if not page:
+            break
+        for row in page:
+            for column in embedding_columns:
+                row[column] = parse_embedding(row.get(column))
+        rows.extend(page)
+    return rows
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first"""
+    if k >= len(scores):
+        return np.argsort(-scores)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def _as_int(value: Any) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+
+class VectorIndex:
+    """Cosine similarity index over one embedding column"""
+
+    def __init__(self, vectors: np.ndarray, records: List[Dict[str, Any]], use_hnsw: Optional[bool] = None):
+        """
+        Args:
+            vectors: (n, dim) embeddings, one per record (normalized here)
+            records: Row metadata returned with each match
+            use_hnsw: Force HNSW on/off (default: FAISS installed and n >= HNSW_MIN_ROWS)
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2:
+            vectors = vectors.reshape(len(records), -1)
+        norms = np.linalg.norm(vectors, axis=1)
+        keep = norms > 0
+        self.vectors = np.ascontiguousarray(vectors[keep] / norms[keep, None])
+        self.records = [record for record, kept in zip(records, keep) if kept]
+        self.dim = self.vectors.shape[1]
+
+        # Metadata columns for in-memory filtering
+        self.project_keys = np.array([str(r.get("project_key")) for r in self.records], dtype=object)
+        self.page_nums = np.array([_as_int(r.get("page_num")) for r in self.records], dtype=np.int64)
+
+        if use_hnsw is None:
+            use_hnsw = FAISS_AVAILABLE and len(self.records) >= HNSW_MIN_ROWS
+        self._hnsw = self._build_hnsw() if use_hnsw else None
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def kind(self) -> str:
+        return "hnsw" if self._hnsw is not None else "flat"
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]], embedding_column: str,
+                  exclude: Sequence[str] = (), **kwargs) -> "VectorIndex":
+        """
+        Build from fetch_table() rows; rows without this embedding (or with another dimension) are skipped.
+        Embedding values and the exclude columns are left out of the records.
+        """
+        usable = [row for row in rows if row.get(embedding_column) is not None and row[embedding_column].size]
+        if usable:
+            dims = [row[embedding_column].shape[0] for row in usable]
+            dim = max(set(dims), key=dims.count)
+            skipped = sum(1 for d in dims if d != dim)
+            if skipped:
+                print(f"⚠️ Skipping {skipped} {embedding_column} rows without {dim} dimensions")
+            usable = [row for row, d in zip(usable, dims) if d == dim]
+        else:
+            dim = 0
+        vectors = np.stack([row[embedding_column] for row in usable]) if usable else np.zeros((0, dim), np.float32)
+        exclude = set(exclude) | {embedding_column}
+        records = [
+            {k: v for k, v in row.items() if k not in exclude and not isinstance(v, np.ndarray)}
+            for row in usable
+        ]
+        return cls(vectors, records, **kwargs)
+
+    def _build_hnsw(self):
+        index = faiss.IndexHNSWFlat(self.dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        if len(self.records):
+            index.add(self.vectors)
+        return index
+
+    def _mask(self, project_key: Optional[str], page_num: Optional[int]) -> np.ndarray:
+        mask = np.ones(len(self.records), dtype=bool)
+        if project_key is not None:
+            mask &= self.project_keys == str(project_key)
+        if page_num is not None:
+            mask &= self.page_nums == _as_int(page_num)
+        return mask
+
+    def search(
+        self,
+        query_embedding: Union[List[float], np.ndarray],
+        top_k: int = 3,
+        project_key: Optional[str] = None,
+        page_num: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Top-k records by cosine similarity
+
+        Args:
+            query_embedding: Query vector (same model/dimension as the index)
+            top_k: Number of results to return
+            project_key: Only match rows from this project
+            page_num: Only match rows from this page
+
+        Returns:
+            Records with "similarity" and "distance" (1 - similarity), best first
+        """
+        query = np.asarray(query_embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if top_k <= 0 or norm == 0 or not len(self.records) or query.shape[0] != self.dim:
+            return []
+        query = query / norm
+
+        if project_key is not None or page_num is not None:
+            candidates = np.flatnonzero(self._mask(project_key, page_num))
+            scores = self.vectors[candidates] @ query
+            order = _top_k(scores, top_k)
+            ids, similarities = candidates[order], scores[order]
+        elif self._hnsw is not None:
+            self._hnsw.hnsw.efSearch = max(HNSW_EF_SEARCH, top_k)
+            similarities, ids = self._hnsw.search(query[None, :], top_k)
+            found = ids[0] >= 0
+            ids, similarities = ids[0][found], similarities[0][found]
+        else:
+            scores = self.vectors @ query
+            ids = _top_k(scores, top_k)
+            similarities = scores[ids]
+
+        return [
+            {**self.records[i], "similarity": float(s), "distance": float(1 - s)}
+            for i, s in zip(ids, similarities)
+        ]
+
+    # -----------------------------
+    # Snapshots
+    # -----------------------------
+    def save(self, path: Union[str, Path]):
+        """Write the index to path (.npz) atomically, plus path.index for HNSW"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, vectors=self.vectors, records=np.array(json.dumps(self.records, default=str)))
+        os.replace(tmp_path, path)
+
+        hnsw_path = path.with_suffix(".index")
+        if self._hnsw is not None:
+            faiss.write_index(self._hnsw, str(hnsw_path))
+        elif hnsw_path.exists():
+            hnsw_path.unlink()
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "VectorIndex":
+        """Load a snapshot written by save() (reusing the saved HNSW graph when present)"""
+        path = Path(path)
+        with np.load(path, allow_pickle=False) as data:
+            vectors = data["vectors"]
+            records = json.loads(str(data["records"]))
+
+        hnsw_path = path.with_suffix(".index")
+        if FAISS_AVAILABLE and hnsw_path.exists():
+            index = cls(vectors, records, use_hnsw=False)
+            hnsw = faiss.read_index(str(hnsw_path))
+            if hnsw.ntotal == len(index):
+                index._hnsw = hnsw
+                return index
+        return cls(vectors, records)
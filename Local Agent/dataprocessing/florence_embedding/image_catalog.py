@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent Image Catalog (SQLite)
+
+Shared by the ingestion scripts (embed_screenshots.py, run_florence_ingestion.py,
+extract_structured_info.py, google/generate_embeddings_gemini.py) so image
+discovery and "what has already been processed" are answered from one place:
+
+1. scan() walks an image root once with os.scandir, comparing each file's size
+   and mtime with the catalog; only new or changed files are hashed and written,
+   vanished files are removed. Manifest (manifest.json) entries are attached to
+   their files by path, so de-duplication is a dict lookup, not a list search.
+2. images() returns catalog rows in the same dict shape find_all_images() used.
+3. mark_done()/pending() record which stage (embedding, extraction, ...) has
+   processed which image, keyed by content hash, so a re-rendered crop is
+   picked up again while unchanged images are skipped.
+
+Usage:
+    catalog = open_catalog(output_dir)
+    catalog.scan(output_dir)
+    images = catalog.images(output_dir, only_page_subfolders=True)
+    todo = catalog.pending("florence_embedding", images)
+    ...
+    catalog.mark_done("florence_embedding", done_images)
+
+The database defaults to <image root>/image_catalog.sqlite; set IMAGE_CATALOG_DB
+to share one catalog between scripts that use different roots.
+"""
+
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+CATALOG_FILENAME = "image_catalog.sqlite"
+
+# Stage names used by the ingestion scripts
+STAGE_FLORENCE_EMBEDDING = "florence_embedding"
+STAGE_FLORENCE_OCR = "florence_ocr"
+STAGE_STRUCTURED_EXTRACTION = "structured_extraction"
+STAGE_GEMINI_EMBEDDING = "gemini_embedding"
+
+_PAGE_RE = re.compile(r"page_(\d+)")
+_REGION_RE = re.compile(r"region_(\d+)")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    root TEXT NOT NULL,
+    project TEXT NOT NULL,
+    relative_path TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    type TEXT NOT NULL,
+    page_number INTEGER,
+    region_number INTEGER,
+    in_manifest INTEGER NOT NULL DEFAULT 0,
+    in_page_folder INTEGER NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    metadata TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_images_root_project ON images(root, project);
+CREATE TABLE IF NOT EXISTS image_stages (
+    path TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    completed_at TEXT NOT NULL,
+    info TEXT,
+    PRIMARY KEY (path, stage)
+);
+CREATE INDEX IF NOT EXISTS idx_image_stages_stage ON image_stages(stage);
+"""
+
+
+def file_hash(path: Union[str, Path]) -> str:
+    """Content hash of an image file"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _walk_files(directory: str, extensions: Tuple[str, ...]) -> Dict[str, os.stat_result]:
+    """All files under directory with a matching extension -> stat (scandir reuses directory entries)"""
+    found: Dict[str, os.stat_result] = {}
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not entry.name.startswith("."):
+                            stack.append(entry.path)
+                    elif entry.name.lower().endswith(extensions):
+                        found[os.path.normpath(entry.path)] = entry.stat()
+        except OSError as e:
+            print(f"  WARNING: Cannot scan {current}: {e}")
+    return found
+
+
+def _read_manifest(project_dir: Path) -> Dict[str, Dict[str, Any]]:
+    """manifest.json images keyed by normalized absolute path"""
+    manifest_path = project_dir / "manifest.json"
+    if not manifest_path.exists():
+        return {}
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except Exception as e:
+        print(f"  WARNING: Error reading manifest {manifest_path}: {e}")
+        return {}
+
+    entries = {}
+    for img_info in manifest.get("images", []):
+        filename = img_info.get("filename")
+        if not filename:
+            continue
+        if img_info.get("type") == "full_page":
+            relative_path = filename
+        else:
+            # Region crop - use relative_path
+            relative_path = img_info.get("relative_path", filename)
+        entries[os.path.normpath(str(project_dir / relative_path))] = {
+            "relative_path": relative_path,
+            "filename": filename,
+            "info": img_info,
+        }
+    return entries
+
+
+class ImageCatalog:
+    """SQLite-backed catalog of images and the processing stages they have been through"""
+
+    def __init__(self, db_path: Union[str, Path]):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # -----------------------------
+    # Scanning
+    # -----------------------------
+    def scan(self, root: Union[str, Path], extensions: Iterable[str] = (".png",),
+             start_from_project: Optional[str] = None, project: Optional[str] = None) -> Dict[str, int]:
+        """
+        Bring the catalog up to date with the files under root.
+
+        Each sub-directory of root is a project; files directly in root belong to
+        project "". Only new/changed files (by size and mtime) are hashed.
+
+        Args:
+            root: Image root directory
+            extensions: File extensions to catalog (case-insensitive)
+            start_from_project: Skip projects that sort before this one
+            project: Only scan this project
+
+        Returns:
+            Counts: {"added", "updated", "removed", "unchanged"}
+        """
+        root_path = Path(root).resolve()
+        extensions = tuple(ext.lower() for ext in extensions)
+        stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+
+        projects: List[Tuple[str, Path]] = []
+        if project is not None:
+            projects.append((project, root_path / project if project else root_path))
+        else:
+            projects.append(("", root_path))
+            for entry in sorted(os.scandir(root_path), key=lambda e: e.name):
+                if entry.is_dir() and not entry.name.startswith("."):
+                    if start_from_project and entry.name < start_from_project:
+                        continue
+                    projects.append((entry.name, Path(entry.path)))
+
+        for project_name, project_dir in projects:
+            project_stats = self._scan_project(str(root_path), project_name, project_dir, extensions)
+            for key, value in project_stats.items():
+                stats[key] += value
+        return stats
+
+    def _scan_project(self, root: str, project: str, project_dir: Path,
+                      extensions: Tuple[str, ...]) -> Dict[str, int]:
+        stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        if not project_dir.is_dir():
+            return stats
+
+        if project:
+            files = _walk_files(str(project_dir), extensions)
+            manifest = _read_manifest(project_dir)
+        else:
+            # Root-level files only; sub-directories are their own projects
+            files = {}
+            with os.scandir(project_dir) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.lower().endswith(extensions):
+                        files[os.path.normpath(entry.path)] = entry.stat()
+            manifest = {}
+
+        with self._lock:
+            existing = {
+                row["path"]: row for row in self._conn.execute(
+                    "SELECT path, size, mtime_ns, content_hash, metadata, in_manifest FROM images "
+                    "WHERE root = ? AND project = ?", (root, project)
+                )
+            }
+
+        rows = []
+        for path, stat in files.items():
+            manifest_entry = manifest.get(path)
+            metadata = json.dumps(manifest_entry["info"], sort_keys=True, default=str) if manifest_entry else "{}"
+            old = existing.get(path)
+            if (old is not None and old["size"] == stat.st_size and old["mtime_ns"] == stat.st_mtime_ns
+                    and old["metadata"] == metadata and bool(old["in_manifest"]) == bool(manifest_entry)):
+                stats["unchanged"] += 1
+                continue
+
+            try:
+                content_hash = file_hash(path)
+            except OSError as e:
+                print(f"  WARNING: Cannot read {path}: {e}")
+                continue
+            rows.append(self._row(root, project, project_dir, path, stat, content_hash, manifest_entry, metadata))
+            stats["updated" if old is not None else "added"] += 1
+
+        removed = [path for path in existing if path not in files]
+        stats["removed"] = len(removed)
+
+        if rows or removed:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO images (path, root, project, relative_path, filename, type, page_number, "
+                    "region_number, in_manifest, in_page_folder, size, mtime_ns, content_hash, metadata) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+                )
+                self._conn.executemany("DELETE FROM images WHERE path = ?", [(p,) for p in removed])
+                self._conn.executemany("DELETE FROM image_stages WHERE path = ?", [(p,) for p in removed])
+        return stats
+
+    @staticmethod
+    def _row(root: str, project: str, project_dir: Path, path: str, stat: os.stat_result,
+             content_hash: str, manifest_entry: Optional[Dict[str, Any]], metadata: str) -> tuple:
+        rel_parts = Path(path).relative_to(project_dir).parts
+        in_page_folder = any(part.startswith("page_") for part in rel_parts[:-1])
+        filename = rel_parts[-1]
+
+        if manifest_entry:
+            info = manifest_entry["info"]
+            image_type = info.get("type", "unknown")
+            relative_path = manifest_entry["relative_path"]
+            filename = manifest_entry["filename"]
+            page_number = info.get("page_number")
+        else:
+            image_type = "region_crop" if in_page_folder else "unknown"
+            relative_path = str(Path(*rel_parts))
+            page_match = _PAGE_RE.search(relative_path)
+            page_number = int(page_match.group(1)) if page_match else None
+        region_match = _REGION_RE.search(Path(path).name)
+        region_number = int(region_match.group(1)) if region_match else None
+
+        return (path, root, project, relative_path, filename, image_type, page_number, region_number,
+                int(bool(manifest_entry)), int(in_page_folder), stat.st_size, stat.st_mtime_ns, content_hash, metadata)
+
+    # -----------------------------
+    # Queries
+    # -----------------------------
+    def images(self, root: Union[str, Path], only_page_subfolders: bool = False,
+               start_from_project: Optional[str] = None, project: Optional[str] = None,
+               image_type: Optional[str] = None, name_pattern: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Cataloged images under root, in find_all_images() format.
+
+        image_path is joined onto root as given (relative roots give relative paths),
+        since image IDs and bucket paths are derived from it; catalog_path is the
+        resolved path the catalog keys stages on.
+
+        Args:
+            only_page_subfolders: Skip full-page images and files outside page_XXX folders
+                (unless listed in the manifest as region crops)
+            start_from_project: Skip projects that sort before this one
+            project: Only this project ("" for files directly in root)
+            image_type: Only this type ("full_page", "region_crop", ...)
+            name_pattern: Filename glob, e.g. "region_*_red_box.png"
+        """
+        root_path = Path(root)
+        query = "SELECT * FROM images WHERE root = ?"
+        params: List[Any] = [str(root_path.resolve())]
+        if project is not None:
+            query += " AND project = ?"
+            params.append(project)
+        if start_from_project:
+            query += " AND project >= ?"
+            params.append(start_from_project)
+        if image_type:
+            query += " AND type = ?"
+            params.append(image_type)
+        if only_page_subfolders:
+            query += " AND type != 'full_page' AND (in_manifest = 1 OR in_page_folder = 1)"
+        query += " ORDER BY project, page_number IS NULL, page_number, region_number IS NULL, region_number, relative_path"
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        results = []
+        for row in rows:
+            filename = Path(row["path"]).name
+            if name_pattern and not fnmatch.fnmatch(filename, name_pattern):
+                continue
+            results.append({
+                "image_path": str(root_path / Path(row["path"]).relative_to(row["root"])),
+                "catalog_path": row["path"],
+                "project_number": row["project"],
+                "filename": row["filename"],
+                "relative_path": row["relative_path"],
+                "type": row["type"],
+                "page_number": row["page_number"],
+                "region_number": row["region_number"],
+                "content_hash": row["content_hash"],
+                "metadata": json.loads(row["metadata"]),
+            })
+        return results
+
+    def pending(self, stage: str, images: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Images not yet processed by stage (or whose content changed since)"""
+        done = self._stage_hashes(stage)
+        return [img for img in images if done.get(img["catalog_path"]) != img["content_hash"]]
+
+    def is_done(self, stage: str, image: Dict[str, Any]) -> bool:
+        return not self.pending(stage, [image])
+
+    def mark_done(self, stage: str, images: Iterable[Dict[str, Any]], info: Optional[Dict[str, Any]] = None) -> int:
+        """Record that stage has processed these images (catalog rows from images())"""
+        now = datetime.now().isoformat()
+        info_json = json.dumps(info, default=str) if info else None
+        rows = [(img["catalog_path"], stage, img["content_hash"], now, info_json) for img in images]
+        if rows:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO image_stages (path, stage, content_hash, completed_at, info) "
+                    "VALUES (?, ?, ?, ?, ?)", rows
+                )
+        return len(rows)
+
+    def mark_done_by_relative_path(self, stage: str, project: str, relative_paths: Iterable[str],
+                                   info: Optional[Dict[str, Any]] = None) -> int:
+        """mark_done() for records that only know (project, relative_path), e.g. structured JSON entries"""
+        wanted = {str(Path(p)) for p in relative_paths if p}
+        if not wanted:
+            return 0
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, relative_path, content_hash FROM images WHERE project = ?", (project,)
+            ).fetchall()
+        matches = [{"catalog_path": row["path"], "content_hash": row["content_hash"]}
+                   for row in rows if str(Path(row["relative_path"])) in wanted]
+        return self.mark_done(stage, matches, info)
+
+    def completed_relative_paths(self, stage: str, project: str) -> Set[str]:
+        """Relative paths (within project) that stage has processed at their current content"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT i.relative_path FROM images i JOIN image_stages s ON s.path = i.path "
+                "WHERE s.stage = ? AND i.project = ? AND s.content_hash = i.content_hash",
+                (stage, project)
+            ).fetchall()
+        return {str(Path(row["relative_path"])) for row in rows}
+
+    def stage_counts(self, root: Optional[Union[str, Path]] = None) -> Dict[str, int]:
+        """Number of images each stage has processed"""
+        query = ("SELECT s.stage, COUNT(*) FROM image_stages s JOIN images i ON s.path = i.path "
+                 "WHERE s.content_hash = i.content_hash")
+        params: List[Any] = []
+        if root is not None:
+            query += " AND i.root = ?"
+            params.append(str(Path(root).resolve()))
+        query += " GROUP BY s.stage"
+        with self._lock:
+            return {stage: count for stage, count in self._conn.execute(query, params)}
+
+    def _stage_hashes(self, stage: str) -> Dict[str, str]:
+        with self._lock:
+            return {row[0]: row[1] for row in self._conn.execute(
+                "SELECT path, content_hash FROM image_stages WHERE stage = ?", (stage,)
+            )}
+
+
+def open_catalog(default_dir: Union[str, Path]) -> ImageCatalog:
+    """Open the shared catalog: IMAGE_CATALOG_DB if set, else <default_dir>/image_catalog.sqlite"""
+    db_path = os.getenv("IMAGE_CATALOG_DB") or str(Path(default_dir) / CATALOG_FILENAME)
+    return ImageCatalog(db_path)
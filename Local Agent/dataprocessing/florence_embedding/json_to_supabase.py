@@ -6,7 +6,9 @@ Convert Structured JSON Files to Supabase Table
 This script reads structured JSON files from extract_structured_info.py and:
 1. Converts array fields to comma-separated strings
 2. Generates text embeddings for text_verbatim and summary using text-embedding-3-small
-3. Inserts data into Supabase image_descriptions table
+3. Upserts data into Supabase image_descriptions table (keyed by project, page and
+   region, so reruns update rows instead of duplicating them); rows are uploaded in
+   the background while the next embedding batch is generated
 """
 
 import os
@@ -18,6 +20,8 @@ from supabase import create_client, Client
 from tqdm import tqdm
 import time
 
+from bulk_loader import open_loader
+
 # Directories
 BASE_DIR = r"C:\Users\brian\OneDrive\Desktop\dataprocessing"
 
@@ -46,7 +50,7 @@ STRUCTURED_JSON_DIR = os.path.join(BASE_DIR, "florence_embedding", "structured_j
 
 # Batch settings
 EMBEDDING_BATCH_SIZE = 100  # Process embeddings in batches
-INSERT_BATCH_SIZE = 50  # Insert records in batches
+CONFLICT_COLUMNS = ["project_key", "page_num", "region_number"]  # Unique index on image_descriptions
 # =================================================
 
 # Initialize clients
@@ -213,65 +217,42 @@ def process_project(project_id: str, skip_existing: bool = True) -> int:
     
     print(f"   ⚙️ Processing {len(rows_to_process)} new images...")
     
-    # Generate embeddings in batches
-    print(f"   🔄 Generating embeddings...")
+    # Generate embeddings in batches; each batch is upserted while the next one is embedded
+    print(f"   🔄 Generating embeddings and upserting into Supabase...")
     text_verbatim_list = [row.get("text_verbatim", "") for row in rows_to_process]
     summary_list = [row.get("summary", "") for row in rows_to_process]
     
-    # Generate embeddings in batches
-    verbatim_embeddings = []
-    summary_embeddings = []
-    
-    for i in range(0, len(rows_to_process), EMBEDDING_BATCH_SIZE):
-        batch = rows_to_process[i:i + EMBEDDING_BATCH_SIZE]
-        batch_verbatim = text_verbatim_list[i:i + EMBEDDING_BATCH_SIZE]
-        batch_summary = summary_list[i:i + EMBEDDING_BATCH_SIZE]
-        
-        print(f"      Processing embedding batch {i // EMBEDDING_BATCH_SIZE + 1}/{(len(rows_to_process) + EMBEDDING_BATCH_SIZE - 1) // EMBEDDING_BATCH_SIZE}...")
-        
-        # Generate embeddings
-        verbatim_batch = generate_embeddings_batch(batch_verbatim)
-        summary_batch = generate_embeddings_batch(batch_summary)
-        
-        verbatim_embeddings.extend(verbatim_batch)
-        summary_embeddings.extend(summary_batch)
-        
-        # Rate limiting
-        time.sleep(0.1)
-    
-    # Add embeddings to rows
-    for i, row in enumerate(rows_to_process):
-        if verbatim_embeddings[i]:
-            row["text_verbatim_embedding"] = verbatim_embeddings[i]
-        if summary_embeddings[i]:
-            row["summary_embedding"] = summary_embeddings[i]
-    
-    # Insert into Supabase in batches
-    print(f"   💾 Inserting into Supabase...")
-    total_inserted = 0
-    
-    for i in range(0, len(rows_to_process), INSERT_BATCH_SIZE):
-        batch = rows_to_process[i:i + INSERT_BATCH_SIZE]
-        batch_num = i // INSERT_BATCH_SIZE + 1
-        total_batches = (len(rows_to_process) + INSERT_BATCH_SIZE - 1) // INSERT_BATCH_SIZE
-        
-        try:
-            response = supabase.table("image_descriptions").insert(batch).execute()
-            inserted_count = len(response.data) if response.data else len(batch)
-            total_inserted += inserted_count
-            print(f"      ✅ Batch {batch_num}/{total_batches}: Inserted {inserted_count} records")
-        except Exception as e:
-            print(f"      ❌ Batch {batch_num}/{total_batches} failed: {e}")
-            # Try inserting one by one to identify problematic records
-            for j, row in enumerate(batch):
-                try:
-                    supabase.table("image_descriptions").insert(row).execute()
-                    total_inserted += 1
-                except Exception as single_error:
-                    print(f"         ⚠️ Failed to insert row {i+j}: {single_error}")
-                    print(f"         Row data: {json.dumps(row, indent=2)[:500]}")
+    loader = open_loader("image_descriptions", CONFLICT_COLUMNS, supabase_client=supabase)
+    loader.start()
+    try:
+        for i in range(0, len(rows_to_process), EMBEDDING_BATCH_SIZE):
+            batch = rows_to_process[i:i + EMBEDDING_BATCH_SIZE]
+            batch_verbatim = text_verbatim_list[i:i + EMBEDDING_BATCH_SIZE]
+            batch_summary = summary_list[i:i + EMBEDDING_BATCH_SIZE]
+            
+            print(f"      Processing embedding batch {i // EMBEDDING_BATCH_SIZE + 1}/{(len(rows_to_process) + EMBEDDING_BATCH_SIZE - 1) // EMBEDDING_BATCH_SIZE}...")
+            
+            # Generate embeddings
+            verbatim_batch = generate_embeddings_batch(batch_verbatim)
+            summary_batch = generate_embeddings_batch(batch_summary)
+            
+            # Add embeddings to rows
+            for row, verbatim_embedding, summary_embedding in zip(batch, verbatim_batch, summary_batch):
+                if verbatim_embedding:
+                    row["text_verbatim_embedding"] = verbatim_embedding
+                if summary_embedding:
+                    row["summary_embedding"] = summary_embedding
+            
+            loader.put(batch)
+            
+            # Rate limiting
+            time.sleep(0.1)
+    finally:
+        stats = loader.close()
     
-    print(f"   ✅ Complete! Inserted {total_inserted} records")
+    total_inserted = stats.rows
+    print(f"   💾 Supabase: {stats}")
+    print(f"   ✅ Complete! Upserted {total_inserted} records")
     return total_inserted
 
 
@@ -51,6 +51,8 @@ except ImportError:
 
 from PIL import Image
 
+from image_catalog import ImageCatalog, open_catalog, STAGE_FLORENCE_OCR
+
 
 # =============================
 # Configuration
@@ -276,13 +278,12 @@ def process_image(image_path: Path, model, processor, device: str, max_new_token
 # =============================
 # File Operations
 # =============================
-def find_images(input_dir: Path) -> list[Path]:
-    """Find all supported image files in input directory"""
-    images = []
-    for ext in DEFAULT_CONFIG["supported_formats"]:
-        images.extend(input_dir.rglob(f"*{ext}"))
-        images.extend(input_dir.rglob(f"*{ext.upper()}"))
-    return sorted(images)
+def find_images(input_dir: Path, catalog: ImageCatalog) -> list[Dict[str, Any]]:
+    """Find all supported image files in input directory (one catalog record per file, any extension case)"""
+    stats = catalog.scan(input_dir, extensions=DEFAULT_CONFIG["supported_formats"])
+    print(f"   Catalog: {stats['added']} new, {stats['updated']} changed, "
+          f"{stats['removed']} removed, {stats['unchanged']} unchanged")
+    return sorted(catalog.images(input_dir), key=lambda img: img["image_path"])
 
 
 def save_json_output(image_path: Path, output_dir: Path, extraction_results: Dict[str, str]):
@@ -357,6 +358,8 @@ Examples:
                        help=f"Maximum tokens to generate (default: {DEFAULT_CONFIG['max_new_tokens']})")
     parser.add_argument("--cache-dir", type=str, default=DEFAULT_CONFIG.get("cache_dir", None),
                        help=f"Directory to cache/download Florence-2 model (default: {DEFAULT_CONFIG.get('cache_dir', 'system default')})")
+    parser.add_argument("--force", action="store_true",
+                       help="Re-process images that already have JSON output (default: skip unchanged images)")
     parser.add_argument("--verbose", "-v", action="store_true",
                        help="Print extracted captions and OCR text to console for verification")
     
@@ -400,19 +403,35 @@ Examples:
     
     # Step 1: Find all images
     print("Step 1: Finding all images...")
-    images = find_images(input_dir)
+    catalog = open_catalog(input_dir)
+    images = find_images(input_dir, catalog)
     print(f"[OK] Found {len(images)} images")
     
     if len(images) == 0:
         print("ERROR: No images found!")
+        catalog.close()
         return
     
+    if not args.force:
+        # Skip images already extracted at their current content whose JSON is still there
+        pending = catalog.pending(STAGE_FLORENCE_OCR, images)
+        pending_paths = {img["image_path"] for img in pending}
+        done = [img for img in images if img["image_path"] not in pending_paths]
+        pending.extend(img for img in done if not (output_dir / f"{Path(img['image_path']).stem}.json").exists())
+        print(f"   Skipping {len(images) - len(pending)} already processed images (use --force to re-process)")
+        images = sorted(pending, key=lambda img: img["image_path"])
+        if not images:
+            print("[OK] Nothing to do")
+            catalog.close()
+            return
+    
     # Step 2: Load model
     print(f"\nStep 2: Loading Florence-2 model...")
     try:
         model, processor = load_florence2_model(args.model_id, device, cache_dir=cache_dir)
     except Exception as e:
         print(f"ERROR: Error loading model: {e}")
+        catalog.close()
         return
     
     # Step 3: Process all images
@@ -420,7 +439,8 @@ Examples:
     successful = 0
     failed = 0
     
-    for image_path in tqdm(images, desc="Processing images"):
+    for img_info in tqdm(images, desc="Processing images"):
+        image_path = Path(img_info["image_path"])
         # Process image with all tasks
         extraction_results = process_image(image_path, model, processor, device, args.max_new_tokens)
         
@@ -440,10 +460,12 @@ Examples:
         # Save JSON output
         try:
             output_path = save_json_output(image_path, output_dir, extraction_results)
+            catalog.mark_done(STAGE_FLORENCE_OCR, [img_info], {"model_id": args.model_id})
             successful += 1
         except Exception as e:
             print(f"  ERROR: Failed to save JSON for {image_path}: {e}")
             failed += 1
+    catalog.close()
     
     print(f"\n{'='*60}")
     print(f"[OK] Processing complete!")
@@ -17,17 +17,32 @@ It extracts:
 - Key elements
 - Levels
 - Overall design philosophy and decisions
+
+Small projects are synthesized in a single GPT-4o request. Projects whose
+context exceeds SINGLE_PASS_INPUT_TOKENS are synthesized map-reduce style:
+1. Map: extractions are grouped by page into chunks of at most MAP_INPUT_TOKENS
+   and summarized into partial findings concurrently (through ExtractionEngine,
+   so requests share one rate limit budget).
+2. Reduce: partials are merged hierarchically in groups of at most
+   MERGE_INPUT_TOKENS until they fit in the final synthesis request.
+3. Map/merge results are cached in PARTIALS_DIR by a hash of their input, so
+   re-synthesizing after some pages change only re-runs the affected requests.
+Dimension extraction from overall building images runs alongside.
 """
 
 import os
 import json
+import asyncio
+import hashlib
 from pathlib import Path
 from typing import Dict, Any, List, Optional
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from PIL import Image
 import base64
 from io import BytesIO
 
+from extraction_engine import ExtractionEngine, RateLimiter, EngineResponse, write_json_atomic
+
 # Load environment variables from .env file if it exists
 try:
     from dotenv import load_dotenv
@@ -49,6 +64,26 @@ STRUCTURED_JSON_DIR = os.path.join(BASE_DIR, "florence_embedding", "structured_j
 OUTPUT_DIR = os.path.join(BASE_DIR, "florence_embedding", "building_synthesis")
 # Allow override via environment variable for batch processing
 PROJECT_INPUT_DIR = os.getenv("PROJECT_INPUT_DIR", os.path.join(BASE_DIR, "test_embeddings"))
+
+# Map-reduce synthesis (token budgets per stage, ~4 characters per token)
+SYNTHESIS_MODEL = "gpt-4o"
+SINGLE_PASS_INPUT_TOKENS = int(os.getenv("SYNTHESIS_SINGLE_PASS_TOKENS", "60000"))  # Larger projects use map-reduce
+MAP_INPUT_TOKENS = int(os.getenv("SYNTHESIS_MAP_INPUT_TOKENS", "20000"))  # Extraction text per page group
+MAP_OUTPUT_TOKENS = 2500
+MERGE_INPUT_TOKENS = int(os.getenv("SYNTHESIS_MERGE_INPUT_TOKENS", "40000"))  # Partials per merge / final request
+MERGE_OUTPUT_TOKENS = 4000
+OVERVIEW_TOKENS = 8000  # Title blocks / connectivity / levels in the final map-reduce request
+FINAL_OUTPUT_TOKENS = 16384
+IMAGE_TOKEN_ESTIMATE = 1105  # Upper bound for one high-detail image tile set
+PARTIALS_DIR = os.path.join(OUTPUT_DIR, "partials")  # Cached map/merge/dimension results per project
+PARTIAL_CACHE_VERSION = "1"  # Bump when MAP_PROMPT / MERGE_PROMPT change to invalidate cached partials
+
+# Concurrency / rate limits
+MAX_IN_FLIGHT = int(os.getenv("SYNTHESIS_MAX_IN_FLIGHT", "6"))  # Concurrent API requests
+PROJECT_CONCURRENCY = int(os.getenv("SYNTHESIS_PROJECT_CONCURRENCY", "2"))  # Projects synthesized at once
+REQUESTS_PER_MINUTE = float(os.getenv("SYNTHESIS_RPM", "500"))
+TOKENS_PER_MINUTE = float(os.getenv("SYNTHESIS_TPM", "30000"))
+MAX_RETRIES = int(os.getenv("SYNTHESIS_MAX_RETRIES", "5"))
 # =================================================
 
 SYNTHESIS_PROMPT = r"""
@@ -159,8 +194,100 @@ Output a JSON object optimized for database storage with comma-separated values
 - **FLOOR PLANS AND FOUNDATION PLANS**: These are the most reliable sources - prioritize extracting dimensions from images classified as "Plan" with location indicating "Foundation" or "Ground Floor" or similar
 """
 
+SYNTHESIS_INSTRUCTIONS = """CRITICAL INSTRUCTIONS FOR overall_building_description:
+1. DO NOT REPEAT information already in other JSON fields (project_id, project_name, client, location, building_type, number_of_levels, levels, dimensions, gravity_system, lateral_system, concrete_strengths, steel_shapes, rebar_sizes, other_materials, structural_beams, structural_columns, structural_trusses, key_elements). This field is for NEW technical information only.
+2. MUST be 500-800 words of DENSE technical content - every sentence must contain technical information, no fluff
+3. MAXIMUM KEYWORD DENSITY - pack as many technical terms, material designations, connection types, and engineering jargon as possible into every sentence
+4. USE VERBATIM TEXT extensively - incorporate exact phrases, specifications, and terminology from "Text (verbatim)" sections (e.g., 'W8X24', '25 MPa', 'A325 bolts', 'SEE DETAIL 3/S4.2')
+5. ENGINEERING JARGON throughout - use terms like load path, moment connection, shear transfer, bearing capacity, deflection criteria, lateral stability, diaphragm action, composite action
+6. FOCUS ON: detailed specifications (material grades, bolt sizes, weld types), load path analysis (connection types, bearing details), construction details (joint configurations, reinforcement layouts), spatial relationships (grid connections, section relationships), code compliance notes, fabrication requirements, assembly sequences, special conditions
+7. NO FLUFF - be direct, precise, technical. Avoid descriptive language or general statements."""
+
+PARTIAL_FIELDS = r"""{
+  "pages": [<page numbers covered>],
+  "project_name": "<Full project name from title blocks / drawing headers, or null>",
+  "client": "<Client name, or null>",
+  "location": "<Building location/address, or null>",
+  "building_type_clues": ["<Evidence of use, e.g., 'poultry barn', 'apartment units', 'office'>"],
+  "levels": ["<Each distinct vertical level shown, e.g., 'Foundation', 'Ground Floor', 'Roof'>"],
+  "dimension_candidates": [{"value": "<e.g., 256'-0\">", "direction": "<length | width | height | area | unknown>", "source": "<image id and view, and whether it is an OUTERMOST overall dimension line or a partial/internal one>"}],
+  "gravity_system": ["<Load path components from roof to foundation, e.g., 'Steel Trusses', 'Wood Stud Walls', 'Continuous Footings'>"],
+  "lateral_system": ["<Lateral resisting elements, e.g., 'Shearwalls', 'Wind Columns', 'Moment Frames'>"],
+  "concrete_strengths": ["<e.g., '25 MPa'>"],
+  "steel_shapes": ["<e.g., 'W8X24', 'HSS6x6'>"],
+  "rebar_sizes": ["<e.g., '15M'>"],
+  "other_materials": ["<e.g., 'Plywood', 'Rigid Insulation'>"],
+  "structural_beams": ["<Beam designations/types>"],
+  "structural_columns": ["<Column designations/types>"],
+  "structural_trusses": ["<Truss types>"],
+  "key_elements": ["<Notable elements, e.g., 'Retaining Walls', 'Moment Connections', 'Mezzanine'>"],
+  "section_links": ["<Callout and what it connects, e.g., '1/S2.1: foundation plan F1 footing at Grid 3-7 -> wall section'>"],
+  "technical_notes": "<DENSE technical notes: material grades, connection details (bolts, welds, anchors), bearing and load transfer details, reinforcement layouts, code references, fabrication/erection notes, special conditions. Use exact verbatim terminology and designations from the drawings. No fluff.>"
+}"""
+
+MAP_PROMPT = r"""
+You are a senior structural engineer reviewing ONE PART (a group of pages) of a structural drawing set for a building project. The other parts are reviewed separately, and all partial findings are merged afterwards into building-level information, so record everything these extractions support that would matter at building level.
+
+- Read plans (X/Y geometry, grids, footings, openings), sections/elevations (levels, heights, bearing), details (typical conditions) and schedules (member sizes, bar marks, material specs) together
+- Use `level`, `orientation`, `grid_references`, `location` and `section_callouts` to tie views together and trace gravity and lateral load paths
+- Keep exact designations and verbatim terminology (e.g., 'W8X24', '25 MPa', '15M', 'A325 bolts', 'E70XX weld', 'SEE DETAIL 3/S4.2')
+- For dimensions, record every candidate overall dimension with its source; say whether it is an OUTERMOST dimension line spanning the whole building or a partial/internal span
+- Only record what the extractions support; use null or empty lists when information is absent
+
+Output a JSON object with this structure ("technical_notes": 150-350 words):
+""" + PARTIAL_FIELDS
+
+MERGE_PROMPT = r"""
+You are a senior structural engineer merging PARTIAL FINDINGS from several parts of one structural drawing set into a single set of findings with the same structure.
+
+- Union the lists, de-duplicating equivalent entries (keep the most specific designation, e.g., 'W8X24' over 'W-shape')
+- Keep every dimension candidate that could be an overall building dimension, with its source; drop duplicates
+- Keep conflicting values for single-valued fields by listing the alternatives in technical_notes rather than guessing
+- Merge technical_notes into one dense text (at most 600 words) that keeps all exact designations, verbatim terms and connection details, dropping only repetition
+- "pages" is the union of the input pages
+
+Output a JSON object with this structure:
+""" + PARTIAL_FIELDS
+
+DIMENSION_PROMPT = """Analyze this engineering drawing image and extract the OVERALL building dimensions.
+
+CRITICAL INSTRUCTIONS:
+1. Look for dimension lines that span the ENTIRE building from one exterior wall edge to the opposite exterior wall edge
+2. Focus on FLOOR PLANS and FOUNDATION PLANS - these typically show overall dimensions
+3. Look for the OUTERMOST dimension lines at the edges of the building footprint
+4. Extract length and width (or longest and shortest dimensions)
+5. Look for overall building height if shown in elevations or sections
+6. Look for total building area if shown
+
+Return ONLY a JSON object with this structure:
+{
+  "dimensions_length": "<format: 'XXX'-XX\"' or null if not found>",
+  "dimensions_width": "<format: 'XXX'-XX\"' or null if not found>",
+  "dimensions_height": "<overall height or null if not found>",
+  "dimensions_area": "<total area in sq ft or null if not found>"
+}
+
+If dimensions are not clearly visible or cannot be determined, use null for those fields.
+Be precise - only extract dimensions that clearly span the entire building footprint."""
+
+DIMENSION_KEYS = ["dimensions_length", "dimensions_width", "dimensions_height", "dimensions_area"]
+
 # Initialize client (will be validated in main)
 client = None
+async_client = None
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to roughly max_tokens"""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars] + "\n... (truncated to fit the token budget)\n"
 
 
 def load_structured_json(project_id: str) -> Dict[str, Any]:
@@ -212,132 +339,11 @@ def find_overall_building_images(project_id: str) -> List[Path]:
     return sorted(overall_images)
 
 
-def extract_dimensions_from_image(image_path: Path, client: OpenAI) -> Optional[Dict[str, str]]:
-    """Extract building dimensions from an overall building image using GPT-4o Vision"""
-    try:
-        # Load and encode image
-        img = Image.open(image_path)
-        
-        # Convert to base64
-        buffered = BytesIO()
-        img.save(buffered, format="PNG")
-        img_base64 = base64.b64encode(buffered.getvalue()).decode()
-        
-        # Create GPT-4o Vision prompt for dimension extraction
-        prompt = """Analyze this engineering drawing image and extract the OVERALL building dimensions.
-
-CRITICAL INSTRUCTIONS:
-1. Look for dimension lines that span the ENTIRE building from one exterior wall edge to the opposite exterior wall edge
-2. Focus on FLOOR PLANS and FOUNDATION PLANS - these typically show overall dimensions
-3. Look for the OUTERMOST dimension lines at the edges of the building footprint
-4. Extract length and width (or longest and shortest dimensions)
-5. Look for overall building height if shown in elevations or sections
-6. Look for total building area if shown
-
-Return ONLY a JSON object with this structure:
-{
-  "dimensions_length": "<format: 'XXX'-XX\"' or null if not found>",
-  "dimensions_width": "<format: 'XXX'-XX\"' or null if not found>",
-  "dimensions_height": "<overall height or null if not found>",
-  "dimensions_area": "<total area in sq ft or null if not found>"
-}
-
-If dimensions are not clearly visible or cannot be determined, use null for those fields.
-Be precise - only extract dimensions that clearly span the entire building footprint."""
-
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/png;base64,{img_base64}",
-                                "detail": "high"
-                            }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=500,
-            temperature=0.1,
-            response_format={"type": "json_object"}
-        )
-        
-        result_text = response.choices[0].message.content
-        result_json = json.loads(result_text)
-        
-        # Validate that we got at least some dimension data
-        if any(result_json.get(k) for k in ["dimensions_length", "dimensions_width", "dimensions_height", "dimensions_area"]):
-            return result_json
-        
-        return None
-        
-    except Exception as e:
-        print(f"      ⚠️ Error extracting dimensions from {image_path.name}: {e}")
-        return None
-
-
-def extract_and_validate_dimensions(project_id: str, existing_dimensions: Dict[str, Any], client: OpenAI) -> Dict[str, Any]:
-    """Extract dimensions from overall building images and validate/update existing dimensions"""
-    
-    # Find overall building images
-    overall_images = find_overall_building_images(project_id)
-    
-    if not overall_images:
-        print(f"      ⚠️ No overall building images found at root level for {project_id}")
-        return existing_dimensions
-    
-    print(f"      🔍 Found {len(overall_images)} overall building image(s), extracting dimensions...")
-    
-    # Try to extract dimensions from each image
-    extracted_dims = {}
-    for img_path in overall_images:
-        dims = extract_dimensions_from_image(img_path, client)
-        if dims:
-            # Merge extracted dimensions (prefer non-null values)
-            for key, value in dims.items():
-                if value and value != "null" and not extracted_dims.get(key):
-                    extracted_dims[key] = value
-    
-    # Merge with existing dimensions (prefer extracted if available, otherwise keep existing)
-    final_dims = {}
-    for key in ["dimensions_length", "dimensions_width", "dimensions_height", "dimensions_area"]:
-        # Prefer extracted dimensions if available, otherwise use existing
-        if extracted_dims.get(key) and extracted_dims[key] != "null":
-            final_dims[key] = extracted_dims[key]
-        elif existing_dimensions.get(key) and existing_dimensions[key] != "null":
-            final_dims[key] = existing_dimensions[key]
-        else:
-            final_dims[key] = None
-    
-    # Log what we found
-    if extracted_dims:
-        print(f"      ✅ Extracted dimensions: {extracted_dims}")
-    if any(final_dims.values()):
-        print(f"      ✅ Final dimensions: {final_dims}")
-    else:
-        print(f"      ⚠️ No dimensions found in overall images or existing data")
-    
-    return final_dims
-
-
-def synthesize_building_info(project_id: str, structured_data: Dict[str, Any], client: OpenAI) -> Dict[str, Any]:
-    """Synthesize building-level information from structured image data"""
-    
-    # Load page metadata for title block information
-    page_metadata = load_page_metadata(project_id)
-    
-    # Prepare context from all images
-    images_data = structured_data.get("images", [])
-    
-    if not images_data:
-        raise ValueError(f"No image data found for project {project_id}")
-    
-    # Create a summary of all image extractions for the LLM
+# =============================
+# Synthesis context
+# =============================
+def build_project_overview(project_id: str, images_data: List[Dict[str, Any]], page_metadata: Optional[Dict[str, Any]]) -> str:
+    """Project-wide context: title blocks, section reference connectivity and level grouping"""
     context_text = f"Project ID: {project_id}\n\n"
     
     # Add title block information from page metadata if available
@@ -412,133 +418,487 @@ def synthesize_building_info(project_id: str, structured_data: Dict[str, Any], c
                 context_text += f"    ... and {len(level_groups[level]) - 10} more\n"
         context_text += "\n"
     
-    context_text += "Image Extractions:\n"
-    context_text += "=" * 80 + "\n\n"
+    return context_text
+
+
+def format_image_extraction(index: int, img: Dict[str, Any]) -> str:
+    """One image extraction as context text"""
+    context_text = f"Image {index}: {img.get('image_id', 'unknown')}\n"
+    context_text += f"  Classification: {img.get('classification', 'N/A')}\n"
+    context_text += f"  Location: {img.get('location', 'N/A')}\n"
+    if img.get('level') is not None:
+        context_text += f"  Level: {img.get('level', 'N/A')}\n"
+    if img.get('orientation') is not None:
+        context_text += f"  Orientation: {img.get('orientation', 'N/A')}\n"
+    grid_refs = img.get('grid_references', [])
+    if grid_refs:
+        context_text += f"  Grid References: {', '.join(grid_refs)}\n"
+    context_text += f"  Page: {img.get('page_number', 'N/A')}\n"
+    context_text += f"  Element Type: {img.get('element_type', 'N/A')}\n"
     
+    key_components = img.get('key_components', [])
+    if key_components:
+        context_text += f"  Key Components: {', '.join(key_components)}\n"
+    
+    section_callouts = img.get('section_callouts', [])
+    if section_callouts:
+        context_text += f"  Section Callouts: {', '.join(section_callouts)}\n"
+    
+    element_callouts = img.get('element_callouts', [])
+    if element_callouts:
+        context_text += f"  Element Callouts: {', '.join(element_callouts)}\n"
+    
+    text_verbatim = img.get('text_verbatim', '')
+    if text_verbatim:
+        # Include more verbatim text to ensure all keywords and technical details are available for synthesis
+        # For Plan views, include even more as they contain critical dimension and layout information
+        if img.get('classification', '').lower() == 'plan':
+            verbatim_preview = text_verbatim[:3000] + "..." if len(text_verbatim) > 3000 else text_verbatim
+        elif img.get('classification', '').lower() in ['section', 'detail']:
+            # Sections and details contain critical structural information
+            verbatim_preview = text_verbatim[:2000] + "..." if len(text_verbatim) > 2000 else text_verbatim
+        else:
+            verbatim_preview = text_verbatim[:1000] + "..." if len(text_verbatim) > 1000 else text_verbatim
+        context_text += f"  Text (verbatim - use extensively in description): {verbatim_preview}\n"
+    
+    summary = img.get('summary', '')
+    if summary:
+        context_text += f"  Summary: {summary}\n"
+    
+    context_text += "\n" + "-" * 80 + "\n\n"
+    return context_text
+
+
+def format_image_extractions(images_data: List[Dict[str, Any]]) -> str:
+    """Image extractions section of a synthesis / map prompt"""
+    context_text = "Image Extractions:\n"
+    context_text += "=" * 80 + "\n\n"
     for i, img in enumerate(images_data, 1):
-        context_text += f"Image {i}: {img.get('image_id', 'unknown')}\n"
-        context_text += f"  Classification: {img.get('classification', 'N/A')}\n"
-        context_text += f"  Location: {img.get('location', 'N/A')}\n"
-        if img.get('level') is not None:
-            context_text += f"  Level: {img.get('level', 'N/A')}\n"
-        if img.get('orientation') is not None:
-            context_text += f"  Orientation: {img.get('orientation', 'N/A')}\n"
-        grid_refs = img.get('grid_references', [])
-        if grid_refs:
-            context_text += f"  Grid References: {', '.join(grid_refs)}\n"
-        context_text += f"  Page: {img.get('page_number', 'N/A')}\n"
-        context_text += f"  Element Type: {img.get('element_type', 'N/A')}\n"
-        
-        key_components = img.get('key_components', [])
-        if key_components:
-            context_text += f"  Key Components: {', '.join(key_components)}\n"
-        
-        section_callouts = img.get('section_callouts', [])
-        if section_callouts:
-            context_text += f"  Section Callouts: {', '.join(section_callouts)}\n"
+        context_text += format_image_extraction(i, img)
+    return context_text
 
-        element_callouts = img.get('element_callouts', [])
-        if element_callouts:
-            context_text += f"  Element Callouts: {', '.join(element_callouts)}\n"
+
+def partition_by_page(images_data: List[Dict[str, Any]], max_tokens: int) -> List[List[Dict[str, Any]]]:
+    """
+    Group extractions by page and pack consecutive pages into chunks of at most max_tokens.
+
+    A page larger than max_tokens is split on its own. Boundaries depend only on
+    page contents, so editing one page leaves the other chunks (and their cached
+    partials) unchanged unless its size crosses a boundary.
+    """
+    pages: Dict[Any, List[Dict[str, Any]]] = {}
+    for img in images_data:
+        pages.setdefault(img.get("page_number"), []).append(img)
+
+    def page_order(page):
+        return (page is None, str(type(page)), page if page is not None else 0)
+    
+    chunks: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    current_tokens = 0
+    for page in sorted(pages, key=page_order):
+        sizes = [estimate_tokens(format_image_extraction(0, img)) for img in pages[page]]
+        page_tokens = sum(sizes)
+        if current and current_tokens + page_tokens > max_tokens:
+            chunks.append(current)
+            current, current_tokens = [], 0
+        if page_tokens <= max_tokens:
+            current.extend(pages[page])
+            current_tokens += page_tokens
+            continue
+        # Oversized page: split it across chunks image by image
+        for img, size in zip(pages[page], sizes):
+            if current and current_tokens + size > max_tokens:
+                chunks.append(current)
+                current, current_tokens = [], 0
+            current.append(img)
+            current_tokens += size
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class PartialCache:
+    """Map/merge/dimension results for one project, keyed by a hash of everything that produced them"""
+
+    def __init__(self, project_id: str):
+        self.dir = Path(PARTIALS_DIR) / project_id
+        self.used = set()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, stage: str, *parts: str) -> str:
+        digest = hashlib.sha256()
+        for part in (PARTIAL_CACHE_VERSION, SYNTHESIS_MODEL, stage) + parts:
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return f"{stage}_{digest.hexdigest()[:32]}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        self.used.add(key)
+        path = self.dir / f"{key}.json"
+        if path.exists():
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    value = json.load(f)
+                self.hits += 1
+                return value
+            except (OSError, json.JSONDecodeError):
+                pass
+        self.misses += 1
+        return None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        write_json_atomic(self.dir / f"{key}.json", value)
+
+    def prune(self):
+        """Remove cached results not used by the last synthesis (pages that changed or disappeared)"""
+        if not self.dir.exists():
+            return
+        for path in self.dir.glob("*.json"):
+            if path.stem not in self.used:
+                path.unlink()
+
+
+# =============================
+# LLM requests
+# =============================
+async def chat_json(engine: ExtractionEngine, system_prompt: Optional[str], user_content: Any, max_tokens: int,
+                    label: str, temperature: float = 0.2, estimated_input_tokens: Optional[int] = None) -> Dict[str, Any]:
+    """
+    One JSON-mode GPT-4o request through the engine (rate limited, retried)
+
+    user_content is a prompt string, or a callable returning (an awaitable of) message
+    content, which is only built once the request holds an in-flight slot.
+    """
+    async def request() -> EngineResponse:
+        content = user_content() if callable(user_content) else user_content
+        if asyncio.iscoroutine(content):
+            content = await content
+        messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
+        messages.append({"role": "user", "content": content})
+        raw = await async_client.chat.completions.with_raw_response.create(
+            model=SYNTHESIS_MODEL,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            response_format={"type": "json_object"}
+        )
+        response = raw.parse()
+        used_tokens = response.usage.total_tokens if response.usage else None
+        return EngineResponse(response.choices[0].message.content, raw.headers, used_tokens)
+    
+    if estimated_input_tokens is None:
+        estimated_input_tokens = estimate_tokens(user_content)
+    # OpenAI counts max_tokens against the TPM budget when admitting a request
+    estimated_tokens = estimate_tokens(system_prompt or "") + estimated_input_tokens + max_tokens
+    return json.loads(await engine.submit(request, estimated_tokens, label=label))
+
+
+async def cached_chat_json(engine: ExtractionEngine, cache: PartialCache, stage: str, system_prompt: str,
+                           user_prompt: str, max_tokens: int, label: str) -> Dict[str, Any]:
+    """chat_json, reusing the cached result when the same prompt was answered before"""
+    key = cache.key(stage, system_prompt, user_prompt)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    result = await chat_json(engine, system_prompt, user_prompt, max_tokens, label)
+    cache.put(key, result)
+    return result
+
+
+# =============================
+# Map-reduce
+# =============================
+async def map_partials(engine: ExtractionEngine, cache: PartialCache, project_id: str,
+                       chunks: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Partial findings for every page group, requested concurrently"""
+    async def summarize(n: int, images: List[Dict[str, Any]]) -> Dict[str, Any]:
+        pages = sorted({img.get("page_number") for img in images if img.get("page_number") is not None})
+        # No chunk numbering in the prompt, so a chunk's cache key depends only on its pages
+        user_prompt = (
+            f"Project ID: {project_id}\n"
+            f"Pages in this part: {', '.join(str(p) for p in pages) or 'N/A'}\n\n"
+            + format_image_extractions(images)
+        )
+        partial = await cached_chat_json(engine, cache, "map", MAP_PROMPT, user_prompt, MAP_OUTPUT_TOKENS,
+                                         label=f"{project_id} map {n}/{len(chunks)}")
+        partial["pages"] = pages
+        return partial
+    
+    return list(await asyncio.gather(*(summarize(n, chunk) for n, chunk in enumerate(chunks, 1))))
+
+
+def pack_partials(partials: List[Dict[str, Any]], max_tokens: int) -> List[List[Dict[str, Any]]]:
+    """Consecutive groups of partials that fit in max_tokens (at least two per group)"""
+    groups: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    current_tokens = 0
+    for partial in partials:
+        size = estimate_tokens(json.dumps(partial, ensure_ascii=False))
+        if len(current) >= 2 and current_tokens + size > max_tokens:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(partial)
+        current_tokens += size
+    if current:
+        groups.append(current)
+    return groups
+
+
+async def reduce_partials(engine: ExtractionEngine, cache: PartialCache, project_id: str,
+                          partials: List[Dict[str, Any]], max_tokens: int) -> List[Dict[str, Any]]:
+    """Merge partials level by level until all of them fit in one request of max_tokens"""
+    level = 1
+    while len(partials) > 1 and estimate_tokens(json.dumps(partials, ensure_ascii=False)) > max_tokens:
+        groups = pack_partials(partials, max_tokens)
+        print(f"      🔗 Merge level {level}: {len(partials)} partials → {len(groups)}")
+
+        async def merge(n: int, group: List[Dict[str, Any]]) -> Dict[str, Any]:
+            if len(group) == 1:
+                return group[0]
+            user_prompt = (
+                f"Project ID: {project_id}\n\n"
+                f"PARTIAL FINDINGS ({len(group)} parts):\n"
+                + json.dumps(group, indent=1, ensure_ascii=False)
+            )
+            merged = await cached_chat_json(engine, cache, "merge", MERGE_PROMPT, user_prompt, MERGE_OUTPUT_TOKENS,
+                                            label=f"{project_id} merge {level}.{n}")
+            merged["pages"] = sorted({p for partial in group for p in partial.get("pages") or []},
+                                     key=lambda p: (str(type(p)), p))
+            return merged
         
-        text_verbatim = img.get('text_verbatim', '')
-        if text_verbatim:
-            # Include more verbatim text to ensure all keywords and technical details are available for synthesis
-            # For Plan views, include even more as they contain critical dimension and layout information
-            if img.get('classification', '').lower() == 'plan':
-                verbatim_preview = text_verbatim[:3000] + "..." if len(text_verbatim) > 3000 else text_verbatim
-            elif img.get('classification', '').lower() in ['section', 'detail']:
-                # Sections and details contain critical structural information
-                verbatim_preview = text_verbatim[:2000] + "..." if len(text_verbatim) > 2000 else text_verbatim
-            else:
-                verbatim_preview = text_verbatim[:1000] + "..." if len(text_verbatim) > 1000 else text_verbatim
-            context_text += f"  Text (verbatim - use extensively in description): {verbatim_preview}\n"
+        partials = list(await asyncio.gather(*(merge(n, group) for n, group in enumerate(groups, 1))))
+        level += 1
+    return partials
+
+
+# =============================
+# Dimensions
+# =============================
+def build_dimension_content(image_path: Path) -> List[Dict[str, Any]]:
+    """User message content for dimension extraction from one overall building image"""
+    # Load and encode image
+    img = Image.open(image_path)
+    
+    # Convert to base64
+    buffered = BytesIO()
+    img.save(buffered, format="PNG")
+    img_base64 = base64.b64encode(buffered.getvalue()).decode()
+    
+    return [
+        {"type": "text", "text": DIMENSION_PROMPT},
+        {
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:image/png;base64,{img_base64}",
+                "detail": "high"
+            }
+        }
+    ]
+
+
+async def extract_dimensions_from_image(engine: ExtractionEngine, cache: PartialCache, image_path: Path) -> Optional[Dict[str, str]]:
+    """Extract building dimensions from an overall building image using GPT-4o Vision"""
+    try:
+        image_bytes = await asyncio.to_thread(image_path.read_bytes)
+        key = cache.key("dimensions", hashlib.sha256(image_bytes).hexdigest())
+        result_json = cache.get(key)
+        if result_json is None:
+            result_json = await chat_json(
+                engine, None, lambda: asyncio.to_thread(build_dimension_content, image_path), 500,
+                label=f"dimensions {image_path.name}", temperature=0.1,
+                estimated_input_tokens=estimate_tokens(DIMENSION_PROMPT) + IMAGE_TOKEN_ESTIMATE
+            )
+            cache.put(key, result_json)
         
-        summary = img.get('summary', '')
-        if summary:
-            context_text += f"  Summary: {summary}\n"
+        # Validate that we got at least some dimension data
+        if any(result_json.get(k) for k in DIMENSION_KEYS):
+            return result_json
         
-        context_text += "\n" + "-" * 80 + "\n\n"
+        return None
+    
+    except Exception as e:
+        print(f"      ⚠️ Error extracting dimensions from {image_path.name}: {e}")
+        return None
+
+
+async def extract_overall_dimensions(engine: ExtractionEngine, cache: PartialCache, project_id: str) -> Dict[str, str]:
+    """Dimensions from the overall building images at the project root (all images requested concurrently)"""
+    # Find overall building images
+    overall_images = find_overall_building_images(project_id)
+    
+    if not overall_images:
+        print(f"      ⚠️ No overall building images found at root level for {project_id}")
+        return {}
+    
+    print(f"      🔍 Found {len(overall_images)} overall building image(s), extracting dimensions...")
+    
+    results = await asyncio.gather(*(extract_dimensions_from_image(engine, cache, path) for path in overall_images))
+    
+    # Merge extracted dimensions in image order (prefer non-null values)
+    extracted_dims = {}
+    for dims in results:
+        if dims:
+            for key, value in dims.items():
+                if value and value != "null" and not extracted_dims.get(key):
+                    extracted_dims[key] = value
+    return extracted_dims
+
+
+def validate_dimensions(existing_dimensions: Dict[str, Any], extracted_dims: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge dimensions from overall building images with the synthesized ones"""
+    # Merge with existing dimensions (prefer extracted if available, otherwise keep existing)
+    final_dims = {}
+    for key in DIMENSION_KEYS:
+        # Prefer extracted dimensions if available, otherwise use existing
+        if extracted_dims.get(key) and extracted_dims[key] != "null":
+            final_dims[key] = extracted_dims[key]
+        elif existing_dimensions.get(key) and existing_dimensions[key] != "null":
+            final_dims[key] = existing_dimensions[key]
+        else:
+            final_dims[key] = None
+    
+    # Log what we found
+    if extracted_dims:
+        print(f"      ✅ Extracted dimensions: {extracted_dims}")
+    if any(final_dims.values()):
+        print(f"      ✅ Final dimensions: {final_dims}")
+    else:
+        print(f"      ⚠️ No dimensions found in overall images or existing data")
+    
+    return final_dims
+
+
+# =============================
+# Synthesis
+# =============================
+async def synthesize_building_info_async(engine: ExtractionEngine, project_id: str,
+                                         structured_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Synthesize building-level information from structured image data
+
+    Projects whose full context fits SINGLE_PASS_INPUT_TOKENS are synthesized in
+    one request. Larger projects are mapped to per-page-group partial findings
+    (concurrently, cached by content), merged hierarchically within
+    MERGE_INPUT_TOKENS, and synthesized from the merged partials. Dimension
+    extraction from overall building images runs alongside.
+    """
+    # Load page metadata for title block information
+    page_metadata = load_page_metadata(project_id)
+    
+    # Prepare context from all images
+    images_data = structured_data.get("images", [])
+    
+    if not images_data:
+        raise ValueError(f"No image data found for project {project_id}")
+    
+    cache = PartialCache(project_id)
+    dimensions_task = asyncio.create_task(extract_overall_dimensions(engine, cache, project_id))
     
     try:
-        user_prompt = f"""Analyze the following engineering drawing extractions and synthesize building-level information.
+        overview = build_project_overview(project_id, images_data, page_metadata)
+        context_text = overview + format_image_extractions(images_data)
+        
+        if estimate_tokens(context_text) <= SINGLE_PASS_INPUT_TOKENS:
+            user_prompt = f"""Analyze the following engineering drawing extractions and synthesize building-level information.
 
-CRITICAL INSTRUCTIONS FOR overall_building_description:
-1. DO NOT REPEAT information already in other JSON fields (project_id, project_name, client, location, building_type, number_of_levels, levels, dimensions, gravity_system, lateral_system, concrete_strengths, steel_shapes, rebar_sizes, other_materials, structural_beams, structural_columns, structural_trusses, key_elements). This field is for NEW technical information only.
-2. MUST be 500-800 words of DENSE technical content - every sentence must contain technical information, no fluff
-3. MAXIMUM KEYWORD DENSITY - pack as many technical terms, material designations, connection types, and engineering jargon as possible into every sentence
-4. USE VERBATIM TEXT extensively - incorporate exact phrases, specifications, and terminology from "Text (verbatim)" sections (e.g., 'W8X24', '25 MPa', 'A325 bolts', 'SEE DETAIL 3/S4.2')
-5. ENGINEERING JARGON throughout - use terms like load path, moment connection, shear transfer, bearing capacity, deflection criteria, lateral stability, diaphragm action, composite action
-6. FOCUS ON: detailed specifications (material grades, bolt sizes, weld types), load path analysis (connection types, bearing details), construction details (joint configurations, reinforcement layouts), spatial relationships (grid connections, section relationships), code compliance notes, fabrication requirements, assembly sequences, special conditions
-7. NO FLUFF - be direct, precise, technical. Avoid descriptive language or general statements.
+{SYNTHESIS_INSTRUCTIONS}
 
 Engineering Drawing Extractions:
 {context_text}"""
-        
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": SYNTHESIS_PROMPT},
-                {"role": "user", "content": user_prompt}
-            ],
-            max_tokens=16384,
-            temperature=0.2,
-            response_format={"type": "json_object"}
-        )
-        
-        result_text = response.choices[0].message.content
-        result_json = json.loads(result_text)
+        else:
+            chunks = partition_by_page(images_data, MAP_INPUT_TOKENS)
+            print(f"      🗺️ Large project (~{estimate_tokens(context_text):,} tokens): summarizing {len(chunks)} page group(s)...")
+            partials = await map_partials(engine, cache, project_id, chunks)
+            partials = await reduce_partials(engine, cache, project_id, partials, MERGE_INPUT_TOKENS)
+            print(f"      ♻️ Cached partials reused: {cache.hits}, new requests: {cache.misses}")
+            
+            user_prompt = f"""Synthesize building-level information from the following engineering drawing set.
+
+The set was too large for one request, so it was reviewed in parts. PARTIAL FINDINGS below cover all {len(images_data)} image extractions (grouped by page); "technical_notes" and "section_links" carry the verbatim technical content to use for overall_building_description, and "dimension_candidates" say which dimension lines are overall. The project overview gives title blocks, section connectivity and level grouping for the whole set.
+
+{SYNTHESIS_INSTRUCTIONS}
+
+PROJECT OVERVIEW:
+{truncate_to_tokens(overview, OVERVIEW_TOKENS)}
+PARTIAL FINDINGS:
+{json.dumps(partials, indent=1, ensure_ascii=False)}"""
+
+        result_json = await chat_json(engine, SYNTHESIS_PROMPT, user_prompt, FINAL_OUTPUT_TOKENS,
+                                      label=f"{project_id} synthesis")
         
         # Ensure project_id is set
         result_json["project_id"] = project_id
         
         # Extract and validate dimensions from overall building images
-        existing_dims = {
-            "dimensions_length": result_json.get("dimensions_length"),
-            "dimensions_width": result_json.get("dimensions_width"),
-            "dimensions_height": result_json.get("dimensions_height"),
-            "dimensions_area": result_json.get("dimensions_area")
-        }
+        existing_dims = {key: result_json.get(key) for key in DIMENSION_KEYS}
         
         print(f"      🔍 Validating dimensions from overall building images...")
-        validated_dims = extract_and_validate_dimensions(project_id, existing_dims, client)
+        validated_dims = validate_dimensions(existing_dims, await dimensions_task)
         
         # Update result with validated dimensions (prefer extracted if available)
-        for dim_key in ["dimensions_length", "dimensions_width", "dimensions_height", "dimensions_area"]:
+        for dim_key in DIMENSION_KEYS:
             if validated_dims.get(dim_key):
                 result_json[dim_key] = validated_dims[dim_key]
             elif not result_json.get(dim_key):
                 result_json[dim_key] = None
         
+        cache.prune()
         return result_json
     
     except Exception as e:
+        dimensions_task.cancel()
         print(f"      ❌ Synthesis failed: {e}")
         import traceback
         traceback.print_exc()
         return None
 
 
-def process_project(project_id: str, client: OpenAI):
-    """Process a single project to synthesize building information"""
+def make_engine() -> ExtractionEngine:
+    """Engine shared by every request of a synthesis run"""
+    return ExtractionEngine(
+        RateLimiter(requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE),
+        max_in_flight=MAX_IN_FLIGHT,
+        max_retries=MAX_RETRIES
+    )
+
+
+def synthesize_building_info(project_id: str, structured_data: Dict[str, Any], client: OpenAI) -> Dict[str, Any]:
+    """Synthesize building-level information from structured image data (synchronous wrapper)"""
+    async def run():
+        global async_client
+        async_client = AsyncOpenAI(api_key=client.api_key if client else API_KEY, max_retries=0)  # Retries are handled by the engine
+        try:
+            return await synthesize_building_info_async(make_engine(), project_id, structured_data)
+        finally:
+            await async_client.close()
+            async_client = None
+    
+    return asyncio.run(run())
+
+
+async def process_project_async(engine: ExtractionEngine, project_id: str) -> bool:
+    """Process a single project to synthesize building information; True if building info was saved"""
     
     print(f"\n--- Synthesizing Building Info for Project: {project_id} ---")
     
     # Load structured JSON
     try:
-        structured_data = load_structured_json(project_id)
+        structured_data = await asyncio.to_thread(load_structured_json, project_id)
         print(f"   📂 Loaded {len(structured_data.get('images', []))} image extractions")
     except Exception as e:
         print(f"   ❌ Error loading structured JSON: {e}")
-        return
+        return False
     
     # Synthesize building information
     print(f"   ⚙️ Synthesizing building-level information...")
-    building_info = synthesize_building_info(project_id, structured_data, client)
+    building_info = await synthesize_building_info_async(engine, project_id, structured_data)
     
     if not building_info:
         print(f"   ❌ Synthesis failed")
-        return
+        return False
     
     # Save output
     output_dir = Path(OUTPUT_DIR)
@@ -546,8 +906,7 @@ def process_project(project_id: str, client: OpenAI):
     
     output_file = output_dir / f"building_info_{project_id}.json"
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(building_info, f, indent=2, ensure_ascii=False)
+    write_json_atomic(output_file, building_info)
     
     print(f"   ✅ Complete!")
     print(f"   💾 Saved to: {output_file}")
@@ -579,6 +938,43 @@ def process_project(project_id: str, client: OpenAI):
         print(f"      Lateral System: {lateral_system}")
     else:
         print(f"      Lateral System: N/A")
+    return True
+
+
+async def run_synthesis(project_ids: List[str], api_key: Optional[str] = None) -> Dict[str, bool]:
+    """Synthesize every project, sharing one engine (and rate-limit budget) across projects"""
+    global async_client
+    
+    async_client = AsyncOpenAI(api_key=api_key or API_KEY, max_retries=0)  # Retries are handled by the engine
+    engine = make_engine()
+    project_slots = asyncio.Semaphore(max(1, PROJECT_CONCURRENCY))
+    results: Dict[str, bool] = {}
+    
+    async def run_project(project_id: str):
+        async with project_slots:
+            try:
+                results[project_id] = await process_project_async(engine, project_id)
+            except Exception as e:
+                print(f"❌ Error processing {project_id}: {e}")
+                import traceback
+                traceback.print_exc()
+                results[project_id] = False
+    
+    try:
+        await asyncio.gather(*(run_project(project_id) for project_id in project_ids))
+    finally:
+        await async_client.close()
+        async_client = None
+    
+    stats = engine.stats
+    print(f"\n📊 API requests: {stats['requests']}, retries: {stats['retries']}, failed: {stats['failures']}")
+    return results
+
+
+def process_project(project_id: str, client: OpenAI) -> bool:
+    """Process a single project to synthesize building information"""
+    api_key = client.api_key if client else None
+    return asyncio.run(run_synthesis([project_id], api_key)).get(project_id, False)
 
 
 def main():
@@ -602,7 +998,7 @@ def main():
     import sys
     if len(sys.argv) > 1:
         project_id = sys.argv[1]
-        process_project(project_id, client)
+        asyncio.run(run_synthesis([project_id]))
     else:
         # Process all projects in structured_json directory
         structured_json_path = Path(STRUCTURED_JSON_DIR)
@@ -621,14 +1017,7 @@ def main():
         print(f"Found {len(projects)} project(s): {', '.join(projects)}")
         print()
         
-        for project_id in projects:
-            try:
-                process_project(project_id, client)
-            except Exception as e:
-                print(f"❌ Error processing {project_id}: {e}")
-                import traceback
-                traceback.print_exc()
-                continue
+        asyncio.run(run_synthesis(projects))
     
     print("\n" + "="*60)
     print("✨ Synthesis Complete!")
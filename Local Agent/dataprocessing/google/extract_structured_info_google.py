@@ -16,9 +16,11 @@ For each image, it extracts:
 """
 
 import os
+import sys
 import json
 import base64
 import re
+import asyncio
 from pathlib import Path
 from typing import Dict, Any, List, Optional
 from google.oauth2 import service_account
@@ -29,6 +31,10 @@ from PIL import Image
 from tqdm import tqdm
 import io
 
+# Shared extraction engine lives with the Florence scripts
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "florence_embedding"))
+from extraction_engine import ExtractionEngine, RateLimiter, EngineResponse, CheckpointLog, materialize
+
 # Load environment variables from .env file if it exists
 try:
     from dotenv import load_dotenv
@@ -51,6 +57,14 @@ OCR_RESULTS_PATH = os.path.join(BASE_DIR, "google", "ocr_results.json")
 # Vertex AI Configuration
 VERTEX_AI_LOCATION = "us-east4"  # Change if your Vertex AI is in a different region
 GEMINI_MODEL = "gemini-2.5-flash-lite"  # Vertex AI model name
+# Concurrency / rate limits (Vertex AI quota for the model; no rate-limit headers to refine from)
+MAX_IN_FLIGHT = int(os.getenv("EXTRACTION_MAX_IN_FLIGHT", "8"))  # Concurrent API requests
+PROJECT_CONCURRENCY = int(os.getenv("EXTRACTION_PROJECT_CONCURRENCY", "4"))  # Projects processed at once
+REQUESTS_PER_MINUTE = float(os.getenv("EXTRACTION_RPM", "300"))
+TOKENS_PER_MINUTE = float(os.getenv("EXTRACTION_TPM", "1000000"))
+MAX_RETRIES = int(os.getenv("EXTRACTION_MAX_RETRIES", "5"))
+IMAGE_TOKEN_ESTIMATE = 258  # Gemini tokens per image
+OUTPUT_TOKEN_ESTIMATE = 2048  # Typical JSON response for one region
 # =================================================
 
 # System prompt for Gemini Vision (same as GPT-4o prompt)
@@ -587,107 +601,121 @@ def find_all_region_images(project_dir: Path) -> List[Dict[str, Any]]:
     return images
 
 
-def process_image_batch(
-    image_data_list: List[Dict[str, Any]],
+async def process_image(
+    engine: ExtractionEngine,
+    img_data: Dict[str, Any],
     project_id: str,
     ocr_data: Dict[str, Dict[str, Any]],
-) -> List[Dict[str, Any]]:
-    """Process a batch of region images with Gemini Vision"""
+) -> Optional[Dict[str, Any]]:
+    """Process one region image with Gemini Vision (Gemini works better one image at a time)"""
     global model
     
-    results = []
-    
-    # Process images one at a time (Gemini works better this way)
-    for img_data in image_data_list:
-        try:
-            img_path = img_data["path"]
-            filename = img_data["filename"]
-            
-            # Read image as bytes directly (since they're already PNG files)
-            with open(str(img_path), 'rb') as f:
-                image_bytes = f.read()
-            
-            image_part = Part.from_data(image_bytes, mime_type="image/png")
-            
-            # Get OCR text if available (for adding to output later, not for prompting)
-            # Match by full path first (most accurate), then fall back to filename
-            ocr_text = ""
-            img_path_str = str(img_path).replace('\\', '/')
-            if img_path_str in ocr_data:
-                ocr_text = ocr_data[img_path_str].get('text', '')
-            elif filename in ocr_data:
-                ocr_text = ocr_data[filename].get('text', '')
-            
-            # Build prompt - DO NOT include verbatim text extraction in the prompt
-            # The VLM should focus on visual analysis only
-            prompt_parts = [
-                "Analyze this engineering drawing image and extract structured information based on visual analysis. Output a JSON object with a single key 'images' containing an array with ONE image analysis object.",
-                "",
-                "Focus on visual elements: classification, location, section callouts, element type, element callouts, key components, and a summary that explains the visual structure. Verbatim text will be provided separately from OCR."
-            ]
-            
-            # Optionally provide OCR text for context in summary generation (truncated)
-            if ocr_text:
-                prompt_parts.append(f"\n**OCR Text Available (for summary context only):**\n{ocr_text[:1000]}...")
-                prompt_parts.append("\nUse this OCR text to inform your summary - explain what the text values mean in the context of the visual elements shown. DO NOT repeat the full verbatim text in your summary, but DO reference specific values and explain their meaning.")
-            
-            # Add context
-            context_lines = [f"Image ID: {filename}"]
-            page_number = img_data.get("page_number")
-            if page_number is not None:
-                context_lines.append(f"Page Number: {page_number}")
-            
-            prompt_parts.append("\n".join(context_lines))
-            prompt = "\n".join(prompt_parts)
-            
-            # Build full prompt
-            full_prompt = f"{EXTRACTION_PROMPT}\n\n{prompt}"
-            
+    try:
+        img_path = img_data["path"]
+        filename = img_data["filename"]
+        
+        # Get OCR text if available (for adding to output later, not for prompting)
+        # Match by full path first (most accurate), then fall back to filename
+        ocr_text = ""
+        img_path_str = str(img_path).replace('\\', '/')
+        if img_path_str in ocr_data:
+            ocr_text = ocr_data[img_path_str].get('text', '')
+        elif filename in ocr_data:
+            ocr_text = ocr_data[filename].get('text', '')
+        
+        # Build prompt - DO NOT include verbatim text extraction in the prompt
+        # The VLM should focus on visual analysis only
+        prompt_parts = [
+            "Analyze this engineering drawing image and extract structured information based on visual analysis. Output a JSON object with a single key 'images' containing an array with ONE image analysis object.",
+            "",
+            "Focus on visual elements: classification, location, section callouts, element type, element callouts, key components, and a summary that explains the visual structure. Verbatim text will be provided separately from OCR."
+        ]
+        
+        # Optionally provide OCR text for context in summary generation (truncated)
+        if ocr_text:
+            prompt_parts.append(f"\n**OCR Text Available (for summary context only):**\n{ocr_text[:1000]}...")
+            prompt_parts.append("\nUse this OCR text to inform your summary - explain what the text values mean in the context of the visual elements shown. DO NOT repeat the full verbatim text in your summary, but DO reference specific values and explain their meaning.")
+        
+        # Add context
+        context_lines = [f"Image ID: {filename}"]
+        page_number = img_data.get("page_number")
+        if page_number is not None:
+            context_lines.append(f"Page Number: {page_number}")
+        
+        prompt_parts.append("\n".join(context_lines))
+        prompt = "\n".join(prompt_parts)
+        
+        # Build full prompt
+        full_prompt = f"{EXTRACTION_PROMPT}\n\n{prompt}"
+        image_part = None
+        
+        async def request() -> EngineResponse:
+            nonlocal image_part
+            if image_part is None:
+                # Read image as bytes directly (since they're already PNG files)
+                image_bytes = await asyncio.to_thread(Path(img_path).read_bytes)
+                image_part = Part.from_data(image_bytes, mime_type="image/png")
             # Generate response using Vertex AI
-            response = model.generate_content(
+            response = await model.generate_content_async(
                 [full_prompt, image_part],
                 generation_config={
                     "temperature": 0.2,
                     "response_mime_type": "application/json",
                 }
             )
-            
-            result_text = response.text
-            result_json = parse_json_with_retry(result_text)
-            
-            # Extract images array
-            images_array = result_json.get("images", [])
-            if images_array:
-                img_obj = images_array[0]
-                img_obj["image_id"] = filename
-                img_obj["project_id"] = project_id
-                img_obj["page_number"] = page_number
-                img_obj["region_number"] = img_data.get("region_number")
-                img_obj["relative_path"] = img_data.get("relative_path")
-                
-                # Add verbatim text from OCR
-                if ocr_text:
-                    img_obj["text_verbatim"] = ocr_text
-                
-                # Truncate summary to 500 words if needed
-                if "summary" in img_obj and img_obj["summary"]:
-                    img_obj["summary"] = truncate_summary(img_obj["summary"], max_words=500)
-                
-                results.append(img_obj)
-            
-        except Exception as e:
-            print(f"      ❌ Failed to process {img_data.get('filename', 'unknown')}: {e}")
-            import traceback
-            traceback.print_exc()
-            continue
-    
-    return results
+            usage = getattr(response, "usage_metadata", None)
+            return EngineResponse(response.text, used_tokens=getattr(usage, "total_token_count", None))
+        
+        estimated_tokens = IMAGE_TOKEN_ESTIMATE + len(full_prompt) // 4 + OUTPUT_TOKEN_ESTIMATE
+        result_text = await engine.submit(request, estimated_tokens, label=f"{project_id} page {page_number} {filename}")
+        result_json = await asyncio.to_thread(parse_json_with_retry, result_text)
+        
+        # Extract images array
+        images_array = result_json.get("images", [])
+        if not images_array:
+            return None
+        img_obj = images_array[0]
+        img_obj["image_id"] = filename
+        img_obj["project_id"] = project_id
+        img_obj["page_number"] = page_number
+        img_obj["region_number"] = img_data.get("region_number")
+        img_obj["relative_path"] = img_data.get("relative_path")
+        
+        # Add verbatim text from OCR
+        if ocr_text:
+            img_obj["text_verbatim"] = ocr_text
+        
+        # Truncate summary to 500 words if needed
+        if "summary" in img_obj and img_obj["summary"]:
+            img_obj["summary"] = truncate_summary(img_obj["summary"], max_words=500)
+        
+        return img_obj
+        
+    except Exception as e:
+        print(f"      ❌ Failed to process {img_data.get('filename', 'unknown')}: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
 
 
-def process_project(project_id: str):
+async def process_image_batch(
+    engine: ExtractionEngine,
+    image_data_list: List[Dict[str, Any]],
+    project_id: str,
+    ocr_data: Dict[str, Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """Process a batch of region images with Gemini Vision (images run concurrently through the engine)"""
+    results = await asyncio.gather(*(process_image(engine, img, project_id, ocr_data) for img in image_data_list))
+    return [img_obj for img_obj in results if img_obj is not None]
+
+
+def result_key(img: Dict[str, Any]) -> tuple:
+    """Resume key: region filenames repeat across pages, and relative_path is left empty here"""
+    return (img.get("page_number"), img.get("image_id") or img.get("filename"))
+
+
+async def process_project_async(engine: ExtractionEngine, project_id: str):
     """Process all region images for a single project"""
-    global model
-    
     project_dir = Path(TEST_EMBEDDINGS_DIR) / project_id
     output_dir = Path(OUTPUT_DIR) / project_id
     
@@ -698,13 +726,14 @@ def process_project(project_id: str):
     # Create output directory
     output_dir.mkdir(parents=True, exist_ok=True)
     output_file = output_dir / f"structured_{project_id}.json"
+    checkpoint = CheckpointLog(output_dir / f"checkpoint_{project_id}.jsonl")
     
     print(f"\n--- Processing Project: {project_id} ---")
     print(f"   Input: {project_dir}")
     print(f"   Output: {output_file}")
     
     # Load OCR results (or run OCR if needed)
-    ocr_data = load_ocr_results(project_dir, project_id)
+    ocr_data = await asyncio.to_thread(load_ocr_results, project_dir, project_id)
     
     # Find all region images
     region_images = find_all_region_images(project_dir)
@@ -716,25 +745,25 @@ def process_project(project_id: str):
     
     # Load existing data if resuming
     existing_data = {"images": []}
-    existing_ids = set()
     
     if output_file.exists():
         try:
             with open(output_file, 'r', encoding='utf-8') as f:
                 existing_data = json.load(f)
-                existing_ids = {img.get("image_id") for img in existing_data.get("images", []) if img.get("image_id")}
-            print(f"   📂 Resuming: {len(existing_ids)} images already processed")
-            if len(existing_ids) > 0:
-                print(f"   📋 Sample existing IDs: {list(existing_ids)[:5]}")
         except Exception as e:
             print(f"   ⚠️ Could not load existing file: {e}")
     
-    # Filter out already processed images - match by filename
-    images_to_process = []
-    for img in region_images:
-        filename = img["filename"]
-        if filename not in existing_ids:
-            images_to_process.append(img)
+    # Fold results checkpointed by an interrupted run into the project JSON
+    checkpointed = checkpoint.load()
+    if checkpointed:
+        print(f"   📂 Recovering {len(checkpointed)} images from checkpoint log")
+        existing_data = await asyncio.to_thread(materialize, checkpoint, output_file, existing_data, result_key)
+    existing_ids = {result_key(img) for img in existing_data.get("images", []) if img.get("image_id")}
+    if existing_ids:
+        print(f"   📂 Resuming: {len(existing_ids)} images already processed")
+    
+    # Filter out already processed images - match by page and filename
+    images_to_process = [img for img in region_images if result_key(img) not in existing_ids]
     
     print(f"   📊 Total images: {len(region_images)}, Already processed: {len(existing_ids)}, To process: {len(images_to_process)}")
     
@@ -742,37 +771,58 @@ def process_project(project_id: str):
         print(f"   ✅ All images already processed!")
         return
     
-    if len(images_to_process) > 0:
-        print(f"   🔄 Will process {len(images_to_process)} new images")
-        print(f"   📝 Sample images to process: {[img['filename'] for img in images_to_process[:5]]}")
+    batches = [images_to_process[i:i + BATCH_SIZE] for i in range(0, len(images_to_process), BATCH_SIZE)]
+    print(f"   ⚙️ Processing {len(images_to_process)} new images in {len(batches)} batches...")
     
-    print(f"   ⚙️ Processing {len(images_to_process)} new images...")
+    async def run_batch(batch_num: int, batch: List[Dict[str, Any]]) -> int:
+        results = await process_image_batch(engine, batch, project_id, ocr_data)
+        if not results:
+            print(f"      ⚠️ No results for batch {batch_num}/{len(batches)}")
+            return 0
+        # Durable as soon as the batch returns; folded into the project JSON at the end
+        await asyncio.to_thread(checkpoint.append, results)
+        print(f"      ✅ Saved {len(results)} images (batch {batch_num}/{len(batches)})")
+        return len(results)
     
-    # Process in batches
-    for i in range(0, len(images_to_process), BATCH_SIZE):
-        batch = images_to_process[i:i + BATCH_SIZE]
-        batch_num = i // BATCH_SIZE + 1
-        total_batches = (len(images_to_process) + BATCH_SIZE - 1) // BATCH_SIZE
-        
-        print(f"   ⚙️ Processing Batch {batch_num}/{total_batches} ({len(batch)} images)...")
-        
-        results = process_image_batch(batch, project_id, ocr_data)
-        
-        if results:
-            existing_data["images"].extend(results)
-            
-            # Save incrementally
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(existing_data, f, indent=2, ensure_ascii=False)
-            
-            print(f"      ✅ Saved {len(results)} images")
-        else:
-            print(f"      ⚠️ No results for this batch")
+    try:
+        await asyncio.gather(*(run_batch(n, batch) for n, batch in enumerate(batches, start=1)))
+    finally:
+        existing_data = await asyncio.to_thread(materialize, checkpoint, output_file, existing_data, result_key)
     
     print(f"   ✅ Complete! Total images: {len(existing_data['images'])}")
     print(f"   💾 Saved to: {output_file}")
 
 
+async def run_extraction(project_ids: List[str]):
+    """Extract every project, sharing one engine (and rate-limit budget) across projects"""
+    engine = ExtractionEngine(
+        RateLimiter(requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE),
+        max_in_flight=MAX_IN_FLIGHT,
+        max_retries=MAX_RETRIES
+    )
+    project_slots = asyncio.Semaphore(max(1, PROJECT_CONCURRENCY))
+    
+    async def run_project(project_id: str):
+        async with project_slots:
+            try:
+                await process_project_async(engine, project_id)
+            except Exception as e:
+                print(f"❌ Error processing {project_id}: {e}")
+                import traceback
+                traceback.print_exc()
+    
+    await asyncio.gather(*(run_project(project_id) for project_id in project_ids))
+    
+    stats = engine.stats
+    print(f"\n📊 API requests: {stats['requests']}, retries: {stats['retries']}, failed: {stats['failures']}")
+
+
+def process_project(project_id: str):
+    """Process all region images for a single project"""
+    setup_gemini_client()
+    asyncio.run(run_extraction([project_id]))
+
+
 def main():
     """Main entry point"""
     global model
@@ -790,10 +840,9 @@ def main():
         return
     
     # Check if project ID provided as argument
-    import sys
     if len(sys.argv) > 1:
         project_id = sys.argv[1]
-        process_project(project_id)
+        asyncio.run(run_extraction([project_id]))
     else:
         # Process all projects in input_images directory
         input_images_path = Path(TEST_EMBEDDINGS_DIR)
@@ -810,18 +859,10 @@ def main():
             return
         
         print(f"📁 Found {len(projects)} project(s): {', '.join(projects)}")
+        print(f"⚙️ Up to {MAX_IN_FLIGHT} requests in flight across {PROJECT_CONCURRENCY} projects at a time")
         print()
         
-        for project_id in projects:
-            try:
-                process_project(project_id)
-                print()  # Add blank line between projects
-            except Exception as e:
-                print(f"❌ Error processing {project_id}: {e}")
-                import traceback
-                traceback.print_exc()
-                print()  # Add blank line even on error
-                continue
+        asyncio.run(run_extraction(projects))
     
     print("\n" + "="*60)
     print("✨ Processing Complete!")
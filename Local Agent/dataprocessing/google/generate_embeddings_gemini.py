@@ -8,17 +8,35 @@ Google's gemini-embedding-001 model via Vertex AI, capped at 1536 dimensions
 for Supabase compatibility.
 
 All authentication uses service account credentials from ocr-key.json.
+
+Texts are embedded through EmbeddingScheduler: requests are packed by estimated
+token count up to the model's per-request limits, identical texts are embedded
+once (content-hash cache), and concurrency adapts to 429s (halved on a 429,
+grown by one after a window of successes) instead of sleeping between batches.
 """
 
 import os
+import sys
 import json
-import time
+import asyncio
+import hashlib
+import random
+from collections import OrderedDict
 from pathlib import Path
 from typing import Dict, Any, List, Optional
 from google.oauth2 import service_account
 import vertexai
 from vertexai.language_models import TextEmbeddingModel
 
+# Shared image catalog lives with the Florence scripts
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "florence_embedding"))
+try:
+    from image_catalog import ImageCatalog, STAGE_GEMINI_EMBEDDING
+    CATALOG_AVAILABLE = True
+except ImportError:
+    CATALOG_AVAILABLE = False
+from extraction_engine import is_retryable, retry_after, write_json_atomic
+
 # ================= CONFIGURATION =================
 # Google Service Account Key Path (for Vertex AI)
 OCR_KEY_PATH = r"C:\Users\shine\Testing-2025-01-07\Local Agent\dataprocessing\google\ocr-key.json"
@@ -33,15 +51,52 @@ EMBEDDING_MODEL = "text-embedding-004"  # Try text-embedding-004 first, fallback
 # Embedding Configuration
 MAX_EMBEDDING_DIM = 1536  # Cap dimensions to avoid Supabase issues (MUST be exactly 1536)
 
-# Rate Limiting Configuration
-DELAY_BETWEEN_BATCHES = 1.0  # Seconds to wait between batches
-BATCH_SIZE = 100  # Process embeddings in batches
+# Request packing (Vertex AI text embedding limits)
+MAX_TEXTS_PER_REQUEST = 250  # Input texts per request
+MAX_TOKENS_PER_REQUEST = 20000  # Total input tokens per request
+MAX_TOKENS_PER_TEXT = 2048  # Longer texts are truncated by the API
+CHARS_PER_TOKEN = 3  # Conservative estimate for drawing text (numbers, symbols)
+
+# Concurrency Configuration (adapts between MIN and MAX based on 429s)
+INITIAL_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "16"))
+MAX_RETRIES = 6
+PROJECT_CONCURRENCY = 2  # Projects processed at once
+BATCH_SIZE = 500  # Images per incremental save
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "5000"))  # Distinct texts kept (~50 KB each)
+
+# Image catalog (records which images have Gemini embeddings); set to the catalog the
+# extraction step used, e.g. <project input dir>/image_catalog.sqlite
+IMAGE_CATALOG_DB = os.getenv("IMAGE_CATALOG_DB")
 # =================================================
 
 # Global variables
 _project_id = None
 _credentials = None
 _embedding_model = None
+_catalog = None
+
+
+def get_catalog() -> Optional["ImageCatalog"]:
+    """Shared image catalog, or None when IMAGE_CATALOG_DB is not configured"""
+    global _catalog
+    if _catalog is None and CATALOG_AVAILABLE and IMAGE_CATALOG_DB:
+        _catalog = ImageCatalog(IMAGE_CATALOG_DB)
+    return _catalog
+
+
+def record_embedded(project_id: str, images: List[Dict[str, Any]]):
+    """Mark images that have both embeddings as done in the image catalog"""
+    catalog = get_catalog()
+    if catalog is None:
+        return
+    catalog.mark_done_by_relative_path(
+        STAGE_GEMINI_EMBEDDING, project_id,
+        [img.get("relative_path") for img in images
+         if img.get("text_verbatim_embedding") is not None and img.get("summary_embedding") is not None],
+        {"model": EMBEDDING_MODEL}
+    )
 
 
 def setup_vertex_ai():
@@ -136,6 +191,150 @@ def generate_embedding(text: str) -> Optional[List[float]]:
         return None
 
 
+def fit_embedding_dimension(embedding: List[float]) -> Optional[List[float]]:
+    """Cap/pad an embedding to MAX_EMBEDDING_DIM dimensions (None if that fails)"""
+    embedding = list(embedding)
+    if len(embedding) > MAX_EMBEDDING_DIM:
+        embedding = embedding[:MAX_EMBEDDING_DIM]
+    elif len(embedding) < MAX_EMBEDDING_DIM:
+        # Pad with zeros if shorter
+        embedding = embedding + [0.0] * (MAX_EMBEDDING_DIM - len(embedding))
+    
+    if len(embedding) != MAX_EMBEDDING_DIM:
+        print(f"      ⚠️ Embedding dimension mismatch: expected {MAX_EMBEDDING_DIM}, got {len(embedding)}")
+        return None
+    return embedding
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()
+
+
+def estimate_tokens(text: str) -> int:
+    return min(MAX_TOKENS_PER_TEXT, len(text) // CHARS_PER_TOKEN + 1)
+
+
+def pack_requests(texts: List[str]) -> List[List[str]]:
+    """Group texts into requests that stay under the per-request text and token limits"""
+    requests: List[List[str]] = []
+    current: List[str] = []
+    current_tokens = 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= MAX_TEXTS_PER_REQUEST or current_tokens + tokens > MAX_TOKENS_PER_REQUEST):
+            requests.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        requests.append(current)
+    return requests
+
+
+class EmbeddingScheduler:
+    """Embeds texts with packed requests, a bounded content-hash cache and AIMD concurrency"""
+    
+    def __init__(self, model, initial_concurrency: int = INITIAL_CONCURRENCY, cache_size: int = EMBEDDING_CACHE_SIZE):
+        self.model = model
+        self.cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.cache_size = max(1, cache_size)
+        self.limit = max(MIN_CONCURRENCY, min(MAX_CONCURRENCY, initial_concurrency))
+        self.in_flight = 0
+        self._successes = 0
+        self._condition = asyncio.Condition()
+        self.stats = {"requests": 0, "texts_sent": 0, "cache_hits": 0, "throttled": 0, "failed_requests": 0}
+    
+    def remember(self, text: Optional[str], embedding: Optional[List[float]]):
+        """Seed the cache with an embedding that already exists"""
+        if text and text.strip() and embedding is not None:
+            self._store(text_hash(text), embedding)
+    
+    def _store(self, h: str, embedding: List[float]):
+        """Cache an embedding, evicting the least recently used ones past cache_size"""
+        self.cache[h] = embedding
+        self.cache.move_to_end(h)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+    
+    async def embed(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Embeddings for texts (None for empty texts and failed requests), embedding each distinct text once"""
+        hashes = [text_hash(t) if t and t.strip() else None for t in texts]
+        found: Dict[str, List[float]] = {}
+        pending: Dict[str, str] = {}
+        for text, h in zip(texts, hashes):
+            if h is None:
+                continue
+            if h in self.cache:
+                self.cache.move_to_end(h)
+                found[h] = self.cache[h]
+                self.stats["cache_hits"] += 1
+            elif h not in pending:
+                pending[h] = text.strip()
+            else:
+                self.stats["cache_hits"] += 1
+        
+        requests = pack_requests(list(pending.values()))
+        results = await asyncio.gather(*(self._run_request(request) for request in requests))
+        for embedded in results:
+            found.update(embedded)
+        return [found.get(h) if h is not None else None for h in hashes]
+    
+    async def _run_request(self, request_texts: List[str]) -> Dict[str, List[float]]:
+        """Embed one packed request; returns text hash -> embedding for the texts that succeeded"""
+        for attempt in range(MAX_RETRIES + 1):
+            async with self._condition:
+                await self._condition.wait_for(lambda: self.in_flight < self.limit)
+                self.in_flight += 1
+            throttled = False
+            error = None
+            try:
+                self.stats["requests"] += 1
+                if hasattr(self.model, "get_embeddings_async"):
+                    embeddings = await self.model.get_embeddings_async(request_texts)
+                else:
+                    embeddings = await asyncio.to_thread(self.model.get_embeddings, request_texts)
+            except Exception as e:
+                error = e
+                throttled = type(e).__name__ in ("ResourceExhausted", "TooManyRequests") or getattr(e, "code", None) == 429
+            finally:
+                async with self._condition:
+                    self.in_flight -= 1
+                    self._adapt(throttled, error is None)
+                    self._condition.notify_all()
+            
+            if error is None:
+                self.stats["texts_sent"] += len(request_texts)
+                embedded: Dict[str, List[float]] = {}
+                for text, embedding in zip(request_texts, embeddings):
+                    fitted = fit_embedding_dimension(embedding.values)
+                    if fitted is not None:
+                        embedded[text_hash(text)] = fitted
+                        self._store(text_hash(text), fitted)
+                return embedded
+            
+            if attempt >= MAX_RETRIES or not (throttled or is_retryable(error)):
+                self.stats["failed_requests"] += 1
+                print(f"      ⚠️ Embedding request failed ({len(request_texts)} texts): {error}")
+                return {}
+            delay = retry_after(error) or min(60.0, 2 ** attempt) * (0.5 + random.random() / 2)
+            await asyncio.sleep(delay)
+    
+    def _adapt(self, throttled: bool, succeeded: bool):
+        """Additive increase after a window of successes, multiplicative decrease on 429"""
+        if throttled:
+            self.stats["throttled"] += 1
+            new_limit = max(MIN_CONCURRENCY, self.limit // 2)
+            if new_limit != self.limit:
+                print(f"      ⏳ Rate limited - concurrency {self.limit} -> {new_limit}")
+            self.limit = new_limit
+            self._successes = 0
+        elif succeeded:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < MAX_CONCURRENCY:
+                self.limit += 1
+                self._successes = 0
+
+
 def generate_embeddings_batch(texts: List[str]) -> List[Optional[List[float]]]:
     """
     Generate embeddings for a batch of texts
@@ -168,22 +367,7 @@ def generate_embeddings_batch(texts: List[str]) -> List[Optional[List[float]]]:
                 results.append(None)
             else:
                 if text_idx < len(embeddings):
-                    embedding = embeddings[text_idx].values
-                    
-                    # Cap/truncate to MAX_EMBEDDING_DIM dimensions
-                    if len(embedding) > MAX_EMBEDDING_DIM:
-                        embedding = embedding[:MAX_EMBEDDING_DIM]
-                    elif len(embedding) < MAX_EMBEDDING_DIM:
-                        # Pad with zeros if shorter
-                        padding = [0.0] * (MAX_EMBEDDING_DIM - len(embedding))
-                        embedding = embedding + padding
-                    
-                    # Verify dimension
-                    if len(embedding) != MAX_EMBEDDING_DIM:
-                        print(f"      ⚠️ Embedding dimension mismatch: expected {MAX_EMBEDDING_DIM}, got {len(embedding)}")
-                        results.append(None)
-                    else:
-                        results.append(embedding)
+                    results.append(fit_embedding_dimension(embeddings[text_idx].values))
                     text_idx += 1
                 else:
                     results.append(None)
@@ -197,7 +381,7 @@ def generate_embeddings_batch(texts: List[str]) -> List[Optional[List[float]]]:
         return [None] * len(texts)
 
 
-def process_project(project_id: str, skip_existing: bool = True):
+async def process_project(scheduler: EmbeddingScheduler, project_id: str, skip_existing: bool = True):
     """Process a single project and add embeddings to JSON file"""
     json_file = Path(STRUCTURED_JSON_DIR) / project_id / f"structured_{project_id}.json"
     
@@ -231,6 +415,13 @@ def process_project(project_id: str, skip_existing: bool = True):
         has_verbatim_emb = "text_verbatim_embedding" in img and img["text_verbatim_embedding"] is not None
         has_summary_emb = "summary_embedding" in img and img["summary_embedding"] is not None
         
+        # Existing embeddings are reused for identical texts elsewhere in the archive,
+        # except on a full re-embed, which must not be answered from them
+        if skip_existing and has_verbatim_emb:
+            scheduler.remember(img.get("text_verbatim"), img["text_verbatim_embedding"])
+        if skip_existing and has_summary_emb:
+            scheduler.remember(img.get("summary"), img["summary_embedding"])
+        
         if skip_existing and has_verbatim_emb and has_summary_emb:
             already_embedded += 1
         else:
@@ -243,13 +434,11 @@ def process_project(project_id: str, skip_existing: bool = True):
         print(f"    ⚙️  Processing all: {len(images)} images")
         needs_embedding = [(i, img) for i, img in enumerate(images)]
     
+    record_embedded(project_id, images)
     if not needs_embedding:
         print(f"    ✅ All images already have embeddings!")
         return 0
     
-    # Process in batches
-    setup_vertex_ai()  # Initialize before processing
-    
     embedded_count = 0
     error_count = 0
     
@@ -260,32 +449,16 @@ def process_project(project_id: str, skip_existing: bool = True):
         
         print(f"    ⚙️  Processing batch {batch_num}/{total_batches} ({len(batch)} images)...")
         
-        # Collect texts for batch
-        verbatim_texts = []
-        summary_texts = []
-        batch_indices = []
-        
-        for idx, img in batch:
-            verbatim = img.get("text_verbatim", "") or ""
-            summary = img.get("summary", "") or ""
-            
-            verbatim_texts.append(verbatim)
-            summary_texts.append(summary)
-            batch_indices.append(idx)
-        
-        # Generate embeddings for verbatim texts
-        print(f"      🔍 Generating verbatim embeddings...")
-        verbatim_embeddings = generate_embeddings_batch(verbatim_texts)
-        
-        # Generate embeddings for summary texts
-        print(f"      🔍 Generating summary embeddings...")
-        time.sleep(DELAY_BETWEEN_BATCHES)  # Rate limiting
-        summary_embeddings = generate_embeddings_batch(summary_texts)
+        # Verbatim and summary texts are packed and embedded together
+        verbatim_texts = [img.get("text_verbatim", "") or "" for _, img in batch]
+        summary_texts = [img.get("summary", "") or "" for _, img in batch]
+        embeddings = await scheduler.embed(verbatim_texts + summary_texts)
+        verbatim_embeddings, summary_embeddings = embeddings[:len(batch)], embeddings[len(batch):]
         
         # Update images with embeddings
         for i, (idx, img) in enumerate(batch):
-            verbatim_emb = verbatim_embeddings[i] if i < len(verbatim_embeddings) else None
-            summary_emb = summary_embeddings[i] if i < len(summary_embeddings) else None
+            verbatim_emb = verbatim_embeddings[i]
+            summary_emb = summary_embeddings[i]
             
             # Only update if embedding was generated or if not skipping existing
             if verbatim_emb is not None:
@@ -302,19 +475,40 @@ def process_project(project_id: str, skip_existing: bool = True):
         
         # Save incrementally after each batch
         data["images"] = images
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        
-        print(f"      ✅ Batch {batch_num} saved")
+        await asyncio.to_thread(write_json_atomic, json_file, data)
+        record_embedded(project_id, [img for _, img in batch])
         
-        # Rate limiting delay
-        if batch_start + BATCH_SIZE < len(needs_embedding):
-            time.sleep(DELAY_BETWEEN_BATCHES)
+        print(f"      ✅ Batch {batch_num} saved ({project_id})")
     
     print(f"    ✅ Complete! Embedded: {embedded_count}, Errors: {error_count}")
     return embedded_count
 
 
+async def process_projects(projects: List[str], skip_existing: bool = True) -> Dict[str, int]:
+    """Embed all projects through one shared scheduler; returns project_id -> embedded count (-1 on failure)"""
+    scheduler = EmbeddingScheduler(setup_vertex_ai())
+    project_slots = asyncio.Semaphore(PROJECT_CONCURRENCY)
+    counts: Dict[str, int] = {}
+    
+    async def run_project(project_id: str):
+        async with project_slots:
+            try:
+                counts[project_id] = await process_project(scheduler, project_id, skip_existing=skip_existing)
+            except Exception as e:
+                print(f"  ❌ Error processing {project_id}: {e}")
+                import traceback
+                traceback.print_exc()
+                counts[project_id] = -1
+    
+    await asyncio.gather(*(run_project(project_id) for project_id in projects))
+    
+    stats = scheduler.stats
+    print(f"\n📊 Requests: {stats['requests']}, texts sent: {stats['texts_sent']}, "
+          f"cache hits: {stats['cache_hits']}, rate limited: {stats['throttled']}, "
+          f"failed requests: {stats['failed_requests']}, final concurrency: {scheduler.limit}")
+    return counts
+
+
 def main():
     """Main entry point"""
     print("="*80)
@@ -347,7 +541,6 @@ def main():
     print()
     
     # Check if project ID provided as argument
-    import sys
     if len(sys.argv) > 1:
         project_id = sys.argv[1]
         if project_id not in projects:
@@ -356,23 +549,10 @@ def main():
         projects = [project_id]
     
     # Process each project
-    total_embedded = 0
-    successful = 0
-    failed = 0
-    
-    for project_id in projects:
-        try:
-            count = process_project(project_id, skip_existing=True)
-            if count >= 0:
-                successful += 1
-                total_embedded += count
-            else:
-                failed += 1
-        except Exception as e:
-            print(f"  ❌ Error processing {project_id}: {e}")
-            import traceback
-            traceback.print_exc()
-            failed += 1
+    counts = asyncio.run(process_projects(projects, skip_existing=True))
+    total_embedded = sum(count for count in counts.values() if count > 0)
+    successful = sum(1 for count in counts.values() if count >= 0)
+    failed = len(counts) - successful
     
     print("\n" + "="*80)
     print("✨ Embedding Generation Complete!")
@@ -33,12 +33,16 @@ def main() -> None:
 
     embedding_service = EmbeddingService(config)
     vector_store = None
-    if config.use_csv_vector_store:
-        from storage.csv_vector_store import CSVVectorStore
-
-        csv_path = config.csv_vector_store_path
-        logger.info("Using CSVVectorStore at %s for local testing.", csv_path)
-        vector_store = CSVVectorStore(csv_path)
+    if config.use_local_vector_store:
+        from storage.local_vector_store import LocalVectorStore
+
+        store_path = config.local_vector_store_path
+        logger.info("Using LocalVectorStore at %s for local testing.", store_path)
+        if not store_path.exists() and config.csv_vector_store_path.exists():
+            logger.info("Importing legacy CSV vector store from %s.", config.csv_vector_store_path)
+            vector_store = LocalVectorStore.import_csv(config.csv_vector_store_path, store_path)
+        else:
+            vector_store = LocalVectorStore(store_path)
     else:
         try:
             vector_store = SupabaseVectorStore()
@@ -1,9 +1,19 @@
+"""
+Embedding generation with Redis caching.
+
+`embed_batch` returns one vector per input, in input order; blank inputs yield
+an empty list in place. Cache lookups use one MGET and writes one pipeline per
+batch. OpenAI requests are split so each stays under EMBEDDING_BATCH_MAX_TOKENS
+and EMBEDDING_BATCH_MAX_ITEMS, and up to EMBEDDING_MAX_INFLIGHT run concurrently.
+Local models encode all missing texts in a single batched `encode` call.
+"""
 from __future__ import annotations
 
 import hashlib
 import json
 import os
-from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 from tenacity import retry, stop_after_attempt, wait_exponential
@@ -15,6 +25,10 @@ try:
     import redis  # type: ignore
 except ImportError:  # pragma: no cover - optional dependency
     redis = None
+try:
+    import tiktoken  # type: ignore
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
 
 logger = get_logger(__name__)
 
@@ -31,6 +45,12 @@ class EmbeddingService:
         self._local_model = None
         self._fallback_dim = config.embedding_dim or 128
         self._redis = self._init_redis()
+        self._encoding = None
+        self.batch_max_tokens = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "250000"))
+        self.batch_max_items = int(os.getenv("EMBEDDING_BATCH_MAX_ITEMS", "2048"))
+        self.input_max_tokens = int(os.getenv("EMBEDDING_INPUT_MAX_TOKENS", "8191"))
+        self.max_inflight = max(1, int(os.getenv("EMBEDDING_MAX_INFLIGHT", "4")))
+        self.local_batch_size = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "64"))
 
     def get_embedding_model(self) -> str:
         return self.model_name
@@ -49,24 +69,38 @@ class EmbeddingService:
         return self._debug_embed(text)
 
     def embed_batch(self, texts: List[str]) -> List[List[float]]:
-        cleaned_texts = [t.strip() for t in texts if t.strip()]
-        if not cleaned_texts:
-            return []
-
-        cached_vectors, missing_texts, missing_indices = self._maybe_get_cached(cleaned_texts)
+        """
+        Embed `texts`, returning vectors aligned with the input (blank texts -> []).
+        Duplicate texts are embedded once.
+        """
+        results: List[List[float]] = [[] for _ in texts]
+        positions: Dict[str, List[int]] = {}
+        for idx, text in enumerate(texts):
+            cleaned = (text or "").strip()
+            if cleaned:
+                positions.setdefault(cleaned, []).append(idx)
+        if not positions:
+            return results
 
-        if missing_texts:
+        unique_texts = list(positions)
+        vectors = self._get_cached(unique_texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            missing_texts = [unique_texts[i] for i in missing]
             if self._should_use_openai():
-                generated = self._embed_batch_with_openai(missing_texts)
+                generated = self._embed_openai_batched(missing_texts)
             elif self._should_use_local_model():
-                generated = [self._embed_with_local(t) for t in missing_texts]
+                generated = self._embed_batch_with_local(missing_texts)
             else:
                 generated = [self._debug_embed(t) for t in missing_texts]
             self._cache_results(missing_texts, generated)
-            for idx, vector in zip(missing_indices, generated):
-                cached_vectors[idx] = vector
+            for i, vector in zip(missing, generated):
+                vectors[i] = vector
 
-        return list(cached_vectors.values())
+        for text, vector in zip(unique_texts, vectors):
+            for idx in positions[text]:
+                results[idx] = vector or []
+        return results
 
     def _should_use_openai(self) -> bool:
         return bool(self.config.openai_api_key) and not self.config.use_local_embeddings
@@ -85,6 +119,66 @@ class EmbeddingService:
         response = client.embeddings.create(model=self.model_name, input=texts)
         return [item.embedding for item in response.data]
 
+    def _embed_openai_batched(self, texts: List[str]) -> List[List[float]]:
+        """
+        Split into token/item-budgeted requests and run up to `max_inflight` concurrently.
+        """
+        batches = self._plan_batches(texts)
+        if len(batches) == 1:
+            return self._embed_batch_with_openai(batches[0])
+        with ThreadPoolExecutor(max_workers=min(self.max_inflight, len(batches))) as executor:
+            results = list(executor.map(self._embed_batch_with_openai, batches))
+        return [vector for batch in results for vector in batch]
+
+    def _plan_batches(self, texts: List[str]) -> List[List[str]]:
+        batches: List[List[str]] = []
+        current: List[str] = []
+        current_tokens = 0
+        for text in texts:
+            text, tokens = self._fit_input(text)
+            if current and (current_tokens + tokens > self.batch_max_tokens or len(current) >= self.batch_max_items):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(text)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _fit_input(self, text: str) -> Tuple[str, int]:
+        """Token count for `text`, truncating inputs longer than the model's per-input limit."""
+        encoding = self._get_encoding()
+        if encoding is None:
+            # ~3 chars/token is a conservative estimate for English technical prose
+            tokens = len(text) // 3 + 1
+            if tokens > self.input_max_tokens:
+                logger.warning("Truncating embedding input of ~%s tokens to %s", tokens, self.input_max_tokens)
+                text = text[: self.input_max_tokens * 3]
+                tokens = self.input_max_tokens
+            return text, tokens
+        token_ids = encoding.encode_ordinary(text)
+        if len(token_ids) > self.input_max_tokens:
+            logger.warning("Truncating embedding input of %s tokens to %s", len(token_ids), self.input_max_tokens)
+            token_ids = token_ids[: self.input_max_tokens]
+            text = encoding.decode(token_ids)
+        return text, len(token_ids)
+
+    def _get_encoding(self):
+        if self._encoding is None and tiktoken is not None:
+            try:
+                self._encoding = tiktoken.encoding_for_model(self.model_name)
+            except Exception:
+                try:
+                    self._encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception:  # pragma: no cover - no cached BPE files offline
+                    self._encoding = False
+        return self._encoding or None
+
+    def _embed_batch_with_local(self, texts: List[str]) -> List[List[float]]:
+        model = self._get_local_model()
+        embeddings = model.encode(texts, batch_size=self.local_batch_size, convert_to_numpy=True)
+        return [vector.tolist() if hasattr(vector, "tolist") else list(vector) for vector in embeddings]
+
     def _embed_with_local(self, text: str) -> List[float]:
         model = self._get_local_model()
         embedding = model.encode(text)
@@ -136,32 +230,31 @@ class EmbeddingService:
         digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:24]
         return f"embed:{self.model_name}:{digest}"
 
-    def _maybe_get_cached(self, texts: List[str]) -> Tuple[Dict[int, List[float]], List[str], List[int]]:
-        cached: Dict[int, List[float]] = {}
-        missing_texts: List[str] = []
-        missing_indices: List[int] = []
+    def _get_cached(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """One MGET for all texts; None marks a miss."""
         if not self._redis:
-            return {i: None for i in range(len(texts))}, texts, list(range(len(texts)))
-        for idx, text in enumerate(texts):
-            key = self._cache_key(text)
+            return [None] * len(texts)
+        try:
+            values = self._redis.mget([self._cache_key(t) for t in texts])
+        except Exception:
+            return [None] * len(texts)
+        vectors: List[Optional[List[float]]] = []
+        for value in values:
             try:
-                cached_value = self._redis.get(key)
-                if cached_value:
-                    cached[idx] = json.loads(cached_value)
-                    continue
-            except Exception:
-                pass
-            missing_texts.append(text)
-            missing_indices.append(idx)
-            cached[idx] = None  # placeholder
-        return cached, missing_texts, missing_indices
+                vectors.append(json.loads(value) if value else None)
+            except (TypeError, ValueError):
+                vectors.append(None)
+        return vectors
 
     def _cache_results(self, texts: List[str], embeddings: List[List[float]]) -> None:
         if not self._redis:
             return
-        for text, vector in zip(texts, embeddings):
-            key = self._cache_key(text)
-            try:
-                self._redis.setex(key, int(os.getenv("EMBEDDING_CACHE_TTL", 2592000)), json.dumps(vector))
-            except Exception:
-                continue
+        ttl = int(os.getenv("EMBEDDING_CACHE_TTL", 2592000))
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            for text, vector in zip(texts, embeddings):
+                if vector:
+                    pipe.setex(self._cache_key(text), ttl, json.dumps(vector))
+            pipe.execute()
+        except Exception as exc:
+            logger.debug("Embedding cache write failed: %s", exc)
@@ -0,0 +1,323 @@
+"""
+Directory / batch ingestion with pipelined stages.
+
+    stat check -> parse+chunk (process pool) -> plan -> embed (thread pool) -> write (single writer)
+
+Stages are connected by bounded queues so a slow embedder or writer throttles
+parsing instead of buffering whole libraries in memory. Writes go through one
+thread, which keeps SQLite and style-frequency updates sequential. Parse workers
+are spawned rather than forked, so they never inherit the writer thread or the
+open SQLite connection. Every
+finished file is appended to a JSONL progress journal; a rerun after a crash
+skips journaled files whose size and mtime are unchanged.
+"""
+from __future__ import annotations
+
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from ir_utils.logger import get_logger
+from .pipeline import IngestionPipeline, IngestPlan, parse_and_chunk
+
+logger = get_logger(__name__)
+
+SUPPORTED_SUFFIXES = (".pdf", ".docx")
+_DONE = object()
+
+
+@dataclass
+class StageStats:
+    """
+    Throughput of one stage. busy_seconds sums the time of every worker, so it exceeds
+    wall time when workers overlap; rates are per second of the stage's wall-clock span.
+    """
+
+    items: int = 0
+    chunks: int = 0
+    busy_seconds: float = 0.0
+    first_start: Optional[float] = None
+    last_end: Optional[float] = None
+
+    def add(self, chunks: int, busy_seconds: float, started: float, finished: float) -> None:
+        self.items += 1
+        self.chunks += chunks
+        self.busy_seconds += busy_seconds
+        self.first_start = started if self.first_start is None else min(self.first_start, started)
+        self.last_end = finished if self.last_end is None else max(self.last_end, finished)
+
+    @property
+    def wall_seconds(self) -> float:
+        if self.first_start is None or self.last_end is None:
+            return 0.0
+        return self.last_end - self.first_start
+
+    def as_dict(self) -> Dict[str, float]:
+        wall = self.wall_seconds
+        return {
+            "items": self.items,
+            "chunks": self.chunks,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "wall_seconds": round(wall, 3),
+            "items_per_second": round(self.items / wall, 2) if wall else 0.0,
+            "chunks_per_second": round(self.chunks / wall, 2) if wall else 0.0,
+        }
+
+
+@dataclass
+class BatchIngestReport:
+    results: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    failures: Dict[str, str] = field(default_factory=dict)
+    resumed: List[str] = field(default_factory=list)
+    stages: Dict[str, StageStats] = field(default_factory=lambda: {s: StageStats() for s in ("parse", "embed", "write")})
+    wall_seconds: float = 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        statuses: Dict[str, int] = {}
+        for result in self.results.values():
+            status = str(result.get("status", "unknown"))
+            statuses[status] = statuses.get(status, 0) + 1
+        return {
+            "files": len(self.results) + len(self.failures) + len(self.resumed),
+            "statuses": statuses,
+            "failed": len(self.failures),
+            "resumed": len(self.resumed),
+            "wall_seconds": round(self.wall_seconds, 3),
+            "stages": {name: stats.as_dict() for name, stats in self.stages.items()},
+        }
+
+
+def _timed_parse(file_path: str, company_id: str) -> Tuple[Any, List[Dict[str, Any]], float]:
+    started = time.perf_counter()
+    parsed, chunks = parse_and_chunk(file_path, company_id)
+    return parsed, chunks, time.perf_counter() - started
+
+
+class _InlineExecutor(Executor):
+    """Runs submissions in the calling thread (parse_workers=0)."""
+
+    def submit(self, fn, /, *args, **kwargs):  # type: ignore[override]
+        future: Future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as exc:
+            future.set_exception(exc)
+        return future
+
+
+class BatchIngestor:
+    """
+    Ingests many files through an IngestionPipeline with overlapping parse, embed and write stages.
+    """
+
+    def __init__(
+        self,
+        pipeline: IngestionPipeline,
+        parse_workers: Optional[int] = None,
+        embed_workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        journal_path: str | Path | None = None,
+    ) -> None:
+        self.pipeline = pipeline
+        self.parse_workers = (
+            parse_workers if parse_workers is not None else int(os.getenv("INGEST_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+        )
+        self.embed_workers = max(1, embed_workers or int(os.getenv("INGEST_EMBED_WORKERS", "4")))
+        self.queue_size = max(1, queue_size or int(os.getenv("INGEST_QUEUE_SIZE", "8")))
+        self.journal_path = Path(journal_path) if journal_path else None
+        self._journal_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def ingest_directory(self, directory: str | Path, recursive: bool = True, force: bool = False) -> BatchIngestReport:
+        root = Path(directory)
+        candidates = root.rglob("*") if recursive else root.glob("*")
+        paths = sorted(
+            p for p in candidates if p.is_file() and p.suffix.lower() in SUPPORTED_SUFFIXES and not p.name.startswith("~$")
+        )
+        return self.ingest_paths(paths, force=force)
+
+    def ingest_paths(self, paths: Iterable[str | Path], force: bool = False) -> BatchIngestReport:
+        report = BatchIngestReport()
+        started = time.perf_counter()
+        journal = self._load_journal()
+        todo: List[Tuple[Path, os.stat_result, Optional[Dict[str, Any]]]] = []
+        for raw_path in paths:
+            path = Path(raw_path)
+            try:
+                stat = path.stat()
+            except OSError as exc:
+                report.failures[str(path)] = str(exc)
+                continue
+            entry = journal.get(str(path))
+            if not force and entry and entry.get("file_size") == stat.st_size and entry.get("file_mtime") == stat.st_mtime:
+                report.resumed.append(str(path))
+                continue
+            previous = self.pipeline.metadata_db.get_document_by_path(self.pipeline.company_id, str(path))
+            if not force and self.pipeline.is_unchanged(previous, stat):
+                self._record(report, path, stat, self.pipeline._unchanged_result(previous))  # type: ignore[arg-type]
+                continue
+            todo.append((path, stat, previous))
+
+        if todo:
+            self._run_stages(todo, report, force)
+        report.wall_seconds = time.perf_counter() - started
+        logger.info("Batch ingestion finished: %s", report.summary())
+        return report
+
+    # ------------------------------------------------------------------
+    # Stages
+    # ------------------------------------------------------------------
+    def _run_stages(
+        self, todo: Sequence[Tuple[Path, os.stat_result, Optional[Dict[str, Any]]]], report: BatchIngestReport, force: bool
+    ) -> None:
+        # Workers start on demand, after the writer thread is running: spawn them instead of forking
+        parse_pool: Executor = (
+            ProcessPoolExecutor(max_workers=self.parse_workers, mp_context=multiprocessing.get_context("spawn"))
+            if self.parse_workers > 0
+            else _InlineExecutor()
+        )
+        write_queue: "queue.Queue[Any]" = queue.Queue(maxsize=self.queue_size)
+        writer = threading.Thread(target=self._writer, args=(write_queue, report), name="ingest-writer", daemon=True)
+        writer.start()
+        embed_slots = threading.BoundedSemaphore(self.queue_size)
+
+        remaining = iter(todo)
+        in_flight: Deque[Tuple[Tuple[Path, os.stat_result, Optional[Dict[str, Any]]], float, Future]] = deque()
+
+        def _submit_next() -> None:
+            item = next(remaining, None)
+            if item is not None:
+                future = parse_pool.submit(_timed_parse, str(item[0]), self.pipeline.company_id)
+                in_flight.append((item, time.perf_counter(), future))
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.embed_workers, thread_name_prefix="ingest-embed") as embed_pool:
+                for _ in range(self.queue_size):
+                    _submit_next()
+                while in_flight:
+                    (path, stat, previous), submitted, future = in_flight.popleft()
+                    _submit_next()
+                    try:
+                        parsed, chunks, seconds = future.result()
+                        report.stages["parse"].add(len(chunks), seconds, submitted, time.perf_counter())
+                        plan = self.pipeline.plan_ingest(path, stat, previous, parsed, chunks, force=force)
+                    except Exception as exc:
+                        logger.error("Failed to parse %s: %s", path, exc)
+                        write_queue.put(("error", path, stat, exc))
+                        continue
+                    if isinstance(plan, dict):
+                        write_queue.put(("result", path, stat, plan))
+                        continue
+                    # Back-pressure: at most queue_size plans are embedding or waiting for the writer
+                    embed_slots.acquire()
+                    embed_pool.submit(self._embed, plan, write_queue, embed_slots, report)
+        finally:
+            parse_pool.shutdown(wait=True)
+            write_queue.put(_DONE)
+            writer.join()
+
+    def _embed(
+        self, plan: IngestPlan, write_queue: "queue.Queue[Any]", slots: threading.BoundedSemaphore, report: BatchIngestReport
+    ) -> None:
+        try:
+            started = time.perf_counter()
+            embeddings = self.pipeline.embed_plan(plan)
+            finished = time.perf_counter()
+            with self._stats_lock:
+                report.stages["embed"].add(len(plan.texts), finished - started, started, finished)
+            write_queue.put(("plan", plan, embeddings))
+        except Exception as exc:
+            logger.error("Failed to embed %s: %s", plan.path, exc)
+            write_queue.put(("error", plan.path, plan.stat, exc))
+        finally:
+            slots.release()
+
+    def _writer(self, write_queue: "queue.Queue[Any]", report: BatchIngestReport) -> None:
+        # Never exits before _DONE: producers block on the bounded queue until it is drained
+        while True:
+            item = write_queue.get()
+            if item is _DONE:
+                return
+            path = item[1].path if item[0] == "plan" else item[1]
+            try:
+                self._write_item(item, report)
+            except Exception as exc:
+                logger.error("Failed to store %s: %s", path, exc)
+                report.failures[str(path)] = str(exc)
+                report.results.pop(str(path), None)
+                try:
+                    self._append_journal({"file_path": str(path), "status": "failed", "error": str(exc)})
+                except Exception as journal_exc:
+                    logger.error("Failed to journal %s: %s", path, journal_exc)
+
+    def _write_item(self, item: Tuple[Any, ...], report: BatchIngestReport) -> None:
+        kind = item[0]
+        if kind == "error":
+            _, path, _stat, exc = item
+            report.failures[str(path)] = str(exc)
+            self._append_journal({"file_path": str(path), "status": "failed", "error": str(exc)})
+            return
+        if kind == "result":
+            _, path, stat, result = item
+            self._record(report, path, stat, result)
+            return
+        _, plan, embeddings = item
+        started = time.perf_counter()
+        result = self.pipeline.write_plan(plan, embeddings)
+        finished = time.perf_counter()
+        chunks = int(result.get("embedded_chunks", 0) or 0)
+        report.stages["write"].add(chunks, finished - started, started, finished)
+        self._record(report, plan.path, plan.stat, result)
+
+    # ------------------------------------------------------------------
+    # Progress journal
+    # ------------------------------------------------------------------
+    def _record(self, report: BatchIngestReport, path: Path, stat: os.stat_result, result: Dict[str, Any]) -> None:
+        report.results[str(path)] = result
+        if not result.get("chunk_count") and result.get("status") is None:
+            return  # embedding produced nothing; leave it out of the journal so a rerun retries
+        self._append_journal(
+            {
+                "file_path": str(path),
+                "file_size": stat.st_size,
+                "file_mtime": stat.st_mtime,
+                "status": result.get("status"),
+                "artifact_id": result.get("artifact_id"),
+                "version_id": result.get("version_id"),
+            }
+        )
+
+    def _append_journal(self, entry: Dict[str, Any]) -> None:
+        if self.journal_path is None:
+            return
+        with self._journal_lock:
+            self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.journal_path.open("a", encoding="utf-8") as fh:
+                fh.write(json.dumps(entry) + "\n")
+                fh.flush()
+                os.fsync(fh.fileno())
+
+    def _load_journal(self) -> Dict[str, Dict[str, Any]]:
+        """Latest successful journal entry per file; failed entries are retried."""
+        entries: Dict[str, Dict[str, Any]] = {}
+        if self.journal_path is None or not self.journal_path.exists():
+            return entries
+        with self.journal_path.open("r", encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line from a crash
+                if entry.get("status") == "failed":
+                    entries.pop(entry.get("file_path"), None)
+                else:
+                    entries[entry.get("file_path")] = entry
+        return entries
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional
 
 from ir_utils.logger import get_logger
 from ingest.document_parser import ParsedDocument, Section
@@ -88,34 +88,36 @@ def chunk_pdf_pages(document: ParsedDocument, max_tokens: int = 512) -> List[Dic
     """
     if not document.pages:
         return smart_chunk(document, max_tokens=max_tokens)
+    return list(iter_page_chunks(document.pages, max_tokens=max_tokens))
 
-    chunks: List[Dict[str, object]] = []
-    for page in document.pages:
+
+def iter_page_chunks(pages: Iterable[Dict[str, object]], max_tokens: int = 512) -> Iterator[Dict[str, object]]:
+    """
+    Chunk pages as they arrive without holding the whole document. Pages are
+    {"page_number", "text"} dicts, as yielded by `iter_pdf_pages` and passed to
+    `parse_pdf(on_page=...)`.
+    """
+    for page in pages:
         text = page.get("text", "") or ""
         if not text.strip():
             continue
         token_estimate = _approximate_tokens(text)
         if token_estimate <= max_tokens:
-            chunks.append(
-                {
-                    "text": text.strip(),
-                    "section_title": f"Page {page.get('page_number')}",
-                    "level": 1,
-                    "page_number": page.get("page_number"),
-                }
-            )
+            yield {
+                "text": text.strip(),
+                "section_title": f"Page {page.get('page_number')}",
+                "level": 1,
+                "page_number": page.get("page_number"),
+            }
         else:
             split_chunks = chunk_with_overlap(text, size=max_tokens, overlap=round(max_tokens * 0.1))
             for idx, chunk_text in enumerate(split_chunks):
-                chunks.append(
-                    {
-                        "text": chunk_text,
-                        "section_title": f"Page {page.get('page_number')} (part {idx + 1})",
-                        "level": 1,
-                        "page_number": page.get("page_number"),
-                    }
-                )
-    return chunks
+                yield {
+                    "text": chunk_text,
+                    "section_title": f"Page {page.get('page_number')} (part {idx + 1})",
+                    "level": 1,
+                    "page_number": page.get("page_number"),
+                }
 
 
 def classify_chunk_type(chunk: Dict[str, object], metadata: Optional[Dict[str, object]] = None) -> str:
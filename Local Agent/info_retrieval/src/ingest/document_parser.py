@@ -1,10 +1,15 @@
 from __future__ import annotations
 
+import gzip
 import hashlib
+import json
+import multiprocessing
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional
 
 from ir_utils.logger import get_logger
 
@@ -22,6 +27,9 @@ try:
 except ImportError:  # pragma: no cover - exercised when dependency is missing
     fitz = None
 
+# Bump when PDF extraction output changes so cached parses are not reused
+PDF_PARSE_CACHE_VERSION = 2
+
 
 @dataclass
 class Section:
@@ -132,10 +140,25 @@ def parse_docx(file_path: str | Path, company_id: Optional[str] = None, source:
     )
 
 
-def parse_pdf(file_path: str | Path, company_id: Optional[str] = None, source: str = "upload") -> ParsedDocument:
+def parse_pdf(
+    file_path: str | Path,
+    company_id: Optional[str] = None,
+    source: str = "upload",
+    cache_dir: str | Path | None = None,
+    on_page: Optional[Callable[[Dict[str, Any]], None]] = None,
+    keep_pages: bool = True,
+) -> ParsedDocument:
     """
     Parse a PDF into text and inferred sections using PyMuPDF.
     Gracefully skips unreadable pages and logs errors.
+
+    Each page is extracted once (one textpage). Large PDFs are split into page
+    ranges across worker processes. With `cache_dir` (or PARSE_CACHE_DIR) set,
+    page text is cached on disk keyed by the file's content hash.
+
+    Pages ({"page_number", "text"} dicts) are handed to `on_page` in order as they
+    are extracted, so a consumer such as `iter_page_chunks` can work page by page.
+    With `keep_pages=False` the returned document does not hold the page list.
     """
     if fitz is None:
         raise ImportError("PyMuPDF (fitz) is required to parse PDF files.")
@@ -144,28 +167,33 @@ def parse_pdf(file_path: str | Path, company_id: Optional[str] = None, source: s
     if not path.exists():
         raise FileNotFoundError(f"File not found: {file_path}")
 
-    logger.info("Parsing PDF with PyMuPDF: %s", path)
-    doc = fitz.open(str(path))  # type: ignore
+    cache_dir = cache_dir or os.getenv("PARSE_CACHE_DIR")
+    cache_file = _parse_cache_file(path, Path(cache_dir)) if cache_dir else None
+    extracted = _read_parse_cache(cache_file) if cache_file else None
+    if extracted is None:
+        logger.info("Parsing PDF with PyMuPDF: %s", path)
+        info = _pdf_info(path)
+        page_iter = _iter_extracted_pages(path, info["page_count"])
+    else:
+        logger.info("Using cached parse for %s", path)
+        info = extracted
+        page_iter = iter(extracted["pages"])
+
+    # The page list is only kept when the caller or a cache write needs it
+    write_cache = cache_file is not None and extracted is None
     pages: List[Dict[str, Any]] = []
     text_parts: List[str] = []
-
-    for page_index, page in enumerate(doc):
-        try:
-            text = page.get_text("text")
-            text_parts.append(text or "")
-            blocks = page.get_text("blocks")
-            pages.append(
-                {
-                    "page_number": page_index + 1,
-                    "text": text,
-                    "blocks": blocks,
-                }
-            )
-        except Exception as exc:  # pragma: no cover - defensive
-            logger.error("Failed to parse page %s in %s: %s", page_index + 1, path, exc)
-            continue
+    for page in page_iter:
+        text_parts.append(page["text"])
+        if keep_pages or write_cache:
+            pages.append(page)
+        if on_page is not None:
+            on_page(page)
+    if write_cache:
+        _write_parse_cache(cache_file, {**info, "version": PDF_PARSE_CACHE_VERSION, "pages": pages})
 
     full_text = "\n".join(text_parts)
+    del text_parts
     sections = infer_sections_from_text(full_text)
     artifact_id = generate_artifact_id(path, company_id) if company_id else None
     version_id = generate_version_id(full_text)
@@ -173,22 +201,110 @@ def parse_pdf(file_path: str | Path, company_id: Optional[str] = None, source: s
         "file_path": str(path),
         "company_id": company_id,
         "source": source,
-        "page_count": doc.page_count,
-        "author": doc.metadata.get("author", ""),
-        "title": doc.metadata.get("title", ""),
-        "creation_date": doc.metadata.get("creationDate", ""),
+        "page_count": info["page_count"],
+        "author": info["author"],
+        "title": info["title"],
+        "creation_date": info["creation_date"],
     }
     return ParsedDocument(
         text=full_text,
         sections=sections,
         tables=[],
         metadata=metadata,
-        pages=pages,
+        pages=pages if keep_pages else [],
         artifact_id=artifact_id,
         version_id=version_id,
     )
 
 
+def iter_pdf_pages(file_path: str | Path, start: int = 0, stop: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield {"page_number", "text"} for pages [start, stop), extracting each page once.
+    Pages that fail to extract are logged and skipped.
+    """
+    doc = fitz.open(str(file_path))  # type: ignore
+    try:
+        stop = doc.page_count if stop is None else min(stop, doc.page_count)
+        for page_index in range(start, stop):
+            try:
+                page = doc.load_page(page_index)
+                text = page.get_textpage().extractText() or ""
+            except Exception as exc:  # pragma: no cover - defensive
+                logger.error("Failed to parse page %s in %s: %s", page_index + 1, file_path, exc)
+                continue
+            yield {"page_number": page_index + 1, "text": text}
+    finally:
+        doc.close()
+
+
+def _extract_page_range(file_path: str, start: int, stop: int) -> List[Dict[str, Any]]:
+    return list(iter_pdf_pages(file_path, start, stop))
+
+
+def _pdf_info(path: Path) -> Dict[str, Any]:
+    doc = fitz.open(str(path))  # type: ignore
+    try:
+        info = doc.metadata or {}
+        return {
+            "page_count": doc.page_count,
+            "author": info.get("author", ""),
+            "title": info.get("title", ""),
+            "creation_date": info.get("creationDate", ""),
+        }
+    finally:
+        doc.close()
+
+
+def _iter_extracted_pages(path: Path, page_count: int) -> Iterator[Dict[str, Any]]:
+    """
+    Pages in order: streamed one at a time for small PDFs, or range by range as
+    worker processes finish for large ones.
+    """
+    min_pages = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+    workers = min(int(os.getenv("PDF_PARSE_WORKERS", str(os.cpu_count() or 1))), max(1, page_count // max(1, min_pages // 2)))
+    # Already inside a worker process (e.g. batch ingestion): stay serial rather than nesting pools
+    if page_count < min_pages or workers < 2 or multiprocessing.parent_process() is not None:
+        yield from iter_pdf_pages(path)
+        return
+    step = -(-page_count // workers)
+    ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    # Spawned, not forked: the caller may hold threads and open SQLite/Qdrant connections
+    with ProcessPoolExecutor(max_workers=len(ranges), mp_context=multiprocessing.get_context("spawn")) as executor:
+        for part in executor.map(_extract_page_range, [str(path)] * len(ranges), *zip(*ranges)):
+            yield from part
+
+
+def _parse_cache_file(path: Path, cache_dir: Path) -> Path:
+    digest = hashlib.blake2b(digest_size=20)
+    with path.open("rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return cache_dir / f"{digest.hexdigest()}.pdf.json.gz"
+
+
+def _read_parse_cache(cache_file: Path) -> Optional[Dict[str, Any]]:
+    if not cache_file.exists():
+        return None
+    try:
+        with gzip.open(cache_file, "rt", encoding="utf-8") as fh:
+            data = json.load(fh)
+    except (OSError, ValueError) as exc:
+        logger.warning("Ignoring unreadable parse cache %s: %s", cache_file, exc)
+        return None
+    return data if data.get("version") == PDF_PARSE_CACHE_VERSION else None
+
+
+def _write_parse_cache(cache_file: Path, extracted: Dict[str, Any]) -> None:
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8") as fh:
+            json.dump(extracted, fh)
+        tmp.replace(cache_file)
+    except OSError as exc:
+        logger.warning("Could not write parse cache %s: %s", cache_file, exc)
+
+
 def extract_sections(document: ParsedDocument) -> List[Section]:
     """
     Return existing sections or infer them from document text.
@@ -1,19 +1,29 @@
 """
 End-to-end ingestion pipeline: parse -> metadata -> chunk -> classify -> embed -> store.
+
+Re-ingestion is incremental: files whose size and mtime match the documents table
+are skipped before parsing, files whose content hash (version_id) is unchanged are
+skipped before embedding, and changed files are diffed at chunk level. Chunk ids
+are content-addressed, so only new/modified chunks are embedded and upserted and
+chunks that disappeared are deleted from SQLite and the vector store. Retained
+chunks keep the version_id of the version that introduced them.
 """
 from __future__ import annotations
 
+import hashlib
 import os
 import re
+from collections import Counter
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 from embeddings.embedding_service import EmbeddingService
 from storage.metadata_db import MetadataDB
 from storage.vector_store import Chunk, VectorStore
 from ir_utils.logger import get_logger
-from .chunking import chunk_pdf_pages, smart_chunk
-from .document_parser import parse_docx, parse_pdf
+from .chunking import iter_page_chunks, smart_chunk
+from .document_parser import ParsedDocument, parse_docx, parse_pdf
 from .metadata_extractor import MetadataExtractor
 from .style_filter import StyleExemplarFilter
 
@@ -31,6 +41,64 @@ def _length_metrics(text: str) -> Dict[str, int | str]:
     }
 
 
+def _chunk_ids(artifact_id: str, chunks: List[Dict[str, Any]], section_types: Dict[str, str]) -> List[str]:
+    """
+    Content-addressed chunk ids: hash of text + heading + page + section type, with an
+    occurrence suffix for repeated chunks so ids stay unique within a document.
+    """
+    ids: List[str] = []
+    seen: Dict[str, int] = {}
+    for chunk in chunks:
+        heading = chunk.get("section_title")
+        fingerprint = "\x1f".join(
+            str(part or "") for part in (chunk.get("text", ""), heading, chunk.get("page_number"), section_types.get(heading))
+        )
+        digest = hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:16]
+        occurrence = seen.get(digest, 0)
+        seen[digest] = occurrence + 1
+        ids.append(f"{artifact_id}_{digest}" if occurrence == 0 else f"{artifact_id}_{digest}_{occurrence}")
+    return ids
+
+
+def parse_and_chunk(file_path: str | Path, company_id: str) -> Tuple[ParsedDocument, List[Dict[str, Any]]]:
+    """
+    Parse and chunk one file. Module-level (and free of pipeline state) so batch
+    ingestion can run it in a process pool.
+    """
+    path = Path(file_path)
+    if path.suffix.lower() == ".pdf":
+        # Pages are chunked as they are extracted; the parsed document keeps no page list
+        chunks: List[Dict[str, Any]] = []
+        parsed = parse_pdf(
+            path,
+            company_id=company_id,
+            on_page=lambda page: chunks.extend(iter_page_chunks([page])),
+            keep_pages=False,
+        )
+        return parsed, chunks if parsed.metadata.get("page_count") else smart_chunk(parsed)
+    parsed = parse_docx(path, company_id=company_id)
+    return parsed, smart_chunk(parsed)
+
+
+@dataclass
+class IngestPlan:
+    """
+    A parsed file with its chunk diff against the previous version, ready to embed and write.
+    """
+
+    path: Path
+    stat: os.stat_result
+    previous: Optional[Dict[str, Any]]
+    chunks: List[Dict[str, Any]]
+    doc_meta: Dict[str, Any]
+    section_stats: Dict[str, Dict[str, int]]
+    chunk_ids: List[str]
+    stale_ids: List[str]
+    pending: List[int]
+    drop_artifact: bool = False
+    texts: List[str] = field(default_factory=list)
+
+
 class IngestionPipeline:
     """
     Coordinates document ingestion into dual indices and metadata DB.
@@ -50,18 +118,40 @@ class IngestionPipeline:
         self.metadata_extractor = MetadataExtractor()
         self.style_filter = StyleExemplarFilter()
 
-    def ingest(self, file_path: str) -> Dict[str, int | str]:
+    def ingest(self, file_path: str, force: bool = False) -> Dict[str, int | str]:
         path = Path(file_path)
         if not path.exists():
             raise FileNotFoundError(f"File not found: {file_path}")
 
-        if path.suffix.lower() == ".pdf":
-            parsed = parse_pdf(path, company_id=self.company_id)
-            chunks = chunk_pdf_pages(parsed)
-        else:
-            parsed = parse_docx(path, company_id=self.company_id)
-            chunks = smart_chunk(parsed)
+        stat = path.stat()
+        previous = self.metadata_db.get_document_by_path(self.company_id, str(path))
+        if not force and self.is_unchanged(previous, stat):
+            logger.info("Skipping %s: size and mtime unchanged", path.name)
+            return self._unchanged_result(previous)
+
+        parsed, chunks = parse_and_chunk(path, self.company_id)
+        plan = self.plan_ingest(path, stat, previous, parsed, chunks, force=force)
+        if isinstance(plan, dict):
+            return plan
+        return self.write_plan(plan, self.embed_plan(plan))
+
+    @staticmethod
+    def is_unchanged(previous: Optional[Dict[str, Any]], stat: os.stat_result) -> bool:
+        return bool(previous) and previous.get("file_size") == stat.st_size and previous.get("file_mtime") == stat.st_mtime
 
+    def plan_ingest(
+        self,
+        path: Path,
+        stat: os.stat_result,
+        previous: Optional[Dict[str, Any]],
+        parsed: ParsedDocument,
+        chunks: List[Dict[str, Any]],
+        force: bool = False,
+    ) -> IngestPlan | Dict[str, int | str]:
+        """
+        Extract metadata and diff chunks against the stored version. Returns the
+        "unchanged" result instead of a plan when the content hash is the same.
+        """
         # Pre-compute section-level length metrics so every chunk carries its parent section stats.
         section_stats: Dict[str, Dict[str, int]] = {}
         if parsed.sections:
@@ -81,35 +171,72 @@ class IngestionPipeline:
                 }
 
         doc_meta = self.metadata_extractor.extract_metadata(parsed, company_id=self.company_id)
-        self.metadata_db.insert_document(
-            {
-                "artifact_id": doc_meta["artifact_id"],
-                "company_id": self.company_id,
-                "file_name": path.name,
-                "file_path": str(path),
-                "file_size": path.stat().st_size if path.exists() else None,
-                "latest_version_id": doc_meta["version_id"],
-                "doc_type": doc_meta.get("doc_type"),
-                "project_name": doc_meta.get("project_name"),
-                "author": doc_meta.get("author"),
-            }
+        if previous:
+            # Generated artifact ids include the file mtime; keep the original identity across edits
+            doc_meta["artifact_id"] = previous["artifact_id"]
+            if not force and previous.get("latest_version_id") == doc_meta["version_id"]:
+                logger.info("Skipping %s: content hash unchanged", path.name)
+                self.metadata_db.update_document_stat(previous["artifact_id"], stat.st_size, stat.st_mtime)
+                return self._unchanged_result(previous)
+
+        chunk_ids = _chunk_ids(doc_meta["artifact_id"], chunks, doc_meta.get("section_types", {}))
+        existing_ids = set(self.metadata_db.fetch_chunk_ids(doc_meta["artifact_id"])) if previous else set()
+        stale_ids = sorted(existing_ids - set(chunk_ids))
+        pending = [idx for idx, chunk_id in enumerate(chunk_ids) if force or chunk_id not in existing_ids]
+        # Stores without per-chunk deletes drop the whole artifact, so every current chunk is re-embedded
+        drop_artifact = bool(stale_ids) and not callable(getattr(self.vector_store, "delete_chunks", None))
+        if drop_artifact:
+            pending = list(range(len(chunk_ids)))
+
+        return IngestPlan(
+            path=path,
+            stat=stat,
+            previous=previous,
+            chunks=chunks,
+            doc_meta=doc_meta,
+            section_stats=section_stats,
+            chunk_ids=chunk_ids,
+            stale_ids=stale_ids,
+            pending=pending,
+            drop_artifact=drop_artifact,
+            texts=[chunks[idx]["text"] for idx in pending],
         )
 
-        texts = [c["text"] for c in chunks]
-        embeddings = self.embedding_service.embed_batch(texts)
-        if not embeddings:
-            logger.warning("No embeddings generated for %s", file_path)
+    def embed_plan(self, plan: IngestPlan) -> List[List[float]]:
+        return self.embedding_service.embed_batch(plan.texts) if plan.texts else []
+
+    def write_plan(self, plan: IngestPlan, embeddings: List[List[float]]) -> Dict[str, int | str]:
+        """
+        Classify and store the embedded chunks, delete stale chunks, then record the document.
+
+        Vectors are written first and the document row last: if any step fails, the
+        recorded size/mtime/version still belong to the previous ingest, so the next
+        run re-plans this file instead of skipping it with vectors missing.
+        """
+        path, chunks, doc_meta, section_stats = plan.path, plan.chunks, plan.doc_meta, plan.section_stats
+        section_types = doc_meta.get("section_types", {})
+        if plan.texts and not any(embeddings):
+            # Nothing is recorded, so the next run retries this file
+            logger.warning("No embeddings generated for %s", path)
             return {"artifact_id": doc_meta["artifact_id"], "version_id": doc_meta["version_id"], "chunk_count": 0}
 
         chunk_records: List[Chunk] = []
+        metadata_rows: List[Dict[str, Any]] = []
+        # Style exemplars from this document are not in the DB until the batch insert below
+        batch_styles: Counter = Counter()
         content_count = 0
         style_count = 0
-        for idx, (chunk, vector) in enumerate(zip(chunks, embeddings)):
-            chunk_id = f"{doc_meta['artifact_id']}_{idx}"
-            section_type = doc_meta.get("section_types", {}).get(chunk.get("section_title"))
+        for idx, vector in zip(plan.pending, embeddings):
+            if not vector:
+                continue  # blank chunk text
+            chunk = chunks[idx]
+            chunk_id = plan.chunk_ids[idx]
+            section_type = section_types.get(chunk.get("section_title"))
             text = chunk.get("text", "")
             normalized_text = self.style_filter._normalize(text)
-            frequency_before = self.metadata_db.get_style_frequency(normalized_text, section_type)
+            frequency_before = self.metadata_db.get_style_frequency(normalized_text, section_type) + batch_styles[
+                (normalized_text, section_type) if section_type else normalized_text
+            ]
             quality_score = self.style_filter.compute_quality_score(text)
             text_length_chars = len(text)
             text_length_words = len(text.split())
@@ -131,6 +258,10 @@ class IngestionPipeline:
             style_frequency = frequency_before + 1 if chunk_type == "style" else 0
             if chunk_type == "style":
                 style_count += 1
+                if normalized_text:
+                    batch_styles[normalized_text] += 1
+                    if section_type:
+                        batch_styles[(normalized_text, section_type)] += 1
             else:
                 content_count += 1
 
@@ -164,11 +295,35 @@ class IngestionPipeline:
                 "section_sentence_count": section_length.get("sentence_count"),
             }
 
-            self.metadata_db.insert_chunk_metadata(chunk_metadata)
+            metadata_rows.append(chunk_metadata)
             chunk_records.append(Chunk(id=chunk_id, text=text, embedding=vector, metadata=chunk_metadata))
 
+        # Vectors first: chunk IDs recorded in SQLite are never re-embedded, so they must already be stored
+        if plan.drop_artifact:
+            # Store without per-chunk deletes: clear the artifact, then every current chunk is upserted below
+            self.vector_store.delete_by_artifact(doc_meta["artifact_id"])
         if chunk_records:
             self.vector_store.upsert(chunk_records)
+        if plan.stale_ids:
+            if not plan.drop_artifact:
+                self.vector_store.delete_chunks(plan.stale_ids)
+            self.metadata_db.delete_chunks(plan.stale_ids)
+        self.metadata_db.insert_chunk_metadata_many(metadata_rows)
+        # Document row last: it is what marks this file as ingested
+        self.metadata_db.insert_document(
+            {
+                "artifact_id": doc_meta["artifact_id"],
+                "company_id": self.company_id,
+                "file_name": path.name,
+                "file_path": str(path),
+                "file_size": plan.stat.st_size,
+                "file_mtime": plan.stat.st_mtime,
+                "latest_version_id": doc_meta["version_id"],
+                "doc_type": doc_meta.get("doc_type"),
+                "project_name": doc_meta.get("project_name"),
+                "author": doc_meta.get("author"),
+            }
+        )
 
         return {
             "artifact_id": doc_meta["artifact_id"],
@@ -176,4 +331,19 @@ class IngestionPipeline:
             "chunk_count": len(chunks),
             "content_chunks": content_count,
             "style_chunks": style_count,
+            "embedded_chunks": len(chunk_records),
+            "deleted_chunks": len(plan.stale_ids),
+            "status": "updated" if plan.previous else "new",
+        }
+
+    def _unchanged_result(self, document: Dict[str, Any]) -> Dict[str, int | str]:
+        return {
+            "artifact_id": document["artifact_id"],
+            "version_id": document["latest_version_id"],
+            "chunk_count": len(self.metadata_db.fetch_chunk_ids(document["artifact_id"])),
+            "content_chunks": 0,
+            "style_chunks": 0,
+            "embedded_chunks": 0,
+            "deleted_chunks": 0,
+            "status": "unchanged",
         }
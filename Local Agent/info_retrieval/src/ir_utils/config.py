@@ -21,7 +21,9 @@ class AppConfig:
     use_local_embeddings: bool
     embedding_dim: Optional[int]
     log_level: str
-    use_csv_vector_store: bool = False
+    use_local_vector_store: bool = False
+    local_vector_store_path: Path = DATA_DIR / "local_vector_store"
+    # Legacy CSV store; imported into the local store on first use when present
     csv_vector_store_path: Path = DATA_DIR / "vector_store.csv"
 
 
@@ -42,7 +44,10 @@ def load_config() -> AppConfig:
         use_local_embeddings=_as_bool(os.getenv("USE_LOCAL_EMBEDDINGS", "false")),
         embedding_dim=_parse_optional_int(os.getenv("EMBEDDING_DIM")),
         log_level=os.getenv("LOG_LEVEL", "INFO"),
-        use_csv_vector_store=_as_bool(os.getenv("USE_CSV_VECTOR_STORE", "false")),
+        use_local_vector_store=_as_bool(
+            os.getenv("USE_LOCAL_VECTOR_STORE", os.getenv("USE_CSV_VECTOR_STORE", "false"))
+        ),
+        local_vector_store_path=_coerce_path(os.getenv("LOCAL_VECTOR_STORE_PATH", DATA_DIR / "local_vector_store")),
         csv_vector_store_path=_coerce_path(os.getenv("CSV_VECTOR_STORE_PATH", DATA_DIR / "vector_store.csv")),
     )
 
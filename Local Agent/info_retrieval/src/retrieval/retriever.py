@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
 
 from embeddings.embedding_service import EmbeddingService
 from storage.vector_store import VectorStore
@@ -26,7 +28,7 @@ class Retriever:
     ) -> None:
         texts = [chunk.get("text", "") for chunk in chunks]
         vectors = self.embedding_service.embed_batch(texts)
-        if not vectors:
+        if not any(vectors):
             logger.warning("No vectors generated; skipping index.")
             return
 
@@ -34,6 +36,8 @@ class Retriever:
 
         chunk_payloads: List[VSChunk] = []
         for chunk, meta, vector in zip(chunks, metadata_list, vectors):
+            if not vector:
+                continue
             payload = {
                 **meta,
                 "text": chunk.get("text", ""),
@@ -86,6 +90,74 @@ class Retriever:
         return self.retrieve_for_query(query_text, company_id, chunk_type=chunk_type, top_k=top_k, filters=filters)
 
 
+class SharedRetriever:
+    """
+    Request-scoped memo over a Retriever, shared by concurrent callers.
+
+    Identical (query, chunk_type, top_k, filters) lookups run once; callers
+    arriving while a lookup is in flight wait for its result instead of
+    issuing a duplicate embed + search. Query vectors are embedded once per
+    query text. Results are returned as shallow copies so callers can mutate
+    their lists freely.
+    """
+
+    def __init__(self, retriever: Retriever) -> None:
+        self._retriever = retriever
+        self.embedding_service = retriever.embedding_service
+        self.vector_store = retriever.vector_store
+        self._lock = threading.Lock()
+        self._results: Dict[Tuple[Any, ...], Future] = {}
+        self._vectors: Dict[str, Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _memo(self, table: Dict[Any, Future], key: Any, compute) -> Any:
+        with self._lock:
+            future = table.get(key)
+            owner = future is None
+            if owner:
+                future = table[key] = Future()
+                self.misses += 1
+            else:
+                self.hits += 1
+        if owner:
+            try:
+                future.set_result(compute())
+            except Exception as exc:  # noqa: BLE001
+                with self._lock:
+                    table.pop(key, None)
+                future.set_exception(exc)
+        return future.result()
+
+    def _query_vector(self, query_text: str) -> List[float]:
+        return self._memo(self._vectors, query_text, lambda: self.embedding_service.embed_text(query_text))
+
+    def retrieve_for_query(
+        self,
+        query_text: str,
+        company_id: str,
+        chunk_type: str,
+        top_k: int = 5,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        filters = dict(filters or {})
+        filters.setdefault("company_id", company_id)
+        filters["index_type"] = chunk_type
+        key = (query_text, chunk_type, top_k, tuple(sorted((k, repr(v)) for k, v in filters.items())))
+
+        def _search() -> List[Dict[str, Any]]:
+            query_vector = self._query_vector(query_text)
+            if not query_vector:
+                return []
+            results = self.vector_store.search(query_vector, top_k=top_k, filters=filters)
+            return [_format_result_from_store(r) for r in results]
+
+        return list(self._memo(self._results, key, _search))
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._retriever, name)
+
+
 def _format_result_from_store(result: Any) -> Dict[str, Any]:
     payload = result.metadata if hasattr(result, "metadata") else result.get("metadata", {})
     text = result.text if hasattr(result, "text") else result.get("text", "")
@@ -0,0 +1,411 @@
+"""
+Indexed local VectorStore for offline and test deployments.
+
+Vectors live in a contiguous float32 matrix, L2-normalized on insert so search
+is a single matrix-vector dot product. Metadata filters are resolved through
+per-field posting lists combined as boolean row masks, so only matching rows
+are scored. Above `ann_threshold` live rows an HNSW index (hnswlib, optional)
+is used for broad queries; selective filters still take the exact path.
+
+On-disk layout (append-friendly, no full rewrites on upsert/delete):
+    <path>/manifest.json   {"dim": int, "format": 1}
+    <path>/vectors.f32     raw little-endian float32 rows, memory-mapped on load
+    <path>/records.jsonl   one {"op": "add"|"del", ...} line per mutation
+Replaced rows are tombstoned and reclaimed by `compact()`, which runs
+automatically once more than half of the stored rows are dead.
+"""
+from __future__ import annotations
+
+import csv
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from storage.vector_store import Chunk, SearchResult, VectorStore
+from ir_utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    import hnswlib
+except ImportError:  # pragma: no cover - environment dependent
+    hnswlib = None
+
+# Metadata fields with posting lists; other filter keys fall back to a scan of the candidate rows
+INDEXED_FIELDS = (
+    "company_id",
+    "index_type",
+    "chunk_type",
+    "doc_type",
+    "section_type",
+    "artifact_id",
+    "version_id",
+    "project_key",
+)
+DEFAULT_ANN_THRESHOLD = 50_000
+# Filtered queries matching at most this many rows are always scored exactly
+EXACT_SEARCH_MAX_ROWS = 20_000
+
+
+class LocalVectorStore(VectorStore):
+    """
+    NumPy-backed VectorStore persisted to a directory (or purely in memory when `path` is None).
+    """
+
+    def __init__(
+        self,
+        path: str | Path | None = "data/local_vector_store",
+        dim: Optional[int] = None,
+        mmap: bool = True,
+        ann_threshold: int = DEFAULT_ANN_THRESHOLD,
+    ) -> None:
+        self.path = Path(path) if path is not None else None
+        self.dim = dim
+        self.ann_threshold = ann_threshold
+        self._lock = threading.RLock()
+
+        # Rows [0, len(_base)) come from disk (memory-mapped); later rows live in _tail
+        self._base: np.ndarray = np.zeros((0, dim or 0), dtype=np.float32)
+        self._tail: np.ndarray = np.zeros((0, dim or 0), dtype=np.float32)
+        self._tail_len = 0
+        self._alive = np.zeros(0, dtype=bool)
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadata: List[Dict[str, Any]] = []
+        self._row_by_id: Dict[str, int] = {}
+        self._postings: Dict[Tuple[str, str], List[int]] = {}
+        self._dead = 0
+
+        self._ann = None
+        self._ann_rows = 0
+
+        if self.path is not None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._load(mmap)
+
+    # ------------------------------------------------------------------
+    # VectorStore interface
+    # ------------------------------------------------------------------
+    def upsert(self, chunks: List[Chunk]) -> None:
+        if not chunks:
+            return
+        with self._lock:
+            vectors = self._normalize(np.asarray([c.embedding for c in chunks], dtype=np.float32))
+            # Vectors first so the alive mask covers rows tombstoned within this batch
+            self._append_vectors(vectors)
+            records: List[Dict[str, Any]] = []
+            for chunk in chunks:
+                previous = self._row_by_id.get(chunk.id)
+                if previous is not None:
+                    self._tombstone(previous)
+                    records.append({"op": "del", "row": previous})
+                row = self._append_row(chunk.id, chunk.text, dict(chunk.metadata))
+                records.append({"op": "add", "row": row, "id": chunk.id, "text": chunk.text, "metadata": chunk.metadata})
+            self._persist(vectors, records)
+            self._maybe_compact()
+
+    def search(self, query_vector: List[float], top_k: int, filters: Optional[Dict[str, object]] = None) -> List[SearchResult]:
+        with self._lock:
+            total = len(self._ids)
+            if total == 0 or top_k <= 0 or not query_vector:
+                return []
+            query = self._normalize(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))[0]
+            if query.shape[0] != self.dim:
+                logger.warning("Query dimension %s does not match store dimension %s", query.shape[0], self.dim)
+                return []
+
+            mask = self._filter_mask(filters or {})
+            candidates = int(mask.sum())
+            if candidates == 0:
+                return []
+
+            rows: Optional[np.ndarray] = None
+            scores: Optional[np.ndarray] = None
+            if candidates > EXACT_SEARCH_MAX_ROWS and self._ann_ready():
+                rows, scores = self._ann_search(query, top_k, mask)
+            if rows is None:
+                rows, scores = self._exact_search(query, top_k, np.flatnonzero(mask))
+            return [
+                SearchResult(id=self._ids[r], score=float(s), text=self._texts[r], metadata=self._metadata[r])
+                for r, s in zip(rows.tolist(), scores.tolist())
+            ]
+
+    def delete_by_artifact(self, artifact_id: str, version_id: Optional[str] = None) -> None:
+        with self._lock:
+            filters: Dict[str, object] = {"artifact_id": artifact_id}
+            if version_id:
+                filters["version_id"] = version_id
+            rows = np.flatnonzero(self._filter_mask(filters)).tolist()
+            if not rows:
+                return
+            for row in rows:
+                self._tombstone(row)
+            self._persist(None, [{"op": "del", "row": row} for row in rows])
+            self._maybe_compact()
+
+    def delete_chunks(self, chunk_ids: List[str]) -> None:
+        with self._lock:
+            rows = [self._row_by_id[c] for c in chunk_ids if c in self._row_by_id]
+            if not rows:
+                return
+            for row in rows:
+                self._tombstone(row)
+            self._persist(None, [{"op": "del", "row": row} for row in rows])
+            self._maybe_compact()
+
+    # ------------------------------------------------------------------
+    # Introspection / maintenance
+    # ------------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self._ids) - self._dead
+
+    def compact(self) -> None:
+        """Drop tombstoned rows and rewrite the on-disk files once."""
+        with self._lock:
+            live = np.flatnonzero(self._alive)
+            vectors = self._rows(live)
+            ids = [self._ids[r] for r in live]
+            texts = [self._texts[r] for r in live]
+            metadata = [self._metadata[r] for r in live]
+            self._reset(self.dim)
+            for chunk_id, text, meta in zip(ids, texts, metadata):
+                self._append_row(chunk_id, text, meta)
+            self._append_vectors(vectors)
+            if self.path is not None:
+                self._rewrite_files(vectors)
+
+    @classmethod
+    def import_csv(cls, csv_path: str | Path, path: str | Path | None, **kwargs: Any) -> "LocalVectorStore":
+        """Build a store from a legacy CSVVectorStore file (id, text, embedding, metadata columns)."""
+        store = cls(path, **kwargs)
+        batch: List[Chunk] = []
+        with Path(csv_path).open("r", newline="", encoding="utf-8") as fh:
+            for row in csv.DictReader(fh):
+                batch.append(
+                    Chunk(
+                        id=row["id"],
+                        text=row.get("text", ""),
+                        embedding=json.loads(row.get("embedding", "[]")),
+                        metadata=json.loads(row.get("metadata", "{}")),
+                    )
+                )
+                if len(batch) >= 1000:
+                    store.upsert(batch)
+                    batch = []
+        store.upsert(batch)
+        return store
+
+    # ------------------------------------------------------------------
+    # Search internals
+    # ------------------------------------------------------------------
+    def _exact_search(self, query: np.ndarray, top_k: int, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if len(rows) == len(self._ids):
+            scores = np.concatenate([self._base @ query, self._tail[: self._tail_len] @ query])
+            scores[~self._alive] = -np.inf
+            rows = np.arange(len(self._ids))
+        else:
+            scores = self._rows(rows) @ query
+        k = min(top_k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        top = top[np.isfinite(scores[top])]
+        return rows[top], scores[top]
+
+    def _ann_ready(self) -> bool:
+        if hnswlib is None or len(self) < self.ann_threshold:
+            return False
+        if self._ann is None:
+            self._ann = hnswlib.Index(space="ip", dim=self.dim)
+            self._ann.init_index(max_elements=max(len(self._ids) * 2, 1024), ef_construction=200, M=16)
+            self._ann_rows = 0
+        if self._ann_rows < len(self._ids):
+            new_rows = np.arange(self._ann_rows, len(self._ids))
+            if len(self._ids) > self._ann.get_max_elements():
+                self._ann.resize_index(len(self._ids) * 2)
+            self._ann.add_items(self._rows(new_rows), new_rows)
+            for row in new_rows[~self._alive[new_rows]].tolist():
+                self._ann.mark_deleted(row)
+            self._ann_rows = len(self._ids)
+        return True
+
+    def _ann_search(self, query: np.ndarray, top_k: int, mask: np.ndarray) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        selectivity = mask.sum() / max(1, len(self))
+        fetch = min(len(self), int(top_k / max(selectivity, 1e-3)) * 2 + top_k)
+        self._ann.set_ef(max(fetch, 64))
+        labels, distances = self._ann.knn_query(query, k=fetch)
+        rows = labels[0].astype(np.int64)
+        keep = mask[rows]
+        rows, scores = rows[keep][:top_k], (1.0 - distances[0][keep])[:top_k]
+        if len(rows) < top_k:
+            return None, None  # filter too selective for the over-fetch; caller falls back to exact
+        return rows, scores.astype(np.float32)
+
+    def _filter_mask(self, filters: Dict[str, object]) -> np.ndarray:
+        mask = self._alive.copy()
+        scan: Dict[str, object] = {}
+        for key, value in filters.items():
+            if value is None:
+                continue
+            if key in INDEXED_FIELDS:
+                rows = self._postings.get((key, _posting_value(value)))
+                if not rows:
+                    return np.zeros_like(mask)
+                field_mask = np.zeros_like(mask)
+                field_mask[np.asarray(rows, dtype=np.int64)] = True
+                mask &= field_mask
+            else:
+                scan[key] = value
+        if scan:
+            for row in np.flatnonzero(mask).tolist():
+                meta = self._metadata[row]
+                if any(meta.get(k) != v for k, v in scan.items()):
+                    mask[row] = False
+        return mask
+
+    # ------------------------------------------------------------------
+    # Storage internals
+    # ------------------------------------------------------------------
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        if vectors.ndim != 2 or vectors.shape[1] == 0:
+            raise ValueError("Embeddings must be non-empty vectors.")
+        if self.dim is None:
+            self._reset(vectors.shape[1])
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match store dimension {self.dim}.")
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).astype(np.float32, copy=False)
+
+    def _reset(self, dim: Optional[int]) -> None:
+        self.dim = dim
+        self._base = np.zeros((0, dim or 0), dtype=np.float32)
+        self._tail = np.zeros((0, dim or 0), dtype=np.float32)
+        self._tail_len = 0
+        self._alive = np.zeros(0, dtype=bool)
+        self._ids, self._texts, self._metadata = [], [], []
+        self._row_by_id, self._postings = {}, {}
+        self._dead = 0
+        self._ann, self._ann_rows = None, 0
+
+    def _append_row(self, chunk_id: str, text: str, metadata: Dict[str, Any]) -> int:
+        row = len(self._ids)
+        self._ids.append(chunk_id)
+        self._texts.append(text)
+        self._metadata.append(metadata)
+        self._row_by_id[chunk_id] = row
+        for field in INDEXED_FIELDS:
+            value = metadata.get(field)
+            if value is not None:
+                self._postings.setdefault((field, _posting_value(value)), []).append(row)
+        return row
+
+    def _append_vectors(self, vectors: np.ndarray) -> None:
+        needed = self._tail_len + len(vectors)
+        if needed > len(self._tail):
+            grown = np.zeros((max(needed, len(self._tail) * 2, 1024), self.dim), dtype=np.float32)
+            grown[: self._tail_len] = self._tail[: self._tail_len]
+            self._tail = grown
+        self._tail[self._tail_len : needed] = vectors
+        self._tail_len = needed
+        self._alive = np.concatenate([self._alive, np.ones(len(vectors), dtype=bool)])
+
+    def _tombstone(self, row: int) -> None:
+        if not self._alive[row]:
+            return
+        self._alive[row] = False
+        self._dead += 1
+        if self._row_by_id.get(self._ids[row]) == row:
+            del self._row_by_id[self._ids[row]]
+        if self._ann is not None and row < self._ann_rows:
+            self._ann.mark_deleted(row)
+
+    def _rows(self, rows: np.ndarray) -> np.ndarray:
+        base_n = len(self._base)
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        if rows.max() < base_n:
+            return np.asarray(self._base[rows])
+        if rows.min() >= base_n:
+            return self._tail[rows - base_n]
+        out = np.empty((len(rows), self.dim), dtype=np.float32)
+        in_base = rows < base_n
+        out[in_base] = self._base[rows[in_base]]
+        out[~in_base] = self._tail[rows[~in_base] - base_n]
+        return out
+
+    def _maybe_compact(self) -> None:
+        if self._dead > 1000 and self._dead * 2 > len(self._ids):
+            logger.info("Compacting local vector store (%s of %s rows dead)", self._dead, len(self._ids))
+            self.compact()
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    @property
+    def _manifest_file(self) -> Path:
+        return self.path / "manifest.json"  # type: ignore[operator]
+
+    @property
+    def _vectors_file(self) -> Path:
+        return self.path / "vectors.f32"  # type: ignore[operator]
+
+    @property
+    def _records_file(self) -> Path:
+        return self.path / "records.jsonl"  # type: ignore[operator]
+
+    def _load(self, mmap: bool) -> None:
+        if not self._manifest_file.exists():
+            return
+        manifest = json.loads(self._manifest_file.read_text(encoding="utf-8"))
+        self._reset(int(manifest["dim"]))
+        deleted: List[int] = []
+        with self._records_file.open("r", encoding="utf-8") as fh:
+            for line in fh:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record["op"] == "add":
+                    self._append_row(record["id"], record.get("text", ""), record.get("metadata") or {})
+                elif record["op"] == "del":
+                    deleted.append(int(record["row"]))
+        rows = len(self._ids)
+        self._alive = np.ones(rows, dtype=bool)
+        for row in deleted:
+            self._tombstone(row)
+        if rows:
+            if mmap:
+                self._base = np.memmap(self._vectors_file, dtype="<f4", mode="r", shape=(rows, self.dim))
+            else:
+                self._base = np.fromfile(self._vectors_file, dtype="<f4", count=rows * self.dim).reshape(rows, self.dim)
+        logger.info("Loaded local vector store from %s (%s live rows)", self.path, len(self))
+
+    def _persist(self, vectors: Optional[np.ndarray], records: Iterable[Dict[str, Any]]) -> None:
+        if self.path is None:
+            return
+        if not self._manifest_file.exists():
+            self._manifest_file.write_text(json.dumps({"dim": self.dim, "format": 1}), encoding="utf-8")
+        if vectors is not None and len(vectors):
+            with self._vectors_file.open("ab") as fh:
+                fh.write(vectors.astype("<f4", copy=False).tobytes())
+        with self._records_file.open("a", encoding="utf-8") as fh:
+            for record in records:
+                fh.write(json.dumps(record, default=str) + "\n")
+
+    def _rewrite_files(self, vectors: np.ndarray) -> None:
+        tmp_vectors = self._vectors_file.with_suffix(".f32.tmp")
+        tmp_records = self._records_file.with_suffix(".jsonl.tmp")
+        vectors.astype("<f4", copy=False).tofile(tmp_vectors)
+        with tmp_records.open("w", encoding="utf-8") as fh:
+            for row, (chunk_id, text, meta) in enumerate(zip(self._ids, self._texts, self._metadata)):
+                fh.write(json.dumps({"op": "add", "row": row, "id": chunk_id, "text": text, "metadata": meta}, default=str) + "\n")
+        self._manifest_file.write_text(json.dumps({"dim": self.dim, "format": 1}), encoding="utf-8")
+        tmp_vectors.replace(self._vectors_file)
+        tmp_records.replace(self._records_file)
+
+
+def _posting_value(value: object) -> str:
+    return value if isinstance(value, str) else json.dumps(value, sort_keys=True, default=str)
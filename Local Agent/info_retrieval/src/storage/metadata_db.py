@@ -2,9 +2,12 @@ from __future__ import annotations
 
 import json
 import sqlite3
+import threading
+from collections import Counter
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Sequence
 from uuid import uuid4
 
 from ir_utils.logger import get_logger
@@ -15,17 +18,39 @@ logger = get_logger(__name__)
 class MetadataDB:
     """
     SQLite wrapper for chunk-level metadata with artifact/version identity.
+
+    One long-lived WAL-mode connection is shared by all calls (serialized by a
+    lock). Style-exemplar frequencies are served from an in-memory counter that
+    is loaded once and kept in sync by the insert/delete methods.
     """
 
     def __init__(self, db_path: Path) -> None:
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # (normalized_text, section_type) -> style chunk count, and normalized_text -> count across sections
+        self._style_counts: Optional[Counter] = None
+        self._style_totals: Optional[Counter] = None
         self._ensure_schema()
 
-    def _connect(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Shared connection; the block runs as one transaction (committed on success)."""
+        with self._lock, self._conn:
+            yield self._conn
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def query(self, sql: str, params: Sequence[Any] = ()) -> List[sqlite3.Row]:
+        """Run a read-only query on the shared connection."""
+        with self._connect() as conn:
+            return conn.execute(sql, params).fetchall()
 
     def _ensure_schema(self) -> None:
         with self._connect() as conn:
@@ -37,6 +62,7 @@ class MetadataDB:
                     file_name TEXT NOT NULL,
                     file_path TEXT,
                     file_size INTEGER,
+                    file_mtime REAL,
                     latest_version_id TEXT NOT NULL,
                     doc_type TEXT,
                     project_name TEXT,
@@ -61,6 +87,10 @@ class MetadataDB:
                     style_frequency INTEGER DEFAULT 0,
                     quality_score REAL,
                     is_pinned INTEGER DEFAULT 0,
+                    text_length_chars INTEGER,
+                    text_length_words INTEGER,
+                    paragraph_count INTEGER,
+                    sentence_count INTEGER,
                     page_number INTEGER,
                     section_number TEXT,
                     heading TEXT,
@@ -85,9 +115,60 @@ class MetadataDB:
                 CREATE INDEX IF NOT EXISTS idx_docs_company ON documents(company_id);
                 """
             )
-            conn.commit()
+            # Older databases lack columns added since; add them in place
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(documents)")}
+            if "file_mtime" not in columns:
+                conn.execute("ALTER TABLE documents ADD COLUMN file_mtime REAL")
+            chunk_columns = {row["name"] for row in conn.execute("PRAGMA table_info(chunks)")}
+            for column in ("text_length_chars", "text_length_words", "paragraph_count", "sentence_count"):
+                if column not in chunk_columns:
+                    conn.execute(f"ALTER TABLE chunks ADD COLUMN {column} INTEGER")
+            conn.executescript(
+                """
+                CREATE INDEX IF NOT EXISTS idx_docs_path ON documents(company_id, file_path);
+                CREATE INDEX IF NOT EXISTS idx_chunks_style_freq ON chunks(normalized_text, chunk_type, section_type);
+                CREATE INDEX IF NOT EXISTS idx_chunks_profile ON chunks(
+                    company_id, doc_type, section_type, chunk_type,
+                    text_length_chars, text_length_words, sentence_count, paragraph_count
+                );
+                """
+            )
 
     def insert_chunk_metadata(self, record: Dict[str, Any]) -> str:
+        return self.insert_chunk_metadata_many([record])[0]
+
+    def insert_chunk_metadata_many(self, records: Sequence[Dict[str, Any]]) -> List[str]:
+        """
+        Insert (or replace) many chunk rows with one executemany in a single transaction.
+        """
+        payloads = [self._chunk_payload(record) for record in records]
+        if not payloads:
+            return []
+        with self._connect() as conn:
+            self._forget_styles(conn, [p["chunk_id"] for p in payloads])
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO chunks
+                (chunk_id, artifact_id, version_id, company_id, source, file_path, doc_type, section_type, chunk_type,
+                 calculation_type, text, normalized_text, style_frequency, quality_score, is_pinned,
+                 text_length_chars, text_length_words, paragraph_count, sentence_count,
+                 page_number, section_number, heading, project_name, author, reviewer, tags,
+                 parent_artifact_id, related_chunks, created_at, modified_at)
+                VALUES (:chunk_id, :artifact_id, :version_id, :company_id, :source, :file_path, :doc_type, :section_type,
+                        :chunk_type, :calculation_type, :text, :normalized_text, :style_frequency, :quality_score, :is_pinned,
+                        :text_length_chars, :text_length_words, :paragraph_count, :sentence_count,
+                        :page_number, :section_number, :heading, :project_name,
+                        :author, :reviewer, :tags, :parent_artifact_id, :related_chunks, :created_at, :modified_at)
+                """,
+                payloads,
+            )
+            if self._style_counts is not None:
+                for payload in payloads:
+                    if payload["chunk_type"] == "style" and payload["normalized_text"]:
+                        self._count_style(payload["normalized_text"], payload["section_type"], 1)
+        return [p["chunk_id"] for p in payloads]
+
+    def _chunk_payload(self, record: Dict[str, Any]) -> Dict[str, Any]:
         chunk_id = record.get("chunk_id") or str(uuid4())
         now = datetime.utcnow().isoformat()
         payload = {
@@ -106,6 +187,10 @@ class MetadataDB:
             "style_frequency": int(record.get("style_frequency", 0) or 0),
             "quality_score": record.get("quality_score"),
             "is_pinned": int(bool(record.get("is_pinned", False))),
+            "text_length_chars": record.get("text_length_chars"),
+            "text_length_words": record.get("text_length_words"),
+            "paragraph_count": record.get("paragraph_count"),
+            "sentence_count": record.get("sentence_count"),
             "page_number": record.get("page_number"),
             "section_number": record.get("section_number"),
             "heading": record.get("heading"),
@@ -118,30 +203,16 @@ class MetadataDB:
             "created_at": record.get("created_at", now),
             "modified_at": record.get("modified_at", now),
         }
-        with self._connect() as conn:
-            conn.execute(
-                """
-                INSERT OR REPLACE INTO chunks
-                (chunk_id, artifact_id, version_id, company_id, source, file_path, doc_type, section_type, chunk_type,
-                 calculation_type, text, normalized_text, style_frequency, quality_score, is_pinned, page_number, section_number, heading, project_name, author, reviewer, tags,
-                 parent_artifact_id, related_chunks, created_at, modified_at)
-                VALUES (:chunk_id, :artifact_id, :version_id, :company_id, :source, :file_path, :doc_type, :section_type,
-                        :chunk_type, :calculation_type, :text, :normalized_text, :style_frequency, :quality_score, :is_pinned,
-                        :page_number, :section_number, :heading, :project_name,
-                        :author, :reviewer, :tags, :parent_artifact_id, :related_chunks, :created_at, :modified_at)
-                """,
-                payload,
-            )
-            conn.commit()
-        return chunk_id
+        return payload
 
     def insert_document(self, record: Dict[str, Any]) -> None:
         with self._connect() as conn:
             conn.execute(
                 """
                 INSERT OR REPLACE INTO documents
-                (artifact_id, company_id, file_name, file_path, file_size, latest_version_id, doc_type, project_name, author)
-                VALUES (:artifact_id, :company_id, :file_name, :file_path, :file_size, :latest_version_id, :doc_type, :project_name, :author)
+                (artifact_id, company_id, file_name, file_path, file_size, file_mtime, latest_version_id, doc_type, project_name, author)
+                VALUES (:artifact_id, :company_id, :file_name, :file_path, :file_size, :file_mtime, :latest_version_id, :doc_type,
+                        :project_name, :author)
                 """,
                 {
                     "artifact_id": record.get("artifact_id"),
@@ -149,13 +220,40 @@ class MetadataDB:
                     "file_name": record.get("file_name"),
                     "file_path": record.get("file_path"),
                     "file_size": record.get("file_size"),
+                    "file_mtime": record.get("file_mtime"),
                     "latest_version_id": record.get("latest_version_id"),
                     "doc_type": record.get("doc_type"),
                     "project_name": record.get("project_name"),
                     "author": record.get("author"),
                 },
             )
-            conn.commit()
+
+    def get_document_by_path(self, company_id: str, file_path: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM documents WHERE company_id = ? AND file_path = ? ORDER BY datetime(created_at) DESC LIMIT 1",
+                (company_id, file_path),
+            ).fetchone()
+            return {key: row[key] for key in row.keys()} if row else None
+
+    def update_document_stat(self, artifact_id: str, file_size: Optional[int], file_mtime: Optional[float]) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE documents SET file_size = ?, file_mtime = ? WHERE artifact_id = ?",
+                (file_size, file_mtime, artifact_id),
+            )
+
+    def fetch_chunk_ids(self, artifact_id: str) -> List[str]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT chunk_id FROM chunks WHERE artifact_id = ?", (artifact_id,)).fetchall()
+            return [row[0] for row in rows]
+
+    def delete_chunks(self, chunk_ids: List[str]) -> None:
+        if not chunk_ids:
+            return
+        with self._connect() as conn:
+            self._forget_styles(conn, chunk_ids)
+            conn.executemany("DELETE FROM chunks WHERE chunk_id = ?", [(chunk_id,) for chunk_id in chunk_ids])
 
     def list_recent(self, limit: int = 20) -> List[Dict[str, Any]]:
         with self._connect() as conn:
@@ -178,14 +276,44 @@ class MetadataDB:
     def get_style_frequency(self, normalized_text: str, section_type: Optional[str] = None) -> int:
         if not normalized_text:
             return 0
-        query = "SELECT COUNT(*) FROM chunks WHERE normalized_text = ? AND chunk_type = 'style'"
-        params: list[Any] = [normalized_text]
+        with self._lock:
+            if self._style_counts is None:
+                self._load_style_counts()
+            assert self._style_counts is not None and self._style_totals is not None
+            if section_type:
+                return self._style_counts[(normalized_text, section_type)]
+            return self._style_totals[normalized_text]
+
+    def _load_style_counts(self) -> None:
+        self._style_counts, self._style_totals = Counter(), Counter()
+        rows = self.query(
+            "SELECT normalized_text, section_type, COUNT(*) FROM chunks "
+            "WHERE chunk_type = 'style' AND normalized_text IS NOT NULL AND normalized_text != '' "
+            "GROUP BY normalized_text, section_type"
+        )
+        for normalized_text, section_type, count in rows:
+            self._count_style(normalized_text, section_type, int(count))
+
+    def _count_style(self, normalized_text: str, section_type: Optional[str], delta: int) -> None:
+        assert self._style_counts is not None and self._style_totals is not None
         if section_type:
-            query += " AND section_type = ?"
-            params.append(section_type)
-        with self._connect() as conn:
-            row = conn.execute(query, params).fetchone()
-            return int(row[0]) if row else 0
+            self._style_counts[(normalized_text, section_type)] += delta
+        self._style_totals[normalized_text] += delta
+
+    def _forget_styles(self, conn: sqlite3.Connection, chunk_ids: Sequence[str]) -> None:
+        """Decrement style counts for existing rows about to be replaced or deleted."""
+        if self._style_counts is None:
+            return
+        for start in range(0, len(chunk_ids), 500):
+            batch = list(chunk_ids[start : start + 500])
+            placeholders = ",".join("?" for _ in batch)
+            rows = conn.execute(
+                f"SELECT normalized_text, section_type FROM chunks WHERE chunk_type = 'style' AND chunk_id IN ({placeholders})",
+                batch,
+            ).fetchall()
+            for normalized_text, section_type in rows:
+                if normalized_text:
+                    self._count_style(normalized_text, section_type, -1)
 
     def get_section_profile(self, company_id: str, doc_type: Optional[str], section_type: Optional[str]) -> Optional[Dict[str, Any]]:
         """
@@ -65,4 +65,7 @@ class QdrantVectorStore(VectorStore):
         ]
 
     def delete_by_artifact(self, artifact_id: str, version_id: Optional[str] = None) -> None:
-        logger.warning("delete_by_artifact is not implemented for Qdrant adapter.")
+        self.vector_db.delete_by_artifact(self.company_id, artifact_id, version_id)
+
+    def delete_chunks(self, chunk_ids: List[str]) -> None:
+        self.vector_db.delete_points(self.company_id, chunk_ids)
@@ -125,6 +125,12 @@ class SupabaseVectorStore(VectorStore):
             query = query.eq("version_id", version_id)
         query.execute()
 
+    def delete_chunks(self, chunk_ids: List[str]) -> None:
+        if not chunk_ids:
+            return
+        ids = [self._coerce_uuid(str(c)) for c in chunk_ids]
+        self.client.table(self.table).delete().in_(self.id_column, ids).execute()
+
     def _build_row(self, chunk: Chunk, include_metadata: bool = True) -> Dict[str, object]:
         metadata = dict(chunk.metadata)
         chunk_id = str(metadata.get("chunk_id") or chunk.id)
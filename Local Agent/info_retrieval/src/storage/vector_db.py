@@ -1,22 +1,46 @@
 from __future__ import annotations
 
 import os
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Optional, Tuple
 
-import numpy as np
-
 from ir_utils.config import AppConfig
 from ir_utils.logger import get_logger
+from storage.local_vector_store import LocalVectorStore
+from storage.vector_store import Chunk
 
 logger = get_logger(__name__)
 
 try:
     from qdrant_client import QdrantClient
-    from qdrant_client.http.models import Distance, FieldCondition, Filter, MatchValue, PointStruct, VectorParams
+    from qdrant_client.http.models import (
+        Distance,
+        FieldCondition,
+        Filter,
+        FilterSelector,
+        MatchValue,
+        PayloadSchemaType,
+        PointIdsList,
+        PointStruct,
+        VectorParams,
+    )
 except ImportError:  # pragma: no cover - environment dependent
     QdrantClient = None
-    Distance = FieldCondition = Filter = MatchValue = PointStruct = VectorParams = None
+    Distance = FieldCondition = Filter = FilterSelector = MatchValue = None
+    PayloadSchemaType = PointIdsList = PointStruct = VectorParams = None
+
+# Payload fields used by search_with_filters / delete_by_artifact; indexed as keywords on collection creation
+PAYLOAD_INDEX_FIELDS = (
+    "artifact_id",
+    "version_id",
+    "doc_type",
+    "section_type",
+    "chunk_type",
+    "index_type",
+    "project_key",
+)
 
 
 class VectorDB:
@@ -29,6 +53,10 @@ class VectorDB:
         self.use_in_memory = use_in_memory or QdrantClient is None
         self._memory_store: Optional[InMemoryVectorStore] = None
         self._client: Optional[Any] = None
+        self.upsert_batch_size = max(1, int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", "256")))
+        self.upsert_workers = max(1, int(os.getenv("QDRANT_UPSERT_WORKERS", "4")))
+        self._known_collections: set[str] = set()
+        self._collections_lock = threading.Lock()
 
         if self.use_in_memory:
             logger.warning("Using in-memory vector store; start Qdrant for persistence.")
@@ -48,20 +76,8 @@ class VectorDB:
         content_collection = self._collection_name("content", company_id)
         style_collection = self._collection_name("style", company_id)
 
-        if self.use_in_memory:
-            assert self._memory_store is not None
-            self._memory_store.initialize_collection(content_collection, vector_size)
-            self._memory_store.initialize_collection(style_collection, vector_size)
-            return content_collection, style_collection
-
-        assert self._client is not None and Distance and VectorParams
-        existing = [c.name for c in self._client.get_collections().collections]  # type: ignore
         for collection in (content_collection, style_collection):
-            if collection not in existing:
-                self._client.create_collection(  # type: ignore
-                    collection_name=collection,
-                    vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
-                )
+            self._ensure_collection(collection, vector_size)
         return content_collection, style_collection
 
     def insert_chunks(
@@ -76,13 +92,40 @@ class VectorDB:
         if len(metadata) != len(chunks):
             raise ValueError("Metadata length must match number of chunks.")
 
+        points_by_collection: Dict[str, List[Tuple[str, Dict[str, Any], List[float]]]] = {}
         for chunk, vector, meta in zip(chunks, embeddings, metadata):
             chunk_type = meta.get("chunk_type") or chunk.get("chunk_type")
             if chunk_type not in {"content", "style"}:
                 raise ValueError("chunk_type must be 'content' or 'style'")
             collection_name = self._collection_name(str(chunk_type), company_id)
             payload = {"text": chunk.get("text", ""), **{k: v for k, v in chunk.items() if k != "text"}, **meta}
-            self._upsert_point(collection_name, payload, vector)
+            point_id = payload.get("chunk_id") or str(uuid.uuid4())
+            points_by_collection.setdefault(collection_name, []).append((point_id, payload, vector))
+
+        for collection_name, points in points_by_collection.items():
+            self._ensure_collection(collection_name, len(points[0][2]))
+            self._upsert_points(collection_name, points)
+
+    def delete_by_artifact(self, company_id: str, artifact_id: str, version_id: Optional[str] = None) -> None:
+        """
+        Delete every point for an artifact (optionally one version) from both company collections.
+        """
+        collections = [self._collection_name(t, company_id) for t in ("content", "style")]
+        if self.use_in_memory:
+            assert self._memory_store is not None
+            for collection in collections:
+                self._memory_store.delete_by_artifact(collection, artifact_id, version_id)
+            return
+
+        assert self._client is not None and Filter and FilterSelector
+        conditions = [FieldCondition(key="artifact_id", match=MatchValue(value=artifact_id))]  # type: ignore
+        if version_id:
+            conditions.append(FieldCondition(key="version_id", match=MatchValue(value=version_id)))  # type: ignore
+        selector = FilterSelector(filter=Filter(must=conditions))  # type: ignore
+        existing = {c.name for c in self._client.get_collections().collections}  # type: ignore
+        for collection in collections:
+            if collection in existing:
+                self._client.delete(collection_name=collection, points_selector=selector, wait=True)  # type: ignore
 
     def search(
         self, query_vector: List[float], company_id: str, chunk_type: str, top_k: int = 10
@@ -127,17 +170,98 @@ class VectorDB:
         )
         return [_format_qdrant_result(r) for r in results]
 
-    def _upsert_point(self, collection_name: str, payload: Dict[str, Any], vector: List[float]) -> None:
-        point_id = payload.get("chunk_id") or str(uuid.uuid4())
+    def delete_points(self, company_id: str, point_ids: List[str]) -> None:
+        """
+        Delete points by id from both company collections.
+        """
+        if not point_ids:
+            return
+        collections = [self._collection_name(t, company_id) for t in ("content", "style")]
+        if self.use_in_memory:
+            assert self._memory_store is not None
+            for collection in collections:
+                self._memory_store.delete_points(collection, point_ids)
+            return
+
+        assert self._client is not None and PointIdsList
+        existing = {c.name for c in self._client.get_collections().collections}  # type: ignore
+        for collection in collections:
+            if collection in existing:
+                self._client.delete(  # type: ignore
+                    collection_name=collection, points_selector=PointIdsList(points=list(point_ids)), wait=True
+                )
 
+    def _ensure_collection(self, collection_name: str, vector_size: int) -> None:
+        if collection_name in self._known_collections:
+            return
+        with self._collections_lock:
+            if collection_name in self._known_collections:
+                return
+            if self.use_in_memory:
+                assert self._memory_store is not None
+                if collection_name not in self._memory_store.collections:
+                    self._memory_store.initialize_collection(collection_name, vector_size)
+            else:
+                assert self._client is not None and Distance and VectorParams
+                existing = {c.name for c in self._client.get_collections().collections}  # type: ignore
+                if collection_name not in existing:
+                    self._client.create_collection(  # type: ignore
+                        collection_name=collection_name,
+                        vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
+                    )
+                # Collections created before the indexes existed get them here too
+                self._create_payload_indexes(collection_name)
+            self._known_collections.add(collection_name)
+
+    def _create_payload_indexes(self, collection_name: str) -> None:
+        """Create the keyword payload indexes the collection does not have yet."""
+        assert self._client is not None and PayloadSchemaType
+        try:
+            indexed = set(self._client.get_collection(collection_name).payload_schema or {})  # type: ignore
+        except Exception as exc:
+            logger.debug("Payload schema of %s unavailable: %s", collection_name, exc)
+            indexed = set()
+        for field in PAYLOAD_INDEX_FIELDS:
+            if field in indexed:
+                continue
+            try:
+                self._client.create_payload_index(  # type: ignore
+                    collection_name=collection_name,
+                    field_name=field,
+                    field_schema=PayloadSchemaType.KEYWORD,
+                )
+            except Exception as exc:  # local (path-based) mode has no payload indexes
+                logger.debug("Payload index %s on %s skipped: %s", field, collection_name, exc)
+
+    def _upsert_points(self, collection_name: str, points: List[Tuple[str, Dict[str, Any], List[float]]]) -> None:
+        """
+        Upsert points in batches. Batches are sent concurrently without waiting for indexing;
+        the last batch is sent with wait=True after the others are acknowledged, so the call
+        returns only once every point is searchable (Qdrant applies updates in order).
+        """
         if self.use_in_memory:
             assert self._memory_store is not None
-            self._memory_store.insert(collection_name, payload, vector, point_id)
+            self._memory_store.insert_many(collection_name, points)
             return
 
         assert self._client is not None and PointStruct
-        point = PointStruct(id=point_id, vector=vector, payload=payload)  # type: ignore
-        self._client.upsert(collection_name=collection_name, points=[point], wait=True)  # type: ignore
+        structs = [PointStruct(id=pid, vector=vector, payload=payload) for pid, payload, vector in points]  # type: ignore
+        size = self.upsert_batch_size
+        batches = [structs[i : i + size] for i in range(0, len(structs), size)]
+        *pending, last = batches
+
+        def _send(batch: List[Any]) -> None:
+            self._client.upsert(collection_name=collection_name, points=batch, wait=False)  # type: ignore
+
+        if pending:
+            workers = min(self.upsert_workers, len(pending))
+            if workers == 1:
+                for batch in pending:
+                    _send(batch)
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    list(executor.map(_send, pending))
+        self._client.upsert(collection_name=collection_name, points=last, wait=True)  # type: ignore
 
     def _collection_name(self, chunk_type: str, company_id: str) -> str:
         if chunk_type not in {"content", "style"}:
@@ -147,52 +271,46 @@ class VectorDB:
 
 class InMemoryVectorStore:
     """
-    Lightweight in-memory vector store for testing.
+    In-memory vector store for testing, one LocalVectorStore per collection.
     """
 
     def __init__(self) -> None:
-        self.collections: Dict[str, Dict[str, Any]] = {}
+        self.collections: Dict[str, LocalVectorStore] = {}
 
     def initialize_collection(self, name: str, vector_size: int) -> None:
-        self.collections[name] = {"vector_size": vector_size, "points": {}}
+        self.collections[name] = LocalVectorStore(path=None, dim=vector_size)
 
     def insert(self, collection_name: str, payload: Dict[str, Any], vector: List[float], point_id: str) -> None:
         collection = self.collections.get(collection_name)
         if collection is None:
             raise ValueError(f"Collection {collection_name} not initialized.")
-        vector_array = np.asarray(vector, dtype=float)
-        collection["points"][point_id] = {"vector": vector_array, "payload": payload}
+        collection.upsert([Chunk(id=point_id, text="", embedding=vector, metadata=payload)])
+
+    def insert_many(self, collection_name: str, points: List[Tuple[str, Dict[str, Any], List[float]]]) -> None:
+        collection = self.collections.get(collection_name)
+        if collection is None:
+            raise ValueError(f"Collection {collection_name} not initialized.")
+        collection.upsert([Chunk(id=pid, text="", embedding=vector, metadata=payload) for pid, payload, vector in points])
+
+    def delete_by_artifact(self, collection_name: str, artifact_id: str, version_id: Optional[str] = None) -> None:
+        collection = self.collections.get(collection_name)
+        if collection is not None:
+            collection.delete_by_artifact(artifact_id, version_id)
+
+    def delete_points(self, collection_name: str, point_ids: List[str]) -> None:
+        collection = self.collections.get(collection_name)
+        if collection is not None:
+            collection.delete_chunks(point_ids)
 
     def search(
         self, collection_name: str, query_vector: List[float], top_k: int, filters: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
         collection = self.collections.get(collection_name)
-        if collection is None or not collection["points"]:
+        if collection is None or not len(collection):
             return []
-        query = np.asarray(query_vector, dtype=float)
-        results = []
-        for point_id, record in collection["points"].items():
-            if filters and not _matches_filters(record["payload"], filters):
-                continue
-            score = _cosine_similarity(query, record["vector"])
-            results.append({"id": point_id, "score": float(score), "payload": record["payload"]})
-        results.sort(key=lambda r: r["score"], reverse=True)
-        return results[:top_k]
+        results = collection.search(query_vector, top_k, filters)
+        return [{"id": r.id, "score": r.score, "payload": r.metadata} for r in results]
 
 
 def _format_qdrant_result(result: Any) -> Dict[str, Any]:
     return {"id": str(result.id), "score": float(result.score), "payload": result.payload}
-
-
-def _cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
-    denom = (np.linalg.norm(a) * np.linalg.norm(b))
-    if denom == 0:
-        return 0.0
-    return float(np.dot(a, b) / denom)
-
-
-def _matches_filters(payload: Dict[str, Any], filters: Dict[str, Any]) -> bool:
-    for key, expected in filters.items():
-        if payload.get(key) != expected:
-            return False
-    return True
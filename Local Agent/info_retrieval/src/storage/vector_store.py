@@ -33,3 +33,6 @@ class VectorStore(Protocol):
 
     def delete_by_artifact(self, artifact_id: str, version_id: Optional[str] = None) -> None:
         ...
+
+    def delete_chunks(self, chunk_ids: List[str]) -> None:
+        ...
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import os
 import re
 import traceback
 from typing import Any, Dict, List, Optional
@@ -11,6 +12,11 @@ from tier2.llm_client import LLMClient
 from tier2.query_analyzer import QueryAnalyzer
 from tier2.section_profile import SectionProfileLoader
 
+# Candidate pool for in-memory filter relaxation: one search on the broadest
+# filter fetches top_k * factor chunks, narrower tiers are picked from it.
+RETRIEVAL_OVERFETCH_FACTOR = int(os.getenv("TIER2_RETRIEVAL_OVERFETCH", "5"))
+RETRIEVAL_MAX_CANDIDATES = int(os.getenv("TIER2_RETRIEVAL_MAX_CANDIDATES", "100"))
+
 
 def _log_text_checkpoint(location_name: str, text: Optional[str]) -> None:
     """Log checkpoints for text generation to trace TBD propagation."""
@@ -112,6 +118,26 @@ def _convert_extra_context(extra_context: Any) -> List[Dict[str, Any]]:
     return chunks
 
 
+def _result_score(result: Dict[str, Any]) -> float:
+    meta = result.get("metadata", {}) or {}
+    score = result.get("score")
+    if score is None:
+        score = meta.get("similarity_score")
+    return float(score or 0.0)
+
+
+def _matches_filters(result: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    """In-memory equivalent of the vector store's equality filters on chunk metadata."""
+    if not filters:
+        return True
+    meta = result.get("metadata", {}) or {}
+    for key, expected in filters.items():
+        value = meta.get(key, result.get(key))
+        if value is None or str(value) != str(expected):
+            return False
+    return True
+
+
 class Tier2Generator:
     """
     Orchestrates Tier 2 RAG-based document generation.
@@ -346,6 +372,14 @@ Generate the section:"""
         doc_type: Optional[str],
         section_type: Optional[str],
     ) -> tuple[List[Dict[str, Any]], List[str], str]:
+        """
+        Retrieve with progressively broader filters using a single embed + search.
+
+        The broadest tier (company + chunk type) is searched once with an
+        over-fetched limit; the doc_type+section_type and doc_type tiers are then
+        applied in memory over that candidate set, keeping score order. The first
+        tier with matches wins, as before.
+        """
         warnings: List[str] = []
         filters_base = {"company_id": company_id, "index_type": chunk_type}
         attempts = [
@@ -355,21 +389,27 @@ Generate the section:"""
         ]
         results: List[Dict[str, Any]] = []
         source_label = "company"
+        fetch_k = top_k
+        if doc_type or section_type:
+            fetch_k = max(top_k, min(top_k * RETRIEVAL_OVERFETCH_FACTOR, RETRIEVAL_MAX_CANDIDATES))
         table_name = getattr(getattr(self.retriever, "vector_store", None), "table", "chunks")
         print("🔍 RETRIEVAL CALLED:")
         print(f"   Query: {query_text}")
         print(f"   Table: {table_name}")
         print(f"   Chunk type: {chunk_type}")
-        print(f"   Limit: {top_k}")
+        print(f"   Limit: {top_k} (candidates: {fetch_k})")
         print("   Threshold: 0.3")
+        candidates = self.retriever.retrieve_for_query(
+            query_text=query_text,
+            company_id=company_id,
+            chunk_type=chunk_type,
+            top_k=fetch_k,
+            filters=dict(filters_base),
+        )
+        candidates = sorted(candidates, key=_result_score, reverse=True)
         for idx, filt in enumerate(attempts):
-            results = self.retriever.retrieve_for_query(
-                query_text=query_text,
-                company_id=company_id,
-                chunk_type=chunk_type,
-                top_k=top_k,
-                filters=filt,
-            )
+            narrowing = {k: v for k, v in filt.items() if k not in filters_base}
+            results = [r for r in candidates if _matches_filters(r, narrowing)][:top_k]
             print(f"📊 RETRIEVAL RESULTS: {len(results)} chunks found (attempt {idx + 1})")
             for i, r in enumerate(results[:3]):
                 meta = r.get("metadata", {}) or {}
@@ -1,8 +1,14 @@
 from __future__ import annotations
 
+import copy
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional
 
+from retrieval.retriever import SharedRetriever
 from tier2.generator import Tier2Generator
 from ir_utils.logger import get_logger
 
@@ -27,6 +33,10 @@ DEFAULT_SECTION_ORDER = CORE_REPORT_SECTIONS + [
 SAFETY_FALLBACK_SECTIONS = CORE_REPORT_SECTIONS
 MIN_INFERRED_SECTIONS = 4
 
+# Rough per-section token cost (prompt with ~14 chunks + 2200 max completion tokens),
+# charged against the token-rate budget before a section is drafted.
+SECTION_TOKEN_ESTIMATE = 4500
+
 DISPLAY_LABELS = {
     "executive_summary": "Executive Summary",
     "background": "Background",
@@ -48,14 +58,64 @@ def preferred_sort(section_types: List[str]) -> List[str]:
     return sorted(section_types, key=lambda s: order_map.get(s, len(DEFAULT_SECTION_ORDER) + 1))
 
 
+class TokenRateLimiter:
+    """
+    Token bucket shared by concurrent section drafts.
+
+    `acquire(n)` blocks until `n` tokens are available under a
+    tokens-per-minute budget. A budget <= 0 disables limiting.
+    """
+
+    def __init__(self, tokens_per_minute: int) -> None:
+        self.capacity = max(0, tokens_per_minute)
+        self._available = float(self.capacity)
+        self._refill_per_s = self.capacity / 60.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> float:
+        """Reserve `tokens`; returns seconds spent waiting."""
+        if self.capacity <= 0:
+            return 0.0
+        tokens = min(tokens, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._available = min(self.capacity, self._available + (now - self._updated) * self._refill_per_s)
+                self._updated = now
+                if self._available >= tokens:
+                    self._available -= tokens
+                    return waited
+                delay = (tokens - self._available) / self._refill_per_s
+            time.sleep(delay)
+            waited += delay
+
+
 class ReportDrafter:
     """
     Orchestrates multi-section report generation using the existing Tier2Generator.
+
+    Sections are drafted concurrently on a bounded pool (REPORT_SECTION_WORKERS)
+    under a shared token-rate budget (REPORT_TOKENS_PER_MINUTE, 0 = unlimited),
+    and share one request-scoped retrieval memo so overlapping fallback queries
+    across sections hit the vector store once. Results are always emitted in
+    section display order.
     """
 
-    def __init__(self, generator: Tier2Generator, metadata_db) -> None:
+    def __init__(
+        self,
+        generator: Tier2Generator,
+        metadata_db,
+        max_workers: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+    ) -> None:
         self.generator = generator
         self.metadata_db = metadata_db
+        self.max_workers = max(1, max_workers or int(os.getenv("REPORT_SECTION_WORKERS", "4")))
+        if tokens_per_minute is None:
+            tokens_per_minute = int(os.getenv("REPORT_TOKENS_PER_MINUTE", "0"))
+        self.rate_limiter = TokenRateLimiter(tokens_per_minute)
 
     def draft_report(
         self,
@@ -63,7 +123,14 @@ class ReportDrafter:
         user_request: str,
         doc_type: Optional[str] = None,
         overrides: Optional[Dict[str, Any]] = None,
+        on_section: Optional[Callable[[Dict[str, Any]], None]] = None,
     ) -> Dict[str, Any]:
+        """
+        Draft every section and combine them.
+
+        `on_section` is called once per section, in display order, as soon as that
+        section and all sections before it are finished (status "generated" or "skipped").
+        """
         doc_type = doc_type or self._infer_doc_type(user_request) or "design_report"
         section_order, source = self.get_section_order(company_id, doc_type)
         section_order = self._ensure_core_sections(section_order)
@@ -72,41 +139,23 @@ class ReportDrafter:
         section_status: List[Dict[str, Any]] = []
         warnings: List[str] = []
 
-        for section_type in section_order:
-            result = self.generator.draft_section(
-                company_id=company_id,
-                user_request=user_request,
-                overrides={"doc_type": doc_type, "section_type": section_type, **(overrides or {})},
-            )
-            section_warnings = result.get("warnings", [])
-            if result.get("draft_text", "").startswith("[TBD"):
+        for event in self.iter_sections(company_id, user_request, doc_type, section_order, overrides):
+            section_warnings = event.pop("warnings", [])
+            if event["status"] == "skipped":
+                warnings.extend(section_warnings or [])
+                warnings.append(f"Section '{event['section_type']}' skipped due to missing grounding content.")
+            else:
+                sections_output.append(event["section"])
                 warnings.extend(section_warnings or [])
-                warnings.append(f"Section '{section_type}' skipped due to missing grounding content.")
-                section_status.append(
-                    {
-                        "section_type": section_type,
-                        "status": "skipped",
-                        "debug": result.get("debug", {}),
-                    }
-                )
-                continue
-            sections_output.append(
-                {
-                    "section_type": section_type,
-                    "text": result.get("draft_text", ""),
-                    "length_target": result.get("length_target", {}),
-                    "citations": result.get("citations", []),
-                    "debug": result.get("debug", {}),
-                }
-            )
             section_status.append(
                 {
-                    "section_type": section_type,
-                    "status": "generated",
-                    "debug": result.get("debug", {}),
+                    "section_type": event["section_type"],
+                    "status": event["status"],
+                    "debug": event["debug"],
                 }
             )
-            warnings.extend(section_warnings or [])
+            if on_section:
+                on_section(event)
 
         combined_parts = []
         for section in sections_output:
@@ -125,6 +174,72 @@ class ReportDrafter:
             "meta": {"section_source": source, "generated_at": datetime.utcnow().isoformat(), "section_order": section_order},
         }
 
+    def iter_sections(
+        self,
+        company_id: str,
+        user_request: str,
+        doc_type: str,
+        section_order: List[str],
+        overrides: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Draft sections concurrently and yield one event per section in `section_order`.
+
+        Each event has section_type, index, status ("generated" | "skipped"), debug,
+        warnings and, when generated, the `section` record used in the report.
+        """
+        generator = self._report_generator()
+
+        def _draft(section_type: str) -> Dict[str, Any]:
+            self.rate_limiter.acquire(SECTION_TOKEN_ESTIMATE)
+            return generator.draft_section(
+                company_id=company_id,
+                user_request=user_request,
+                overrides={"doc_type": doc_type, "section_type": section_type, **(overrides or {})},
+            )
+
+        workers = min(self.max_workers, max(1, len(section_order)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-section") as pool:
+            futures = [pool.submit(_draft, section_type) for section_type in section_order]
+            # Yield strictly in display order; later sections keep drafting meanwhile
+            for index, (section_type, future) in enumerate(zip(section_order, futures)):
+                yield self._section_event(index, section_type, future.result())
+
+        shared = getattr(generator, "retriever", None)
+        if isinstance(shared, SharedRetriever):
+            logger.info(
+                f"Report retrieval: {shared.misses} lookups, {shared.hits} shared across {len(section_order)} sections"
+            )
+
+    def _report_generator(self) -> Tier2Generator:
+        """Shallow copy of the generator whose retriever is a fresh request-scoped SharedRetriever."""
+        retriever = getattr(self.generator, "retriever", None)
+        if retriever is None or isinstance(retriever, SharedRetriever):
+            return self.generator
+        generator = copy.copy(self.generator)
+        generator.retriever = SharedRetriever(retriever)
+        return generator
+
+    def _section_event(self, index: int, section_type: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        event: Dict[str, Any] = {
+            "index": index,
+            "section_type": section_type,
+            "debug": result.get("debug", {}),
+            "warnings": result.get("warnings", []),
+        }
+        if result.get("draft_text", "").startswith("[TBD"):
+            event["status"] = "skipped"
+            return event
+        event["status"] = "generated"
+        event["section"] = {
+            "section_type": section_type,
+            "text": result.get("draft_text", ""),
+            "length_target": result.get("length_target", {}),
+            "citations": result.get("citations", []),
+            "debug": result.get("debug", {}),
+        }
+        return event
+
     def get_section_order(self, company_id: str, doc_type: Optional[str]) -> tuple[List[str], str]:
         # 1) Try template table if it exists
         template_order = self._load_template_sections(company_id, doc_type)
@@ -159,10 +274,6 @@ class ReportDrafter:
         If a document_templates table exists in metadata DB with columns (company_id, doc_type, section_order TEXT JSON),
         use it. Otherwise return [].
         """
-        try:
-            conn = self.metadata_db._connect()  # type: ignore[attr-defined]
-        except Exception:
-            return []
         try:
             query = """
                 SELECT section_order
@@ -170,25 +281,19 @@ class ReportDrafter:
                 WHERE company_id = ? AND (? IS NULL OR doc_type = ?)
                 ORDER BY updated_at DESC LIMIT 1
             """
-            row = conn.execute(query, (company_id, doc_type, doc_type)).fetchone()
-            if not row or not row[0]:
+            rows = self.metadata_db.query(query, (company_id, doc_type, doc_type))
+            if not rows or not rows[0][0]:
                 return []
             import json
 
-            data = json.loads(row[0])
+            data = json.loads(rows[0][0])
             if isinstance(data, list):
                 return [s for s in data if s]
         except Exception:
             return []
-        finally:
-            conn.close()
         return []
 
     def _infer_sections_from_chunks(self, company_id: str, doc_type: Optional[str]) -> List[str]:
-        try:
-            conn = self.metadata_db._connect()  # type: ignore[attr-defined]
-        except Exception:
-            return []
         conditions = ["company_id = ?", "section_type IS NOT NULL", "section_type != ''"]
         params: List[Any] = [company_id]
         if doc_type:
@@ -201,7 +306,7 @@ class ReportDrafter:
             WHERE {where_clause}
         """
         try:
-            rows = conn.execute(query, params).fetchall()
+            rows = self.metadata_db.query(query, params)
             section_types = [row["section_type"] for row in rows if row["section_type"] not in (None, "", "unknown")]
             section_types = list(dict.fromkeys(section_types))  # preserve order, drop dupes
             if not section_types:
@@ -216,8 +321,6 @@ class ReportDrafter:
             return sorted_sections
         except Exception:
             return []
-        finally:
-            conn.close()
 
     def _infer_doc_type(self, user_request: str) -> Optional[str]:
         text = user_request.lower()
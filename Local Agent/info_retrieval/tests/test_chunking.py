@@ -3,8 +3,10 @@ from pathlib import Path
 
 sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
 
-from ingest.chunking import classify_chunk_type, smart_chunk, tag_chunks_with_type  # noqa: E402
-from ingest.document_parser import ParsedDocument, Section  # noqa: E402
+import pytest  # noqa: E402
+
+from ingest.chunking import chunk_pdf_pages, classify_chunk_type, iter_page_chunks, smart_chunk, tag_chunks_with_type  # noqa: E402
+from ingest.document_parser import ParsedDocument, Section, iter_pdf_pages, parse_pdf  # noqa: E402
 
 
 def test_smart_chunk_respects_section():
@@ -28,3 +30,33 @@ def test_tag_chunks_with_type():
     chunks = smart_chunk(doc, max_tokens=5)
     tagged = tag_chunks_with_type(chunks, {"section_type": "results"})
     assert all("chunk_type" in item for item in tagged)
+
+
+def _make_pdf(path, pages):
+    fitz = pytest.importorskip("fitz")
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {i + 1} checks the bearing wall on gridline {i + 1}.")
+    doc.save(str(path))
+    doc.close()
+
+
+def test_iter_page_chunks_consumes_iter_pdf_pages(tmp_path):
+    pdf_path = tmp_path / "calc.pdf"
+    _make_pdf(pdf_path, 3)
+    chunks = list(iter_page_chunks(iter_pdf_pages(pdf_path), max_tokens=64))
+    assert [c["page_number"] for c in chunks] == [1, 2, 3]
+    assert "gridline 3" in chunks[-1]["text"]
+
+
+def test_parse_and_chunk_streams_pdf_pages(tmp_path):
+    from ingest.pipeline import parse_and_chunk
+
+    pdf_path = tmp_path / "calc.pdf"
+    _make_pdf(pdf_path, 4)
+    parsed, chunks = parse_and_chunk(pdf_path, "acme")
+
+    assert parsed.pages == []  # pages went straight to the chunker
+    assert chunks == chunk_pdf_pages(parse_pdf(pdf_path, company_id="acme"))
+    assert parsed.version_id == parse_pdf(pdf_path).version_id
@@ -0,0 +1,115 @@
+import sys
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+from embeddings.embedding_service import EmbeddingService  # noqa: E402
+from ir_utils.config import AppConfig  # noqa: E402
+
+
+def _config(openai_key=None, local=False):
+    return AppConfig(
+        openai_api_key=openai_key,
+        vector_db_path=Path("data/vector_db"),
+        metadata_db_path=Path("data/metadata.db"),
+        embedding_model="text-embedding-3-small",
+        qdrant_collection="documents",
+        use_local_embeddings=local,
+        embedding_dim=8,
+        log_level="INFO",
+    )
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+        self.mget_calls = 0
+        self.pipeline_executes = 0
+
+    def mget(self, keys):
+        self.mget_calls += 1
+        return [self.store.get(k) for k in keys]
+
+    def pipeline(self, transaction=True):
+        redis = self
+        ops = []
+
+        class _Pipe:
+            def setex(self, key, ttl, value):
+                ops.append((key, value))
+
+            def execute(self):
+                redis.pipeline_executes += 1
+                redis.store.update(dict(ops))
+
+        return _Pipe()
+
+
+class FakeOpenAI:
+    def __init__(self):
+        self.requests = []
+        self._lock = threading.Lock()
+        self.embeddings = SimpleNamespace(create=self._create)
+
+    def _create(self, model, input):
+        with self._lock:
+            self.requests.append(list(input))
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[float(len(t)), 1.0]) for t in input])
+
+
+def test_embed_batch_keeps_positions_for_blank_and_duplicate_texts():
+    service = EmbeddingService(_config())
+    vectors = service.embed_batch(["alpha", "", "beta", "  ", "alpha"])
+
+    assert len(vectors) == 5
+    assert vectors[1] == [] and vectors[3] == []
+    assert vectors[0] == vectors[4] == service.embed_text("alpha")
+    assert vectors[2] == service.embed_text("beta")
+
+
+def test_redis_cache_uses_one_mget_and_one_pipeline_per_batch():
+    service = EmbeddingService(_config())
+    service._redis = FakeRedis()
+
+    first = service.embed_batch(["a", "b", "c"])
+    assert service._redis.mget_calls == 1 and service._redis.pipeline_executes == 1
+    assert len(service._redis.store) == 3
+
+    assert service.embed_batch(["c", "a", "b"]) == [first[2], first[0], first[1]]
+    assert service._redis.mget_calls == 2 and service._redis.pipeline_executes == 1
+
+
+def test_openai_requests_respect_token_and_item_budgets(monkeypatch):
+    monkeypatch.setenv("EMBEDDING_BATCH_MAX_TOKENS", "100")
+    monkeypatch.setenv("EMBEDDING_BATCH_MAX_ITEMS", "3")
+    monkeypatch.setenv("EMBEDDING_INPUT_MAX_TOKENS", "60")
+    service = EmbeddingService(_config(openai_key="sk-test"))
+    monkeypatch.setattr(service, "_get_encoding", lambda: None)  # chars/3 estimate
+    client = FakeOpenAI()
+    service._openai_client = client
+
+    texts = [f"{i:02d}" + "x" * 88 for i in range(7)] + ["y" * 600]
+    vectors = service.embed_batch(texts)
+
+    assert all(sum(len(t) // 3 + 1 for t in request) <= 100 for request in client.requests)
+    assert all(len(request) <= 3 for request in client.requests)
+    assert sorted(t for request in client.requests for t in request)[:7] == texts[:7]
+    assert [v[0] for v in vectors[:7]] == [90.0] * 7
+    assert vectors[7] == [180.0, 1.0]  # truncated to 60 tokens * 3 chars
+
+
+def test_local_model_encodes_missing_texts_in_one_call():
+    calls = []
+
+    class FakeModel:
+        def encode(self, texts, batch_size=32, convert_to_numpy=True):
+            calls.append(list(texts))
+            return [[float(len(t))] for t in texts]
+
+    service = EmbeddingService(_config(local=True))
+    service._local_model = FakeModel()
+
+    assert service.embed_batch(["one", "three", "", "one"]) == [[3.0], [5.0], [], [3.0]]
+    assert calls == [["one", "three"]]
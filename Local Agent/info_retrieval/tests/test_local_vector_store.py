@@ -0,0 +1,97 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+import csv  # noqa: E402
+import json  # noqa: E402
+
+from storage.local_vector_store import LocalVectorStore  # noqa: E402
+from storage.vector_db import InMemoryVectorStore  # noqa: E402
+from storage.vector_store import Chunk  # noqa: E402
+
+
+def _chunk(chunk_id, vector, **metadata):
+    metadata.setdefault("artifact_id", "a1")
+    metadata.setdefault("version_id", "v1")
+    return Chunk(id=chunk_id, text=f"text {chunk_id}", embedding=vector, metadata=metadata)
+
+
+def _seed(store):
+    store.upsert(
+        [
+            _chunk("c1", [1.0, 0.0, 0.0], index_type="content", doc_type="report"),
+            _chunk("c2", [0.8, 0.6, 0.0], index_type="content", doc_type="memo"),
+            _chunk("s1", [0.0, 1.0, 0.0], index_type="style", doc_type="report", artifact_id="a2"),
+        ]
+    )
+
+
+def test_search_ranks_by_cosine_and_applies_filters():
+    store = LocalVectorStore(path=None)
+    _seed(store)
+
+    results = store.search([2.0, 0.0, 0.0], top_k=2)
+    assert [r.id for r in results] == ["c1", "c2"]
+    assert abs(results[0].score - 1.0) < 1e-6
+
+    filtered = store.search([1.0, 0.0, 0.0], top_k=5, filters={"index_type": "content", "doc_type": "memo"})
+    assert [r.id for r in filtered] == ["c2"]
+    assert store.search([1.0, 0.0, 0.0], top_k=5, filters={"doc_type": "spec"}) == []
+    # Non-indexed keys and None values behave like the old CSV store
+    assert [r.id for r in store.search([1.0, 0.0, 0.0], 5, {"chunk_id": None, "missing": None})] == ["c1", "c2", "s1"]
+
+
+def test_upsert_replaces_and_delete_by_artifact():
+    store = LocalVectorStore(path=None)
+    _seed(store)
+    store.upsert([_chunk("c1", [0.0, 0.0, 1.0], index_type="content", version_id="v2")])
+
+    assert len(store) == 3
+    top = store.search([0.0, 0.0, 1.0], top_k=1)[0]
+    assert top.id == "c1" and top.metadata["version_id"] == "v2"
+
+    store.delete_by_artifact("a1", version_id="v1")
+    assert sorted(r.id for r in store.search([1.0, 1.0, 1.0], 10)) == ["c1", "s1"]
+    store.delete_by_artifact("a1")
+    assert [r.id for r in store.search([1.0, 1.0, 1.0], 10)] == ["s1"]
+
+
+def test_persists_and_reloads_with_tombstones(tmp_path):
+    store = LocalVectorStore(tmp_path / "store")
+    _seed(store)
+    store.delete_by_artifact("a2")
+    store.upsert([_chunk("c3", [0.0, 0.0, 1.0], index_type="content")])
+
+    reloaded = LocalVectorStore(tmp_path / "store")
+    assert len(reloaded) == 3
+    assert [r.id for r in reloaded.search([0.0, 0.0, 1.0], 1)] == ["c3"]
+    assert reloaded.search([0.0, 1.0, 0.0], 5, {"index_type": "style"}) == []
+
+    reloaded.upsert([_chunk("c4", [1.0, 1.0, 0.0])])
+    reloaded.compact()
+    again = LocalVectorStore(tmp_path / "store", mmap=False)
+    assert sorted(r.id for r in again.search([1.0, 0.0, 0.0], 10)) == ["c1", "c2", "c3", "c4"]
+
+
+def test_import_legacy_csv(tmp_path):
+    csv_path = tmp_path / "vector_store.csv"
+    with csv_path.open("w", newline="", encoding="utf-8") as fh:
+        writer = csv.DictWriter(fh, fieldnames=["id", "text", "embedding", "metadata"])
+        writer.writeheader()
+        writer.writerow({"id": "x", "text": "legacy", "embedding": json.dumps([0.0, 1.0]), "metadata": json.dumps({"index_type": "content"})})
+
+    store = LocalVectorStore.import_csv(csv_path, tmp_path / "store")
+    results = store.search([0.0, 1.0], 1, {"index_type": "content"})
+    assert results[0].text == "legacy"
+
+
+def test_in_memory_vector_store_keeps_collection_interface():
+    store = InMemoryVectorStore()
+    store.initialize_collection("content_demo", 2)
+    store.insert("content_demo", {"text": "a", "doc_type": "report"}, [1.0, 0.0], "p1")
+    store.insert("content_demo", {"text": "b", "doc_type": "memo"}, [0.0, 1.0], "p2")
+
+    results = store.search("content_demo", [1.0, 0.1], top_k=1, filters={"doc_type": "memo"})
+    assert results[0]["id"] == "p2" and results[0]["payload"]["text"] == "b"
+    assert store.search("style_demo", [1.0, 0.0], top_k=1) == []
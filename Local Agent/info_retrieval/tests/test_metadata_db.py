@@ -0,0 +1,69 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+from storage.metadata_db import MetadataDB  # noqa: E402
+
+
+def _row(chunk_id, text, chunk_type="style", section_type="conclusion", **extra):
+    return {
+        "chunk_id": chunk_id,
+        "artifact_id": "a1",
+        "version_id": "v1",
+        "company_id": "acme",
+        "doc_type": "design_report",
+        "section_type": section_type,
+        "chunk_type": chunk_type,
+        "text": text,
+        "normalized_text": text.lower(),
+        **extra,
+    }
+
+
+def _sql_frequency(db, normalized_text, section_type=None):
+    query = "SELECT COUNT(*) FROM chunks WHERE normalized_text = ? AND chunk_type = 'style'"
+    params = [normalized_text]
+    if section_type:
+        query += " AND section_type = ?"
+        params.append(section_type)
+    return db.query(query, params)[0][0]
+
+
+def test_style_frequency_counter_tracks_inserts_replacements_and_deletes(tmp_path):
+    db = MetadataDB(tmp_path / "metadata.db")
+    db.insert_chunk_metadata_many([_row("c1", "We trust this meets your needs"), _row("c2", "We trust this meets your needs")])
+    assert db.get_style_frequency("we trust this meets your needs", "conclusion") == 2
+
+    db.insert_chunk_metadata_many(
+        [
+            _row("c3", "We trust this meets your needs", section_type="summary"),
+            _row("c1", "We trust this meets your needs", chunk_type="content"),
+        ]
+    )
+    db.delete_chunks(["c2"])
+
+    for section_type in ("conclusion", "summary", None):
+        expected = _sql_frequency(db, "we trust this meets your needs", section_type)
+        assert db.get_style_frequency("we trust this meets your needs", section_type) == expected
+    assert db.get_style_frequency("we trust this meets your needs") == 1
+
+    reopened = MetadataDB(tmp_path / "metadata.db")
+    assert reopened.get_style_frequency("we trust this meets your needs", "summary") == 1
+    assert reopened.query("PRAGMA journal_mode")[0][0] == "wal"
+
+
+def test_section_profile_uses_stored_length_metrics(tmp_path):
+    db = MetadataDB(tmp_path / "metadata.db")
+    db.insert_chunk_metadata_many(
+        [
+            _row(f"c{i}", "x" * chars, chunk_type="content", section_type="methodology",
+                 text_length_chars=chars, text_length_words=chars // 5, sentence_count=4, paragraph_count=2)
+            for i, chars in enumerate((800, 1200))
+        ]
+    )
+
+    profile = db.get_section_profile("acme", "design_report", "methodology")
+    assert profile["count"] == 2 and profile["avg_chars"] == 1000
+    assert profile["min_chars"] == 800 and profile["max_chars"] == 1200
+    assert db.get_section_profile("acme", "design_report", "scope") is None
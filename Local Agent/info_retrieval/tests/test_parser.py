@@ -1,6 +1,8 @@
 import sys
 from pathlib import Path
 
+import pytest
+
 sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
 
 from ingest.document_parser import ParsedDocument, Section, infer_sections_from_text  # noqa: E402
@@ -32,3 +34,47 @@ def test_parse_sample_docs():
         pdf_parsed = document_parser.parse_pdf(pdf_path, company_id="acme")
         assert pdf_parsed.text
         assert pdf_parsed.metadata.get("page_count") == len(pdf_parsed.pages)
+
+
+def _make_pdf(path, pages):
+    fitz = pytest.importorskip("fitz")
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"{i + 1}. Section {i + 1}\nLoad case {i + 1} governs the footing design.")
+    doc.save(str(path))
+    doc.close()
+
+
+def test_parse_pdf_parallel_ranges_match_serial(tmp_path, monkeypatch):
+    pdf_path = tmp_path / "calc.pdf"
+    _make_pdf(pdf_path, 12)
+
+    serial = document_parser.parse_pdf(pdf_path)
+    monkeypatch.setenv("PDF_PARALLEL_MIN_PAGES", "4")
+    monkeypatch.setenv("PDF_PARSE_WORKERS", "3")
+    parallel = document_parser.parse_pdf(pdf_path)
+
+    assert [p["page_number"] for p in parallel.pages] == list(range(1, 13))
+    assert parallel.pages == serial.pages
+    assert parallel.version_id == serial.version_id
+    assert "Load case 12" in parallel.text
+
+
+def test_parse_pdf_cache_skips_extraction(tmp_path, monkeypatch):
+    pdf_path = tmp_path / "calc.pdf"
+    _make_pdf(pdf_path, 3)
+    cache_dir = tmp_path / "parse_cache"
+
+    first = document_parser.parse_pdf(pdf_path, company_id="acme", cache_dir=cache_dir)
+    assert len(list(cache_dir.iterdir())) == 1
+
+    def _fail(*args, **kwargs):
+        raise AssertionError("extraction should come from the cache")
+
+    monkeypatch.setattr(document_parser, "_pdf_info", _fail)
+    monkeypatch.setattr(document_parser, "iter_pdf_pages", _fail)
+    monkeypatch.setenv("PARSE_CACHE_DIR", str(cache_dir))
+    cached = document_parser.parse_pdf(pdf_path, company_id="acme")
+    assert cached.pages == first.pages and cached.version_id == first.version_id
+    assert cached.metadata["page_count"] == 3
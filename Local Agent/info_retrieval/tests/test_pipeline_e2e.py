@@ -76,3 +76,195 @@ def test_ingestion_pipeline_end_to_end(tmp_path):
     retriever_embedding = embedding_service.embed_text("thermal analysis")
     matches = vector_store.search(retriever_embedding, top_k=3, filters={"index_type": "content"})
     assert matches
+
+
+class CountingEmbeddingService:
+    def __init__(self, inner):
+        self.inner = inner
+        self.embedded = []
+
+    def embed_batch(self, texts):
+        self.embedded.extend(texts)
+        return self.inner.embed_batch(texts)
+
+
+class DeletableVectorStore(FakeSupabaseVectorStore):
+    def upsert(self, chunks):
+        ids = {c.id for c in chunks}
+        self.records = [r for r in self.records if r.id not in ids] + list(chunks)
+
+    def delete_chunks(self, chunk_ids):
+        self.records = [r for r in self.records if r.id not in set(chunk_ids)]
+
+
+def _write_docx(path, paragraphs):
+    import docx
+
+    document = docx.Document()
+    document.add_heading("Structural Assessment", level=1)
+    for text in paragraphs:
+        document.add_paragraph(text)
+    document.save(path)
+
+
+def test_reingest_skips_unchanged_and_diffs_chunks(tmp_path):
+    import os
+
+    config = AppConfig(
+        openai_api_key=None,
+        vector_db_path=tmp_path / "vector_db",
+        metadata_db_path=tmp_path / "metadata.db",
+        embedding_model="debug-model",
+        qdrant_collection="documents",
+        use_local_embeddings=False,
+        embedding_dim=32,
+        log_level="INFO",
+    )
+    embedding_service = CountingEmbeddingService(EmbeddingService(config))
+    vector_store = DeletableVectorStore()
+    metadata_db = MetadataDB(config.metadata_db_path)
+    pipeline = IngestionPipeline(embedding_service, vector_store, metadata_db, company_id="acme")
+
+    doc_path = tmp_path / "assessment.docx"
+    paragraphs = [f"Paragraph {i} describes the condition of level {i} slab. " * 30 for i in range(4)]
+    _write_docx(doc_path, paragraphs)
+    first = pipeline.ingest(str(doc_path))
+    assert first["status"] == "new" and first["embedded_chunks"] == first["chunk_count"] > 1
+
+    embedding_service.embedded.clear()
+    assert pipeline.ingest(str(doc_path))["status"] == "unchanged"
+    os.utime(doc_path, (doc_path.stat().st_atime, doc_path.stat().st_mtime + 10))
+    touched = pipeline.ingest(str(doc_path))
+    assert touched["status"] == "unchanged" and touched["artifact_id"] == first["artifact_id"]
+    assert embedding_service.embedded == []
+
+    paragraphs[-1] = "The parking deck membrane was replaced in 2024. " * 30
+    _write_docx(doc_path, paragraphs)
+    updated = pipeline.ingest(str(doc_path))
+
+    assert updated["status"] == "updated" and updated["artifact_id"] == first["artifact_id"]
+    assert 0 < updated["embedded_chunks"] < updated["chunk_count"]
+    assert updated["deleted_chunks"] >= 1
+    stored_ids = sorted(r.id for r in vector_store.records)
+    assert stored_ids == sorted(metadata_db.fetch_chunk_ids(first["artifact_id"]))
+    assert len(stored_ids) == updated["chunk_count"]
+    assert any("membrane" in r.text for r in vector_store.records)
+
+
+class FlakyVectorStore(DeletableVectorStore):
+    def __init__(self) -> None:
+        super().__init__()
+        self.fail_next = False
+
+    def upsert(self, chunks):
+        if self.fail_next:
+            self.fail_next = False
+            raise ConnectionError("vector store unavailable")
+        super().upsert(chunks)
+
+
+def test_failed_upsert_leaves_document_unrecorded(tmp_path):
+    import pytest
+
+    config = AppConfig(
+        openai_api_key=None,
+        vector_db_path=tmp_path / "vector_db",
+        metadata_db_path=tmp_path / "metadata.db",
+        embedding_model="debug-model",
+        qdrant_collection="documents",
+        use_local_embeddings=False,
+        embedding_dim=32,
+        log_level="INFO",
+    )
+    vector_store = FlakyVectorStore()
+    metadata_db = MetadataDB(config.metadata_db_path)
+    pipeline = IngestionPipeline(EmbeddingService(config), vector_store, metadata_db, company_id="acme")
+
+    doc_path = tmp_path / "assessment.docx"
+    _write_docx(doc_path, [f"Paragraph {i} describes the condition of level {i} slab. " * 30 for i in range(3)])
+    vector_store.fail_next = True
+    with pytest.raises(ConnectionError):
+        pipeline.ingest(str(doc_path))
+    assert metadata_db.get_document_by_path("acme", str(doc_path)) is None
+
+    retried = pipeline.ingest(str(doc_path))
+    assert retried["status"] == "new" and retried["embedded_chunks"] == retried["chunk_count"]
+    assert sorted(r.id for r in vector_store.records) == sorted(metadata_db.fetch_chunk_ids(retried["artifact_id"]))
+
+
+def test_batch_ingest_uses_process_pool_and_resumes_from_journal(tmp_path):
+    from ingest.batch_ingest import BatchIngestor
+
+    config = AppConfig(
+        openai_api_key=None,
+        vector_db_path=tmp_path / "vector_db",
+        metadata_db_path=tmp_path / "metadata.db",
+        embedding_model="debug-model",
+        qdrant_collection="documents",
+        use_local_embeddings=False,
+        embedding_dim=32,
+        log_level="INFO",
+    )
+    docs = tmp_path / "library"
+    docs.mkdir()
+    for i in range(3):
+        _write_docx(docs / f"report_{i}.docx", [f"Report {i} covers footing {j} settlement. " * 20 for j in range(3)])
+    (docs / "broken.docx").write_bytes(b"not a docx")
+
+    embedding_service = CountingEmbeddingService(EmbeddingService(config))
+    vector_store = DeletableVectorStore()
+    pipeline = IngestionPipeline(embedding_service, vector_store, MetadataDB(config.metadata_db_path), company_id="acme")
+    journal = tmp_path / "ingest_journal.jsonl"
+
+    report = BatchIngestor(pipeline, parse_workers=2, embed_workers=2, queue_size=2, journal_path=journal).ingest_directory(docs)
+
+    assert sorted(Path(p).name for p in report.results) == ["report_0.docx", "report_1.docx", "report_2.docx"]
+    assert [Path(p).name for p in report.failures] == ["broken.docx"]
+    summary = report.summary()
+    assert summary["statuses"] == {"new": 3}
+    assert summary["stages"]["parse"]["items"] == 3
+    assert 0 < summary["stages"]["parse"]["wall_seconds"] <= summary["wall_seconds"]
+    assert summary["stages"]["write"]["chunks"] == len(vector_store.records) == len(embedding_service.embedded)
+
+    embedding_service.embedded.clear()
+    rerun = BatchIngestor(pipeline, parse_workers=0, journal_path=journal).ingest_directory(docs)
+    assert len(rerun.resumed) == 3
+    assert [Path(p).name for p in rerun.failures] == ["broken.docx"]
+    assert embedding_service.embedded == []
+
+
+def test_batch_ingest_survives_journal_write_errors(tmp_path):
+    import threading
+
+    from ingest.batch_ingest import BatchIngestor
+
+    config = AppConfig(
+        openai_api_key=None,
+        vector_db_path=tmp_path / "vector_db",
+        metadata_db_path=tmp_path / "metadata.db",
+        embedding_model="debug-model",
+        qdrant_collection="documents",
+        use_local_embeddings=False,
+        embedding_dim=32,
+        log_level="INFO",
+    )
+    docs = tmp_path / "library"
+    docs.mkdir()
+    for i in range(4):
+        _write_docx(docs / f"report_{i}.docx", [f"Report {i} covers footing settlement. " * 20])
+    pipeline = IngestionPipeline(
+        EmbeddingService(config), DeletableVectorStore(), MetadataDB(config.metadata_db_path), company_id="acme"
+    )
+    ingestor = BatchIngestor(pipeline, parse_workers=0, embed_workers=1, queue_size=1)
+
+    def disk_full(entry):
+        raise OSError(28, "No space left on device")
+
+    ingestor._append_journal = disk_full
+    reports = []
+    runner = threading.Thread(target=lambda: reports.append(ingestor.ingest_directory(docs)), daemon=True)
+    runner.start()
+    runner.join(timeout=60)
+
+    assert not runner.is_alive(), "writer thread died and left producers blocked"
+    assert sorted(Path(p).name for p in reports[0].failures) == [f"report_{i}.docx" for i in range(4)]
@@ -41,6 +41,9 @@ class DummyMetadataDB:
         conn.commit()
         return conn
 
+    def query(self, sql, params=()):
+        return self._connect().execute(sql, params).fetchall()
+
 
 def test_report_drafter_infers_sections_and_combines_text():
     responses = {
@@ -74,3 +77,78 @@ def test_report_drafter_skips_when_no_content():
     assert len(result["sections"]) == 1
     assert result["sections"][0]["section_type"] == "conclusion"
     assert any("skipped" in w for w in result["warnings"])
+
+
+class SlowGenerator(DummyGenerator):
+    """Later sections finish first so ordering and overlap are observable."""
+
+    def __init__(self, responses, delays):
+        super().__init__(responses)
+        self.delays = delays
+        self.active = 0
+        self.peak = 0
+        import threading
+
+        self._lock = threading.Lock()
+
+    def draft_section(self, company_id, user_request, overrides=None):
+        import time
+
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delays.get(overrides.get("section_type"), 0.0))
+        with self._lock:
+            self.active -= 1
+        return super().draft_section(company_id, user_request, overrides)
+
+
+def test_report_drafter_drafts_concurrently_and_streams_in_order():
+    order = ["executive_summary", "background", "detailed_analysis", "recommendations", "conclusion"]
+    responses = {s: {"text": f"{s} text"} for s in order}
+    delays = {s: 0.05 * (len(order) - i) for i, s in enumerate(order)}
+    gen = SlowGenerator(responses, delays)
+    drafter = ReportDrafter(generator=gen, metadata_db=DummyMetadataDB(section_types=order), max_workers=3)
+
+    streamed = []
+    result = drafter.draft_report(
+        company_id="demo",
+        user_request="Draft full report",
+        doc_type="design_report",
+        on_section=lambda event: streamed.append(event["section_type"]),
+    )
+
+    assert streamed == order
+    assert [s["section_type"] for s in result["sections"]] == order
+    assert gen.peak == 3
+
+
+def test_shared_retriever_dedupes_identical_lookups():
+    from retrieval.retriever import Retriever, SharedRetriever
+
+    class _Embeddings:
+        def __init__(self):
+            self.calls = 0
+
+        def embed_text(self, text):
+            self.calls += 1
+            return [1.0, 0.0]
+
+    class _Store:
+        def __init__(self):
+            self.searches = []
+
+        def search(self, vector, top_k, filters):
+            self.searches.append(dict(filters))
+            return [{"id": "c1", "score": 0.9, "text": "chunk", "metadata": {}}]
+
+    embeddings, store = _Embeddings(), _Store()
+    shared = SharedRetriever(Retriever(embeddings, store))
+
+    first = shared.retrieve_for_query("q", "demo", "content", top_k=5, filters={"doc_type": "design_report"})
+    second = shared.retrieve_for_query("q", "demo", "content", top_k=5, filters={"doc_type": "design_report"})
+    shared.retrieve_for_query("q", "demo", "content", top_k=5, filters={"section_type": "scope"})
+
+    assert first == second and first is not second
+    assert len(store.searches) == 2
+    assert embeddings.calls == 1
@@ -47,3 +47,35 @@ def test_draft_section_with_rewrite():
     assert result["draft_text"].startswith("This is a rewritten")
     assert result["citations"][0]["artifact_id"] == "a1"
     assert result["length_target"]["min_chars"] <= len(result["draft_text"]) <= result["length_target"]["max_chars"]
+
+
+def test_retrieve_with_fallbacks_single_search_relaxes_in_memory():
+    class CountingRetriever:
+        def __init__(self, chunks):
+            self.chunks = chunks
+            self.calls = []
+
+        def retrieve_for_query(self, query_text, company_id, chunk_type, top_k=6, filters=None):
+            self.calls.append({"top_k": top_k, "filters": dict(filters or {})})
+            return self.chunks[:top_k]
+
+    chunks = [
+        {"text": "general", "score": 0.9, "metadata": {"doc_type": "memo", "section_type": "scope"}},
+        {"text": "report intro", "score": 0.8, "metadata": {"doc_type": "design_report", "section_type": "introduction"}},
+        {"text": "report scope", "score": 0.7, "metadata": {"doc_type": "design_report", "section_type": "scope"}},
+        {"text": "report scope 2", "score": 0.75, "metadata": {"doc_type": "design_report", "section_type": "scope"}},
+    ]
+    retriever = CountingRetriever(chunks)
+    generator = Tier2Generator(retriever=retriever, metadata_db=DummyMetadataDB(), llm_client=DummyLLM(["x"]))
+
+    results, warnings, source = generator._retrieve_with_fallbacks("q", "demo", "content", 2, "design_report", "scope")
+    assert [r["text"] for r in results] == ["report scope 2", "report scope"]
+    assert source == "section+doc_type" and not warnings
+
+    results, warnings, source = generator._retrieve_with_fallbacks("q", "demo", "content", 2, "design_report", "appendix")
+    assert [r["text"] for r in results] == ["report intro", "report scope 2"]
+    assert source == "doc_type" and warnings
+
+    assert len(retriever.calls) == 2
+    assert all(c["filters"] == {"company_id": "demo", "index_type": "content"} for c in retriever.calls)
+    assert retriever.calls[0]["top_k"] == 10
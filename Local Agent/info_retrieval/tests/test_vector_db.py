@@ -0,0 +1,113 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+from ir_utils.config import AppConfig  # noqa: E402
+from storage import vector_db  # noqa: E402
+from storage.qdrant_vector_store import QdrantVectorStore  # noqa: E402
+from storage.vector_db import VectorDB  # noqa: E402
+from storage.vector_store import Chunk  # noqa: E402
+
+
+def _config(tmp_path):
+    return AppConfig(
+        openai_api_key=None,
+        vector_db_path=tmp_path / "qdrant",
+        metadata_db_path=tmp_path / "metadata.db",
+        embedding_model="test",
+        qdrant_collection="documents",
+        use_local_embeddings=True,
+        embedding_dim=3,
+        log_level="INFO",
+    )
+
+
+def _chunks(artifact_id, version_id, count):
+    return [
+        Chunk(
+            id=f"{artifact_id}-{version_id}-{i}",
+            text=f"chunk {i}",
+            embedding=[1.0, float(i), 0.0],
+            metadata={"artifact_id": artifact_id, "version_id": version_id, "index_type": "content"},
+        )
+        for i in range(count)
+    ]
+
+
+class _FakeQdrantClient:
+    def __init__(self, collections=(), payload_indexes=()):
+        self.collections = set(collections)
+        self.payload_indexes = list(payload_indexes)
+        self.upserts = []
+        self.deletes = []
+
+    def get_collections(self):
+        return SimpleNamespace(collections=[SimpleNamespace(name=n) for n in self.collections])
+
+    def get_collection(self, collection_name):
+        schema = {field: "keyword" for name, field in self.payload_indexes if name == collection_name}
+        return SimpleNamespace(payload_schema=schema)
+
+    def create_collection(self, collection_name, vectors_config):
+        self.collections.add(collection_name)
+
+    def create_payload_index(self, collection_name, field_name, field_schema):
+        self.payload_indexes.append((collection_name, field_name))
+
+    def upsert(self, collection_name, points, wait):
+        self.upserts.append((len(points), wait))
+
+    def delete(self, collection_name, points_selector, wait):
+        self.deletes.append((collection_name, points_selector))
+
+
+def test_in_memory_delete_by_artifact_removes_only_that_version(tmp_path):
+    store = QdrantVectorStore(VectorDB(_config(tmp_path), use_in_memory=True), company_id="acme")
+    store.upsert(_chunks("doc", "v1", 3) + _chunks("doc", "v2", 2) + _chunks("other", "v1", 1))
+
+    store.delete_by_artifact("doc", version_id="v1")
+    remaining = store.search([1.0, 1.0, 0.0], top_k=10, filters={"index_type": "content"})
+    assert sorted(r.id for r in remaining) == ["doc-v2-0", "doc-v2-1", "other-v1-0"]
+
+    store.delete_by_artifact("doc")
+    assert [r.id for r in store.search([1.0, 1.0, 0.0], top_k=10)] == ["other-v1-0"]
+
+
+def _patch_qdrant(monkeypatch, fake):
+    monkeypatch.setattr(vector_db, "QdrantClient", lambda **kwargs: fake)
+    monkeypatch.setattr(vector_db, "PointStruct", lambda **kwargs: kwargs)
+    monkeypatch.setattr(vector_db, "VectorParams", lambda **kwargs: kwargs)
+    monkeypatch.setattr(vector_db, "Distance", SimpleNamespace(COSINE="Cosine"))
+    monkeypatch.setattr(vector_db, "PayloadSchemaType", SimpleNamespace(KEYWORD="keyword"))
+    for name in ("FieldCondition", "Filter", "FilterSelector", "MatchValue"):
+        monkeypatch.setattr(vector_db, name, lambda **kwargs: kwargs)
+
+
+def test_qdrant_upserts_are_batched_with_final_barrier(tmp_path, monkeypatch):
+    fake = _FakeQdrantClient()
+    _patch_qdrant(monkeypatch, fake)
+    monkeypatch.setenv("QDRANT_UPSERT_BATCH_SIZE", "4")
+
+    db = VectorDB(_config(tmp_path))
+    QdrantVectorStore(db, company_id="acme").upsert(_chunks("doc", "v1", 10))
+
+    assert sorted(fake.upserts) == [(2, True), (4, False), (4, False)]
+    assert fake.upserts[-1] == (2, True)
+    assert ("content_acme", "artifact_id") in fake.payload_indexes
+
+    db.delete_by_artifact("acme", "doc", "v1")
+    (collection, selector), = fake.deletes
+    assert collection == "content_acme"
+    assert [c["key"] for c in selector["filter"]["must"]] == ["artifact_id", "version_id"]
+
+
+def test_existing_collection_gets_only_missing_payload_indexes(tmp_path, monkeypatch):
+    fake = _FakeQdrantClient(collections={"content_acme"}, payload_indexes=[("content_acme", "artifact_id")])
+    _patch_qdrant(monkeypatch, fake)
+
+    QdrantVectorStore(VectorDB(_config(tmp_path)), company_id="acme").upsert(_chunks("doc", "v1", 1))
+
+    indexed = [field for name, field in fake.payload_indexes if name == "content_acme"]
+    assert sorted(indexed) == sorted(vector_db.PAYLOAD_INDEX_FIELDS)